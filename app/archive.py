@@ -0,0 +1,234 @@
+"""
+歷史訂單封存
+
+orders 每年增加約「人數 × 工作日」筆（含每人每日的 NoOrder），以日期篩選的管理報表都要掃描它。
+此模組把早於保存期限（horizon）的訂單移至每年一張的 orders_archive_<年> 資料表，
+orders 只保留近期資料；查詢較早日期的報表才會 UNION 封存表。
+
+- 先提交新的 boundary（允許封存的日期上限，只增不減）並建立所需年份的封存表，
+  等待 grace 秒讓其他程序的快取與進行中的請求看到新界線，之後才開始搬移
+- 每個交易搬移一整天：INSERT 至封存表並自 orders 刪除，交易短且不阻擋訂餐；
+  中斷後重新執行會由最早尚未搬移的日期繼續
+- 距今 MIN_HORIZON_DAYS 天內的日期永遠不會被封存，這些查詢不需讀取封存狀態
+- 個人訂單列表（GET /orders/）涵蓋所有日期，已有封存資料時以 all_orders() 一併讀取封存表；
+  封存時仍遞增受影響使用者的版本號
+- 排程工作 archive_orders 的保存天數由環境變數 WEBDINER_ARCHIVE_HORIZON_DAYS 設定（見 app.jobs）
+
+使用方式：
+    python -m app.archive --horizon-days 400            # 封存 400 天前的訂單
+    python -m app.archive --status
+"""
+
+import argparse
+import logging
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import NamedTuple, Optional, Tuple
+
+from sqlalchemy import Column, Index, MetaData, Table, func, select, text, union_all
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, aliased
+
+from . import cache, localtime, models, versions
+
+logger = logging.getLogger("webdiner.archive")
+
+MIN_HORIZON_DAYS = 30
+DEFAULT_HORIZON_DAYS = 400
+
+_metadata = MetaData()
+
+
+class ArchiveRef(NamedTuple):
+    boundary: Optional[date]
+    archived_through: Optional[date]
+    years: Tuple[int, ...]
+
+
+def _load_state(db: Session) -> ArchiveRef:
+    state = db.get(models.OrderArchiveState, 1)
+    if state is None or state.boundary is None:
+        return ArchiveRef(None, None, ())
+    names = db.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'orders_archive_%'"
+    )).scalars().all()
+    years = tuple(sorted(int(name.rsplit("_", 1)[1]) for name in names))
+    return ArchiveRef(state.boundary, state.archived_through, years)
+
+
+cache.register("archive", _load_state, depends_on=(versions.ARCHIVE,))
+
+
+def archive_table(year: int) -> Table:
+    """orders_archive_<年>：欄位與 orders 相同"""
+    name = f"orders_archive_{year}"
+    if name in _metadata.tables:
+        return _metadata.tables[name]
+    columns = [Column(c.name, c.type, primary_key=c.primary_key) for c in models.Order.__table__.columns]
+    return Table(
+        name, _metadata, *columns,
+        Index(f"ix_{name}_date_snapshot", *models.ORDER_REPORT_COLUMNS),
+        Index(f"ix_{name}_user_date", "user_id", "order_date"),
+    )
+
+
+def is_archived(db: Session, day: date) -> bool:
+    """該日期是否可能已移至封存表（已封存的日期不再接受修改）"""
+    if day >= localtime.today() - timedelta(days=MIN_HORIZON_DAYS):
+        return False
+    boundary = cache.get("archive", db).boundary
+    return boundary is not None and day < boundary
+
+
+def orders_between(db: Session, first: date, last: Optional[date] = None):
+    """
+    回傳查詢 first ~ last 訂單時使用的實體
+
+    日期皆未封存時為 models.Order 本身；否則為 orders 與相關年份封存表的 UNION ALL，
+    以 aliased(models.Order) 包裝，呼叫端的查詢寫法不變
+    """
+    last = last or first
+    if not is_archived(db, first):
+        return models.Order
+    state = cache.get("archive", db)
+    names = [c.name for c in models.Order.__table__.columns]
+    parts = [
+        select(*[models.Order.__table__.c[n] for n in names]).where(
+            models.Order.order_date >= first, models.Order.order_date <= last
+        )
+    ]
+    for year in state.years:
+        if not first.year <= year <= last.year:
+            continue
+        table = archive_table(year)
+        parts.append(
+            select(*[table.c[n] for n in names]).where(table.c.order_date >= first, table.c.order_date <= last)
+        )
+    return aliased(models.Order, union_all(*parts).subquery("orders_all"))
+
+
+def all_orders(db: Session):
+    """不限日期的查詢（例如個人訂單列表）使用的實體；尚未封存過時為 models.Order 本身"""
+    state = cache.get("archive", db)
+    if state.boundary is None or not state.years:
+        return models.Order
+    return orders_between(db, date(state.years[0], 1, 1), date.max)
+
+
+def _state(db: Session) -> models.OrderArchiveState:
+    state = db.get(models.OrderArchiveState, 1)
+    if state is None:
+        state = models.OrderArchiveState(id=1)
+        db.add(state)
+    return state
+
+
+def advance_boundary(db: Session, boundary: date, horizon_days: int) -> bool:
+    """提交新的界線並建立所需年份的封存表；界線未前進時回傳 False"""
+    state = _state(db)
+    if state.boundary is not None and boundary <= state.boundary:
+        return False
+    first = db.query(func.min(models.Order.order_date)).filter(models.Order.order_date < boundary).scalar()
+    # 於同一交易中建立所有可能用到的年份，讀取端依實際存在的資料表組成 UNION
+    bind = db.connection()
+    for year in range(first.year if first else boundary.year, boundary.year + 1):
+        archive_table(year).create(bind=bind, checkfirst=True)
+    state.boundary = boundary
+    state.horizon_days = horizon_days
+    state.updated_at = datetime.utcnow()
+    versions.bump(db, versions.ARCHIVE)
+    db.commit()
+    cache.invalidate("archive")
+    return True
+
+
+def move_day(db: Session, day: date) -> int:
+    """將一天的訂單移至封存表（單一交易），回傳搬移筆數"""
+    orders = models.Order.__table__
+    table = archive_table(day.year)
+    names = [c.name for c in orders.columns]
+    db.execute(
+        table.insert().prefix_with("OR REPLACE").from_select(
+            names, select(*[orders.c[n] for n in names]).where(orders.c.order_date == day)
+        )
+    )
+    # 搬移不是刪除：移除刪除觸發器寫入的 change_log 紀錄，避免 /api/changes 將封存的訂單回報為 deletes
+    last_change = db.query(func.coalesce(func.max(models.ChangeLog.id), 0)).scalar()
+    user_ids = db.execute(
+        orders.delete().where(orders.c.order_date == day).returning(orders.c.user_id)
+    ).scalars().all()
+    db.query(models.ChangeLog).filter(models.ChangeLog.id > last_change).delete(synchronize_session=False)
+    versions.bump_orders(db, set(user_ids), [])
+    state = _state(db)
+    state.archived_through = day
+    state.updated_at = datetime.utcnow()
+    db.commit()
+    return len(user_ids)
+
+
+def run(engine: Engine, horizon_days: int = DEFAULT_HORIZON_DAYS, grace: float = 5.0, pause: float = 0.05,
+        max_days: Optional[int] = None, today: Optional[date] = None, log=logger.info) -> dict:
+    """
+    封存 horizon_days 天前的訂單；可隨時中斷並重新執行
+
+    - grace: 界線前進後開始搬移前的等待秒數（需大於快取輪詢週期）
+    - pause: 每搬完一天的間隔，讓訂餐寫入取得鎖
+    - max_days: 本次最多搬移的天數（分段執行）
+    """
+    if horizon_days < MIN_HORIZON_DAYS:
+        raise ValueError(f"horizon_days 不可小於 {MIN_HORIZON_DAYS}")
+    boundary = (today or localtime.today()) - timedelta(days=horizon_days)
+    result = {"boundary": boundary, "days": 0, "orders": 0}
+
+    with Session(engine) as db:
+        if advance_boundary(db, boundary, horizon_days):
+            log(f"Archive boundary advanced to {boundary}")
+            time.sleep(grace)
+        boundary = _state(db).boundary
+        db.commit()
+
+        while max_days is None or result["days"] < max_days:
+            day = db.query(func.min(models.Order.order_date)).filter(models.Order.order_date < boundary).scalar()
+            db.commit()
+            if day is None:
+                break
+            moved = move_day(db, day)
+            result["days"] += 1
+            result["orders"] += moved
+            log(f"Archived {moved} orders of {day}")
+            if pause:
+                time.sleep(pause)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="封存歷史訂單")
+    parser.add_argument("--database", help="SQLite 檔案路徑（預設使用應用程式設定）")
+    parser.add_argument("--horizon-days", type=int, default=DEFAULT_HORIZON_DAYS, help="保留於 orders 的天數")
+    parser.add_argument("--grace", type=float, default=5.0, help="界線前進後等待的秒數")
+    parser.add_argument("--pause", type=float, default=0.05, help="每搬移一天後的間隔秒數")
+    parser.add_argument("--max-days", type=int, help="本次最多搬移的天數")
+    parser.add_argument("--status", action="store_true", help="僅顯示目前進度")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        from sqlalchemy import create_engine
+        engine = create_engine(f"sqlite:///{args.database}", connect_args={"timeout": 30})
+    else:
+        from .database import engine
+
+    if args.status:
+        with Session(engine) as db:
+            state = _load_state(db)
+            hot = db.query(func.count(models.Order.id)).scalar()
+        print(f"boundary={state.boundary} archived_through={state.archived_through} hot_orders={hot}")
+        return 0
+
+    result = run(engine, args.horizon_days, grace=args.grace, pause=args.pause, max_days=args.max_days, log=print)
+    print(f"Archived {result['orders']} orders in {result['days']} days (boundary {result['boundary']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+月結報表
+
+以單一 GROUP BY 查詢（orders ⋈ users ⋈ departments）取得每位使用者、每家廠商的份數與金額，
+部門與廠商合計由同一組結果累加，不另行查詢。金額與廠商名稱來自訂單寫入當下的快照
+（orders.unit_price / vendor_name），修改菜單價格不會改變歷史帳單。
+
+- 已結束的月份（versions.month_closed）結果不再隨日常訂餐變動，以 "billing" 快取領域
+  永久保存；管理者修改該月訂單時 bump_orders 會遞增 billing 版本使快取失效
+- 本月的報表每次重新計算
+- 人員與部門名稱為產生報表時的資料
+- 舊版 JSON 品項訂單與不訂餐（NoOrder）不列入計費
+"""
+
+from datetime import date
+from typing import Iterator, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import archive, cache, exports, localtime, models, versions
+
+UNKNOWN_VENDOR = "未知廠商"
+NO_DEPARTMENT = "未分配部門"
+
+
+def month_range(month: Optional[str]):
+    """YYYY-MM（預設本月）的第一天與最後一天；格式錯誤時拋出 ValueError"""
+    days = versions.month_days(month or localtime.today().strftime("%Y-%m"))
+    return days[0], days[-1]
+
+
+def _add(totals: dict, vendor_id, vendor_name, count: int, amount: int):
+    totals["count"] += count
+    totals["amount"] += amount
+    vendor = totals["vendors"].setdefault(vendor_id, {
+        "vendor_id": vendor_id, "vendor_name": vendor_name, "count": 0, "amount": 0,
+    })
+    vendor["count"] += count
+    vendor["amount"] += amount
+
+
+def _totals(**fields) -> dict:
+    return {**fields, "count": 0, "amount": 0, "vendors": {}}
+
+
+def _finish(totals: dict) -> dict:
+    totals["vendors"] = sorted(totals["vendors"].values(), key=lambda v: (v["vendor_name"], v["vendor_id"] or 0))
+    return totals
+
+
+def compute(db: Session, first: date, last: date) -> dict:
+    Order = archive.orders_between(db, first, last)
+    rows = db.query(
+        models.User.id.label("user_id"),
+        models.User.employee_id,
+        models.User.name,
+        models.Department.id.label("department_id"),
+        models.Department.name.label("department_name"),
+        models.Department.display_order,
+        Order.vendor_id,
+        Order.vendor_name,
+        func.count(Order.id).label("count"),
+        func.coalesce(func.sum(Order.unit_price), 0).label("amount"),
+    ).select_from(Order).join(
+        models.User, models.User.id == Order.user_id
+    ).outerjoin(
+        models.Department, models.Department.id == models.User.department_id
+    ).filter(
+        Order.order_date >= first, Order.order_date <= last, Order.vendor_menu_item_id != None
+    ).group_by(models.User.id, Order.vendor_id).all()
+
+    total = _totals()
+    departments, users = {}, {}
+    for row in rows:
+        vendor_name = row.vendor_name if row.vendor_name is not None else UNKNOWN_VENDOR
+        department_name = row.department_name if row.department_id is not None else NO_DEPARTMENT
+        user = users.get(row.user_id)
+        if user is None:
+            user = users[row.user_id] = _totals(
+                user_id=row.user_id, employee_id=row.employee_id, name=row.name,
+                department_id=row.department_id, department_name=department_name,
+            )
+        department = departments.get(row.department_id)
+        if department is None:
+            department = departments[row.department_id] = _totals(
+                department_id=row.department_id, department_name=department_name,
+            )
+            department["_order"] = (row.department_id is None, row.display_order or 0, row.department_id or 0)
+        for totals in (total, department, user):
+            _add(totals, row.vendor_id, vendor_name, row.count, row.amount)
+
+    ordered_departments = sorted(departments.values(), key=lambda d: d.pop("_order"))
+    department_rank = {d["department_id"]: n for n, d in enumerate(ordered_departments)}
+    return {
+        "month": first.strftime("%Y-%m"),
+        "closed": versions.month_closed(first),
+        "count": total["count"],
+        "amount": total["amount"],
+        "vendors": _finish(total)["vendors"],
+        "departments": [_finish(d) for d in ordered_departments],
+        "users": [
+            _finish(u) for u in sorted(
+                users.values(), key=lambda u: (department_rank[u["department_id"]], u["employee_id"])
+            )
+        ],
+    }
+
+
+def _load_closed(db: Session, month: str) -> Optional[dict]:
+    first, last = month_range(month)
+    return compute(db, first, last) if versions.month_closed(first) else None
+
+
+cache.register("billing", _load_closed, keyed=True, depends_on=(versions.BILLING,))
+
+
+def report(db: Session, first: date, last: date) -> dict:
+    if versions.month_closed(first):
+        return cache.get("billing", db, first.strftime("%Y-%m"))
+    return compute(db, first, last)
+
+
+# ---- 匯出 ----
+
+USER_HEADER = ["部門", "工號", "姓名", "廠商", "份數", "金額"]
+DEPARTMENT_HEADER = ["部門", "廠商", "份數", "金額"]
+
+
+def user_rows(report: dict) -> Iterator[list]:
+    """每位使用者每家廠商一列，之後為該使用者的小計"""
+    yield USER_HEADER
+    for user in report["users"]:
+        for vendor in user["vendors"]:
+            yield [user["department_name"], user["employee_id"], user["name"],
+                   vendor["vendor_name"], vendor["count"], vendor["amount"]]
+        if len(user["vendors"]) > 1:
+            yield [user["department_name"], user["employee_id"], user["name"], "小計", user["count"], user["amount"]]
+    yield ["合計", "", "", "", report["count"], report["amount"]]
+
+
+def department_rows(report: dict) -> Iterator[list]:
+    yield DEPARTMENT_HEADER
+    for department in report["departments"]:
+        for vendor in department["vendors"]:
+            yield [department["department_name"], vendor["vendor_name"], vendor["count"], vendor["amount"]]
+        yield [department["department_name"], "小計", department["count"], department["amount"]]
+    for vendor in report["vendors"]:
+        yield ["合計", vendor["vendor_name"], vendor["count"], vendor["amount"]]
+    yield ["合計", "", report["count"], report["amount"]]
+
+
+def csv_stream(report: dict) -> Iterator[bytes]:
+    return exports.csv_stream(user_rows(report))
+
+
+def xlsx_stream(report: dict) -> Iterator[bytes]:
+    return exports.xlsx_stream([("人員", user_rows(report)), ("部門", department_rows(report))])
@@ -0,0 +1,390 @@
+"""
+參考資料快取
+
+訂餐驗證所需的廠商、品項與特殊日期變動頻率很低，卻在每一筆訂單都要查詢。
+此模組保留唯讀快照，寫入端點於 commit 後呼叫 invalidate() 使其失效。
+
+- catalog: 廠商與廠商品項
+- calendar: 特殊日期（假日 / 補班日）
+- principals: 以工號為鍵的登入使用者（每個請求的身分驗證），不含密碼雜湊
+- 其他模組可以 register() 加入自己的領域（例如分機表 directory）
+
+啟動時 warm_up() 會預先載入所有領域，第一個請求不需等待載入。
+
+多個 worker 時每個程序各有一份快取，依 WEBDINER_CACHE_URL 選擇後端：
+
+- 未設定（預設）：程序內 LRU。本程序的寫入立即失效；其他程序的寫入由背景執行緒
+  每 WEBDINER_CACHE_POLL_SECONDS 秒（預設 1 秒）輪詢 data_versions 偵測，
+  最多延遲一個輪詢週期
+- redis://...：共用的 Redis（需安裝 redis 套件）。以每個領域的世代號碼組成鍵，
+  invalidate() 遞增世代號碼，所有程序立即看到失效；值以 pickle 儲存，Redis 須為內部可信任服務
+
+PRAGMA data_version 只能在同一條連線上比較，且任何寫入（包含訂單）都會改變，
+因此改為輪詢 data_versions 中各領域的版本號。
+
+同一個輪詢也供其他程序內狀態以 watch() 跟上其他 worker 的寫入（訂餐看板、查詢統計設定），
+此部分不論快取後端皆會執行。
+"""
+
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models, metrics
+
+logger = logging.getLogger("webdiner.cache")
+
+
+class VendorRef(NamedTuple):
+    id: int
+    name: str
+    description: Optional[str]
+    color: Optional[str]
+    is_active: bool
+    created_at: Optional[object] = None
+    daily_limit: Optional[int] = None
+
+
+class MenuItemRef(NamedTuple):
+    id: int
+    vendor_id: int
+    name: str
+    description: Optional[str]
+    price: int
+    weekday: Optional[int]
+    is_active: bool
+    daily_limit: Optional[int] = None
+
+
+class Catalog(NamedTuple):
+    vendors: Dict[int, VendorRef]
+    menu_items: Dict[int, MenuItemRef]
+
+    def snapshot(self, item_id: Optional[int]) -> dict:
+        """寫入訂單時保存的單價與名稱（orders.unit_price / vendor_name / item_name）；不訂餐時皆為 None"""
+        item = self.menu_items.get(item_id) if item_id else None
+        if item is None:
+            return {"unit_price": None, "vendor_name": None, "item_name": None}
+        vendor = self.vendors.get(item.vendor_id)
+        return {"unit_price": item.price, "vendor_name": vendor.name if vendor else None, "item_name": item.name}
+
+
+class SpecialDayRef(NamedTuple):
+    id: int
+    date: date
+    is_holiday: bool
+    description: Optional[str]
+
+
+class Calendar(NamedTuple):
+    # date -> is_holiday
+    special_days: Dict[date, bool]
+    # 依日期排序的完整資料
+    days: Tuple[SpecialDayRef, ...] = ()
+
+    def is_holiday(self, day: date) -> bool:
+        if day in self.special_days:
+            return self.special_days[day]
+        # Weekend check (5=Saturday, 6=Sunday)
+        return day.weekday() >= 5
+
+    def between(self, first: date, last: date) -> list:
+        return [day for day in self.days if first <= day.date <= last]
+
+
+def _load_catalog(db: Session) -> Catalog:
+    vendors = {
+        v.id: VendorRef(v.id, v.name, v.description, v.color, bool(v.is_active), v.created_at, v.daily_limit)
+        for v in db.query(models.Vendor).all()
+    }
+    menu_items = {
+        m.id: MenuItemRef(m.id, m.vendor_id, m.name, m.description, m.price, m.weekday, bool(m.is_active),
+                          m.daily_limit)
+        for m in db.query(models.VendorMenuItem).all()
+    }
+    return Catalog(vendors, menu_items)
+
+
+def _load_calendar(db: Session) -> Calendar:
+    days = tuple(
+        SpecialDayRef(row.id, row.date, bool(row.is_holiday), row.description)
+        for row in db.query(models.SpecialDay).order_by(models.SpecialDay.date).all()
+    )
+    return Calendar({day.date: day.is_holiday for day in days}, days)
+
+
+# 密碼雜湊不放入快取（Redis 後端會寫到程序外）；需要時由資料庫讀取
+_PRINCIPAL_EXCLUDED = {"hashed_password"}
+
+
+def _load_principal(db: Session, employee_id: str) -> Optional[dict]:
+    user = db.query(models.User).filter(models.User.employee_id == employee_id).first()
+    if user is None:
+        return None
+    return {column.key: getattr(user, column.key) for column in models.User.__table__.columns
+            if column.key not in _PRINCIPAL_EXCLUDED}
+
+
+# domain -> (loader, 是否以 key 區分)
+_loaders: Dict[str, Tuple[Callable, bool]] = {
+    "catalog": (_load_catalog, False),
+    "calendar": (_load_calendar, False),
+    "principals": (_load_principal, True),
+}
+
+# 快取領域所依賴的 data_versions 領域（供輪詢判斷其他程序的寫入）
+DEPENDENCIES: Dict[str, Tuple[str, ...]] = {
+    "catalog": ("catalog",),
+    "calendar": ("calendar",),
+    "principals": ("users",),
+}
+
+_MISSING = object()
+
+
+class LocalBackend:
+    """程序內 LRU；每個領域有世代號碼，載入期間發生失效時不保存舊資料"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, Optional[str]], object]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+
+    def lookup(self, domain: str, key: Optional[str]):
+        with self._lock:
+            token = self._generations.get(domain, 0)
+            value = self._entries.get((domain, key), _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end((domain, key))
+            return value, token
+
+    def store(self, domain: str, key: Optional[str], value, token):
+        with self._lock:
+            if self._generations.get(domain, 0) != token:
+                return
+            self._entries[(domain, key)] = value
+            self._entries.move_to_end((domain, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, domains: Iterable[str]):
+        domains = set(domains)
+        with self._lock:
+            for domain in domains:
+                self._generations[domain] = self._generations.get(domain, 0) + 1
+            for entry in [entry for entry in self._entries if entry[0] in domains]:
+                del self._entries[entry]
+
+    def loaded_domains(self) -> set:
+        with self._lock:
+            return {domain for domain, _ in self._entries}
+
+
+class RedisBackend:
+    """以 Redis 共用的快取；鍵為 <prefix>:<domain>:<世代>:<key>"""
+
+    def __init__(self, url: str, prefix: str = "webdiner:cache", ttl: int = 24 * 3600):
+        import redis  # 選用相依：僅在設定 redis:// 時需要
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _generation(self, domain: str) -> int:
+        return int(self.client.get(f"{self.prefix}:gen:{domain}") or 0)
+
+    def _key(self, domain: str, generation: int, key: Optional[str]) -> str:
+        return f"{self.prefix}:{domain}:{generation}:{key or ''}"
+
+    def lookup(self, domain: str, key: Optional[str]):
+        generation = self._generation(domain)
+        raw = self.client.get(self._key(domain, generation, key))
+        return (pickle.loads(raw) if raw is not None else _MISSING), generation
+
+    def store(self, domain: str, key: Optional[str], value, token):
+        # 載入期間若已失效，資料寫在舊世代的鍵下，不會再被讀取，並隨 TTL 過期
+        self.client.set(self._key(domain, token, key), pickle.dumps(value), ex=self.ttl)
+
+    def invalidate(self, domains: Iterable[str]):
+        pipe = self.client.pipeline()
+        for domain in set(domains):
+            pipe.incr(f"{self.prefix}:gen:{domain}")
+        pipe.execute()
+
+    def loaded_domains(self) -> set:
+        loaded = set()
+        for domain in _loaders:
+            pattern = self._key(domain, self._generation(domain), "*")
+            if next(iter(self.client.scan_iter(match=pattern, count=100)), None) is not None:
+                loaded.add(domain)
+        return loaded
+
+
+def create_backend(url: Optional[str] = None):
+    url = url if url is not None else os.environ.get("WEBDINER_CACHE_URL", "")
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    return LocalBackend()
+
+
+# 可重入：loader 可以讀取其他快取領域（例如月結報表需要封存狀態）
+_lock = threading.RLock()
+_backend = create_backend()
+
+
+def configure(url: Optional[str] = None):
+    """切換快取後端（預設依環境變數）；主要供啟動程序與測試使用"""
+    global _backend
+    stop_polling()
+    _backend = create_backend(url)
+    return _backend
+
+
+def backend():
+    return _backend
+
+
+def register(domain: str, loader: Callable, keyed: bool = False, depends_on: Iterable[str] = ()):
+    """
+    登記快取領域
+
+    - loader: loader(db) 載入完整快照；keyed 時為 loader(db, key)，回傳 None 表示不存在（不快取）
+    - depends_on: 內容所依賴的 data_versions 領域，供輪詢偵測其他程序的寫入
+    """
+    _loaders[domain] = (loader, keyed)
+    DEPENDENCIES[domain] = tuple(depends_on)
+
+
+def get(domain: str, db: Session, key: Optional[str] = None):
+    value, _ = _backend.lookup(domain, key)
+    if value is not _MISSING:
+        metrics.cache_requests.inc(domain=domain, result="hit")
+        return value
+    with _lock:
+        value, token = _backend.lookup(domain, key)
+        if value is not _MISSING:
+            metrics.cache_requests.inc(domain=domain, result="hit")
+            return value
+        metrics.cache_requests.inc(domain=domain, result="miss")
+        loader, keyed = _loaders[domain]
+        value = loader(db, key) if keyed else loader(db)
+        if value is not None:
+            _backend.store(domain, key, value, token)
+        return value
+
+
+def get_catalog(db: Session) -> Catalog:
+    return get("catalog", db)
+
+
+def get_calendar(db: Session) -> Calendar:
+    return get("calendar", db)
+
+
+def get_principal(db: Session, employee_id: str) -> Optional[dict]:
+    """登入使用者的欄位值；不存在時為 None"""
+    return get("principals", db, employee_id)
+
+
+def warm_up(db: Session) -> list:
+    """載入所有已登記、不以 key 區分且尚未載入的領域，回傳載入的領域名稱"""
+    loaded = _backend.loaded_domains()
+    warmed = [domain for domain, (_, keyed) in _loaders.items() if not keyed and domain not in loaded]
+    for domain in warmed:
+        get(domain, db)
+    return warmed
+
+
+def invalidate(*domains: str):
+    """使指定快取失效；未指定時清除全部"""
+    _backend.invalidate(domains or list(_loaders))
+
+
+# ========== 跨程序失效與監看 ==========
+
+# (目前要監看的版本領域, callback(db, 改變的版本領域))
+_watchers: List[Tuple[Callable[[], Iterable[str]], Callable[[Session, Set[str]], None]]] = []
+
+
+def watch(domains: Callable[[], Iterable[str]], callback: Callable[[Session, Set[str]], None]):
+    """
+    監看 data_versions 領域，讓程序內的狀態跟上其他 worker 的寫入
+
+    - domains: 回傳目前要監看的版本領域（例如有看板的日期），每次輪詢時呼叫
+    - callback: 版本改變時於輪詢執行緒中呼叫；本程序自己的寫入同樣會觸發，callback 須可重複執行
+    """
+    _watchers.append((domains, callback))
+
+class _Poller(threading.Thread):
+    def __init__(self, engine: Engine, interval: float):
+        super().__init__(name="cache-version-poller", daemon=True)
+        self.engine = engine
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.versions: Optional[Dict[str, int]] = None
+
+    def poll(self) -> list:
+        """讀取 data_versions，回傳因版本改變而失效的快取領域，並通知 watch() 的監看者"""
+        # 共用的 Redis 快取由 invalidate() 直接失效，只需通知監看者
+        dependencies = DEPENDENCIES if isinstance(_backend, LocalBackend) else {}
+        watchers = [(set(domains()), callback) for domains, callback in _watchers]
+        watched = {version for versions in dependencies.values() for version in versions}
+        watched = sorted(watched.union(*(domains for domains, _ in watchers)))
+        with Session(self.engine) as db:
+            rows = db.query(models.DataVersion.domain, models.DataVersion.version).filter(
+                models.DataVersion.domain.in_(watched)
+            ).all()
+            current = {domain: version for domain, version in rows}
+            previous, self.versions = self.versions, current
+            if previous is None:
+                return []
+            # 新加入監看的領域視為已改變（其建立後的寫入不會遺漏）
+            changed = {domain for domain in watched if current.get(domain) != previous.get(domain)}
+            stale = [domain for domain, versions in dependencies.items() if changed.intersection(versions)]
+            if stale:
+                invalidate(*stale)
+            for domains, callback in watchers:
+                if changed & domains:
+                    try:
+                        callback(db, changed & domains)
+                    except Exception:
+                        logger.exception("cache watcher %r failed", callback)
+        return stale
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:  # 資料庫暫時鎖定等狀況：下一輪再試
+                logger.exception("cache version poll failed")
+
+
+_poller: Optional[_Poller] = None
+
+
+def start_polling(engine: Engine, interval: Optional[float] = None) -> _Poller:
+    """啟動背景輪詢；先記錄目前版本，之後載入的快照皆不早於此基準"""
+    global _poller
+    stop_polling()
+    if interval is None:
+        interval = float(os.environ.get("WEBDINER_CACHE_POLL_SECONDS", "1.0"))
+    _poller = _Poller(engine, interval)
+    _poller.poll()
+    _poller.start()
+    return _poller
+
+
+def stop_polling():
+    global _poller
+    if _poller is not None:
+        _poller.stopped.set()
+        _poller.join(timeout=5)
+        _poller = None
@@ -0,0 +1,143 @@
+"""
+每日供應上限
+
+廠商（vendors.daily_limit）與品項（vendor_menu_items.daily_limit）可設定每日份數上限，空值為不限。
+order_capacity 為每個 (scope, ref_id, order_date) 一列的已訂份數計數器，由 orders 的 trigger
+（migration 11）在寫入訂單的同一個語句中更新：
+
+- 新增訂單或改訂其他品項 / 日期時計數加一，取消或改訂時原品項與廠商減一（不訂餐與舊版訂單不計）
+- 加一後超過上限時 trigger 以 RAISE(ABORT) 中止該語句，訂單與計數器一起還原；
+  不需要先 COUNT(*)，兩個請求同時搶最後一份時只有一個會成功
+- 使用者訂餐、管理者修改、批次設定與每週計畫展開都受同一個限制
+
+呼叫端捕捉 IntegrityError 後以 exceeded() 取得原因；批次寫入先以 load() 一次取得剩餘份數，
+在記憶體中逐列扣除，讓超過上限的列個別被拒絕而不是中止整批
+"""
+
+from datetime import date
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, or_, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import cache, models
+
+ITEM = "item"
+VENDOR = "vendor"
+
+ITEM_EXCEEDED = "此餐點品項當日已達供應上限"
+VENDOR_EXCEEDED = "此廠商當日已達供應上限"
+
+# trigger 中止語句時的訊息 -> 回應給使用者的原因
+_ABORTS = {"daily_limit:item": ITEM_EXCEEDED, "daily_limit:vendor": VENDOR_EXCEEDED}
+
+
+def exceeded(exc: IntegrityError) -> Optional[str]:
+    """IntegrityError 是否為超過每日上限；是則回傳原因"""
+    return _ABORTS.get(str(exc.orig))
+
+
+def install_triggers(conn: Connection):
+    """建立維護 order_capacity 的 trigger（只計算有品項的訂單）"""
+    def change(row: str, delta: str) -> str:
+        return "".join(
+            f"INSERT INTO order_capacity (scope, ref_id, order_date, used) "
+            f"SELECT '{scope}', {row}.{column}, {row}.order_date, {delta} "
+            f"WHERE {row}.vendor_menu_item_id IS NOT NULL AND {row}.{column} IS NOT NULL "
+            f"ON CONFLICT (scope, ref_id, order_date) DO UPDATE SET used = used + {delta}; "
+            for scope, column in ((ITEM, "vendor_menu_item_id"), (VENDOR, "vendor_id"))
+        )
+
+    check = "".join(
+        f"SELECT RAISE(ABORT, 'daily_limit:{scope}') FROM order_capacity "
+        f"WHERE scope = '{scope}' AND ref_id = NEW.{column} AND order_date = NEW.order_date "
+        f"AND used > (SELECT daily_limit FROM {table} WHERE id = NEW.{column}); "
+        for scope, column, table in ((ITEM, "vendor_menu_item_id", "vendor_menu_items"),
+                                     (VENDOR, "vendor_id", "vendors"))
+    )
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS trg_order_capacity_insert AFTER INSERT ON orders "
+        f"WHEN NEW.vendor_menu_item_id IS NOT NULL BEGIN {change('NEW', '1')}{check}END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS trg_order_capacity_delete AFTER DELETE ON orders "
+        f"WHEN OLD.vendor_menu_item_id IS NOT NULL BEGIN {change('OLD', '-1')}END"
+    ))
+    # 只有品項、廠商或日期改變時才更新（截止時確認等狀態變更不受影響）
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS trg_order_capacity_update "
+        "AFTER UPDATE OF vendor_id, vendor_menu_item_id, order_date ON orders "
+        "WHEN OLD.vendor_menu_item_id IS NOT NEW.vendor_menu_item_id OR OLD.vendor_id IS NOT NEW.vendor_id "
+        "OR OLD.order_date IS NOT NEW.order_date BEGIN "
+        f"{change('OLD', '-1')}{change('NEW', '1')}"
+        f"{check}END"
+    ))
+
+
+class Capacity(NamedTuple):
+    """有上限的品項與廠商在指定日期的已訂份數"""
+    limits: Dict[Tuple[str, int], int]
+    used: Dict[Tuple[str, int, date], int]
+
+    def left(self, scope: str, ref_id: Optional[int], day: date) -> Optional[int]:
+        """剩餘份數；不限時為 None"""
+        limit = self.limits.get((scope, ref_id))
+        if limit is None:
+            return None
+        return max(limit - self.used.get((scope, ref_id, day), 0), 0)
+
+    def item_left(self, item: cache.MenuItemRef, day: date) -> Optional[int]:
+        """品項實際可訂的份數（品項與廠商上限取小者）；皆不限時為 None"""
+        limits = [left for left in (self.left(ITEM, item.id, day), self.left(VENDOR, item.vendor_id, day))
+                  if left is not None]
+        return min(limits) if limits else None
+
+    def take(self, item: cache.MenuItemRef, day: date,
+             replacing: Optional[cache.MenuItemRef] = None) -> Optional[str]:
+        """
+        為一筆訂單扣除一份；超過上限時不扣除並回傳原因
+        replacing 為同一筆訂單原本的品項（改訂時先歸還）
+        """
+        released = []
+        if replacing is not None:
+            released = [(ITEM, replacing.id), (VENDOR, replacing.vendor_id)]
+        taken = [(ITEM, item.id), (VENDOR, item.vendor_id)]
+        for scope, ref_id in taken:
+            if (scope, ref_id) in released:
+                continue
+            if self.left(scope, ref_id, day) == 0:
+                return ITEM_EXCEEDED if scope == ITEM else VENDOR_EXCEEDED
+        if replacing is not None:
+            self.release(replacing, day)
+        for scope, ref_id in taken:
+            self.used[(scope, ref_id, day)] = self.used.get((scope, ref_id, day), 0) + 1
+        return None
+
+    def release(self, item: cache.MenuItemRef, day: date):
+        """歸還一份（取消或改訂的訂單原本的品項）"""
+        for scope, ref_id in ((ITEM, item.id), (VENDOR, item.vendor_id)):
+            self.used[(scope, ref_id, day)] = self.used.get((scope, ref_id, day), 0) - 1
+
+
+def load(db: Session, catalog: cache.Catalog, days: Iterable[date]) -> Capacity:
+    """指定日期的剩餘份數；沒有設定任何上限時不查詢資料庫"""
+    limits = {(ITEM, item.id): item.daily_limit for item in catalog.menu_items.values()
+              if item.daily_limit is not None}
+    limits.update({(VENDOR, vendor.id): vendor.daily_limit for vendor in catalog.vendors.values()
+                   if vendor.daily_limit is not None})
+    days = set(days)
+    if not limits or not days:
+        return Capacity(limits, {})
+
+    counter = models.OrderCapacity
+    conditions = []
+    for scope in (ITEM, VENDOR):
+        ref_ids = [ref_id for limit_scope, ref_id in limits if limit_scope == scope]
+        if ref_ids:
+            conditions.append(and_(counter.scope == scope, counter.ref_id.in_(ref_ids)))
+    rows = db.query(counter.scope, counter.ref_id, counter.order_date, counter.used).filter(
+        counter.order_date.in_(days), or_(*conditions),
+    ).all()
+    return Capacity(limits, {(row.scope, row.ref_id, row.order_date): row.used for row in rows})
@@ -0,0 +1,126 @@
+"""
+增量同步：變更紀錄與 /api/changes
+
+寫入 orders、vendors、vendor_menu_items、special_days、users 時，資料庫 trigger（migration 4）
+在同一交易中於 change_log 新增一筆 (scope, entity_id, owner_id)。用戶端保存上次取得的游標，
+之後以 GET /api/changes?since=<cursor> 只取回這段期間異動的資料：
+
+- 同一筆資料多次異動只回傳一次，內容為目前狀態（upserts）；已不存在者列於 deletes
+- 訂單僅包含自己的訂單；使用者範圍僅限管理員
+- 廠商與品項為軟刪除，停用後以 is_active = false 出現在 upserts
+- SQLite 同時只有一個寫入者，id 依 commit 順序遞增，游標之前的紀錄不會事後才出現
+- 游標過舊（紀錄已清除）、超前（資料庫已更換）或未提供時回傳 reset = true，用戶端應重新完整載入
+
+使用方式：
+    python -m app.changes --prune-days 30   # 清除 30 天前的變更紀錄
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+
+# scope -> (資料表模型, 回應 schema)
+SCOPES = {
+    "orders": (models.Order, schemas.Order),
+    "vendors": (models.Vendor, schemas.Vendor),
+    "menu_items": (models.VendorMenuItem, schemas.VendorMenuItem),
+    "special_days": (models.SpecialDay, schemas.SpecialDay),
+    "users": (models.User, schemas.User),
+}
+ADMIN_SCOPES = {"users"}
+
+# 每次回應最多處理的變更紀錄筆數；超過時 has_more = true，以回傳的游標繼續取得
+PAGE_SIZE = 1000
+
+
+def visible_scopes(user: models.User) -> list:
+    return [scope for scope in SCOPES if scope not in ADMIN_SCOPES or user.is_admin]
+
+
+def collect(db: Session, user: models.User, scopes: Iterable[str], since: Optional[int],
+            limit: int = PAGE_SIZE) -> dict:
+    """彙整 since 之後的變更；scopes 需已檢查過權限"""
+    scopes = list(scopes)
+    low, high = db.query(func.min(models.ChangeLog.id), func.max(models.ChangeLog.id)).one()
+    high = high or 0
+    result = {
+        "cursor": high,
+        "reset": False,
+        "has_more": False,
+        "changes": {scope: {"upserts": [], "deletes": []} for scope in scopes},
+    }
+    # 清除紀錄時保留最新一筆，因此 low 為 None 代表從未有任何變更
+    if since is None or since > high or (low is not None and since < low - 1):
+        result["reset"] = True
+        return result
+    if since == high or not scopes:
+        return result
+
+    conditions = []
+    if "orders" in scopes:
+        conditions.append(and_(models.ChangeLog.scope == "orders", models.ChangeLog.owner_id == user.id))
+    others = [scope for scope in scopes if scope != "orders"]
+    if others:
+        conditions.append(models.ChangeLog.scope.in_(others))
+    entries = db.query(models.ChangeLog.id, models.ChangeLog.scope, models.ChangeLog.entity_id).filter(
+        models.ChangeLog.id > since,
+        models.ChangeLog.id <= high,
+        or_(*conditions),
+    ).order_by(models.ChangeLog.id).limit(limit + 1).all()
+
+    if len(entries) > limit:
+        entries = entries[:limit]
+        result["has_more"] = True
+        result["cursor"] = entries[-1].id
+
+    touched: Dict[str, set] = {}
+    for entry in entries:
+        touched.setdefault(entry.scope, set()).add(entry.entity_id)
+
+    for scope, entity_ids in touched.items():
+        model, schema = SCOPES[scope]
+        query = db.query(model).filter(model.id.in_(entity_ids))
+        if scope == "orders":
+            # id 可能已被他人的新訂單重複使用，僅回傳自己的訂單
+            query = query.filter(models.Order.user_id == user.id)
+        rows = query.order_by(model.id).all()
+        result["changes"][scope]["upserts"] = [schema.model_validate(row).model_dump() for row in rows]
+        result["changes"][scope]["deletes"] = sorted(entity_ids - {row.id for row in rows})
+    return result
+
+
+def prune(db: Session, before: datetime) -> int:
+    """清除 before 之前的變更紀錄（保留最新一筆以維持游標）；由呼叫端 commit"""
+    latest = db.query(func.max(models.ChangeLog.id)).scalar()
+    if latest is None:
+        return 0
+    return db.query(models.ChangeLog).filter(
+        models.ChangeLog.changed_at < before,
+        models.ChangeLog.id < latest,
+    ).delete(synchronize_session=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WebDiner 變更紀錄維護")
+    parser.add_argument("--prune-days", type=int, required=True, help="清除幾天前的變更紀錄")
+    args = parser.parse_args(argv)
+
+    from .database import SessionLocal
+    db = SessionLocal()
+    try:
+        deleted = prune(db, datetime.utcnow() - timedelta(days=args.prune_days))
+        db.commit()
+    finally:
+        db.close()
+    print(f"Pruned {deleted} change log entries")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
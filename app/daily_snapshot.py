@@ -0,0 +1,349 @@
+"""
+截止後的每日訂單快照
+
+截止時間（ordering.CUTOFF_TIME）之後，當日訂單只會因管理者修改而變動。截止時（排程工作
+confirm_orders）將當日訂單凍結為一份快照存於 daily_snapshots，內容為：
+
+- orders: 每位使用者的訂單（訂購當下的品項、廠商、單價快照與訂購人）
+- vendors: 各廠商的訂單表（品項、份數、金額與訂購人），已依廠商、品項名稱排序
+
+統計、訂餐公告、每日明細與廠商訂單表都由快照產生，不再重新彙總 orders。
+管理者修改已凍結日期的訂單時（update_user_order、bulk_update_orders），在同一交易中只修補受影響使用者的訂單
+與受影響的廠商訂單表；尚未凍結的日期每次由資料庫即時建立相同結構，不寫入快照。
+
+- 只有截止工作會凍結，並補凍結服務停止期間錯過截止的日期（missed_days）；
+  讀取不寫入，沒有快照的過去日期（例如啟用前的資料）每次即時建立
+- 快照取得寫入鎖後才讀取訂單，與管理者修改之間不會遺漏更新
+- 訂購人的姓名為凍結當下的資料；廠商顏色與品項說明仍取自目前的菜單
+"""
+
+import json
+from datetime import date, datetime
+from html import escape
+from typing import Any, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import archive, exports, models
+from .ordering import earliest_editable_date
+
+UNKNOWN_VENDOR = "未知廠商"
+
+
+def is_frozen(day: date) -> bool:
+    """該日期是否已過截止時間（台灣時間）"""
+    return day < earliest_editable_date()
+
+
+# ---- 建立 ----
+
+def _entry(row) -> dict:
+    return {
+        "order_id": row.id,
+        "user_id": row.user_id,
+        "employee_id": row.employee_id,
+        "name": row.user_name,
+        "department_id": row.department_id,
+        "item_id": row.vendor_menu_item_id,
+        "vendor_id": row.vendor_id,
+        "vendor_name": row.vendor_name,
+        "item_name": row.item_name,
+        "unit_price": row.unit_price,
+        # 舊版 JSON 訂單的明細：[品項名稱, 單價, 數量]
+        "lines": [],
+    }
+
+
+def build(db: Session, day: date) -> dict:
+    """由資料庫建立指定日期的快照內容（不寫入）；舊版 JSON 訂單每個明細一列"""
+    Order = archive.orders_between(db, day)
+    Line = models.OrderLine
+    rows = db.query(
+        Order.id, Order.user_id, Order.vendor_menu_item_id, Order.vendor_id,
+        Order.vendor_name, Order.item_name, Order.unit_price,
+        models.User.employee_id, models.User.name.label("user_name"), models.User.department_id,
+        Line.item_name.label("line_name"), Line.unit_price.label("line_price"), Line.quantity,
+    ).select_from(Order).outerjoin(
+        models.User, models.User.id == Order.user_id
+    ).outerjoin(
+        Line, and_(Line.order_id == Order.id, Order.vendor_menu_item_id == None, Order.items != None,
+                   Line.item_name != None)
+    ).filter(Order.order_date == day).order_by(Order.id, Line.line_no).all()
+
+    orders = {}
+    for row in rows:
+        entry = orders.get(row.id)
+        if entry is None:
+            entry = orders[row.id] = _entry(row)
+        if row.line_name is not None:
+            entry["lines"].append([row.line_name, row.line_price, row.quantity])
+    orders = sorted(orders.values(), key=lambda order: (order["employee_id"] or "", order["order_id"]))
+    return {"date": day.isoformat(), "frozen_at": None, "orders": orders, "vendors": _sheets(orders)}
+
+
+def _person(order: dict) -> dict:
+    return {key: order[key] for key in ("user_id", "employee_id", "name", "department_id")}
+
+
+def _sheet_item(order: dict) -> dict:
+    return {"item_id": order["item_id"], "item_name": order["item_name"], "unit_price": order["unit_price"] or 0,
+            "count": 0, "amount": 0, "people": []}
+
+
+def _add(vendors: dict, order: dict):
+    vendor = vendors.setdefault(order["vendor_id"], {
+        "vendor_id": order["vendor_id"], "vendor_name": order["vendor_name"], "count": 0, "amount": 0, "items": {},
+    })
+    item = vendor["items"].setdefault(order["item_id"], _sheet_item(order))
+    price = order["unit_price"] or 0
+    for totals in (vendor, item):
+        totals["count"] += 1
+        totals["amount"] += price
+    item["people"].append(_person(order))
+
+
+def _sort_sheets(vendors) -> List[dict]:
+    """廠商（品項以 item_id 為 key）轉為排序後的訂單表"""
+    sheets = []
+    for vendor in vendors:
+        for item in vendor["items"].values():
+            item["people"].sort(key=lambda person: person["employee_id"] or "")
+        vendor["items"] = sorted(vendor["items"].values(), key=lambda item: (item["item_name"] or "", item["item_id"]))
+        sheets.append(vendor)
+    return sorted(sheets, key=lambda v: (v["vendor_name"] or UNKNOWN_VENDOR, v["vendor_id"] or 0))
+
+
+def _sheets(orders: List[dict]) -> List[dict]:
+    """各廠商的訂單表（不含不訂餐與舊版 JSON 訂單）"""
+    vendors = {}
+    for order in orders:
+        if order["item_id"] is not None:
+            _add(vendors, order)
+    return _sort_sheets(vendors.values())
+
+
+def freeze(db: Session, day: date) -> dict:
+    """凍結指定日期的訂單並提交；已有快照時回傳既有內容"""
+    # 先以寫入語句取得資料庫的寫入鎖，之後讀到的訂單不會再被其他交易改變
+    db.execute(update(models.DailySnapshot).where(models.DailySnapshot.date == day)
+               .values(date=models.DailySnapshot.date))
+    existing = db.get(models.DailySnapshot, day)
+    if existing is not None:
+        db.commit()
+        return json.loads(existing.payload)
+    payload = build(db, day)
+    frozen_at = datetime.utcnow()
+    payload["frozen_at"] = frozen_at.isoformat()
+    db.execute(sqlite_insert(models.DailySnapshot).values(
+        date=day, frozen_at=frozen_at, payload=json.dumps(payload, ensure_ascii=False),
+    ).on_conflict_do_nothing(index_elements=["date"]))
+    db.commit()
+    return payload
+
+
+def missed_days(db: Session, today: date) -> Set[date]:
+    """
+    最近一份快照之後、today 之前有訂單卻沒有凍結的日期（截止工作因服務停止而未執行）
+
+    尚未有任何快照時（剛啟用）為空集合，不回頭凍結歷史資料
+    """
+    latest = db.query(func.max(models.DailySnapshot.date)).scalar()
+    if latest is None:
+        return set()
+    return {
+        day for (day,) in db.query(models.Order.order_date).filter(
+            models.Order.order_date > latest, models.Order.order_date < today
+        ).distinct()
+    }
+
+
+def get(db: Session, day: date) -> dict:
+    """指定日期的快照；尚未凍結時由資料庫即時建立（不寫入）"""
+    if is_frozen(day):
+        row = db.query(models.DailySnapshot.payload).filter(models.DailySnapshot.date == day).first()
+        if row is not None:
+            return json.loads(row.payload)
+    return build(db, day)
+
+
+def patch(db: Session, day: date, changes: Iterable[Tuple[models.User, Optional[Any]]]):
+    """
+    管理者修改已凍結日期的訂單後，修補快照中受影響使用者的訂單與廠商訂單表
+
+    於寫入訂單之後、commit 之前呼叫（與訂單修改同一交易）。changes 為 (使用者, 訂單)，
+    訂單為 None 表示已取消，可為 ORM 物件或 RETURNING 的資料列。
+    沒有快照的日期不需修補，之後凍結時會讀到修改後的訂單
+    """
+    snapshot = db.get(models.DailySnapshot, day)
+    if snapshot is None:
+        return
+    payload = json.loads(snapshot.payload)
+    orders = {entry["user_id"]: entry for entry in payload["orders"]}
+
+    vendors = {}
+    for vendor in payload["vendors"]:
+        vendor["items"] = {item["item_id"]: item for item in vendor["items"]}
+        vendors[vendor["vendor_id"]] = vendor
+    for user, order in changes:
+        previous = orders.pop(user.id, None)
+        if previous is not None and previous["item_id"] is not None:
+            _remove(vendors, previous)
+        if order is None:
+            continue
+        entry = orders[user.id] = {
+            "order_id": order.id, "user_id": user.id, "employee_id": user.employee_id, "name": user.name,
+            "department_id": user.department_id, "item_id": order.vendor_menu_item_id,
+            "vendor_id": order.vendor_id, "vendor_name": order.vendor_name, "item_name": order.item_name,
+            "unit_price": order.unit_price, "lines": [],
+        }
+        if entry["item_id"] is not None:
+            _add(vendors, entry)
+
+    payload["orders"] = sorted(orders.values(), key=lambda entry: (entry["employee_id"] or "", entry["order_id"]))
+    payload["vendors"] = _sort_sheets(vendors.values())
+    snapshot.payload = json.dumps(payload, ensure_ascii=False)
+
+
+def _remove(vendors: dict, order: dict):
+    vendor = vendors.get(order["vendor_id"])
+    if vendor is None:
+        return
+    item = vendor["items"].get(order["item_id"])
+    if item is None:
+        return
+    price = order["unit_price"] or 0
+    item["people"] = [person for person in item["people"] if person["user_id"] != order["user_id"]]
+    for totals in (vendor, item):
+        totals["count"] -= 1
+        totals["amount"] -= price
+    if not item["people"]:
+        del vendor["items"][order["item_id"]]
+    if not vendor["items"]:
+        del vendors[order["vendor_id"]]
+
+
+# ---- 由快照產生的檢視 ----
+
+def stats(snapshot: dict, catalog) -> dict:
+    """GET /admin/stats：各廠商份數、金額與品項（同名的廠商與品項合併）"""
+    vendor_stats = {}
+
+    def add(vendor_name, item_name, description, amount, count):
+        stats = vendor_stats.setdefault(vendor_name, {"total_price": 0, "total_count": 0, "items": {}})
+        stats["total_price"] += amount
+        stats["total_count"] += count
+        item = stats["items"].setdefault(item_name, {"count": 0, "subtotal": 0, "description": description})
+        item["count"] += count
+        item["subtotal"] += amount
+
+    for sheet in snapshot["vendors"]:
+        for item in sheet["items"]:
+            menu_item = catalog.menu_items.get(item["item_id"])
+            add(sheet["vendor_name"] or "Unknown Vendor", item["item_name"],
+                menu_item.description if menu_item else "", item["amount"], item["count"])
+    # Legacy orders with JSON items：份數為品項數量
+    for order in snapshot["orders"]:
+        for item_name, price, quantity in order["lines"]:
+            add("Legacy/General", item_name, "", (price or 0) * quantity, quantity)
+
+    vendors = []
+    for v_name, v_data in vendor_stats.items():
+        items = [
+            {"name": i_name, "description": i_data["description"], "count": i_data["count"],
+             "subtotal": i_data["subtotal"]}
+            for i_name, i_data in v_data["items"].items()
+        ]
+        items.sort(key=lambda x: x["count"], reverse=True)
+        vendors.append({"name": v_name, "total_orders": v_data["total_count"],
+                        "total_price": v_data["total_price"], "items": items})
+    vendors.sort(key=lambda x: x["total_price"], reverse=True)
+    return {
+        "date": snapshot["date"],
+        "total_orders": len(snapshot["orders"]),
+        "total_price": sum(vendor["total_price"] for vendor in vendors),
+        "vendors": vendors,
+    }
+
+
+def announcement(snapshot: dict, catalog) -> dict:
+    """GET /admin/order_announcement：以品項為單位列出訂購人員"""
+    items = []
+    for sheet in snapshot["vendors"]:
+        vendor = catalog.vendors.get(sheet["vendor_id"])
+        for item in sheet["items"]:
+            menu_item = catalog.menu_items.get(item["item_id"])
+            items.append({
+                "vendor_id": sheet["vendor_id"],
+                "vendor_name": sheet["vendor_name"] if sheet["vendor_name"] is not None else UNKNOWN_VENDOR,
+                "vendor_color": vendor.color if vendor and sheet["vendor_name"] is not None else "#6B7280",
+                "item_id": item["item_id"],
+                "item_name": item["item_name"],
+                "item_description": (menu_item.description if menu_item else None) or "",
+                "orders": [{"employee_id": p["employee_id"], "name": p["name"]} for p in item["people"]],
+            })
+    items.sort(key=lambda x: (x["vendor_name"], x["item_name"] or ""))
+    return {"date": snapshot["date"], "items": items}
+
+
+def user_orders(snapshot: dict) -> dict:
+    """user_id -> 訂單（每日明細）"""
+    return {order["user_id"]: order for order in snapshot["orders"]}
+
+
+# ---- 廠商訂單表匯出 ----
+
+SHEET_HEADER = ["廠商", "品項", "單價", "份數", "金額", "訂購人"]
+
+
+def sheet_rows(snapshot: dict, vendor_id: Optional[int] = None) -> Iterator[list]:
+    yield SHEET_HEADER
+    for sheet in snapshot["vendors"]:
+        if vendor_id is not None and sheet["vendor_id"] != vendor_id:
+            continue
+        vendor_name = sheet["vendor_name"] or UNKNOWN_VENDOR
+        for item in sheet["items"]:
+            people = "、".join(f"{p['name']}（{p['employee_id']}）" for p in item["people"])
+            yield [vendor_name, item["item_name"], item["unit_price"], item["count"], item["amount"], people]
+        yield [vendor_name, "小計", "", sheet["count"], sheet["amount"], ""]
+
+
+def csv_stream(snapshot: dict, vendor_id: Optional[int] = None) -> Iterator[bytes]:
+    return exports.csv_stream(sheet_rows(snapshot, vendor_id))
+
+
+def printable(snapshot: dict, departments: dict, vendor_id: Optional[int] = None) -> str:
+    """可列印的廠商訂單表（每家廠商一頁）"""
+    pages = []
+    for sheet in snapshot["vendors"]:
+        if vendor_id is not None and sheet["vendor_id"] != vendor_id:
+            continue
+        rows = []
+        for item in sheet["items"]:
+            people = "".join(
+                f"<li>{escape(p['name'] or '')}（{escape(p['employee_id'] or '')}）"
+                f"{' ' + escape(departments[p['department_id']]) if p['department_id'] in departments else ''}</li>"
+                for p in item["people"]
+            )
+            rows.append(
+                f"<tr><td>{escape(item['item_name'] or '')}</td><td class=\"n\">{item['unit_price']}</td>"
+                f"<td class=\"n\">{item['count']}</td><td class=\"n\">{item['amount']}</td><td><ul>{people}</ul></td></tr>"
+            )
+        pages.append(
+            f"<section><h1>{escape(sheet['vendor_name'] or UNKNOWN_VENDOR)}</h1>"
+            f"<p>訂餐日期：{snapshot['date']}　共 {sheet['count']} 份　合計 {sheet['amount']} 元</p>"
+            f"<table><thead><tr><th>品項</th><th>單價</th><th>份數</th><th>金額</th><th>訂購人</th></tr></thead>"
+            f"<tbody>{''.join(rows)}</tbody></table></section>"
+        )
+    if not pages:
+        pages.append(f"<section><h1>{snapshot['date']}</h1><p>沒有訂單</p></section>")
+    return (
+        "<!DOCTYPE html><html lang=\"zh-Hant\"><head><meta charset=\"utf-8\">"
+        f"<title>廠商訂單表 {snapshot['date']}</title><style>"
+        "body{font-family:sans-serif;margin:2em}section{page-break-after:always}"
+        "section:last-child{page-break-after:auto}table{border-collapse:collapse;width:100%}"
+        "th,td{border:1px solid #999;padding:4px 8px;vertical-align:top}td.n{text-align:right}"
+        "ul{margin:0;padding-left:1.2em}@media print{body{margin:0}}"
+        "</style></head><body>" + "".join(pages) + "</body></html>"
+    )
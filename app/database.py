@@ -1,8 +1,11 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./webdiner.db"
+# 預設為工作目錄下的 webdiner.db；可用環境變數指定其他資料庫（例如基準測試用的 seed 資料庫）
+SQLALCHEMY_DATABASE_URL = os.environ.get("WEBDINER_DATABASE_URL", "sqlite:///./webdiner.db")
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30}
@@ -11,6 +14,15 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+
+@event.listens_for(engine, "connect")
+def _configure_connection(dbapi_connection, connection_record):
+    # synchronous 為連線層級設定，每條新連線都需設定（journal_mode=WAL 則保存在資料庫檔案中）
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -0,0 +1,177 @@
+"""
+請求層級的 SQL 查詢統計
+
+- 以 SQLAlchemy before/after_cursor_execute 事件計算每個請求的查詢數與資料庫耗時
+- 回應加上 Server-Timing 與 X-DB-Queries 標頭，可直接在瀏覽器開發者工具檢視
+- 超過門檻的慢請求寫入 webdiner.slow logger：路由、使用者、查詢數與最慢的 N 筆 SQL
+  繫結參數可能含密碼雜湊、token 等敏感資料，預設只記錄語句；需要時由 log_parameters 開啟
+
+設定可由系統管理員透過 /api/admin/instrumentation 於執行期間調整，不需重新啟動。
+設定保存在 instrumentation_settings 並遞增 data_versions，其他 worker 由 cache 的版本輪詢
+（watch）重新載入，最多延遲一個輪詢週期；啟動時由 load() 套用已保存的設定。
+"""
+
+import heapq
+import logging
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import cache, models, versions
+
+logger = logging.getLogger("webdiner.slow")
+
+
+class Settings:
+    enabled: bool = True
+    slow_request_ms: float = 500.0
+    top_n: int = 5
+    # 是否在慢請求日誌中記錄繫結參數（預設不記錄）
+    log_parameters: bool = False
+
+
+settings = Settings()
+
+FIELDS = ("enabled", "slow_request_ms", "top_n", "log_parameters")
+
+
+def current() -> dict:
+    return {field: getattr(settings, field) for field in FIELDS}
+
+
+def load(db: Session):
+    """套用資料庫中保存的設定；尚未保存過時維持預設值"""
+    row = db.get(models.InstrumentationSetting, 1)
+    if row is not None:
+        for field in FIELDS:
+            setattr(settings, field, getattr(row, field))
+
+
+def save(db: Session, values: dict) -> dict:
+    """更新設定並 commit；本程序立即套用，其他 worker 於下一次輪詢套用"""
+    row = {**current(), **values}
+    stored = {**row, "updated_at": datetime.utcnow()}
+    stmt = sqlite_insert(models.InstrumentationSetting).values(id=1, **stored)
+    db.execute(stmt.on_conflict_do_update(index_elements=["id"], set_=stored))
+    versions.bump(db, versions.INSTRUMENTATION)
+    db.commit()
+    for field, value in row.items():
+        setattr(settings, field, value)
+    return row
+
+
+cache.watch(lambda: (versions.INSTRUMENTATION,), lambda db, changed: load(db))
+
+
+class RequestStats:
+    """單一請求的查詢統計"""
+
+    __slots__ = ("queries", "db_seconds", "slowest", "user", "_counter")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        # min-heap: (duration, seq, statement, parameters)，只保留最慢的 top_n 筆
+        self.slowest: List[Tuple[float, int, str, object]] = []
+        self.user: Optional[str] = None
+        self._counter = 0
+
+    def record(self, statement: str, parameters, duration: float):
+        self.queries += 1
+        self.db_seconds += duration
+        self._counter += 1
+        entry = (duration, self._counter, statement, parameters if settings.log_parameters else None)
+        if len(self.slowest) < settings.top_n:
+            heapq.heappush(self.slowest, entry)
+        elif settings.top_n and duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("webdiner_request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def set_user(employee_id: str):
+    """由驗證流程呼叫，記錄慢請求日誌中的使用者"""
+    stats = _current.get()
+    if stats is not None:
+        stats.user = employee_id
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    stats.record(statement, parameters, time.perf_counter() - start_times.pop())
+
+
+def track():
+    """開始統計目前 context 的查詢；回傳 (stats, token) 供 untrack() 還原"""
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def untrack(token):
+    _current.reset(token)
+
+
+def _route_path(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", request.url.path)
+
+
+async def instrument_requests(request: Request, call_next):
+    """HTTP middleware：統計查詢並加上 Server-Timing / X-DB-Queries 標頭"""
+    if not settings.enabled:
+        return await call_next(request)
+
+    stats, token = track()
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        untrack(token)
+    total_ms = (time.perf_counter() - started) * 1000
+    db_ms = stats.db_seconds * 1000
+
+    response.headers["X-DB-Queries"] = str(stats.queries)
+    response.headers["Server-Timing"] = (
+        f'db;dur={db_ms:.1f};desc="{stats.queries} queries", app;dur={total_ms:.1f}'
+    )
+
+    if total_ms >= settings.slow_request_ms:
+        slowest = sorted(stats.slowest, reverse=True)
+        logger.warning(
+            "Slow request %s %s user=%s %.1fms queries=%d db=%.1fms\n%s",
+            request.method,
+            _route_path(request),
+            stats.user,
+            total_ms,
+            stats.queries,
+            db_ms,
+            "\n".join(
+                f"  {duration * 1000:.1f}ms {statement.strip()}" + ("" if parameters is None else f" {parameters!r}")
+                for duration, _, statement, parameters in slowest
+            ),
+        )
+    return response
@@ -0,0 +1,136 @@
+"""
+排程工作
+
+時間皆為台灣時間，截止相關的工作依 ordering.CUTOFF_TIME 排定：
+- confirm_orders: 截止時將當日（含服務停止期間錯過的日期）Pending 訂單改為 Confirmed，單一 UPDATE，
+  之後凍結當日與錯過截止之日期的訂單快照（app.daily_snapshot）
+- order_reminders: 截止前 30 分鐘提醒尚未訂餐的使用者（假日不提醒）
+- order_announcement: 截止後產生當日公告文字，存於執行紀錄
+- archive_orders: 每週日凌晨封存歷史訂單；保存天數由 WEBDINER_ARCHIVE_HORIZON_DAYS 設定，0 為停用
+- prune_changes: 每日清除 30 天前的變更紀錄
+- weekly_orders: 每週五中午依使用者的每週固定計畫批次建立下週訂單（app.weekly_plans）
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import archive, cache, changes, daily_snapshot, models, order_board, ordering, scheduler, versions, weekly_plans
+from .ordering import CUTOFF_TIME
+
+CHANGE_LOG_DAYS = 30
+
+
+def _at(minutes_from_cutoff: int) -> str:
+    """截止時間前後的每日 cron"""
+    moment = datetime.combine(datetime.min, CUTOFF_TIME) + timedelta(minutes=minutes_from_cutoff)
+    return f"{moment.minute} {moment.hour} * * *"
+
+
+@scheduler.job("confirm_orders", _at(0), "截止時確認當日訂單（Pending → Confirmed）並凍結快照")
+def confirm_orders(engine: Engine, now: datetime) -> dict:
+    today = now.date()
+    orders = models.Order.__table__
+    with Session(engine) as db:
+        rows = db.execute(
+            update(orders)
+            .where(orders.c.status == "Pending", orders.c.order_date <= today)
+            .values(status="Confirmed")
+            .returning(orders.c.user_id, orders.c.order_date)
+        ).all()
+        dates = {order_date for _, order_date in rows}
+        versions.bump_orders(db, {user_id for user_id, _ in rows}, dates)
+        db.commit()
+        if any(versions.month_closed(day) for day in dates):
+            cache.invalidate("billing")
+        for day in dates:
+            order_board.resync(db, day)
+        # 補凍結錯過截止的日期（本次才確認的 Pending 訂單所在日期，以及最近一份快照之後有訂單的日期）
+        missed = sorted(daily_snapshot.missed_days(db, today) | {day for day in dates if day < today})
+        for day in missed:
+            daily_snapshot.freeze(db, day)
+        snapshot = daily_snapshot.freeze(db, today)
+    return {"date": today, "confirmed": len(rows), "dates": sorted(dates), "snapshot": len(snapshot["orders"]),
+            "caught_up": missed}
+
+
+@scheduler.job("order_reminders", _at(-30), "截止前提醒尚未訂餐的使用者")
+def order_reminders(engine: Engine, now: datetime) -> dict:
+    today = now.date()
+    with Session(engine) as db:
+        if cache.get_calendar(db).is_holiday(today):
+            return {"date": today, "skipped": "holiday"}
+        missing_users = ordering.missing_orders(db, today)
+    return {"date": today, "sent": ordering.deliver_reminders(missing_users, today)}
+
+
+def announcement_text(announcement: dict) -> str:
+    lines = [f"{announcement['date']} 訂餐公告"]
+    for item in announcement["items"]:
+        names = "、".join(order["name"] for order in item["orders"])
+        lines.append(f"【{item['vendor_name']}】{item['item_name']} × {len(item['orders'])}：{names}")
+    return "\n".join(lines)
+
+
+@scheduler.job("order_announcement", _at(1), "截止後產生當日訂餐公告")
+def order_announcement(engine: Engine, now: datetime) -> dict:
+    today = now.date()
+    with Session(engine) as db:
+        if cache.get_calendar(db).is_holiday(today):
+            return {"date": today, "skipped": "holiday"}
+        announcement = daily_snapshot.announcement(daily_snapshot.get(db, today), cache.get_catalog(db))
+    return {
+        "date": today,
+        "items": len(announcement["items"]),
+        "orders": sum(len(item["orders"]) for item in announcement["items"]),
+        "text": announcement_text(announcement),
+    }
+
+
+def archive_horizon_days(engine: Engine) -> Optional[int]:
+    """
+    排程封存的保存天數，與 python -m app.archive --horizon-days 相同；None 表示停用
+
+    依序為環境變數 WEBDINER_ARCHIVE_HORIZON_DAYS（0 為停用）、上次封存（含手動執行）記錄的天數、
+    archive.DEFAULT_HORIZON_DAYS；沿用上次的天數，排程不會把手動設定較長的保存期限縮短
+    """
+    configured = os.environ.get("WEBDINER_ARCHIVE_HORIZON_DAYS", "").strip()
+    if configured:
+        return int(configured) or None
+    with Session(engine) as db:
+        state = db.get(models.OrderArchiveState, 1)
+        recorded = state.horizon_days if state is not None else None
+    return recorded or archive.DEFAULT_HORIZON_DAYS
+
+
+@scheduler.job("archive_orders", "0 3 * * 0", "封存保存期限之前的訂單")
+def archive_orders(engine: Engine, now: datetime) -> dict:
+    horizon_days = archive_horizon_days(engine)
+    if horizon_days is None:
+        return {"skipped": "disabled"}
+    return archive.run(engine, horizon_days, today=now.date())
+
+
+@scheduler.job("prune_changes", "30 3 * * *", f"清除 {CHANGE_LOG_DAYS} 天前的變更紀錄")
+def prune_changes(engine: Engine, now: datetime) -> dict:
+    with Session(engine) as db:
+        deleted = changes.prune(db, datetime.utcnow() - timedelta(days=CHANGE_LOG_DAYS))
+        db.commit()
+    return {"deleted": deleted}
+
+
+@scheduler.job("weekly_orders", "0 12 * * 5", "依每週固定計畫建立下週訂單")
+def weekly_orders(engine: Engine, now: datetime) -> dict:
+    first, last = weekly_plans.next_week(now.date())
+    with Session(engine) as db:
+        created = weekly_plans.materialize(db, first, last)
+    return {
+        "first": first,
+        "last": last,
+        "created": sum(order["status"] != "NoOrder" for order in created),
+        "no_order": sum(order["status"] == "NoOrder" for order in created),
+    }
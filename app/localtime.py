@@ -0,0 +1,19 @@
+"""
+台灣時間
+
+伺服器主機的時區不一定是台灣時間；訂餐截止、預設日期、月結與封存界線中的「今天」
+皆以台灣時間計算，避免跨日前後各模組對「今天」的判斷不一致。
+"""
+
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+TAIWAN_TZ = ZoneInfo("Asia/Taipei")
+
+
+def now() -> datetime:
+    return datetime.now(TAIWAN_TZ)
+
+
+def today() -> date:
+    return now().date()
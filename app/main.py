@@ -1,20 +1,15 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .database import engine, Base
-from .routers import auth, menu, orders, admin, vendor, extension_directory
-from . import models
-
-# Create tables
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="VSCC-WebDiner API")
-
-@app.on_event("startup")
-def on_startup():
-    with engine.connect() as connection:
-        from sqlalchemy import text
-        connection.execute(text("PRAGMA journal_mode=WAL;"))
-        connection.execute(text("PRAGMA synchronous=NORMAL;"))
+from .routers import auth, menu, orders, admin, vendor, extension_directory, changes, metrics as metrics_router
+from . import models, instrumentation, metrics, responses, startup, versions
+
+# 結構升級、WAL 與快取預熱於 lifespan 執行，匯入時不觸碰資料庫
+app = FastAPI(
+    title="VSCC-WebDiner API",
+    default_response_class=responses.ORJSONResponse,
+    lifespan=startup.lifespan_for(engine),
+)
 
 # CORS
 origins = [
@@ -34,6 +29,18 @@ app.add_middleware(
     allow_origin_regex=r"http://(localhost|127\.0\.0\.1|192\.168\.\d{1,3}\.\d{1,3}|10\.\d{1,3}\.\d{1,3}\.\d{1,3}|172\.(1[6-9]|2[0-9]|3[0-1])\.\d{1,3}\.\d{1,3}):\d+",
 )
 
+# 條件式 GET：版本未變時回應 304
+app.add_exception_handler(versions.NotModified, versions.not_modified_handler)
+app.middleware("http")(versions.apply_validators)
+
+# 每個請求的 SQL 查詢數與耗時（Server-Timing / X-DB-Queries）
+app.middleware("http")(instrumentation.instrument_requests)
+# 路由延遲與請求數（/api/metrics）
+app.middleware("http")(metrics.track_requests)
+metrics.instrument_pool(engine)
+# MessagePack 協商與 br / gzip 壓縮（最外層，壓縮前已加上上述標頭）
+app.middleware("http")(responses.encode_responses)
+
 # Include Routers (所有 API 都加上 /api 前綴，避免與前端路由衝突)
 app.include_router(auth.router, prefix="/api")
 app.include_router(menu.router, prefix="/api")
@@ -41,6 +48,8 @@ app.include_router(orders.router, prefix="/api")
 app.include_router(admin.router, prefix="/api")
 app.include_router(vendor.router, prefix="/api")
 app.include_router(extension_directory.router, prefix="/api")
+app.include_router(changes.router, prefix="/api")
+app.include_router(metrics_router.router, prefix="/api")
 
 
 @app.get("/")
@@ -0,0 +1,388 @@
+"""
+程序內 Prometheus 指標
+
+不依賴外部套件，以 Prometheus text exposition format (0.0.4) 輸出，
+可直接由本機 Prometheus 抓取 /api/metrics。
+
+- 路由請求數與延遲分布、進行中請求數
+- 連線池 checkout 次數、使用中連線數與 overflow
+- SQLite 鎖定逾時（database is locked）與寫入語句耗時（含等待寫入鎖的時間）
+- Argon2 雜湊 / 驗證耗時
+- 快取命中與未命中次數
+- 依狀態分類的訂單寫入數
+
+多個 worker 時（run.py 設定 WEBDINER_METRICS_DIR），各 worker 每秒將自己的數值寫入該目錄的
+worker-<pid>.json，/api/metrics 不論由哪個 worker 回應都合併所有檔案（計數與分布相加）；
+已結束的 worker 保留最後的數值，計數器不會因 worker 重新啟動而倒退；gauge 為當下狀態，只合併仍在執行的 worker。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+logger = logging.getLogger("webdiner.metrics")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ""
+    # 累計值（計數與分布）在 worker 結束後仍需保留；gauge 只反映執行中程序的狀態
+    cumulative = True
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def snapshot(self) -> List[Tuple[Tuple, object]]:
+        """目前的數值：(label 值, 數值) 依 label 排序"""
+        raise NotImplementedError
+
+    def combine(self, a, b):
+        """合併兩個 worker 的同一組 label 數值"""
+        return a + b
+
+    def lines(self, items: List[Tuple[Tuple, object]]) -> List[str]:
+        raise NotImplementedError
+
+    def samples(self) -> List[str]:
+        return self.lines(self.snapshot())
+
+    def render(self, items: Optional[List[Tuple[Tuple, object]]] = None) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.type_name}\n"
+        lines = self.samples() if items is None else self.lines(items)
+        return header + "".join(line + "\n" for line in lines)
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def snapshot(self):
+        with self._lock:
+            return sorted(self._values.items())
+
+    def lines(self, items):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+    cumulative = False
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class GaugeFunc(_Metric):
+    """抓取時才計算數值的 gauge"""
+    type_name = "gauge"
+    cumulative = False
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], float]):
+        super().__init__(name, documentation)
+        self._fn = fn
+
+    def snapshot(self):
+        try:
+            value = self._fn()
+        except Exception:
+            return []
+        return [] if value is None else [((), value)]
+
+    def lines(self, items):
+        return [f"{self.name} {_format_value(value)}" for _, value in items]
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def snapshot(self):
+        with self._lock:
+            return sorted((key, list(state)) for key, state in self._values.items())
+
+    def combine(self, a, b):
+        return [x + y for x, y in zip(a, b)]
+
+    def lines(self, items):
+        lines = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, object]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._started, **self._labels)
+        return False
+
+
+def render() -> str:
+    if _sharing is None:
+        return "".join(metric.render() for metric in _registry)
+    _sharing.write()
+    return "".join(metric.render(items) for metric, items in zip(_registry, _sharing.merge()))
+
+
+# ========== 多 worker 合併 ==========
+
+def _alive(path: Path) -> bool:
+    """worker-<pid>.json 的程序是否仍在執行"""
+    try:
+        os.kill(int(path.stem.split("-", 1)[1]), 0)
+    except ValueError:
+        return False
+    except PermissionError:  # 存在但屬於其他使用者
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class _Sharing(threading.Thread):
+    """定期將本程序的數值寫入共用目錄，並在輸出時合併所有 worker 的檔案"""
+
+    def __init__(self, directory: Path, interval: float):
+        super().__init__(name="metrics-writer", daemon=True)
+        self.directory = directory
+        self.interval = interval
+        self.path = directory / f"worker-{os.getpid()}.json"
+        self.stopped = threading.Event()
+
+    def write(self):
+        data = {metric.name: [[list(key), value] for key, value in metric.snapshot()] for metric in _registry}
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(data))
+        os.replace(temporary, self.path)
+
+    def merge(self) -> List[List[Tuple[Tuple, object]]]:
+        merged: List[Dict[Tuple, object]] = [{} for _ in _registry]
+        for path in sorted(self.directory.glob("worker-*.json")):
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):  # 其他 worker 正在寫入或已移除
+                continue
+            alive = _alive(path)
+            for metric, values in zip(_registry, merged):
+                if not (metric.cumulative or alive):
+                    continue
+                for key, value in data.get(metric.name, []):
+                    key = tuple(key)
+                    values[key] = metric.combine(values[key], value) if key in values else value
+        return [sorted(values.items()) for values in merged]
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                logger.exception("failed to write metrics snapshot")
+
+
+_sharing: Optional[_Sharing] = None
+
+
+def start_sharing(directory: Optional[str] = None, interval: float = 1.0) -> Optional[_Sharing]:
+    """設定 WEBDINER_METRICS_DIR 時（多 worker）開始定期寫入本程序的數值"""
+    global _sharing
+    directory = directory if directory is not None else os.environ.get("WEBDINER_METRICS_DIR", "")
+    if not directory:
+        return None
+    stop_sharing()
+    _sharing = _Sharing(Path(directory), interval)
+    _sharing.write()
+    _sharing.start()
+    return _sharing
+
+
+def stop_sharing():
+    """停止定期寫入；最後一次寫入保留本程序結束前的數值"""
+    global _sharing
+    if _sharing is not None:
+        _sharing.stopped.set()
+        _sharing.join(timeout=5)
+        _sharing.write()
+        _sharing = None
+
+
+# ========== 指標定義 ==========
+
+http_requests = Counter(
+    "webdiner_http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+http_request_duration = Histogram(
+    "webdiner_http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+)
+http_in_flight = Gauge("webdiner_http_requests_in_flight", "HTTP requests currently being served")
+
+db_pool_checkouts = Counter("webdiner_db_pool_checkouts_total", "Connections checked out from the pool")
+db_pool_checked_out = Gauge("webdiner_db_pool_checked_out", "Connections currently checked out")
+sqlite_busy = Counter(
+    "webdiner_sqlite_busy_total", "Statements that failed because the database stayed locked past the busy timeout"
+)
+db_write_duration = Histogram(
+    "webdiner_db_write_statement_seconds",
+    "INSERT/UPDATE/DELETE latency, including time blocked waiting for the SQLite write lock",
+    ("statement",),
+)
+
+argon2_duration = Histogram(
+    "webdiner_argon2_seconds", "Argon2 password hash/verify latency", ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+cache_requests = Counter("webdiner_cache_requests_total", "Reference cache lookups", ("domain", "result"))
+
+order_writes = Counter("webdiner_order_writes_total", "Orders written by resulting status", ("status",))
+
+
+# ========== 資料庫事件 ==========
+
+_WRITE_VERBS = ("INSERT", "UPDATE", "DELETE")
+
+
+@event.listens_for(Pool, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    db_pool_checkouts.inc()
+    db_pool_checked_out.inc()
+
+
+@event.listens_for(Pool, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    db_pool_checked_out.dec()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_write(conn, cursor, statement, parameters, context, executemany):
+    verb = statement.lstrip()[:6].upper()
+    if verb in _WRITE_VERBS:
+        conn.info.setdefault("write_start_time", []).append((verb, time.perf_counter()))
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_write(conn, cursor, statement, parameters, context, executemany):
+    verb = statement.lstrip()[:6].upper()
+    if verb in _WRITE_VERBS and conn.info.get("write_start_time"):
+        verb, started = conn.info["write_start_time"].pop()
+        db_write_duration.observe(time.perf_counter() - started, statement=verb)
+
+
+@event.listens_for(Engine, "handle_error")
+def _on_error(context):
+    if context.connection is not None:
+        context.connection.info.pop("write_start_time", None)
+    if "database is locked" in str(context.original_exception):
+        sqlite_busy.inc()
+
+
+def instrument_pool(engine: Engine):
+    """登錄以應用程式主要連線池計算的 overflow gauge"""
+    GaugeFunc(
+        "webdiner_db_pool_overflow",
+        "Connections opened beyond the pool size",
+        lambda: max(engine.pool.overflow(), 0) if hasattr(engine.pool, "overflow") else None,
+    )
+
+
+# ========== HTTP middleware ==========
+
+async def track_requests(request: Request, call_next):
+    """記錄每個路由的請求數與延遲"""
+    http_in_flight.inc()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        http_in_flight.dec()
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        http_requests.inc(method=request.method, route=route, status=status)
+        http_request_duration.observe(time.perf_counter() - started, method=request.method, route=route)
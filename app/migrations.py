@@ -0,0 +1,474 @@
+"""
+資料庫結構版本管理 (Schema Migrations)
+
+以遞增版本號記錄已套用的 migration，啟動時或透過 CLI 自動補齊尚未套用的版本。
+
+- 版本紀錄存放於 schema_version 資料表
+- 每個 migration 在獨立的 BEGIN IMMEDIATE 交易中執行，多個 worker 同時啟動時只會有一個實際套用
+- migration 必須可重複執行（使用 IF NOT EXISTS 等寫法），以相容由 create_all 建立的舊資料庫
+
+使用方式：
+    python -m app.migrations            # 套用所有尚未套用的 migration
+    python -m app.migrations --status   # 僅顯示目前版本
+    python -m app.migrations --database bench.db
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection, Engine
+
+from . import capacity
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    """註冊 migration，版本號必須嚴格遞增"""
+    def decorator(fn: Callable[[Connection], None]):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"Migration version {version} must be greater than {MIGRATIONS[-1].version}")
+        MIGRATIONS.append(Migration(version, description, fn))
+        return fn
+    return decorator
+
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, "
+        "description VARCHAR NOT NULL, "
+        "applied_at DATETIME NOT NULL)"
+    ))
+
+
+def current_version(conn: Connection) -> int:
+    _ensure_version_table(conn)
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def upgrade(engine: Engine, target: Optional[int] = None, log=None) -> List[int]:
+    """套用所有版本號 <= target 且尚未套用的 migration，回傳本次套用的版本"""
+    applied = []
+    for m in MIGRATIONS:
+        if target is not None and m.version > target:
+            break
+        with engine.connect() as conn:
+            # 取得寫入鎖後再確認版本，避免多個 worker 重複套用
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            if current_version(conn) >= m.version:
+                conn.rollback()
+                continue
+            m.apply(conn)
+            conn.execute(
+                text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": m.version, "d": m.description, "t": datetime.utcnow()},
+            )
+            conn.commit()
+        applied.append(m.version)
+        if log:
+            log(f"Applied migration {m.version}: {m.description}")
+    return applied
+
+
+# ========== Migrations ==========
+
+# 導入 migration 前（以 create_all 建立）的資料表結構。之後新增的欄位與資料表由各自的 migration 建立，
+# 此處固定不變，不可改用目前的 models（否則新資料庫在套用後續 migration 前就已有新欄位）；
+# 後續 migration 同樣寫死建立當時的 DDL
+INITIAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS divisions (
+    id INTEGER NOT NULL,
+    name VARCHAR,
+    is_active BOOLEAN,
+    display_column INTEGER,
+    display_order INTEGER,
+    PRIMARY KEY (id)
+);
+CREATE INDEX IF NOT EXISTS ix_divisions_id ON divisions (id);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_divisions_name ON divisions (name);
+CREATE TABLE IF NOT EXISTS menu_items (
+    id INTEGER NOT NULL,
+    name VARCHAR,
+    description VARCHAR,
+    price INTEGER,
+    category VARCHAR,
+    is_active BOOLEAN,
+    PRIMARY KEY (id)
+);
+CREATE INDEX IF NOT EXISTS ix_menu_items_id ON menu_items (id);
+CREATE INDEX IF NOT EXISTS ix_menu_items_name ON menu_items (name);
+CREATE TABLE IF NOT EXISTS special_days (
+    id INTEGER NOT NULL,
+    date DATE,
+    is_holiday BOOLEAN,
+    description VARCHAR,
+    PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_special_days_date ON special_days (date);
+CREATE INDEX IF NOT EXISTS ix_special_days_id ON special_days (id);
+CREATE TABLE IF NOT EXISTS vendors (
+    id INTEGER NOT NULL,
+    name VARCHAR,
+    description VARCHAR,
+    color VARCHAR,
+    is_active BOOLEAN,
+    created_at DATETIME,
+    PRIMARY KEY (id)
+);
+CREATE INDEX IF NOT EXISTS ix_vendors_id ON vendors (id);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_vendors_name ON vendors (name);
+CREATE TABLE IF NOT EXISTS departments (
+    id INTEGER NOT NULL,
+    name VARCHAR,
+    is_active BOOLEAN,
+    division_id INTEGER,
+    display_column INTEGER,
+    display_order INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(division_id) REFERENCES divisions (id)
+);
+CREATE INDEX IF NOT EXISTS ix_departments_id ON departments (id);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_departments_name ON departments (name);
+CREATE TABLE IF NOT EXISTS vendor_menu_items (
+    id INTEGER NOT NULL,
+    vendor_id INTEGER,
+    name VARCHAR,
+    description VARCHAR,
+    price INTEGER,
+    weekday INTEGER,
+    is_active BOOLEAN,
+    PRIMARY KEY (id),
+    FOREIGN KEY(vendor_id) REFERENCES vendors (id)
+);
+CREATE INDEX IF NOT EXISTS ix_vendor_menu_items_id ON vendor_menu_items (id);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER NOT NULL,
+    employee_id VARCHAR,
+    name VARCHAR,
+    extension VARCHAR,
+    email VARCHAR,
+    hashed_password VARCHAR,
+    is_active BOOLEAN,
+    is_admin BOOLEAN,
+    role VARCHAR,
+    department_id INTEGER,
+    title VARCHAR,
+    is_department_head BOOLEAN,
+    PRIMARY KEY (id),
+    FOREIGN KEY(department_id) REFERENCES departments (id)
+);
+CREATE INDEX IF NOT EXISTS ix_users_email ON users (email);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_users_employee_id ON users (employee_id);
+CREATE INDEX IF NOT EXISTS ix_users_id ON users (id);
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER NOT NULL,
+    user_id INTEGER,
+    vendor_id INTEGER,
+    vendor_menu_item_id INTEGER,
+    order_date DATE,
+    created_at DATETIME,
+    status VARCHAR,
+    items VARCHAR,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id),
+    FOREIGN KEY(vendor_id) REFERENCES vendors (id),
+    FOREIGN KEY(vendor_menu_item_id) REFERENCES vendor_menu_items (id)
+);
+CREATE INDEX IF NOT EXISTS ix_orders_id ON orders (id);
+CREATE INDEX IF NOT EXISTS ix_orders_order_date ON orders (order_date);
+"""
+
+
+def _execute_script(conn: Connection, script: str):
+    """逐一執行以分號分隔的 DDL"""
+    for statement in script.split(";"):
+        if statement.strip():
+            conn.execute(text(statement))
+
+
+@migration(1, "initial schema")
+def _initial_schema(conn: Connection):
+    _execute_script(conn, INITIAL_SCHEMA)
+
+
+@migration(2, "deduplicate orders and add composite indexes")
+def _composite_indexes(conn: Connection):
+    # 同一人同一天只保留一筆：優先保留實際訂單（非 NoOrder），其次保留最新的一筆
+    conn.execute(text("""
+        DELETE FROM orders WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, order_date
+                    ORDER BY (status = 'NoOrder'), id DESC
+                ) AS rn
+                FROM orders
+            ) WHERE rn > 1
+        )
+    """))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_orders_user_date ON orders (user_id, order_date)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_orders_date_item ON orders (order_date, vendor_menu_item_id)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_vendor_menu_items_vendor_weekday_active "
+        "ON vendor_menu_items (vendor_id, weekday, is_active)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_users_department_active ON users (department_id, is_active)"
+    ))
+    conn.execute(text("ANALYZE"))
+
+
+@migration(3, "add data_versions table")
+def _data_versions(conn: Connection):
+    _execute_script(conn, """
+        CREATE TABLE IF NOT EXISTS data_versions (
+            domain VARCHAR NOT NULL,
+            version INTEGER NOT NULL,
+            updated_at DATETIME,
+            PRIMARY KEY (domain)
+        );
+    """)
+
+
+@migration(4, "add change_log table and triggers")
+def _change_log(conn: Connection):
+    _execute_script(conn, """
+        CREATE TABLE IF NOT EXISTS change_log (
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            scope VARCHAR NOT NULL,
+            entity_id INTEGER NOT NULL,
+            owner_id INTEGER,
+            changed_at DATETIME
+        );
+        CREATE INDEX IF NOT EXISTS ix_change_log_scope_owner ON change_log (scope, owner_id, id);
+    """)
+    # 以 trigger 記錄變更：ORM、Core 批次語法與工具程式的寫入都會在同一交易中留下紀錄
+    tables = {
+        "orders": ("orders", "user_id"),
+        "vendors": ("vendors", None),
+        "menu_items": ("vendor_menu_items", None),
+        "special_days": ("special_days", None),
+        "users": ("users", None),
+    }
+    for scope, (table, owner) in tables.items():
+        for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            owner_value = f"{row}.{owner}" if owner else "NULL"
+            conn.execute(text(
+                f"CREATE TRIGGER IF NOT EXISTS trg_change_log_{table}_{event.lower()} "
+                f"AFTER {event} ON {table} BEGIN "
+                f"INSERT INTO change_log (scope, entity_id, owner_id, changed_at) "
+                f"VALUES ('{scope}', {row}.id, {owner_value}, CURRENT_TIMESTAMP); END"
+            ))
+
+
+
+@migration(5, "add order_archive_state table")
+def _order_archive_state(conn: Connection):
+    _execute_script(conn, """
+        CREATE TABLE IF NOT EXISTS order_archive_state (
+            id INTEGER NOT NULL,
+            boundary DATE,
+            archived_through DATE,
+            horizon_days INTEGER,
+            updated_at DATETIME,
+            PRIMARY KEY (id)
+        );
+    """)
+
+
+@migration(6, "snapshot unit price and names on orders")
+def _order_snapshot(conn: Connection):
+    # 回填不改變同步內容，結束時移除回填 UPDATE 觸發的 change_log 紀錄
+    last_change = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM change_log")).scalar()
+    archives = conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'orders_archive_%'"
+    )).scalars().all()
+    columns = "order_date, vendor_menu_item_id, unit_price, vendor_id, vendor_name, item_name, user_id"
+    for table in ["orders", *archives]:
+        existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+        for column, column_type in (("unit_price", "INTEGER"), ("vendor_name", "VARCHAR"), ("item_name", "VARCHAR")):
+            if column not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+        conn.execute(text(f"""
+            UPDATE {table} SET unit_price = m.price, item_name = m.name, vendor_name = v.name
+            FROM vendor_menu_items AS m LEFT JOIN vendors AS v ON v.id = m.vendor_id
+            WHERE m.id = {table}.vendor_menu_item_id AND {table}.unit_price IS NULL
+        """))
+        prefix = "ix_orders" if table == "orders" else f"ix_{table}"
+        conn.execute(text(f"DROP INDEX IF EXISTS {prefix}_date_item"))
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {prefix}_date_snapshot ON {table} ({columns})"))
+    conn.execute(text("DELETE FROM change_log WHERE id > :id"), {"id": last_change})
+    conn.execute(text("ANALYZE orders"))
+
+
+@migration(7, "add order_lines and order_line_progress tables")
+def _order_lines(conn: Connection):
+    # 資料轉換可能很久，另由 app.order_lines 分批執行（啟動時自動接續）
+    _execute_script(conn, """
+        CREATE TABLE IF NOT EXISTS order_lines (
+            id INTEGER NOT NULL,
+            order_id INTEGER NOT NULL,
+            line_no INTEGER NOT NULL,
+            order_date DATE NOT NULL,
+            menu_item_id INTEGER,
+            quantity INTEGER NOT NULL,
+            unit_price INTEGER,
+            item_name VARCHAR,
+            PRIMARY KEY (id)
+        );
+        CREATE INDEX IF NOT EXISTS ix_order_lines_date
+            ON order_lines (order_date, menu_item_id, unit_price, item_name, quantity, order_id);
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_order_lines_order_line ON order_lines (order_id, line_no);
+        CREATE TABLE IF NOT EXISTS order_line_progress (
+            source VARCHAR NOT NULL,
+            last_order_id INTEGER NOT NULL,
+            completed BOOLEAN NOT NULL,
+            updated_at DATETIME,
+            PRIMARY KEY (source)
+        );
+    """)
+
+
+@migration(8, "add scheduled_jobs and job_runs tables")
+def _scheduler(conn: Connection):
+    _execute_script(conn, """
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            name VARCHAR NOT NULL,
+            cron VARCHAR NOT NULL,
+            enabled BOOLEAN NOT NULL,
+            next_run_at DATETIME,
+            last_run_id INTEGER,
+            locked_by VARCHAR,
+            locked_until DATETIME,
+            PRIMARY KEY (name)
+        );
+        CREATE TABLE IF NOT EXISTS job_runs (
+            id INTEGER NOT NULL,
+            job_name VARCHAR NOT NULL,
+            "trigger" VARCHAR NOT NULL,
+            worker VARCHAR,
+            started_at DATETIME NOT NULL,
+            finished_at DATETIME,
+            status VARCHAR NOT NULL,
+            result VARCHAR,
+            error VARCHAR,
+            PRIMARY KEY (id)
+        );
+        CREATE INDEX IF NOT EXISTS ix_job_runs_job ON job_runs (job_name, id);
+    """)
+
+
+@migration(9, "add daily_snapshots table")
+def _daily_snapshots(conn: Connection):
+    _execute_script(conn, """
+        CREATE TABLE IF NOT EXISTS daily_snapshots (
+            date DATE NOT NULL,
+            frozen_at DATETIME NOT NULL,
+            payload VARCHAR NOT NULL,
+            PRIMARY KEY (date)
+        );
+    """)
+
+
+@migration(10, "add weekly_plans table")
+def _weekly_plans(conn: Connection):
+    _execute_script(conn, """
+        CREATE TABLE IF NOT EXISTS weekly_plans (
+            id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            weekday INTEGER NOT NULL,
+            vendor_id INTEGER,
+            vendor_menu_item_id INTEGER,
+            updated_at DATETIME,
+            PRIMARY KEY (id),
+            FOREIGN KEY(user_id) REFERENCES users (id),
+            FOREIGN KEY(vendor_id) REFERENCES vendors (id),
+            FOREIGN KEY(vendor_menu_item_id) REFERENCES vendor_menu_items (id)
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_weekly_plans_user_weekday ON weekly_plans (user_id, weekday);
+    """)
+
+
+@migration(11, "add daily capacity limits and order_capacity counters")
+def _order_capacity(conn: Connection):
+    for table in ("vendors", "vendor_menu_items"):
+        existing = {row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))}
+        if "daily_limit" not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN daily_limit INTEGER"))
+    _execute_script(conn, """
+        CREATE TABLE IF NOT EXISTS order_capacity (
+            scope VARCHAR NOT NULL,
+            ref_id INTEGER NOT NULL,
+            order_date DATE NOT NULL,
+            used INTEGER NOT NULL,
+            PRIMARY KEY (scope, ref_id, order_date)
+        );
+    """)
+    # 以現有訂單建立計數器，之後由 trigger 維護
+    conn.execute(text("DELETE FROM order_capacity"))
+    for scope, column in ((capacity.ITEM, "vendor_menu_item_id"), (capacity.VENDOR, "vendor_id")):
+        conn.execute(text(f"""
+            INSERT INTO order_capacity (scope, ref_id, order_date, used)
+            SELECT '{scope}', {column}, order_date, COUNT(*) FROM orders
+            WHERE vendor_menu_item_id IS NOT NULL AND {column} IS NOT NULL
+            GROUP BY {column}, order_date
+        """))
+    capacity.install_triggers(conn)
+
+
+@migration(12, "add instrumentation_settings table")
+def _instrumentation_settings(conn: Connection):
+    _execute_script(conn, """
+        CREATE TABLE IF NOT EXISTS instrumentation_settings (
+            id INTEGER NOT NULL,
+            enabled BOOLEAN NOT NULL,
+            slow_request_ms FLOAT NOT NULL,
+            top_n INTEGER NOT NULL,
+            log_parameters BOOLEAN NOT NULL,
+            updated_at DATETIME,
+            PRIMARY KEY (id)
+        );
+    """)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="WebDiner 資料庫 migration")
+    parser.add_argument("--database", help="SQLite 檔案路徑（預設使用應用程式設定）")
+    parser.add_argument("--target", type=int, help="升級至指定版本")
+    parser.add_argument("--status", action="store_true", help="僅顯示目前版本")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        engine = create_engine(f"sqlite:///{args.database}", connect_args={"timeout": 30})
+    else:
+        from .database import engine
+
+    if args.status:
+        with engine.connect() as conn:
+            version = current_version(conn)
+            conn.commit()
+        print(f"Current schema version: {version} (latest: {MIGRATIONS[-1].version})")
+        return 0
+
+    applied = upgrade(engine, target=args.target, log=print)
+    if not applied:
+        print("Schema is up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Date, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, Date, DateTime, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
@@ -23,6 +23,10 @@ class User(Base):
 
     orders = relationship("Order", back_populates="user")
 
+    __table_args__ = (
+        Index("ix_users_department_active", "department_id", "is_active"),
+    )
+
 class Division(Base):
     """處別模型 - 如：管理處、技術處、審驗處"""
     __tablename__ = "divisions"
@@ -65,6 +69,7 @@ class Vendor(Base):
     description = Column(String)
     color = Column(String, default="#3B82F6")  # 廠商代表色
     is_active = Column(Boolean, default=True)
+    daily_limit = Column(Integer, nullable=True)  # 每日份數上限，空值為不限（見 app.capacity）
     created_at = Column(DateTime, default=datetime.utcnow)
 
     menu_items = relationship("VendorMenuItem", back_populates="vendor")
@@ -81,9 +86,14 @@ class VendorMenuItem(Base):
     price = Column(Integer)  # 價格（元）
     weekday = Column(Integer, nullable=True)  # 0-4 for Mon-Fri, null for all days
     is_active = Column(Boolean, default=True)
+    daily_limit = Column(Integer, nullable=True)  # 每日份數上限，空值為不限
 
     vendor = relationship("Vendor", back_populates="menu_items")
 
+    __table_args__ = (
+        Index("ix_vendor_menu_items_vendor_weekday_active", "vendor_id", "weekday", "is_active"),
+    )
+
 # Keep old MenuItem for backward compatibility (can be removed later)
 class MenuItem(Base):
     __tablename__ = "menu_items"
@@ -95,6 +105,11 @@ class MenuItem(Base):
     category = Column(String)
     is_active = Column(Boolean, default=True)
 
+# orders 與封存表 orders_archive_<年> 的報表索引欄位
+ORDER_REPORT_COLUMNS = (
+    "order_date", "vendor_menu_item_id", "unit_price", "vendor_id", "vendor_name", "item_name", "user_id",
+)
+
 # Modified: Order model
 class Order(Base):
     __tablename__ = "orders"
@@ -107,11 +122,22 @@ class Order(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     status = Column(String, default="Pending")
     items = Column(String, nullable=True)  # Keep for backward compatibility, nullable
+    # 寫入當下的單價與名稱：報表不需再關聯菜單，修改價格也不會改寫歷史訂單
+    unit_price = Column(Integer, nullable=True)
+    vendor_name = Column(String, nullable=True)
+    item_name = Column(String, nullable=True)
 
     user = relationship("User", back_populates="orders")
     vendor = relationship("Vendor", back_populates="orders")  # New
     menu_item = relationship("VendorMenuItem")  # New
 
+    __table_args__ = (
+        # 每人每日僅能有一筆訂單（含不訂餐）
+        Index("ux_orders_user_date", "user_id", "order_date", unique=True),
+        # 報表彙總的覆蓋索引：依日期篩選後只讀索引，不需回表
+        Index("ix_orders_date_snapshot", *ORDER_REPORT_COLUMNS),
+    )
+
 class SpecialDay(Base):
     __tablename__ = "special_days"
 
@@ -120,3 +146,156 @@ class SpecialDay(Base):
     is_holiday = Column(Boolean, default=True)  # True = Holiday, False = Workday (makeup day)
     description = Column(String, nullable=True)
 
+
+class DataVersion(Base):
+    """各資料領域的版本號，寫入時於同一交易中遞增，供條件式 GET 計算 ETag"""
+    __tablename__ = "data_versions"
+
+    domain = Column(String, primary_key=True)  # catalog, calendar, org, users, orders:date:YYYY-MM-DD, orders:user:<id>
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ChangeLog(Base):
+    """變更紀錄：由資料庫 trigger 於寫入的同一交易中新增，id 即為 /api/changes 的游標"""
+    __tablename__ = "change_log"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    scope = Column(String, nullable=False)  # orders, vendors, menu_items, special_days, users
+    entity_id = Column(Integer, nullable=False)
+    owner_id = Column(Integer, nullable=True)  # 訂單所屬使用者；其他範圍為 NULL
+    changed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_change_log_scope_owner", "scope", "owner_id", "id"),
+        # 清除舊紀錄後 id 不會被重複使用，游標保持單調遞增
+        {"sqlite_autoincrement": True},
+    )
+
+
+class OrderArchiveState(Base):
+    """訂單封存進度（單一列）：boundary 之前的日期可能已移至 orders_archive_<年>"""
+    __tablename__ = "order_archive_state"
+
+    id = Column(Integer, primary_key=True)
+    boundary = Column(Date, nullable=True)          # 允許封存的日期上限（不含）
+    archived_through = Column(Date, nullable=True)  # 最後完成封存的日期
+    horizon_days = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class OrderLine(Base):
+    """
+    舊版 JSON 訂單品項（Order.items）正規化後的明細，由 app.order_lines 轉換產生
+
+    order_id 可能指向 orders 或 orders_archive_<年>（封存時保留訂單 id），因此不設外鍵；
+    單價與名稱為轉換當下舊版菜單（MenuItem）的資料，找不到品項時為 NULL
+    """
+    __tablename__ = "order_lines"
+
+    id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, nullable=False)
+    line_no = Column(Integer, nullable=False)      # 於 JSON 陣列中的順序（僅計有效品項）
+    order_date = Column(Date, nullable=False)
+    menu_item_id = Column(Integer, nullable=True)  # 舊版 MenuItem.id
+    quantity = Column(Integer, nullable=False, default=1)
+    unit_price = Column(Integer, nullable=True)
+    item_name = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ux_order_lines_order_line", "order_id", "line_no", unique=True),
+        # 依日期彙總的覆蓋索引
+        Index("ix_order_lines_date", "order_date", "menu_item_id", "unit_price", "item_name", "quantity", "order_id"),
+    )
+
+class OrderLineProgress(Base):
+    """舊版 JSON 品項轉換進度：每個來源資料表（orders、orders_archive_<年>）一列"""
+    __tablename__ = "order_line_progress"
+
+    source = Column(String, primary_key=True)
+    last_order_id = Column(Integer, nullable=False, default=0)
+    completed = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class ScheduledJob(Base):
+    """
+    排程工作狀態（每個工作一列，app.scheduler 登記的工作於啟動時同步）
+
+    locked_by / locked_until 為執行租約：以條件式 UPDATE 取得，多個 worker 同時到期時只有一個執行；
+    執行中的程序結束異常時租約到期後可再次取得。時間皆為 UTC
+    """
+    __tablename__ = "scheduled_jobs"
+
+    name = Column(String, primary_key=True)
+    cron = Column(String, nullable=False)
+    enabled = Column(Boolean, nullable=False, default=True)
+    next_run_at = Column(DateTime, nullable=True)
+    last_run_id = Column(Integer, nullable=True)
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+
+class JobRun(Base):
+    """排程工作的執行紀錄（排定或手動觸發）"""
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True)
+    job_name = Column(String, nullable=False)
+    trigger = Column(String, nullable=False)       # schedule / manual
+    worker = Column(String, nullable=True)
+    started_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    status = Column(String, nullable=False, default="running")  # running / success / failed
+    result = Column(String, nullable=True)         # JSON
+    error = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_job_runs_job", "job_name", "id"),
+    )
+
+class DailySnapshot(Base):
+    """截止後凍結的每日訂單快照（JSON，結構見 app.daily_snapshot）"""
+    __tablename__ = "daily_snapshots"
+
+    date = Column(Date, primary_key=True)
+    frozen_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    payload = Column(String, nullable=False)
+
+class WeeklyPlan(Base):
+    """
+    使用者的固定每週訂餐計畫：每個工作日（0=週一 … 4=週五）一列，品項為空代表該日不訂餐
+    由排程工作 weekly_orders 以單一 INSERT ... SELECT 展開為下週的訂單（見 app.weekly_plans）
+    """
+    __tablename__ = "weekly_plans"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    weekday = Column(Integer, nullable=False)
+    vendor_id = Column(Integer, ForeignKey("vendors.id"), nullable=True)
+    vendor_menu_item_id = Column(Integer, ForeignKey("vendor_menu_items.id"), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ux_weekly_plans_user_weekday", "user_id", "weekday", unique=True),
+    )
+
+class OrderCapacity(Base):
+    """
+    每日已訂份數計數器：品項（scope = item）與廠商（scope = vendor）每日一列
+    由 orders 的 trigger 在寫入訂單的同一個語句中更新並檢查上限（見 app.capacity）
+    """
+    __tablename__ = "order_capacity"
+
+    scope = Column(String, primary_key=True)
+    ref_id = Column(Integer, primary_key=True)
+    order_date = Column(Date, primary_key=True)
+    used = Column(Integer, nullable=False, default=0)
+
+class InstrumentationSetting(Base):
+    """查詢統計設定（單一列）：由系統管理員調整，所有 worker 依此套用（見 app.instrumentation）"""
+    __tablename__ = "instrumentation_settings"
+
+    id = Column(Integer, primary_key=True)
+    enabled = Column(Boolean, nullable=False)
+    slow_request_ms = Column(Float, nullable=False)
+    top_n = Column(Integer, nullable=False)
+    log_parameters = Column(Boolean, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,220 @@
+"""
+訂餐看板即時推播
+
+管理員開啟 /api/admin/orders/stream?date= 後，該日期會建立一份看板：
+以一次查詢載入每位使用者目前的品項，之後由訂單寫入端點在 commit 後呼叫 publish()，
+看板比對新舊狀態並向所有訂閱者推送精簡的差異（使用者的新狀態與品項 ±1），
+取代每位管理員反覆重新整理時的完整彙總查詢。
+
+- 沒有訂閱者的日期不建立看板，publish() 直接返回
+- 寫入端點在執行緒池中執行，訊息以 call_soon_threadsafe 交給各訂閱者的事件迴圈
+- 看板以「使用者目前狀態」計算差異，同一變更重複發布不會重複計數
+- 其他 worker 的寫入由 cache 的版本輪詢偵測（orders:date:<日期>）：refresh() 重新載入該日訂單，
+  與看板比對後推送相同格式的差異，最多延遲一個輪詢週期；本程序的寫入已發布過，比對後沒有差異
+"""
+
+import asyncio
+import json
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import cache, models, versions
+
+# 每位訂閱者最多暫存的訊息數；消費過慢時改送 resync 要求用戶端重新載入
+QUEUE_SIZE = 256
+
+RESYNC = "event: resync\ndata: {}\n\n"
+
+# refresh() 發現的差異超過此數量時改送 resync（例如其他 worker 截止時批次確認）
+REFRESH_LIMIT = 50
+
+
+class _Board:
+    def __init__(self, day: date, entries: Dict[int, Tuple[Optional[int], str]]):
+        self.day = day
+        # user_id -> (vendor_menu_item_id, status)
+        self.entries = entries
+        self.subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+        self.seq = 0
+
+
+_lock = threading.Lock()
+_boards: Dict[date, _Board] = {}
+
+
+def format_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def _offer(queue: asyncio.Queue, message: str):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        # 清空並要求重新同步，而不是默默遺漏差異
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC)
+
+
+def subscribe(day: date, db: Session, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue) -> int:
+    """訂閱指定日期；第一位訂閱者載入看板。回傳目前的序號"""
+    with _lock:
+        board = _boards.get(day)
+        if board is None:
+            rows = db.query(
+                models.Order.user_id, models.Order.vendor_menu_item_id, models.Order.status
+            ).filter(models.Order.order_date == day).all()
+            board = _Board(day, {user_id: (item_id, status) for user_id, item_id, status in rows})
+            _boards[day] = board
+        board.subscribers.append((loop, queue))
+        return board.seq
+
+
+def unsubscribe(day: date, queue: asyncio.Queue):
+    with _lock:
+        board = _boards.get(day)
+        if board is None:
+            return
+        board.subscribers = [(loop, q) for loop, q in board.subscribers if q is not queue]
+        if not board.subscribers:
+            del _boards[day]
+
+
+def _item_info(catalog: cache.Catalog, item_id: int) -> dict:
+    item = catalog.menu_items.get(item_id)
+    vendor = catalog.vendors.get(item.vendor_id) if item else None
+    return {
+        "item_id": item_id,
+        "item_name": item.name if item else None,
+        "item_description": (item.description or "") if item else "",
+        "price": item.price if item else 0,
+        "vendor_id": item.vendor_id if item else None,
+        "vendor_name": vendor.name if vendor else "未知廠商",
+        "vendor_color": vendor.color if vendor else "#6B7280",
+    }
+
+
+def publish(db: Session, user: models.User, order_date: date, item_id: Optional[int] = None,
+            status: Optional[str] = None):
+    """
+    在 commit 後發布一位使用者在某日的新狀態
+
+    status 為 None 表示訂單已刪除；NoOrder 與舊版訂單的 item_id 為 None
+    """
+    if order_date not in _boards:
+        return
+    with _lock:
+        board = _boards.get(order_date)
+        if board is None:
+            return
+        previous = board.entries.get(user.id)
+        current = None if status is None else (item_id, status)
+        if previous == current:
+            return
+        if current is None:
+            board.entries.pop(user.id, None)
+        else:
+            board.entries[user.id] = current
+
+        catalog = cache.get_catalog(db)
+        changes = []
+        previous_item = previous[0] if previous else None
+        current_item = current[0] if current else None
+        if previous_item != current_item:
+            if previous_item is not None:
+                changes.append({"delta": -1, **_item_info(catalog, previous_item)})
+            if current_item is not None:
+                changes.append({"delta": 1, **_item_info(catalog, current_item)})
+
+        board.seq += 1
+        message = format_event("order", {
+            "seq": board.seq,
+            "date": order_date.isoformat(),
+            "user": {"id": user.id, "employee_id": user.employee_id, "name": user.name},
+            "order": None if current is None else {"item_id": current_item, "status": current[1]},
+            "changes": changes,
+        })
+        for loop, queue in board.subscribers:
+            loop.call_soon_threadsafe(_offer, queue, message)
+
+
+def publish_orders(db: Session, user: models.User, orders) -> None:
+    """發布 INSERT / UPDATE ... RETURNING 回傳的訂單"""
+    for order in orders:
+        publish(db, user, order["order_date"], order["vendor_menu_item_id"], order["status"])
+
+
+def resync(db: Session, day: date):
+    """大量異動（例如截止時批次確認）後重新載入看板，並要求訂閱者重新同步"""
+    if day not in _boards:
+        return
+    rows = db.query(
+        models.Order.user_id, models.Order.vendor_menu_item_id, models.Order.status
+    ).filter(models.Order.order_date == day).all()
+    with _lock:
+        board = _boards.get(day)
+        if board is None:
+            return
+        board.entries = {user_id: (item_id, status) for user_id, item_id, status in rows}
+        board.seq += 1
+        for loop, queue in board.subscribers:
+            loop.call_soon_threadsafe(_offer, queue, RESYNC)
+
+
+def refresh(db: Session, day: date):
+    """以資料庫目前的訂單更新看板，推送其他 worker 寫入造成的差異"""
+    board = _boards.get(day)
+    if board is None:
+        return
+    # 使用者欄位供 publish() 組成訊息（id、employee_id、name）
+    rows = db.query(
+        models.User.id, models.User.employee_id, models.User.name,
+        models.Order.vendor_menu_item_id, models.Order.status,
+    ).join(models.Order, models.Order.user_id == models.User.id).filter(models.Order.order_date == day).all()
+    current = {row.id: row for row in rows}
+    with _lock:
+        entries = dict(board.entries)
+    changed = [
+        user_id for user_id in entries.keys() | current.keys()
+        if entries.get(user_id) != ((current[user_id].vendor_menu_item_id, current[user_id].status)
+                                    if user_id in current else None)
+    ]
+    if len(changed) > REFRESH_LIMIT:
+        resync(db, day)
+        return
+    removed = [user_id for user_id in changed if user_id not in current]
+    users = {}
+    if removed:
+        users = {row.id: row for row in db.query(
+            models.User.id, models.User.employee_id, models.User.name
+        ).filter(models.User.id.in_(removed))}
+    for user_id in sorted(changed):
+        row = current.get(user_id)
+        if row is not None:
+            publish(db, row, day, row.vendor_menu_item_id, row.status)
+        elif user_id in users:  # 使用者已刪除時略過
+            publish(db, users[user_id], day)
+
+
+def _watched_days():
+    with _lock:
+        return [versions.orders_on(day) for day in _boards]
+
+
+def _refresh_changed(db: Session, changed: set):
+    for day in [day for day in list(_boards) if versions.orders_on(day) in changed]:
+        refresh(db, day)
+
+
+cache.watch(_watched_days, _refresh_changed)
+
+
+def subscriber_count(day: Optional[date] = None) -> int:
+    with _lock:
+        if day is not None:
+            board = _boards.get(day)
+            return len(board.subscribers) if board else 0
+        return sum(len(board.subscribers) for board in _boards.values())
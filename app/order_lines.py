@@ -0,0 +1,170 @@
+"""
+舊版 JSON 訂單品項正規化
+
+早期訂單以 JSON 字串記錄品項（Order.items，例如 [{"menu_item_id": 3, "quantity": 1}]），
+報表過去每個請求都要解析這些字串再逐一查詢舊版菜單。此模組把它們一次轉換為 order_lines，
+報表改以集合查詢（order_lines ⋈ orders）彙總。
+
+- 依訂單 id 分批轉換，每批一個交易，進度記錄於 order_line_progress（每個來源資料表一列），
+  中斷後重新執行由上次的位置繼續；重複轉換同一筆訂單不會產生重複的明細
+- 已封存的訂單（orders_archive_<年>）同樣轉換，明細保留原訂單 id
+- 應用程式不再寫入 JSON 品項，來源資料表轉換完成後即標記 completed，之後啟動只需讀取進度
+- 單價與名稱取自轉換當下的舊版菜單；JSON 格式錯誤或找不到品項時的處理與原本的報表相同
+  （略過格式錯誤的項目，找不到的品項不列入統計）
+
+使用方式：
+    python -m app.order_lines                 # 轉換所有尚未轉換的訂單（啟動時也會自動執行）
+    python -m app.order_lines --status
+"""
+
+import argparse
+import json
+import logging
+import sys
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import Date, column, select, table, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger("webdiner.order_lines")
+
+BATCH_SIZE = 2000
+
+
+def parse_items(raw) -> List[dict]:
+    """解析 Order.items；只保留含 menu_item_id 的項目，格式錯誤時回傳空串列"""
+    try:
+        items = json.loads(raw)
+        return [item for item in items if isinstance(item, dict) and "menu_item_id" in item]
+    except (TypeError, ValueError):
+        return []
+
+
+def _quantity(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 1
+
+
+def build_lines(order_id: int, order_date, raw, menu: dict) -> List[dict]:
+    lines = []
+    for line_no, item in enumerate(parse_items(raw)):
+        menu_item_id = item["menu_item_id"] if isinstance(item["menu_item_id"], int) else None
+        price, name = menu.get(menu_item_id, (None, None))
+        lines.append({
+            "order_id": order_id,
+            "line_no": line_no,
+            "order_date": order_date,
+            "menu_item_id": menu_item_id,
+            "quantity": _quantity(item.get("quantity", 1)),
+            "unit_price": price,
+            "item_name": name,
+        })
+    return lines
+
+
+def _sources(db: Session) -> List[str]:
+    archives = db.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'orders_archive_%' ORDER BY name"
+    )).scalars().all()
+    return ["orders", *archives]
+
+
+def _save_progress(db: Session, source: str, last_order_id: int, completed: bool):
+    stmt = sqlite_insert(models.OrderLineProgress).values(
+        source=source, last_order_id=last_order_id, completed=completed, updated_at=datetime.utcnow()
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["source"],
+        set_={"last_order_id": stmt.excluded.last_order_id, "completed": stmt.excluded.completed,
+              "updated_at": stmt.excluded.updated_at},
+    ))
+
+
+def convert(engine: Engine, batch_size: int = BATCH_SIZE, max_batches: Optional[int] = None,
+            log=logger.info) -> dict:
+    """轉換尚未轉換的舊版訂單，回傳本次處理的訂單與明細筆數"""
+    result = {"orders": 0, "lines": 0, "batches": 0}
+    with Session(engine) as db:
+        progress = {
+            p.source: (p.last_order_id, p.completed) for p in db.query(models.OrderLineProgress).all()
+        }
+        sources = [source for source in _sources(db) if not progress.get(source, (0, False))[1]]
+        menu = {m.id: (m.price, m.name) for m in db.query(models.MenuItem).all()} if sources else {}
+        db.commit()
+
+        for source in sources:
+            orders = table(
+                source, column("id"), column("order_date", Date), column("items"), column("vendor_menu_item_id")
+            )
+            # items 與 ColumnCollection.items() 同名，以索引取欄位
+            items = orders.c["items"]
+            last_order_id = progress.get(source, (0, False))[0]
+            while True:
+                if max_batches is not None and result["batches"] >= max_batches:
+                    return result
+                rows = db.execute(
+                    select(orders.c.id, orders.c.order_date, items)
+                    .where(orders.c.id > last_order_id, items.isnot(None),
+                           orders.c.vendor_menu_item_id.is_(None))
+                    .order_by(orders.c.id)
+                    .limit(batch_size)
+                ).all()
+                lines = [line for order_id, order_date, raw in rows
+                         for line in build_lines(order_id, order_date, raw, menu)]
+                if lines:
+                    db.execute(
+                        sqlite_insert(models.OrderLine).on_conflict_do_nothing(index_elements=["order_id", "line_no"]),
+                        lines,
+                    )
+                if rows:
+                    last_order_id = rows[-1][0]
+                completed = len(rows) < batch_size
+                _save_progress(db, source, last_order_id, completed)
+                db.commit()
+
+                result["orders"] += len(rows)
+                result["lines"] += len(lines)
+                result["batches"] += 1
+                if rows:
+                    log(f"Converted {len(rows)} legacy orders from {source} (through id {last_order_id})")
+                if completed:
+                    break
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="轉換舊版 JSON 訂單品項")
+    parser.add_argument("--database", help="SQLite 檔案路徑（預設使用應用程式設定）")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="每批轉換的訂單數")
+    parser.add_argument("--max-batches", type=int, help="本次最多執行的批次數")
+    parser.add_argument("--status", action="store_true", help="僅顯示目前進度")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        from sqlalchemy import create_engine
+        engine = create_engine(f"sqlite:///{args.database}", connect_args={"timeout": 30})
+    else:
+        from .database import engine
+
+    if args.status:
+        with Session(engine) as db:
+            for p in db.query(models.OrderLineProgress).order_by(models.OrderLineProgress.source).all():
+                print(f"{p.source}: last_order_id={p.last_order_id} completed={p.completed}")
+            lines = db.query(models.OrderLine).count()
+        print(f"order_lines={lines}")
+        return 0
+
+    result = convert(engine, batch_size=args.batch_size, max_batches=args.max_batches, log=print)
+    print(f"Converted {result['orders']} legacy orders into {result['lines']} lines")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
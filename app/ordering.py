@@ -0,0 +1,47 @@
+"""
+訂餐截止與提醒
+
+訂餐端點、管理端點與排程工作（app.jobs）共用的規則，不依賴任何 router：
+
+- CUTOFF_TIME: 每日訂餐截止時間（台灣時間）
+- earliest_editable_date: 仍可新增或修改訂單的最早日期（截止後的日期由每日快照凍結）
+- missing_orders: 指定日期尚未訂餐的在職使用者
+- deliver_reminders: 寄送訂餐提醒
+"""
+
+from datetime import date, time, timedelta
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from . import archive, localtime, models
+
+CUTOFF_TIME = time(9, 0)  # 9:00 AM
+
+
+def earliest_editable_date() -> date:
+    """仍可新增或修改訂單的最早日期（台灣時間，今日 9:00 後為明日）"""
+    now = localtime.now()
+    if now.time() > CUTOFF_TIME:
+        return now.date() + timedelta(days=1)
+    return now.date()
+
+
+def missing_orders(db: Session, target_date: date) -> List[dict]:
+    """指定日期尚未訂餐的在職使用者"""
+    all_users = db.query(models.User).filter(models.User.is_active == True).all()
+    Order = archive.orders_between(db, target_date)
+    ordered_user_ids = {uid for (uid,) in db.query(Order.user_id).filter(Order.order_date == target_date)}
+    return [
+        {"employee_id": user.employee_id, "name": user.name, "email": user.email}
+        for user in all_users if user.id not in ordered_user_ids
+    ]
+
+
+def deliver_reminders(missing_users: List[dict], target_date: date) -> int:
+    # Mock sending email
+    sent_count = 0
+    for user in missing_users:
+        print(f"Sending reminder to {user['email']} for date {target_date}")
+        sent_count += 1
+    return sent_count
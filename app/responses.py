@@ -0,0 +1,164 @@
+"""
+回應序列化與壓縮
+
+- ORJSONResponse: 以 orjson 序列化的預設回應類別（date / datetime 直接輸出 ISO 格式）
+- trusted(): 伺服器端自行組出的 dict / list 直接序列化，略過 response_model 驗證與 jsonable_encoder
+- encode_responses: 依 Accept 與 Accept-Encoding 協商回應格式
+    - Accept: application/msgpack 時改以 MessagePack 編碼（需安裝 msgpack）
+    - 超過 COMPRESS_MIN_SIZE 的 JSON / 文字回應以 br（需安裝 brotli）或 gzip 壓縮
+    - 未知長度的串流回應（CSV 匯出）逐段壓縮，不先讀完整個內容；Server-Sent Events 不處理
+
+brotli 與 msgpack 為選用套件，未安裝時自動略過對應格式。
+"""
+
+import gzip
+import zlib
+from typing import Any, Optional
+
+import orjson
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 選用套件
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 選用套件
+    msgpack = None
+
+COMPRESS_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+COMPRESSIBLE_TYPES = ("application/json", "application/msgpack", "text/plain", "text/csv", "text/html")
+
+
+def _default(obj: Any):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def trusted(content: Any, status_code: int = 200) -> ORJSONResponse:
+    """已知結構正確的回應內容，直接序列化（不經 response_model 驗證）"""
+    return ORJSONResponse(content, status_code=status_code)
+
+
+def _accepted(header: str) -> dict:
+    """解析 Accept / Accept-Encoding 標頭：{token: q}"""
+    accepted = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[token.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = _accepted(accept_encoding)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    ranked = [
+        (accepted.get(name, accepted.get("*", 0.0)), -i, name)
+        for i, name in enumerate(candidates)
+    ]
+    q, _, name = max(ranked)
+    return name if q > 0 else None
+
+
+def wants_msgpack(accept: str) -> bool:
+    if msgpack is None:
+        return False
+    accepted = _accepted(accept)
+    return any(accepted.get(name, 0) > 0 for name in MSGPACK_TYPES)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+async def compress_stream(chunks, encoding: str):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process, finish = compressor.compress, compressor.flush
+    async for chunk in chunks:
+        data = process(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+async def encode_responses(request: Request, call_next):
+    """HTTP middleware：MessagePack 協商與 br / gzip 壓縮"""
+    use_msgpack = wants_msgpack(request.headers.get("accept", ""))
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    response = await call_next(request)
+
+    content_type = response.headers.get("content-type", "")
+    if "content-encoding" in response.headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+        return response
+    convert = use_msgpack and content_type.startswith("application/json")
+    if not convert and encoding is None:
+        return response
+
+    length = response.headers.get("content-length")
+    if length is None and not convert:
+        headers = [
+            (name, value) for name, value in response.raw_headers
+            if name not in (b"content-type", b"vary")
+        ]
+        streamed = StreamingResponse(
+            compress_stream(response.body_iterator, encoding), status_code=response.status_code,
+            media_type=content_type,
+        )
+        streamed.raw_headers.extend(headers)
+        streamed.raw_headers.extend([(b"content-encoding", encoding.encode()), (b"vary", b"Accept, Accept-Encoding")])
+        return streamed
+    if not convert and length is not None and int(length) < COMPRESS_MIN_SIZE:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = [
+        (name, value) for name, value in response.raw_headers
+        if name not in (b"content-length", b"content-type", b"vary")
+    ]
+    if convert:
+        body = msgpack.packb(orjson.loads(body), use_bin_type=True) if body else body
+        content_type = "application/msgpack"
+    if encoding is not None and len(body) >= COMPRESS_MIN_SIZE:
+        body = compress(body, encoding)
+        headers.append((b"content-encoding", encoding.encode()))
+
+    encoded = Response(content=body, status_code=response.status_code, media_type=content_type)
+    encoded.raw_headers.extend(headers)
+    encoded.raw_headers.append((b"vary", b"Accept, Accept-Encoding"))
+    return encoded
@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import and_, case, delete, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from typing import List, Optional
 from datetime import date, datetime
-import json
-from .. import models, schemas, database
+from collections import defaultdict
+from contextlib import contextmanager
+import asyncio
+from .. import models, schemas, database, archive, billing, cache, capacity, exports, instrumentation, localtime, metrics, ordering, responses, scheduler, versions, order_board, daily_snapshot
 from .auth import get_current_user, get_password_hash
+from .orders import BATCH_INSERT_CHUNK, capacity_guard
 from ..models import User, Department, Division, Vendor, VendorMenuItem, SpecialDay
 
 router = APIRouter(
@@ -21,139 +28,32 @@ def check_admin(user: models.User = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="權限不足")
     return user
 
-@router.get("/stats")
-def get_stats(date: date = None, db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
-    target_date = date if date else date.today()
-    orders = db.query(models.Order).filter(models.Order.order_date == target_date).all()
-    
-    grand_total_orders = 0
-    grand_total_price = 0
-    
-    # Structure: { vendor_name: { "total_price": 0, "total_count": 0, "items": { item_name: { "count": 0, "price": 0 } } } }
-    vendor_stats = {}
-    
-    for order in orders:
-        grand_total_orders += 1
-        
-        # Handle new style orders (Vendor based)
-        if order.vendor_menu_item_id:
-            menu_item = db.query(models.VendorMenuItem).get(order.vendor_menu_item_id)
-            if menu_item:
-                vendor_name = menu_item.vendor.name if menu_item.vendor else "Unknown Vendor"
-                price = menu_item.price
-                quantity = 1 # Default to 1
-                
-                grand_total_price += price * quantity
-                
-                if vendor_name not in vendor_stats:
-                    vendor_stats[vendor_name] = {
-                        "total_price": 0,
-                        "total_count": 0,
-                        "items": {}
-                    }
-                
-                vendor_stats[vendor_name]["total_price"] += price * quantity
-                vendor_stats[vendor_name]["total_count"] += quantity
-                
-                if menu_item.name not in vendor_stats[vendor_name]["items"]:
-                    vendor_stats[vendor_name]["items"][menu_item.name] = {"count": 0, "price": price, "description": menu_item.description}
-                
-                vendor_stats[vendor_name]["items"][menu_item.name]["count"] += quantity
-        
-        # Handle legacy orders with JSON items
-        elif order.items:
-            try:
-                items = json.loads(order.items)
-                vendor_name = "Legacy/General"
-                
-                for item in items:
-                    menu_item = db.query(models.MenuItem).get(item['menu_item_id'])
-                    if menu_item:
-                        price = menu_item.price
-                        quantity = item['quantity']
-                        
-                        grand_total_price += price * quantity
-                        
-                        if vendor_name not in vendor_stats:
-                            vendor_stats[vendor_name] = {
-                                "total_price": 0,
-                                "total_count": 0,
-                                "items": {}
-                            }
-                        
-                        vendor_stats[vendor_name]["total_price"] += price * quantity
-                        vendor_stats[vendor_name]["total_count"] += quantity # This counts items, not orders, which is slightly inconsistent but okay for stats
-                        
-                        if menu_item.name not in vendor_stats[vendor_name]["items"]:
-                            vendor_stats[vendor_name]["items"][menu_item.name] = {"count": 0, "price": price}
-                        
-                        vendor_stats[vendor_name]["items"][menu_item.name]["count"] += quantity
-            except (TypeError, json.JSONDecodeError):
-                pass
-
-    # Convert to list for frontend
-    vendors_list = []
-    for v_name, v_data in vendor_stats.items():
-        items_list = [
-            {
-                "name": i_name, 
-                "description": i_data.get("description", ""),
-                "count": i_data["count"], 
-                "subtotal": i_data["count"] * i_data["price"]
-            }
-            for i_name, i_data in v_data["items"].items()
-        ]
-        items_list.sort(key=lambda x: x["count"], reverse=True)
-        
-        vendors_list.append({
-            "name": v_name,
-            "total_orders": v_data["total_count"], # Note: for legacy this is item count sum
-            "total_price": v_data["total_price"],
-            "items": items_list
-        })
-    
-    vendors_list.sort(key=lambda x: x["total_price"], reverse=True)
+def check_sysadmin(user: models.User = Depends(get_current_user)):
+    if user.role != "sysadmin":
+        raise HTTPException(status_code=403, detail="只有系統管理員可以執行此操作")
+    return user
 
-    return {
-        "date": target_date,
-        "total_orders": grand_total_orders,
-        "total_price": grand_total_price,
-        "vendors": vendors_list
-    }
+@router.get("/stats", dependencies=[Depends(versions.conditional(versions.CATALOG, auth=check_admin, orders_date="date"))])
+def get_stats(date: date = None, db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
+    target_date = date if date else localtime.today()
+    # 截止後由凍結的快照產生，之前的日期即時彙總
+    snapshot = daily_snapshot.get(db, target_date)
+    return responses.trusted(daily_snapshot.stats(snapshot, cache.get_catalog(db)))
 
-@router.get("/reminders/missing")
-def get_missing_orders(target_date: date = date.today(), db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
-    # Get all users
-    all_users = db.query(models.User).filter(models.User.is_active == True).all() # Assuming is_active exists or filter all
-    # Get users who ordered
-    ordered_user_ids = db.query(models.Order.user_id).filter(models.Order.order_date == target_date).all()
-    ordered_user_ids = [uid[0] for uid in ordered_user_ids]
-    
-    missing_users = []
-    for user in all_users:
-        if user.id not in ordered_user_ids:
-            missing_users.append({
-                "employee_id": user.employee_id,
-                "name": user.name,
-                "email": user.email
-            })
-            
-    return missing_users
+@router.get("/reminders/missing", dependencies=[Depends(versions.conditional(versions.USERS, auth=check_admin, orders_date="target_date"))])
+def get_missing_orders(target_date: Optional[date] = None, db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
+    target_date = target_date or localtime.today()
+    return ordering.missing_orders(db, target_date)
 
 @router.post("/reminders/send")
-def send_reminders(target_date: date = date.today(), db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
-    missing_users = get_missing_orders(target_date, db, current_user)
-    
-    # Mock sending email
-    sent_count = 0
-    for user in missing_users:
-        print(f"Sending reminder to {user['email']} for date {target_date}")
-        sent_count += 1
-        
+def send_reminders(target_date: Optional[date] = None, db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
+    target_date = target_date or localtime.today()
+    missing_users = ordering.missing_orders(db, target_date)
+    sent_count = ordering.deliver_reminders(missing_users, target_date)
     return {"message": f"Sent reminders to {sent_count} users"}
 
 # User Management Endpoints
-@router.get("/users", response_model=List[schemas.User])
+@router.get("/users", response_model=List[schemas.User], dependencies=[Depends(versions.conditional(versions.USERS, auth=check_admin))])
 def get_users(skip: int = 0, limit: int = 200, db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
     users = db.query(models.User).offset(skip).limit(limit).all()
     return users
@@ -187,7 +87,9 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db), current
         is_department_head=user.is_department_head  # 是否為部門主管
     )
     db.add(new_user)
+    versions.bump(db, versions.USERS)
     db.commit()
+    cache.invalidate("directory", "principals")
     db.refresh(new_user)
     return new_user
 
@@ -224,7 +126,9 @@ def update_user(user_id: int, user_update: schemas.UserUpdate, db: Session = Dep
     for key, value in update_data.items():
         setattr(db_user, key, value)
         
+    versions.bump(db, versions.USERS)
     db.commit()
+    cache.invalidate("directory", "principals")
     db.refresh(db_user)
     return db_user
 
@@ -239,12 +143,14 @@ def delete_user(user_id: int, db: Session = Depends(get_db), current_user: model
         raise HTTPException(status_code=403, detail="管理員無法刪除其他管理員或系統管理員")
     
     db.delete(db_user)
+    versions.bump(db, versions.USERS)
     db.commit()
+    cache.invalidate("directory", "principals")
     return {"message": "User deleted"}
 
 # ========== Division (處別) Management Endpoints ==========
 
-@router.get("/divisions", response_model=List[schemas.Division])
+@router.get("/divisions", response_model=List[schemas.Division], dependencies=[Depends(versions.conditional(versions.ORG, auth=check_admin))])
 def get_divisions(db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
     """取得所有處別列表"""
     return db.query(models.Division).filter(models.Division.is_active == True).order_by(
@@ -252,7 +158,7 @@ def get_divisions(db: Session = Depends(get_db), current_user: models.User = Dep
         models.Division.display_order
     ).all()
 
-@router.get("/divisions/{division_id}", response_model=schemas.DivisionWithDepartments)
+@router.get("/divisions/{division_id}", response_model=schemas.DivisionWithDepartments, dependencies=[Depends(versions.conditional(versions.ORG, auth=check_admin))])
 def get_division_with_departments(division_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
     """取得處別及其所屬部門"""
     division = db.query(models.Division).filter(models.Division.id == division_id).first()
@@ -280,7 +186,9 @@ def create_division(division: schemas.DivisionCreate, db: Session = Depends(get_
         existing.is_active = True
         existing.display_column = division.display_column
         existing.display_order = division.display_order
+        versions.bump(db, versions.ORG)
         db.commit()
+        cache.invalidate("directory")
         db.refresh(existing)
         return existing
     
@@ -291,7 +199,9 @@ def create_division(division: schemas.DivisionCreate, db: Session = Depends(get_
         display_order=division.display_order
     )
     db.add(new_division)
+    versions.bump(db, versions.ORG)
     db.commit()
+    cache.invalidate("directory")
     db.refresh(new_division)
     return new_division
 
@@ -311,7 +221,9 @@ def update_division(
     for key, value in update_data.items():
         setattr(division, key, value)
     
+    versions.bump(db, versions.ORG)
     db.commit()
+    cache.invalidate("directory")
     db.refresh(division)
     return division
 
@@ -332,17 +244,19 @@ def delete_division(division_id: int, db: Session = Depends(get_db), current_use
         raise HTTPException(status_code=400, detail=f"無法刪除有 {dept_count} 個使用中部門的處別")
     
     division.is_active = False
+    versions.bump(db, versions.ORG)
     db.commit()
+    cache.invalidate("directory")
     return {"message": "Division deleted"}
 
 # ========== Department (部門) Management Endpoints ==========
 
-@router.get("/departments", response_model=List[schemas.Department])
+@router.get("/departments", response_model=List[schemas.Department], dependencies=[Depends(versions.conditional(versions.ORG, auth=check_admin))])
 def get_departments(db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
     """取得所有部門列表"""
     return db.query(models.Department).filter(models.Department.is_active == True).all()
 
-@router.get("/departments/by-division/{division_id}", response_model=List[schemas.Department])
+@router.get("/departments/by-division/{division_id}", response_model=List[schemas.Department], dependencies=[Depends(versions.conditional(versions.ORG, auth=check_admin))])
 def get_departments_by_division(division_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
     """取得指定處別下的所有部門"""
     return db.query(models.Department).filter(
@@ -362,7 +276,9 @@ def create_department(dept: schemas.DepartmentCreate, db: Session = Depends(get_
         existing.division_id = dept.division_id
         existing.display_column = dept.display_column
         existing.display_order = dept.display_order
+        versions.bump(db, versions.ORG)
         db.commit()
+        cache.invalidate("directory")
         db.refresh(existing)
         return existing
     
@@ -374,7 +290,9 @@ def create_department(dept: schemas.DepartmentCreate, db: Session = Depends(get_
         display_order=dept.display_order
     )
     db.add(new_dept)
+    versions.bump(db, versions.ORG)
     db.commit()
+    cache.invalidate("directory")
     db.refresh(new_dept)
     return new_dept
 
@@ -394,7 +312,9 @@ def update_department(
     for key, value in update_data.items():
         setattr(dept, key, value)
     
+    versions.bump(db, versions.ORG)
     db.commit()
+    cache.invalidate("directory")
     db.refresh(dept)
     return dept
 
@@ -405,13 +325,15 @@ def delete_department(dept_id: int, db: Session = Depends(get_db), current_user:
         raise HTTPException(status_code=404, detail="找不到部門")
     
     dept.is_active = False
+    versions.bump(db, versions.ORG)
     db.commit()
+    cache.invalidate("directory")
     return {"message": "Department deleted"}
 
 # Order Management Endpoints
-@router.get("/orders/daily_details")
+@router.get("/orders/daily_details", dependencies=[Depends(versions.conditional(versions.USERS, versions.ORG, versions.CATALOG, auth=check_admin, orders_date="date"))])
 def get_daily_order_details(date: date = None, db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
-    target_date = date if date else date.today()
+    target_date = date if date else localtime.today()
     
     # Get all active users
     users = db.query(models.User).filter(models.User.is_active == True).order_by(models.User.employee_id.asc()).all()
@@ -420,9 +342,9 @@ def get_daily_order_details(date: date = None, db: Session = Depends(get_db), cu
     departments = db.query(models.Department).all()
     dept_map = {d.id: d.name for d in departments}
     
-    # Get all orders for the date
-    orders = db.query(models.Order).filter(models.Order.order_date == target_date).all()
-    user_orders = {order.user_id: order for order in orders}
+    # Get all orders for the date（品項與廠商名稱為訂購當下的快照；截止後取自凍結的每日快照）
+    user_orders = daily_snapshot.user_orders(daily_snapshot.get(db, target_date))
+    vendors = cache.get_catalog(db).vendors
     
     result = []
     for user in users:
@@ -432,7 +354,7 @@ def get_daily_order_details(date: date = None, db: Session = Depends(get_db), cu
             "employee_id": user.employee_id,
             "name": user.name,
             "department": dept_map.get(user.department_id) if user.department_id else None,
-            "order_id": order.id if order else None,
+            "order_id": order["order_id"] if order else None,
             "item_name": "未選",
             "vendor_name": "",
             "vendor_color": "",
@@ -441,29 +363,43 @@ def get_daily_order_details(date: date = None, db: Session = Depends(get_db), cu
         }
         
         if order:
-            if order.vendor_menu_item_id:
-                menu_item = db.query(models.VendorMenuItem).get(order.vendor_menu_item_id)
-                if menu_item:
-                    order_info["item_name"] = menu_item.name
-                    order_info["vendor_name"] = menu_item.vendor.name
-                    order_info["vendor_color"] = menu_item.vendor.color
-                    order_info["vendor_id"] = menu_item.vendor.id
-                    order_info["item_id"] = menu_item.id
-            elif order.items: # Legacy support
-                try:
-                    items = json.loads(order.items)
-                    if items:
-                        item_id = items[0]['menu_item_id']
-                        menu_item = db.query(models.MenuItem).get(item_id)
-                        if menu_item:
-                            order_info["item_name"] = menu_item.name
-                            order_info["vendor_name"] = "Legacy"
-                except:
-                    pass
+            if order["item_id"]:
+                order_info["item_name"] = order["item_name"]
+                order_info["vendor_name"] = order["vendor_name"]
+                order_info["vendor_color"] = vendors[order["vendor_id"]].color if order["vendor_id"] in vendors else None
+                order_info["vendor_id"] = order["vendor_id"]
+                order_info["item_id"] = order["item_id"]
+            elif order["lines"]:
+                # Legacy support：舊版 JSON 訂單只顯示第一個品項
+                order_info["item_name"] = order["lines"][0][0]
+                order_info["vendor_name"] = "Legacy"
         
         result.append(order_info)
         
-    return result
+    return responses.trusted(result)
+
+@router.get("/orders/vendor_sheets", dependencies=[Depends(versions.conditional(versions.ORG, auth=check_admin, orders_date="date"))])
+def get_vendor_sheets(date: date = None, vendor_id: Optional[int] = None, format: str = "json", db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
+    """
+    廠商訂單表 - 各廠商的品項、份數、金額與訂購人（截止後取自凍結的每日快照）
+    format: json（預設）、csv、html（可列印，每家廠商一頁）；vendor_id 只輸出單一廠商
+    """
+    if format not in ("json", "csv", "html"):
+        raise HTTPException(status_code=400, detail=f"不支援的匯出格式：{format}")
+    target_date = date if date else localtime.today()
+    snapshot = daily_snapshot.get(db, target_date)
+    filename = f"orders-{target_date.isoformat()}" + (f"-{vendor_id}" if vendor_id else "")
+    if format == "csv":
+        return StreamingResponse(daily_snapshot.csv_stream(snapshot, vendor_id), media_type=exports.CSV_MEDIA_TYPE,
+                                 headers=exports.attachment(f"{filename}.csv"))
+    if format == "html":
+        departments = {d.id: d.name for d in db.query(models.Department.id, models.Department.name)}
+        return HTMLResponse(daily_snapshot.printable(snapshot, departments, vendor_id))
+    return responses.trusted({
+        "date": snapshot["date"],
+        "frozen_at": snapshot["frozen_at"],
+        "vendors": [v for v in snapshot["vendors"] if vendor_id is None or v["vendor_id"] == vendor_id],
+    })
 
 @router.put("/orders/user_order")
 def update_user_order(
@@ -481,6 +417,9 @@ def update_user_order(
     if not user:
         raise HTTPException(status_code=404, detail="找不到使用者")
 
+    if archive.is_archived(db, order_date):
+        raise HTTPException(status_code=400, detail="該日期的訂單已封存，無法修改")
+
     # Check for existing order
     existing_order = db.query(models.Order).filter(
         models.Order.user_id == user_id,
@@ -490,41 +429,227 @@ def update_user_order(
     if is_cancel:
         if existing_order:
             db.delete(existing_order)
+            if daily_snapshot.is_frozen(order_date):
+                db.flush()
+                daily_snapshot.patch(db, order_date, [(user, None)])
+            versions.bump_orders(db, [user_id], [order_date])
             db.commit()
+            if versions.month_closed(order_date):
+                cache.invalidate("billing")
+            metrics.order_writes.inc(status="Cancelled")
+            order_board.publish(db, user, order_date)
         return {"message": "Order cancelled"}
 
     if not vendor_id or not item_id:
          raise HTTPException(status_code=400, detail="需要指定廠商和餐點品項")
 
-    # Verify item exists
-    menu_item = db.query(models.VendorMenuItem).filter(
-        models.VendorMenuItem.id == item_id,
-        models.VendorMenuItem.vendor_id == vendor_id
-    ).first()
-    
-    if not menu_item:
+    # Verify item exists（使用快取的菜單資料）
+    catalog = cache.get_catalog(db)
+    menu_item = catalog.menu_items.get(item_id)
+    if not menu_item or menu_item.vendor_id != vendor_id:
         raise HTTPException(status_code=404, detail="找不到餐點品項")
+    snapshot = catalog.snapshot(item_id)
 
     if existing_order:
         existing_order.vendor_id = vendor_id
         existing_order.vendor_menu_item_id = item_id
         existing_order.items = None # Clear legacy items
+        for key, value in snapshot.items():
+            setattr(existing_order, key, value)
+        # 與批次修改相同：為不訂餐的使用者指定品項即視為確認訂餐
+        if existing_order.status == "NoOrder":
+            existing_order.status = "Confirmed"
     else:
         new_order = models.Order(
             user_id=user_id,
             vendor_id=vendor_id,
             vendor_menu_item_id=item_id,
             order_date=order_date,
-            status="Confirmed"
+            status="Confirmed",
+            **snapshot
         )
         db.add(new_order)
     
+    order_status = existing_order.status if existing_order else "Confirmed"
+    # 先寫入訂單：超過每日供應上限時回應 409
+    with capacity_guard(db):
+        db.flush()
+    if daily_snapshot.is_frozen(order_date):
+        # 截止後的日期：修補凍結的快照（訂單已寫入，取得寫入鎖與 id）
+        daily_snapshot.patch(db, order_date, [(user, existing_order or new_order)])
+    versions.bump_orders(db, [user_id], [order_date])
     db.commit()
+    if versions.month_closed(order_date):
+        cache.invalidate("billing")
+    metrics.order_writes.inc(status=order_status)
+    order_board.publish(db, user, order_date, item_id, order_status)
     return {"message": "Order updated"}
 
+def write_bulk_orders(db: Session, deleted_ids: List[int], upserts: List[dict]) -> list:
+    """批次設定的寫入：一個 DELETE 與多列 INSERT ... ON CONFLICT DO UPDATE，回傳寫入的訂單"""
+    if deleted_ids:
+        db.execute(delete(models.Order).where(models.Order.id.in_(deleted_ids)))
+    written = []
+    for start in range(0, len(upserts), BATCH_INSERT_CHUNK):
+        stmt = sqlite_insert(models.Order).values(upserts[start:start + BATCH_INSERT_CHUNK])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "order_date"],
+            set_={
+                **{name: stmt.excluded[name] for name in (
+                    "vendor_id", "vendor_menu_item_id", "unit_price", "vendor_name", "item_name")},
+                "items": None,
+                # 既有訂單保留原狀態（Pending 仍由截止時確認），不訂餐改為 Confirmed
+                "status": case((models.Order.status == "NoOrder", "Confirmed"), else_=models.Order.status),
+            },
+        ).returning(
+            models.Order.id, models.Order.user_id, models.Order.order_date, models.Order.vendor_id,
+            models.Order.vendor_menu_item_id, models.Order.status, models.Order.unit_price,
+            models.Order.vendor_name, models.Order.item_name,
+        )
+        written.extend(db.execute(stmt).all())
+    return written
+
+@router.put("/orders/bulk", response_model=List[schemas.AdminOrderBulkOutcome])
+def bulk_update_orders(
+    bulk: schemas.AdminOrderBulk,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(check_admin)
+):
+    """
+    批次設定多位使用者、多個日期的訂單（例如整個部門週五訂同一品項）
+
+    - 規則與 PUT /orders/user_order 相同：品項以快取的菜單驗證，已封存的日期不可修改
+    - 部門列展開為該部門的在職人員；同一人同一天出現多次時以後面的列為準，前面的標示為 superseded
+    - 所有變更在單一交易中以一個 DELETE 與多列 INSERT ... ON CONFLICT DO UPDATE 寫入，
+      已凍結的日期在同一交易中修補每日快照
+    """
+    catalog = cache.get_catalog(db)
+
+    user_ids = {row.user_id for row in bulk.rows if row.user_id is not None}
+    department_ids = {row.department_id for row in bulk.rows if row.user_id is None and row.department_id is not None}
+    users = {}
+    members = defaultdict(list)
+    if user_ids or department_ids:
+        for user in db.query(User).filter(or_(
+            User.id.in_(user_ids), and_(User.department_id.in_(department_ids), User.is_active == True)
+        )).order_by(User.employee_id):
+            users[user.id] = user
+            if user.is_active and user.department_id in department_ids:
+                members[user.department_id].append(user)
+
+    outcomes = []
+    targets = {}  # (user_id, order_date) -> (outcome, row)
+    for index, row in enumerate(bulk.rows):
+        reason = None
+        row_users = []
+        if row.user_id is not None:
+            if row.user_id in users:
+                row_users = [users[row.user_id]]
+            else:
+                reason = "找不到使用者"
+        elif row.department_id is not None:
+            row_users = members.get(row.department_id)
+            if not row_users:
+                reason = "找不到部門或部門沒有在職人員"
+        else:
+            reason = "需要指定使用者或部門"
+
+        if reason is None and archive.is_archived(db, row.order_date):
+            reason = "該日期的訂單已封存，無法修改"
+        if reason is None and not row.is_cancel:
+            menu_item = catalog.menu_items.get(row.item_id) if row.item_id else None
+            if not row.vendor_id or not row.item_id:
+                reason = "需要指定廠商和餐點品項"
+            elif not menu_item or menu_item.vendor_id != row.vendor_id:
+                reason = "找不到餐點品項"
+        if reason is not None:
+            outcomes.append({"index": index, "user_id": row.user_id, "order_date": row.order_date,
+                             "outcome": "rejected", "reason": reason})
+            continue
+
+        for user in row_users:
+            outcome = {"index": index, "user_id": user.id, "order_date": row.order_date, "outcome": None}
+            earlier = targets.get((user.id, row.order_date))
+            if earlier is not None:
+                earlier[0]["outcome"] = "superseded"
+            targets[(user.id, row.order_date)] = (outcome, row)
+            outcomes.append(outcome)
+
+    existing = {}
+    if targets:
+        for order in db.query(
+            models.Order.id, models.Order.user_id, models.Order.order_date, models.Order.vendor_id,
+            models.Order.vendor_menu_item_id, models.Order.status, models.Order.items,
+        ).filter(
+            models.Order.user_id.in_({user_id for user_id, _ in targets}),
+            models.Order.order_date.in_({day for _, day in targets}),
+        ):
+            existing[(order.user_id, order.order_date)] = order
+
+    deleted = []
+    upserts = []
+    now = datetime.utcnow()
+    left = capacity.load(db, catalog, {day for _, day in targets})
+    # 寫入時 DELETE 在 INSERT 之前執行：先歸還同一批次取消的訂單，其他列可使用釋出的份數
+    for key, (outcome, row) in targets.items():
+        current = existing.get(key)
+        if row.is_cancel and current is not None and current.vendor_menu_item_id in catalog.menu_items:
+            left.release(catalog.menu_items[current.vendor_menu_item_id], key[1])
+    for key, (outcome, row) in targets.items():
+        current = existing.get(key)
+        if current is not None:
+            outcome["order_id"] = current.id
+        if row.is_cancel:
+            outcome["outcome"] = "cancelled" if current is not None else "unchanged"
+            if current is not None:
+                deleted.append(key)
+        elif (current is not None and current.status != "NoOrder" and current.items is None
+              and (current.vendor_id, current.vendor_menu_item_id) == (row.vendor_id, row.item_id)):
+            outcome["outcome"] = "unchanged"
+        else:
+            replacing = catalog.menu_items.get(current.vendor_menu_item_id) if current is not None else None
+            reason = left.take(catalog.menu_items[row.item_id], key[1], replacing)
+            if reason:
+                outcome.update(outcome="rejected", reason=reason)
+                continue
+            outcome["outcome"] = "created" if current is None else "updated"
+            upserts.append({
+                "user_id": key[0], "vendor_id": row.vendor_id, "vendor_menu_item_id": row.item_id,
+                "order_date": key[1], "created_at": now, "status": "Confirmed", **catalog.snapshot(row.item_id),
+            })
+
+    with capacity_guard(db):
+        written = write_bulk_orders(db, [existing[key].id for key in deleted], upserts)
+
+    changes = defaultdict(list)  # order_date -> [(使用者, 訂單或 None)]
+    for user_id, day in deleted:
+        changes[day].append((users[user_id], None))
+    for order in written:
+        targets[(order.user_id, order.order_date)][0]["order_id"] = order.id
+        changes[order.order_date].append((users[order.user_id], order))
+    for day, day_changes in changes.items():
+        if daily_snapshot.is_frozen(day):
+            daily_snapshot.patch(db, day, day_changes)
+    if changes:
+        versions.bump_orders(db, {user.id for day_changes in changes.values() for user, _ in day_changes}, changes)
+    # commit 後發布看板仍需使用者資料：先移出 session，避免逐一重新載入
+    for user in users.values():
+        db.expunge(user)
+    db.commit()
+
+    if any(versions.month_closed(day) for day in changes):
+        cache.invalidate("billing")
+    for user_id, day in deleted:
+        metrics.order_writes.inc(status="Cancelled")
+        order_board.publish(db, users[user_id], day)
+    for order in written:
+        metrics.order_writes.inc(status=order.status)
+        order_board.publish(db, users[order.user_id], order.order_date, order.vendor_menu_item_id, order.status)
+    return outcomes
+
 # --- Special Day Management ---
 
-@router.get("/special_days", response_model=List[schemas.SpecialDay])
+@router.get("/special_days", response_model=List[schemas.SpecialDay], dependencies=[Depends(versions.conditional(versions.CALENDAR, auth=check_admin))])
 def get_special_days(db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
     return db.query(SpecialDay).all()
 
@@ -540,7 +665,9 @@ def create_special_day(day: schemas.SpecialDayCreate, db: Session = Depends(get_
         db_day = SpecialDay(**day.dict())
         db.add(db_day)
     
+    versions.bump(db, versions.CALENDAR)
     db.commit()
+    cache.invalidate("calendar")
     db.refresh(db_day)
     return db_day
 
@@ -557,65 +684,159 @@ def delete_special_day(date_str: str, db: Session = Depends(get_db), current_use
         raise HTTPException(status_code=404, detail="找不到特殊日期")
     
     db.delete(db_day)
+    versions.bump(db, versions.CALENDAR)
     db.commit()
+    cache.invalidate("calendar")
     return {"message": "Special day deleted"}
 
 # ========== Order Announcement (訂餐公告) ==========
 
-@router.get("/order_announcement")
+@router.get("/order_announcement", dependencies=[Depends(versions.conditional(versions.USERS, versions.CATALOG, auth=check_admin, orders_date="date"))])
 def get_order_announcement(date: date = None, db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
     """
     取得訂餐公告資料 - 以品項為單位，顯示訂購人員
     回傳格式: [{ vendor_name, vendor_color, item_name, item_description, price, orders: [{ employee_id, name }] }]
     """
-    from datetime import date as date_type
-    target_date = date if date else date_type.today()
-    
-    # 取得該日期所有訂單
-    orders = db.query(models.Order).filter(models.Order.order_date == target_date).all()
-    
-    # 以 vendor_menu_item_id 為 key 來聚合訂單
-    item_orders = {}
-    
-    for order in orders:
-        if not order.vendor_menu_item_id:
-            continue  # 跳過舊式訂單
-            
-        menu_item = db.query(models.VendorMenuItem).get(order.vendor_menu_item_id)
-        if not menu_item:
-            continue
-            
-        user = db.query(models.User).get(order.user_id)
-        if not user:
-            continue
-        
-        item_key = order.vendor_menu_item_id
-        
-        if item_key not in item_orders:
-            item_orders[item_key] = {
-                "vendor_id": menu_item.vendor_id,
-                "vendor_name": menu_item.vendor.name if menu_item.vendor else "未知廠商",
-                "vendor_color": menu_item.vendor.color if menu_item.vendor else "#6B7280",
-                "item_id": menu_item.id,
-                "item_name": menu_item.name,
-                "item_description": menu_item.description or "",
-                "orders": []
-            }
-        
-        item_orders[item_key]["orders"].append({
-            "employee_id": user.employee_id,
-            "name": user.name
-        })
-    
-    # 轉換為 list 並排序 (依照廠商名稱、品項名稱)
-    result = list(item_orders.values())
-    result.sort(key=lambda x: (x["vendor_name"], x["item_name"]))
-    
-    # 每個品項內的訂購人員依工號排序
-    for item in result:
-        item["orders"].sort(key=lambda x: x["employee_id"])
-    
-    return {
-        "date": target_date,
-        "items": result
-    }
\ No newline at end of file
+    target_date = date if date else localtime.today()
+    return responses.trusted(order_announcement(db, target_date))
+
+def order_announcement(db: Session, target_date: date) -> dict:
+    """訂餐公告內容；截止後取自凍結的每日快照"""
+    return daily_snapshot.announcement(daily_snapshot.get(db, target_date), cache.get_catalog(db))
+
+# ========== Billing Report (月結報表) ==========
+
+@router.get("/reports/billing", dependencies=[Depends(versions.conditional(versions.USERS, versions.ORG, versions.CATALOG, auth=check_admin, orders_month="month"))])
+def get_billing_report(month: Optional[str] = None, format: str = "json", db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
+    """
+    月結報表 - 每位使用者與每個部門的份數、金額及各廠商明細
+    format: json（預設）、csv（人員明細）、xlsx（人員與部門兩個工作表）
+    """
+    if format not in ("json", "csv", "xlsx"):
+        raise HTTPException(status_code=400, detail=f"不支援的匯出格式：{format}")
+    try:
+        first, last = billing.month_range(month)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="月份格式錯誤，請使用 YYYY-MM 格式")
+
+    report = billing.report(db, first, last)
+    filename = f"billing-{report['month']}.{format}"
+    if format == "csv":
+        return StreamingResponse(billing.csv_stream(report), media_type=exports.CSV_MEDIA_TYPE,
+                                 headers=exports.attachment(filename))
+    if format == "xlsx":
+        return StreamingResponse(billing.xlsx_stream(report), media_type=exports.XLSX_MEDIA_TYPE,
+                                 headers=exports.attachment(filename))
+    return responses.trusted(report)
+
+# ========== Order Board Stream (即時訂餐看板) ==========
+
+# 瀏覽器的 EventSource 無法設定 Authorization 標頭，允許以 ?token= 傳遞
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
+
+# 無訊息時送出註解行，避免代理伺服器關閉閒置連線
+STREAM_KEEPALIVE_SECONDS = 15
+
+@contextmanager
+def stream_session(request: Request):
+    """
+    串流端點使用的短暫 Session
+
+    Depends(get_db) 的 Session 要到回應結束才關閉，串流期間會一直占用連線池的連線與 WAL 讀取快照；
+    串流端點只在建立連線時查詢，查詢完即關閉。沿用 get_db 的覆寫，測試時指向測試資料庫
+    """
+    sessions = request.app.dependency_overrides.get(get_db, get_db)()
+    try:
+        yield next(sessions)
+    finally:
+        sessions.close()
+
+async def check_stream_admin(
+    request: Request,
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+    token: Optional[str] = None,
+):
+    with stream_session(request) as db:
+        user = await get_current_user(header_token or token or "", db)
+    return check_admin(user)
+
+@router.get("/orders/stream")
+async def stream_orders(
+    request: Request,
+    date: date = None,
+    current_user: models.User = Depends(check_stream_admin)
+):
+    """
+    指定日期訂單異動的 Server-Sent Events
+
+    - ready: 連線建立，用戶端此時載入完整資料
+    - order: 一位使用者的新狀態（order 為 null 表示取消）與品項 ±1 的 changes
+    - resync: 用戶端消費過慢而遺漏訊息，或截止時批次確認訂單，需要重新載入
+    """
+    target_date = date if date else localtime.today()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=order_board.QUEUE_SIZE)
+    loop = asyncio.get_running_loop()
+
+    def subscribe() -> int:
+        with stream_session(request) as db:
+            return order_board.subscribe(target_date, db, loop, queue)
+
+    seq = await run_in_threadpool(subscribe)
+
+    async def events():
+        try:
+            yield order_board.format_event("ready", {"date": target_date.isoformat(), "seq": seq})
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            order_board.unsubscribe(target_date, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ========== Instrumentation (查詢統計) ==========
+
+@router.get("/instrumentation", response_model=schemas.InstrumentationSettings)
+def get_instrumentation(current_user: models.User = Depends(check_sysadmin)):
+    """取得目前的查詢統計設定"""
+    return instrumentation.current()
+
+@router.put("/instrumentation", response_model=schemas.InstrumentationSettings)
+def update_instrumentation(
+    update: schemas.InstrumentationSettingsUpdate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(check_sysadmin)
+):
+    """於執行期間開關查詢統計或調整慢請求門檻；設定保存於資料庫，所有 worker 於一個輪詢週期內套用"""
+    values = {key: value for key, value in update.dict(exclude_unset=True).items() if value is not None}
+    return instrumentation.save(db, values)
+
+# ========== Scheduled Jobs (排程工作) ==========
+
+@router.get("/jobs", response_model=List[schemas.ScheduledJob])
+def get_jobs(db: Session = Depends(get_db), current_user: models.User = Depends(check_sysadmin)):
+    """所有排程工作的 cron、下次執行時間與最後一次執行結果"""
+    return scheduler.status(db)
+
+@router.post("/jobs/{name}/run", response_model=schemas.JobRun)
+def run_job(name: str, db: Session = Depends(get_db), current_user: models.User = Depends(check_sysadmin)):
+    """立即執行排程工作（不影響原本的排程），回傳執行紀錄"""
+    if name not in scheduler.JOBS:
+        raise HTTPException(status_code=404, detail="找不到排程工作")
+    try:
+        return scheduler.run_job(db.get_bind(), name, trigger="manual")
+    except scheduler.JobLocked:
+        raise HTTPException(status_code=409, detail="排程工作正在執行中")
+
+@router.get("/jobs/{name}/runs", response_model=List[schemas.JobRun])
+def get_job_runs(name: str, limit: int = 20, db: Session = Depends(get_db), current_user: models.User = Depends(check_sysadmin)):
+    """排程工作最近的執行紀錄（新到舊）"""
+    if name not in scheduler.JOBS:
+        raise HTTPException(status_code=404, detail="找不到排程工作")
+    return scheduler.runs(db, name, min(limit, scheduler.KEEP_RUNS))
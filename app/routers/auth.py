@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from .. import models, schemas, database
+from .. import models, schemas, database, cache, instrumentation, metrics, versions
 
 router = APIRouter(
     prefix="/auth",
@@ -21,10 +21,12 @@ pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    with metrics.argon2_duration.time(operation="verify"):
+        return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    with metrics.argon2_duration.time(operation="hash"):
+        return pwd_context.hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -54,7 +56,9 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
         hashed_password=hashed_password
     )
     db.add(new_user)
+    versions.bump(db, versions.USERS)
     db.commit()
+    cache.invalidate("directory", "principals")
     db.refresh(new_user)
     return new_user
 
@@ -90,9 +94,14 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.employee_id == token_data.username).first()
-    if user is None:
+    # 使用者欄位來自快取；以 merge(load=False) 放入本次請求的 Session，不需查詢即可照常讀寫
+    principal = cache.get_principal(db, token_data.username)
+    if principal is None:
         raise credentials_exception
+    user = models.User(**principal)
+    make_transient_to_detached(user)
+    user = db.merge(user, load=False)
+    instrumentation.set_user(user.employee_id)
     return user
 
 @router.get("/me", response_model=schemas.User)
@@ -107,10 +116,14 @@ def change_password(
     current_user: models.User = Depends(get_current_user)
 ):
     """Allow authenticated users to change their own password"""
-    if not verify_password(password_data.old_password, current_user.hashed_password):
+    # 快取的使用者不含密碼雜湊
+    hashed_password = db.query(models.User.hashed_password).filter(models.User.id == current_user.id).scalar()
+    if not verify_password(password_data.old_password, hashed_password):
         raise HTTPException(status_code=400, detail="舊密碼錯誤")
     
     current_user.hashed_password = get_password_hash(password_data.new_password)
+    versions.bump(db, versions.USERS)
     db.commit()
+    cache.invalidate("principals")
     
     return {"message": "Password updated successfully"}
@@ -0,0 +1,39 @@
+"""
+增量同步端點
+
+用戶端先以 GET /api/changes 取得目前游標（reset = true）並完整載入資料，
+之後定期以 since=<cursor> 取得差異套用至本地快取。
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from .. import changes, models, responses
+from ..database import get_db
+from .auth import get_current_user
+
+router = APIRouter(prefix="/changes", tags=["changes"])
+
+
+@router.get("")
+def get_changes(
+    since: Optional[int] = Query(None, ge=0, description="上次回應的 cursor"),
+    scope: Optional[str] = Query(None, description="以逗號分隔：orders,vendors,menu_items,special_days,users"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """取得游標之後的新增 / 修改（upserts）與刪除（deletes）"""
+    visible = changes.visible_scopes(current_user)
+    if scope:
+        requested = [name.strip() for name in scope.split(",") if name.strip()]
+        for name in requested:
+            if name not in changes.SCOPES:
+                raise HTTPException(status_code=400, detail=f"不支援的同步範圍：{name}")
+            if name not in visible:
+                raise HTTPException(status_code=403, detail="權限不足")
+        scopes = list(dict.fromkeys(requested))
+    else:
+        scopes = visible
+    return responses.trusted(changes.collect(db, current_user, scopes, since))
@@ -15,7 +15,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import asc
 from typing import List, Dict
 from datetime import datetime
-from .. import models, schemas
+from .. import models, schemas, cache, responses, versions
 from ..database import get_db
 from .auth import get_current_user
 
@@ -25,14 +25,8 @@ router = APIRouter(
 )
 
 
-def get_sorted_users(db: Session, department_id: int) -> List[schemas.ExtensionDirectoryUser]:
-    """取得部門內排序後的使用者列表"""
-    users = db.query(models.User).filter(
-        models.User.department_id == department_id,
-        models.User.is_active == True
-    ).all()
-    
-    # 排序：主管優先，然後按工號由小到大
+def sort_directory_users(users: List[models.User]) -> List[schemas.ExtensionDirectoryUser]:
+    """排序：主管優先，然後按工號由小到大"""
     sorted_users = sorted(
         users,
         key=lambda u: (
@@ -53,13 +47,18 @@ def get_sorted_users(db: Session, department_id: int) -> List[schemas.ExtensionD
     ]
 
 
-@router.get("/", response_model=schemas.ExtensionDirectory)
-def get_extension_directory(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
-):
+def get_sorted_users(db: Session, department_id: int) -> List[schemas.ExtensionDirectoryUser]:
+    """取得部門內排序後的使用者列表"""
+    users = db.query(models.User).filter(
+        models.User.department_id == department_id,
+        models.User.is_active == True
+    ).all()
+    return sort_directory_users(users)
+
+
+def load_directory(db: Session) -> schemas.ExtensionDirectory:
     """
-    取得完整的分機表資料
+    建立完整的分機表資料（由 cache 的 directory 領域保存，處別 / 部門 / 人員異動時失效）
     
     回傳結構：
     - columns: 4個欄位（0-3）
@@ -90,6 +89,14 @@ def get_extension_directory(
         models.Division.is_active == True
     ).all()
     division_map = {d.id: d for d in divisions}
+
+    # 一次取得所有啟用部門的啟用人員，再依部門分組
+    users_by_dept: Dict[int, List[models.User]] = {}
+    for user in db.query(models.User).filter(
+        models.User.department_id.in_([dept.id for dept in departments]),
+        models.User.is_active == True
+    ).all():
+        users_by_dept.setdefault(user.department_id, []).append(user)
     
     # 建立 4 個欄位的資料結構
     # 結構：column -> division_id -> list of departments
@@ -113,7 +120,7 @@ def get_extension_directory(
             division_id=div_id if div_id else None,
             division_name=division_map[div_id].name if div_id and div_id in division_map else None,
             display_order=dept.display_order or 0,
-            users=get_sorted_users(db, dept.id)
+            users=sort_directory_users(users_by_dept.get(dept.id, []))
         )
         columns_dict[col_index][div_id].append(dept_data)
     
@@ -165,7 +172,20 @@ def get_extension_directory(
     )
 
 
-@router.get("/divisions", response_model=List[schemas.Division])
+cache.register("directory", load_directory, depends_on=(versions.ORG, versions.USERS))
+
+
+@router.get("/", response_model=schemas.ExtensionDirectory, dependencies=[Depends(versions.conditional(versions.ORG, versions.USERS, auth=get_current_user))])
+def get_extension_directory(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """取得完整的分機表資料"""
+    # 結構已由 schema 物件保證，略過 response_model 的重複驗證
+    return responses.trusted(cache.get("directory", db))
+
+
+@router.get("/divisions", response_model=List[schemas.Division], dependencies=[Depends(versions.conditional(versions.ORG, auth=get_current_user))])
 def get_divisions_for_directory(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
@@ -179,7 +199,7 @@ def get_divisions_for_directory(
     ).all()
 
 
-@router.get("/departments", response_model=List[schemas.Department])
+@router.get("/departments", response_model=List[schemas.Department], dependencies=[Depends(versions.conditional(versions.ORG, auth=get_current_user))])
 def get_departments_for_directory(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
@@ -220,7 +240,9 @@ def update_division_position(
     
     division.display_column = display_column
     division.display_order = display_order
+    versions.bump(db, versions.ORG)
     db.commit()
+    cache.invalidate("directory")
     db.refresh(division)
     
     return {"message": "處別位置已更新", "division": division.name}
@@ -252,7 +274,9 @@ def update_department_position(
     if division_id is not None:
         dept.division_id = division_id
     
+    versions.bump(db, versions.ORG)
     db.commit()
+    cache.invalidate("directory")
     db.refresh(dept)
     
     return {"message": "部門位置已更新", "department": dept.name}
@@ -276,11 +300,14 @@ def batch_update_division_positions(
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="只有管理員可以修改處別位置")
     
+    divisions = db.query(models.Division).filter(
+        models.Division.id.in_([pos.get("id") for pos in positions])
+    ).all()
+    division_map = {d.id: d for d in divisions}
+
     updated = 0
     for pos in positions:
-        division = db.query(models.Division).filter(
-            models.Division.id == pos.get("id")
-        ).first()
+        division = division_map.get(pos.get("id"))
         
         if division:
             if "display_column" in pos:
@@ -289,7 +316,9 @@ def batch_update_division_positions(
                 division.display_order = pos["display_order"]
             updated += 1
     
+    versions.bump(db, versions.ORG)
     db.commit()
+    cache.invalidate("directory")
     return {"message": f"已更新 {updated} 個處別的位置"}
 
 
@@ -311,11 +340,14 @@ def batch_update_department_positions(
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="只有管理員可以修改部門位置")
     
+    departments = db.query(models.Department).filter(
+        models.Department.id.in_([pos.get("id") for pos in positions])
+    ).all()
+    dept_map = {d.id: d for d in departments}
+
     updated = 0
     for pos in positions:
-        dept = db.query(models.Department).filter(
-            models.Department.id == pos.get("id")
-        ).first()
+        dept = dept_map.get(pos.get("id"))
         
         if dept:
             if "division_id" in pos:
@@ -324,11 +356,13 @@ def batch_update_department_positions(
                 dept.display_order = pos["display_order"]
             updated += 1
     
+    versions.bump(db, versions.ORG)
     db.commit()
+    cache.invalidate("directory")
     return {"message": f"已更新 {updated} 個部門的位置"}
 
 
-@router.get("/users/{dept_id}", response_model=List[schemas.ExtensionDirectoryUser])
+@router.get("/users/{dept_id}", response_model=List[schemas.ExtensionDirectoryUser], dependencies=[Depends(versions.conditional(versions.USERS, auth=get_current_user))])
 def get_department_users(
     dept_id: int,
     db: Session = Depends(get_db),
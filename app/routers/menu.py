@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
-from .. import models, schemas, database
+from .. import models, schemas, database, versions
 from .auth import get_current_user
 
 router = APIRouter(
@@ -17,7 +17,7 @@ def check_admin(user: models.User = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="權限不足")
     return user
 
-@router.get("/", response_model=List[schemas.MenuItem])
+@router.get("/", response_model=List[schemas.MenuItem], dependencies=[Depends(versions.conditional(versions.CATALOG))])
 def read_menu_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     items = db.query(models.MenuItem).filter(models.MenuItem.is_active == True).offset(skip).limit(limit).all()
     return items
@@ -26,6 +26,7 @@ def read_menu_items(skip: int = 0, limit: int = 100, db: Session = Depends(get_d
 def create_menu_item(item: schemas.MenuItemCreate, db: Session = Depends(get_db), current_user: models.User = Depends(check_admin)):
     db_item = models.MenuItem(**item.dict())
     db.add(db_item)
+    versions.bump(db, versions.CATALOG)
     db.commit()
     db.refresh(db_item)
     return db_item
@@ -39,6 +40,7 @@ def update_menu_item(item_id: int, item: schemas.MenuItemCreate, db: Session = D
     for key, value in item.dict().items():
         setattr(db_item, key, value)
     
+    versions.bump(db, versions.CATALOG)
     db.commit()
     db.refresh(db_item)
     return db_item
@@ -50,5 +52,6 @@ def delete_menu_item(item_id: int, db: Session = Depends(get_db), current_user:
         raise HTTPException(status_code=404, detail="找不到品項")
     
     db_item.is_active = False # Soft delete
+    versions.bump(db, versions.CATALOG)
     db.commit()
     return {"message": "Item deleted"}
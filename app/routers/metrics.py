@@ -0,0 +1,50 @@
+"""
+Prometheus 指標端點
+
+預設須由系統管理員以 Bearer token 存取。
+
+設定環境變數 WEBDINER_METRICS_ALLOW_LOCAL=1 時，本機（127.0.0.1 / ::1）連線可不帶 token 抓取。
+判斷依據為 TCP 連線的來源位址：同一台主機上的反向代理轉送的請求也會被視為本機，
+因此經由反向代理對外服務時不可開啟。
+"""
+
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.orm import Session
+
+from .. import metrics
+from ..database import get_db
+from .auth import get_current_user
+
+router = APIRouter(tags=["metrics"])
+
+LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+
+def allow_local() -> bool:
+    return os.environ.get("WEBDINER_METRICS_ALLOW_LOCAL", "0") == "1"
+
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
+
+
+async def check_metrics_access(
+    request: Request,
+    token: str = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    if allow_local() and request.client and request.client.host in LOCAL_HOSTS:
+        return
+    if not token:
+        raise HTTPException(status_code=401, detail="無法驗證身份憑證", headers={"WWW-Authenticate": "Bearer"})
+    user = await get_current_user(token, db)
+    if user.role != "sysadmin":
+        raise HTTPException(status_code=403, detail="只有系統管理員可以執行此操作")
+
+
+@router.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(check_metrics_access)])
+def get_metrics():
+    """Prometheus text exposition format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,15 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import update, delete, insert, func, or_, cast, Integer
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime, time, date
-from zoneinfo import ZoneInfo
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import List, Optional
+from datetime import datetime, date, timedelta
+from contextlib import contextmanager
 import json
-from .. import models, schemas, database
+from .. import models, schemas, database, archive, cache, capacity, metrics, versions, order_board
+from ..localtime import TAIWAN_TZ
+from ..ordering import CUTOFF_TIME, earliest_editable_date
 from .auth import get_current_user
 
-# 台灣時區
-TAIWAN_TZ = ZoneInfo("Asia/Taipei")
-
 router = APIRouter(
     prefix="/orders",
     tags=["orders"]
@@ -18,18 +20,22 @@ router = APIRouter(
 # Use get_db from database module
 from ..database import get_db
 
-CUTOFF_TIME = time(9, 0) # 9:00 AM
+WEEKDAY_NAMES = ['星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']
 
-def is_holiday_or_weekend(order_date: date, db: Session):
-    # Check SpecialDay first
-    special_day = db.query(models.SpecialDay).filter(models.SpecialDay.date == order_date).first()
-    if special_day:
-        return special_day.is_holiday
+# INSERT ... RETURNING 回傳的欄位（對應 schemas.Order）
+ORDER_RETURNING = (
+    models.Order.id,
+    models.Order.user_id,
+    models.Order.vendor_id,
+    models.Order.vendor_menu_item_id,
+    models.Order.order_date,
+    models.Order.created_at,
+    models.Order.status,
+)
 
-    # Weekend check (5=Saturday, 6=Sunday)
-    if order_date.weekday() >= 5:
-        return True
-    return False
+def is_holiday_or_weekend(order_date: date, db: Session):
+    # SpecialDay 優先，其次為週末；資料來自快取
+    return cache.get_calendar(db).is_holiday(order_date)
 
 def check_cutoff(order_date: date):
     # 使用台灣時間進行判斷
@@ -43,185 +49,513 @@ def check_cutoff(order_date: date):
         if now_taiwan.time() > CUTOFF_TIME:
             raise HTTPException(status_code=400, detail="今日訂餐截止時間（早上 9:00）已過")
 
-@router.get("/special_days", response_model=List[schemas.SpecialDay])
+def order_with_details(order, catalog: cache.Catalog) -> dict:
+    """以快取的廠商與品項資料組成 OrderWithDetails"""
+    vendor = catalog.vendors.get(order["vendor_id"]) if order["vendor_id"] else None
+    menu_item = catalog.menu_items.get(order["vendor_menu_item_id"]) if order["vendor_menu_item_id"] else None
+    is_no_order = order["status"] == "NoOrder"
+    return {
+        **{column.name: order[column.name] for column in ORDER_RETURNING},
+        "vendor_name": vendor.name if vendor else ("不訂餐" if is_no_order else None),
+        "vendor_color": vendor.color if vendor else None,
+        "menu_item_name": menu_item.name if menu_item else ("不訂餐" if is_no_order else None),
+        "menu_item_description": menu_item.description if menu_item else None,
+        "menu_item_price": menu_item.price if menu_item else None
+    }
+
+@router.get("/special_days", response_model=List[schemas.SpecialDay],
+            dependencies=[Depends(versions.conditional(versions.CALENDAR, auth=get_current_user))])
 def get_public_special_days(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    return db.query(models.SpecialDay).all()
+    return [day._asdict() for day in cache.get_calendar(db).days]
 
-@router.post("/", response_model=schemas.Order)
-def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    """Create a new order"""
+def validate_order(order: schemas.OrderCreate, catalog: cache.Catalog, calendar: cache.Calendar):
+    """
+    驗證訂單內容（假日、截止時間、廠商與品項），不合法時拋出 HTTPException
+    所有檢查皆使用快取的參考資料，不查詢資料庫
+    """
     # 1. Check Holiday/Weekend
-    if is_holiday_or_weekend(order.order_date, db):
+    if calendar.is_holiday(order.order_date):
         raise HTTPException(status_code=400, detail="週末或假日無法訂餐")
 
     # 2. Check Cut-off time
     check_cutoff(order.order_date)
-    
+
+    if order.is_no_order:
+        return None
+
     # 3. Verify vendor exists
-    if not order.is_no_order:
-        if not order.vendor_id:
-             raise HTTPException(status_code=400, detail="一般訂單需要指定廠商")
-             
-        vendor = db.query(models.Vendor).filter(models.Vendor.id == order.vendor_id).first()
-        if not vendor or not vendor.is_active:
-            raise HTTPException(status_code=404, detail="找不到廠商或廠商已停用")
-        
-        # 4. Verify menu item exists and belongs to vendor
-        if not order.vendor_menu_item_id:
-             raise HTTPException(status_code=400, detail="一般訂單需要指定餐點品項")
-
-        menu_item = db.query(models.VendorMenuItem).filter(
-            models.VendorMenuItem.id == order.vendor_menu_item_id,
-            models.VendorMenuItem.vendor_id == order.vendor_id
-        ).first()
-        if not menu_item or not menu_item.is_active:
-            raise HTTPException(status_code=404, detail="找不到餐點品項或品項已停用")
-        
-        # 5. Check if menu item is available on this day
-        weekday = order.order_date.weekday()
-        if menu_item.weekday is not None and menu_item.weekday != weekday:
-            raise HTTPException(status_code=400, detail=f"此餐點品項在{['星期一', '星期二', '星期三', '星期四', '星期五'][weekday]}不供應")
-    
-    # 6. Check if order already exists for this date
-    existing_order = db.query(models.Order).filter(
-        models.Order.user_id == current_user.id,
-        models.Order.order_date == order.order_date
-    ).first()
-    if existing_order:
-        raise HTTPException(status_code=400, detail="您在此日期已有訂單")
-    
-    # 7. Create Order
-    db_order = models.Order(
-        user_id=current_user.id,
-        vendor_id=None if order.is_no_order else order.vendor_id,
-        vendor_menu_item_id=None if order.is_no_order else order.vendor_menu_item_id,
-        order_date=order.order_date,
-        status="NoOrder" if order.is_no_order else "Pending"
+    if not order.vendor_id:
+        raise HTTPException(status_code=400, detail="一般訂單需要指定廠商")
+
+    vendor = catalog.vendors.get(order.vendor_id)
+    if not vendor or not vendor.is_active:
+        raise HTTPException(status_code=404, detail="找不到廠商或廠商已停用")
+
+    # 4. Verify menu item exists and belongs to vendor
+    if not order.vendor_menu_item_id:
+        raise HTTPException(status_code=400, detail="一般訂單需要指定餐點品項")
+
+    menu_item = catalog.menu_items.get(order.vendor_menu_item_id)
+    if not menu_item or menu_item.vendor_id != order.vendor_id or not menu_item.is_active:
+        raise HTTPException(status_code=404, detail="找不到餐點品項或品項已停用")
+
+    # 5. Check if menu item is available on this day
+    weekday = order.order_date.weekday()
+    if menu_item.weekday is not None and menu_item.weekday != weekday:
+        raise HTTPException(status_code=400, detail=f"此餐點品項在{WEEKDAY_NAMES[weekday]}不供應")
+
+    return menu_item
+
+@contextmanager
+def capacity_guard(db: Session):
+    """寫入訂單超過每日供應上限時（orders 的 trigger 中止語句）還原交易並回應 409"""
+    try:
+        yield
+    except IntegrityError as e:
+        reason = capacity.exceeded(e)
+        if reason is None:
+            raise
+        db.rollback()
+        raise HTTPException(status_code=409, detail=reason)
+
+def order_values(user_id: int, order: schemas.OrderCreate, catalog: cache.Catalog) -> dict:
+    """將 OrderCreate 轉為 orders 資料表的欄位值（含寫入當下的單價與名稱）"""
+    item_id = None if order.is_no_order else order.vendor_menu_item_id
+    return {
+        "user_id": user_id,
+        "vendor_id": None if order.is_no_order else order.vendor_id,
+        "vendor_menu_item_id": item_id,
+        "order_date": order.order_date,
+        "created_at": datetime.utcnow(),
+        "status": "NoOrder" if order.is_no_order else "Pending",
+        **catalog.snapshot(item_id),
+    }
+
+def parse_month(month: str):
+    """解析 YYYY-MM，回傳該月第一天與最後一天"""
+    try:
+        first_day = datetime.strptime(month, "%Y-%m").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="月份格式錯誤，請使用 YYYY-MM 格式")
+    next_month = (first_day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return first_day, next_month - timedelta(days=1)
+
+@router.get("/calendar", response_model=schemas.CalendarMonth, dependencies=[Depends(versions.conditional(
+    versions.CATALOG, versions.CALENDAR, auth=get_current_user, own_orders=True, orders_month="month"
+))])
+def get_calendar_month(month: Optional[str] = None, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """
+    月曆訂餐頁面的初始資料
+
+    一次回傳該月的個人訂單、特殊日期與每日可訂品項；廠商與品項只列出一次，
+    availability 以品項 ID 表示每個工作日可訂的餐點，remaining 為設有每日上限的品項剩餘份數
+    （整個月的計數器一次查詢）
+    """
+    if month is None:
+        month = datetime.now(TAIWAN_TZ).strftime("%Y-%m")
+    first_day, last_day = parse_month(month)
+
+    catalog = cache.get_catalog(db)
+    calendar = cache.get_calendar(db)
+
+    # 較早的月份可能已封存，需一併查詢封存表
+    Order = archive.orders_between(db, first_day, last_day)
+    orders = db.query(*[getattr(Order, column.name) for column in ORDER_RETURNING]).filter(
+        Order.user_id == current_user.id,
+        Order.order_date >= first_day,
+        Order.order_date <= last_day
+    ).order_by(Order.order_date).all()
+
+    special_days = [day._asdict() for day in calendar.between(first_day, last_day)]
+
+    # 依星期分組的可訂品項（依廠商、品項 ID 排序）
+    active_items = sorted(
+        (
+            item for item in catalog.menu_items.values()
+            if item.is_active and item.vendor_id in catalog.vendors and catalog.vendors[item.vendor_id].is_active
+        ),
+        key=lambda item: (item.vendor_id, item.id),
     )
-    db.add(db_order)
+    items_by_weekday = {
+        weekday: [item.id for item in active_items if item.weekday is None or item.weekday == weekday]
+        for weekday in range(7)
+    }
+
+    availability = {}
+    used_item_ids = set()
+    day = first_day
+    while day <= last_day:
+        if not calendar.is_holiday(day):
+            availability[day] = items_by_weekday[day.weekday()]
+            used_item_ids.update(availability[day])
+        day += timedelta(days=1)
+
+    menu_items = [item for item in active_items if item.id in used_item_ids]
+    vendor_ids = sorted({item.vendor_id for item in menu_items})
+
+    left = capacity.load(db, catalog, availability)
+    remaining = {}
+    if left.limits:
+        for day, item_ids in availability.items():
+            limited = {item_id: left.item_left(catalog.menu_items[item_id], day) for item_id in item_ids}
+            remaining[day] = {item_id: count for item_id, count in limited.items() if count is not None}
+
+    return {
+        "month": month,
+        "orders": [order_with_details(order._mapping, catalog) for order in orders],
+        "special_days": special_days,
+        "vendors": [catalog.vendors[vendor_id]._asdict() for vendor_id in vendor_ids],
+        "menu_items": [item._asdict() for item in menu_items],
+        "availability": availability,
+        "remaining": remaining,
+    }
+
+@router.post("/", response_model=schemas.Order)
+def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """
+    Create a new order
+
+    驗證使用快取資料，寫入為單一 INSERT ... ON CONFLICT DO NOTHING RETURNING，
+    同一人同一天的重複送出由唯一索引保證只會成功一筆
+    """
+    catalog = cache.get_catalog(db)
+    validate_order(order, catalog, cache.get_calendar(db))
+
+    stmt = (
+        sqlite_insert(models.Order)
+        .values(**order_values(current_user.id, order, catalog))
+        .on_conflict_do_nothing(index_elements=["user_id", "order_date"])
+        .returning(*ORDER_RETURNING)
+    )
+    with capacity_guard(db):
+        created = db.execute(stmt).mappings().first()
+    if created is not None:
+        versions.bump_orders(db, [current_user.id], [order.order_date])
     db.commit()
-    db.refresh(db_order)
-    return db_order
 
-@router.post("/batch", response_model=List[schemas.Order])
+    # 6. Order already exists for this date
+    if created is None:
+        raise HTTPException(status_code=400, detail="您在此日期已有訂單")
+    metrics.order_writes.inc(status=created["status"])
+    order_board.publish_orders(db, current_user, [created])
+    return created
+
+# SQLite 單一語句的參數上限為 32766，每筆訂單 9 個欄位
+BATCH_INSERT_CHUNK = 1000
+
+def insert_orders(db: Session, rows: List[dict]) -> List[dict]:
+    """
+    以多列 INSERT ... ON CONFLICT DO NOTHING RETURNING 寫入訂單
+    回傳實際寫入的資料列；與既有訂單衝突的列不會出現在結果中
+    """
+    created = []
+    for start in range(0, len(rows), BATCH_INSERT_CHUNK):
+        stmt = (
+            sqlite_insert(models.Order)
+            .values(rows[start:start + BATCH_INSERT_CHUNK])
+            .on_conflict_do_nothing(index_elements=["user_id", "order_date"])
+            .returning(*ORDER_RETURNING)
+        )
+        created.extend(dict(row) for row in db.execute(stmt).mappings())
+    return created
+
+@router.post("/batch", response_model=schemas.OrderBatchResult)
 def create_batch_orders(batch: schemas.OrderBatchCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    """Create multiple orders at once (Optimized)"""
-    if not batch.orders:
-        return []
-
-    # 1. Collect IDs and Dates
-    dates = {o.order_date for o in batch.orders}
-    vendor_ids = {o.vendor_id for o in batch.orders if o.vendor_id}
-    menu_item_ids = {o.vendor_menu_item_id for o in batch.orders if o.vendor_menu_item_id}
-    
-    # 2. Prefetch Data
-    # Existing orders
-    existing_orders = db.query(models.Order).filter(
-        models.Order.user_id == current_user.id,
-        models.Order.order_date.in_(dates)
-    ).all()
-    existing_dates = {o.order_date for o in existing_orders}
-    
-    # Vendors
-    vendors = db.query(models.Vendor).filter(models.Vendor.id.in_(vendor_ids)).all()
-    vendor_map = {v.id: v for v in vendors}
-    
-    # Menu Items
-    menu_items = db.query(models.VendorMenuItem).filter(models.VendorMenuItem.id.in_(menu_item_ids)).all()
-    menu_item_map = {m.id: m for m in menu_items}
-    
-    created_orders = []
-    
-    for order_data in batch.orders:
-        # Skip if order exists
-        if order_data.order_date in existing_dates:
-            continue
-            
-        # Basic validation
-        if is_holiday_or_weekend(order_data.order_date, db):
+    """
+    Create multiple orders at once
+
+    所有列先以快取的行事曆與菜單資料在記憶體中驗證，通過的列以單一多列 INSERT 寫入；
+    每一筆被略過的訂單都會在 rejected 中附上原因
+    """
+    catalog = cache.get_catalog(db)
+    calendar = cache.get_calendar(db)
+    left = capacity.load(db, catalog, [order_data.order_date for order_data in batch.orders])
+
+    rejected = []
+    rows = []
+    row_indexes = []
+    seen_dates = set()
+
+    for index, order_data in enumerate(batch.orders):
+        if order_data.order_date in seen_dates:
+            rejected.append({"index": index, "order_date": order_data.order_date, "reason": "同一批次中日期重複"})
             continue
-            
         try:
-            check_cutoff(order_data.order_date)
-        except HTTPException:
+            menu_item = validate_order(order_data, catalog, calendar)
+        except HTTPException as e:
+            rejected.append({"index": index, "order_date": order_data.order_date, "reason": e.detail})
             continue
-            
-        # Verify vendor/item if not "No Order"
-        if not order_data.is_no_order:
-            if not order_data.vendor_id or not order_data.vendor_menu_item_id:
-                continue
-                
-            vendor = vendor_map.get(order_data.vendor_id)
-            if not vendor or not vendor.is_active:
-                continue
-                
-            menu_item = menu_item_map.get(order_data.vendor_menu_item_id)
-            if not menu_item or not menu_item.is_active:
-                continue
-                
-            if menu_item.vendor_id != order_data.vendor_id:
-                continue
-                
-            # Check weekday availability
-            weekday = order_data.order_date.weekday()
-            if menu_item.weekday is not None and menu_item.weekday != weekday:
-                continue
-        
-        # Create order object
-        db_order = models.Order(
-            user_id=current_user.id,
-            vendor_id=None if order_data.is_no_order else order_data.vendor_id,
-            vendor_menu_item_id=None if order_data.is_no_order else order_data.vendor_menu_item_id,
-            order_date=order_data.order_date,
-            status="NoOrder" if order_data.is_no_order else "Pending"
-        )
-        db.add(db_order)
-        created_orders.append(db_order)
-    
-    if created_orders:
+        reason = left.take(menu_item, order_data.order_date) if menu_item else None
+        if reason:
+            rejected.append({"index": index, "order_date": order_data.order_date, "reason": reason})
+            continue
+        seen_dates.add(order_data.order_date)
+        rows.append(order_values(current_user.id, order_data, catalog))
+        row_indexes.append(index)
+
+    created = []
+    if rows:
         try:
+            with capacity_guard(db):
+                created = insert_orders(db, rows)
+            if created:
+                versions.bump_orders(db, [current_user.id], [order["order_date"] for order in created])
             db.commit()
-            for order in created_orders:
-                db.refresh(order)
+        except HTTPException:
+            raise
         except Exception as e:
             db.rollback()
             raise HTTPException(status_code=500, detail=f"資料庫錯誤：{str(e)}")
-    
-    return created_orders
 
-@router.get("/", response_model=List[schemas.OrderWithDetails])
+    for order in created:
+        metrics.order_writes.inc(status=order["status"])
+    order_board.publish_orders(db, current_user, created)
+
+    # 未被寫入的列即為與既有訂單衝突
+    created_dates = {order["order_date"] for order in created}
+    for index, row in zip(row_indexes, rows):
+        if row["order_date"] not in created_dates:
+            rejected.append({"index": index, "order_date": row["order_date"], "reason": "您在此日期已有訂單"})
+    rejected.sort(key=lambda r: r["index"])
+
+    return {"created": created, "rejected": rejected}
+
+# 單次同步的最大天數
+MAX_SYNC_DAYS = 62
+
+def _same_selection(existing: models.Order, desired: schemas.OrderCreate) -> bool:
+    if desired.is_no_order:
+        return existing.status == "NoOrder"
+    return (
+        existing.status != "NoOrder"
+        and existing.vendor_id == desired.vendor_id
+        and existing.vendor_menu_item_id == desired.vendor_menu_item_id
+    )
+
+@router.put("/range", response_model=schemas.OrderRangeSyncResult)
+def sync_order_range(sync: schemas.OrderRangeSync, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """
+    將一段日期內的訂單同步為指定狀態
+
+    - selections 列出每個日期想要的選擇；區間內未列出的日期代表不要有訂單
+    - 伺服器計算與現有訂單的最小差異（新增 / 修改 / 刪除），並套用截止時間與假日規則
+    - 所有變更在同一個交易中完成，任何錯誤都不會留下部分狀態
+    """
+    if sync.end_date < sync.start_date:
+        raise HTTPException(status_code=400, detail="結束日期不可早於開始日期")
+    if (sync.end_date - sync.start_date).days >= MAX_SYNC_DAYS:
+        raise HTTPException(status_code=400, detail=f"同步區間不可超過 {MAX_SYNC_DAYS} 天")
+
+    catalog = cache.get_catalog(db)
+    calendar = cache.get_calendar(db)
+    left = capacity.load(db, catalog, [selection.order_date for selection in sync.selections])
+
+    rejected = []
+    desired = {}
+    for index, selection in enumerate(sync.selections):
+        if not sync.start_date <= selection.order_date <= sync.end_date:
+            rejected.append({"index": index, "order_date": selection.order_date, "reason": "日期不在同步範圍內"})
+        elif selection.order_date in desired:
+            rejected.append({"index": index, "order_date": selection.order_date, "reason": "同一批次中日期重複"})
+        else:
+            desired[selection.order_date] = (index, selection)
+
+    existing = {
+        order.order_date: order
+        for order in db.query(models.Order).filter(
+            models.Order.user_id == current_user.id,
+            models.Order.order_date >= sync.start_date,
+            models.Order.order_date <= sync.end_date
+        ).all()
+    }
+
+    to_create = []
+    to_update = []
+    to_delete = []
+    deleted_dates = []
+    updated = []
+    unchanged = 0
+
+    for order_date in sorted(set(desired) | set(existing)):
+        current = existing.get(order_date)
+        index, selection = desired.get(order_date, (None, None))
+
+        if selection is None:
+            # 區間內未選擇：刪除現有訂單
+            try:
+                check_cutoff(order_date)
+            except HTTPException as e:
+                rejected.append({"index": index, "order_date": order_date, "reason": e.detail})
+                continue
+            to_delete.append(current.id)
+            deleted_dates.append(order_date)
+            continue
+
+        if current is not None and _same_selection(current, selection):
+            unchanged += 1
+            continue
+
+        try:
+            menu_item = validate_order(selection, catalog, calendar)
+        except HTTPException as e:
+            rejected.append({"index": index, "order_date": order_date, "reason": e.detail})
+            continue
+        replacing = catalog.menu_items.get(current.vendor_menu_item_id) if current is not None else None
+        reason = left.take(menu_item, order_date, replacing) if menu_item else None
+        if reason:
+            rejected.append({"index": index, "order_date": order_date, "reason": reason})
+            continue
+
+        values = order_values(current_user.id, selection, catalog)
+        if current is None:
+            to_create.append(values)
+        else:
+            to_update.append({
+                "id": current.id,
+                "vendor_id": values["vendor_id"],
+                "vendor_menu_item_id": values["vendor_menu_item_id"],
+                "status": values["status"],
+                "items": None,
+                "unit_price": values["unit_price"],
+                "vendor_name": values["vendor_name"],
+                "item_name": values["item_name"],
+            })
+            updated.append({
+                "id": current.id,
+                "user_id": current.user_id,
+                "vendor_id": values["vendor_id"],
+                "vendor_menu_item_id": values["vendor_menu_item_id"],
+                "order_date": order_date,
+                "created_at": current.created_at,
+                "status": values["status"],
+            })
+
+    created = []
+    try:
+        with capacity_guard(db):
+            if to_delete:
+                db.execute(delete(models.Order).where(models.Order.id.in_(to_delete)))
+            if to_update:
+                db.execute(update(models.Order), to_update)
+            if to_create:
+                created = insert_orders(db, to_create)
+        changed_dates = deleted_dates + [order["order_date"] for order in created + updated]
+        if changed_dates:
+            versions.bump_orders(db, [current_user.id], changed_dates)
+        db.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"資料庫錯誤：{str(e)}")
+
+    for order in created + updated:
+        metrics.order_writes.inc(status=order["status"])
+    if to_delete:
+        metrics.order_writes.inc(len(to_delete), status="Cancelled")
+    order_board.publish_orders(db, current_user, created + updated)
+    for order_date in deleted_dates:
+        order_board.publish(db, current_user, order_date)
+
+    # 同步期間其他請求搶先寫入的日期
+    created_dates = {order["order_date"] for order in created}
+    for values in to_create:
+        if values["order_date"] not in created_dates:
+            index, _ = desired[values["order_date"]]
+            rejected.append({"index": index, "order_date": values["order_date"], "reason": "您在此日期已有訂單"})
+    rejected.sort(key=lambda r: r["order_date"])
+    return {
+        "created": created,
+        "updated": updated,
+        "deleted": to_delete,
+        "unchanged": unchanged,
+        "rejected": rejected,
+    }
+
+def weekly_plan_entries(plans, catalog: cache.Catalog) -> List[dict]:
+    """以快取的廠商與品項資料組成 WeeklyPlanEntry"""
+    entries = []
+    for plan in plans:
+        vendor = catalog.vendors.get(plan["vendor_id"]) if plan["vendor_id"] else None
+        menu_item = catalog.menu_items.get(plan["vendor_menu_item_id"]) if plan["vendor_menu_item_id"] else None
+        is_no_order = plan["vendor_menu_item_id"] is None
+        entries.append({
+            "weekday": plan["weekday"],
+            "vendor_id": plan["vendor_id"],
+            "vendor_menu_item_id": plan["vendor_menu_item_id"],
+            "is_no_order": is_no_order,
+            "vendor_name": vendor.name if vendor else ("不訂餐" if is_no_order else None),
+            "menu_item_name": menu_item.name if menu_item else ("不訂餐" if is_no_order else None),
+            "menu_item_price": menu_item.price if menu_item else None,
+            "available": is_no_order or bool(
+                vendor and vendor.is_active and menu_item and menu_item.is_active
+                and menu_item.vendor_id == plan["vendor_id"]
+                and menu_item.weekday in (None, plan["weekday"])
+            ),
+        })
+    return entries
+
+@router.get("/weekly_plan", response_model=List[schemas.WeeklyPlanEntry],
+            dependencies=[Depends(versions.conditional(versions.CATALOG, auth=get_current_user, own_orders=True))])
+def read_weekly_plan(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """目前使用者的每週固定訂餐計畫（由排程工作 weekly_orders 展開為下週訂單）"""
+    plans = db.query(
+        models.WeeklyPlan.weekday, models.WeeklyPlan.vendor_id, models.WeeklyPlan.vendor_menu_item_id
+    ).filter(models.WeeklyPlan.user_id == current_user.id).order_by(models.WeeklyPlan.weekday).all()
+    return weekly_plan_entries([plan._mapping for plan in plans], cache.get_catalog(db))
+
+@router.put("/weekly_plan", response_model=List[schemas.WeeklyPlanEntry])
+def replace_weekly_plan(plan: schemas.WeeklyPlanUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """
+    整份取代目前使用者的每週固定計畫
+
+    以快取的菜單驗證每一天的品項（含供應星期）；計畫只影響之後展開的訂單，不改動既有訂單
+    """
+    catalog = cache.get_catalog(db)
+    rows = []
+    seen = set()
+    for day in sorted(plan.days, key=lambda d: d.weekday):
+        if not 0 <= day.weekday <= 4:
+            raise HTTPException(status_code=400, detail="每週計畫僅限星期一至星期五")
+        if day.weekday in seen:
+            raise HTTPException(status_code=400, detail=f"{WEEKDAY_NAMES[day.weekday]}重複")
+        seen.add(day.weekday)
+        if not day.is_no_order:
+            vendor = catalog.vendors.get(day.vendor_id) if day.vendor_id else None
+            if not vendor or not vendor.is_active:
+                raise HTTPException(status_code=404, detail="找不到廠商或廠商已停用")
+            menu_item = catalog.menu_items.get(day.vendor_menu_item_id) if day.vendor_menu_item_id else None
+            if not menu_item or menu_item.vendor_id != day.vendor_id or not menu_item.is_active:
+                raise HTTPException(status_code=404, detail="找不到餐點品項或品項已停用")
+            if menu_item.weekday is not None and menu_item.weekday != day.weekday:
+                raise HTTPException(status_code=400, detail=f"此餐點品項在{WEEKDAY_NAMES[day.weekday]}不供應")
+        rows.append({
+            "user_id": current_user.id,
+            "weekday": day.weekday,
+            "vendor_id": None if day.is_no_order else day.vendor_id,
+            "vendor_menu_item_id": None if day.is_no_order else day.vendor_menu_item_id,
+            "updated_at": datetime.utcnow(),
+        })
+
+    db.execute(delete(models.WeeklyPlan).where(models.WeeklyPlan.user_id == current_user.id))
+    if rows:
+        db.execute(insert(models.WeeklyPlan).values(rows))
+    # 計畫與個人訂單共用使用者的版本號（GET /orders/weekly_plan 的 ETag）
+    versions.bump(db, versions.orders_of(current_user.id))
+    db.commit()
+    return weekly_plan_entries(rows, catalog)
+
+@router.get("/", response_model=List[schemas.OrderWithDetails],
+            dependencies=[Depends(versions.conditional(versions.CATALOG, auth=get_current_user, own_orders=True))])
 def read_orders(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     """Get all orders for current user"""
-    orders = db.query(models.Order).filter(models.Order.user_id == current_user.id).all()
-    
-    result = []
-    for order in orders:
-        vendor = None
-        menu_item = None
-        
-        if order.vendor_id:
-            vendor = db.query(models.Vendor).filter(models.Vendor.id == order.vendor_id).first()
-        
-        if order.vendor_menu_item_id:
-            menu_item = db.query(models.VendorMenuItem).filter(models.VendorMenuItem.id == order.vendor_menu_item_id).first()
-        
-        order_dict = {
-            "id": order.id,
-            "user_id": order.user_id,
-            "vendor_id": order.vendor_id,
-            "vendor_menu_item_id": order.vendor_menu_item_id,
-            "order_date": order.order_date,
-            "created_at": order.created_at,
-            "status": order.status,
-            "vendor_name": vendor.name if vendor else ("不訂餐" if order.status == "NoOrder" else None),
-            "vendor_color": vendor.color if vendor else None,
-            "menu_item_name": menu_item.name if menu_item else ("不訂餐" if order.status == "NoOrder" else None),
-            "menu_item_description": menu_item.description if menu_item else None,
-            "menu_item_price": menu_item.price if menu_item else None
-        }
-        result.append(order_dict)
-    
-    return result
+    catalog = cache.get_catalog(db)
+    # 已有封存資料時一併讀取封存表（與月結報表相同的 UNION），個人訂單不因封存而消失
+    Order = archive.all_orders(db)
+    orders = db.query(*(getattr(Order, column.key) for column in ORDER_RETURNING)).filter(
+        Order.user_id == current_user.id
+    ).all()
+    return [order_with_details(order._mapping, catalog) for order in orders]
 
 @router.delete("/{order_id}")
 def cancel_order(order_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
@@ -233,6 +567,83 @@ def cancel_order(order_id: int, db: Session = Depends(get_db), current_user: mod
     # Check cancellation cut-off
     check_cutoff(db_order.order_date)
     
+    order_date = db_order.order_date
     db.delete(db_order)
+    versions.bump_orders(db, [current_user.id], [order_date])
     db.commit()
+    metrics.order_writes.inc(status="Cancelled")
+    order_board.publish(db, current_user, order_date)
     return {"message": "Order cancelled"}
+
+def _sqlite_weekday(column):
+    """SQLite strftime('%w') 為週日=0，轉換為 Python weekday()（週一=0）"""
+    return (cast(func.strftime("%w", column), Integer) + 6) % 7
+
+@router.patch("/{order_id}", response_model=schemas.OrderWithDetails)
+def modify_order(order_id: int, change: schemas.OrderModify, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """
+    直接修改訂單的廠商與品項，或切換為不訂餐
+
+    截止時間、品項供應星期與假日規則皆寫在單一 UPDATE 的 WHERE 條件中，
+    不需先取消再重新建立訂單
+    """
+    catalog = cache.get_catalog(db)
+    calendar = cache.get_calendar(db)
+    earliest = earliest_editable_date()
+
+    menu_item = None
+    if not change.is_no_order:
+        vendor = catalog.vendors.get(change.vendor_id) if change.vendor_id else None
+        if not vendor or not vendor.is_active:
+            raise HTTPException(status_code=404, detail="找不到廠商或廠商已停用")
+        menu_item = catalog.menu_items.get(change.vendor_menu_item_id) if change.vendor_menu_item_id else None
+        if not menu_item or menu_item.vendor_id != change.vendor_id or not menu_item.is_active:
+            raise HTTPException(status_code=404, detail="找不到餐點品項或品項已停用")
+
+    # 可修改期間內的假日與補班日
+    holidays = [day for day, is_holiday in calendar.special_days.items() if is_holiday and day >= earliest]
+    workdays = [day for day, is_holiday in calendar.special_days.items() if not is_holiday and day >= earliest]
+    weekday = _sqlite_weekday(models.Order.order_date)
+
+    conditions = [
+        models.Order.id == order_id,
+        models.Order.user_id == current_user.id,
+        models.Order.order_date >= earliest,
+        ~models.Order.order_date.in_(holidays),
+        or_(weekday < 5, models.Order.order_date.in_(workdays)),
+    ]
+    if menu_item is not None and menu_item.weekday is not None:
+        conditions.append(weekday == menu_item.weekday)
+
+    stmt = (
+        update(models.Order)
+        .where(*conditions)
+        .values(
+            vendor_id=None if change.is_no_order else change.vendor_id,
+            vendor_menu_item_id=None if change.is_no_order else change.vendor_menu_item_id,
+            status="NoOrder" if change.is_no_order else "Pending",
+            items=None,
+            **catalog.snapshot(None if change.is_no_order else change.vendor_menu_item_id),
+        )
+        .returning(*ORDER_RETURNING)
+        .execution_options(synchronize_session=False)
+    )
+    with capacity_guard(db):
+        updated = db.execute(stmt).mappings().first()
+    if updated is not None:
+        versions.bump_orders(db, [current_user.id], [updated["order_date"]])
+    db.commit()
+
+    if updated is None:
+        # 未更新：找出原因（僅在失敗時查詢）
+        db_order = db.query(models.Order).filter(models.Order.id == order_id, models.Order.user_id == current_user.id).first()
+        if not db_order:
+            raise HTTPException(status_code=404, detail="找不到訂單")
+        check_cutoff(db_order.order_date)
+        if calendar.is_holiday(db_order.order_date):
+            raise HTTPException(status_code=400, detail="週末或假日無法訂餐")
+        raise HTTPException(status_code=400, detail=f"此餐點品項在{WEEKDAY_NAMES[db_order.order_date.weekday()]}不供應")
+
+    metrics.order_writes.inc(status=updated["status"])
+    order_board.publish_orders(db, current_user, [updated])
+    return order_with_details(updated, catalog)
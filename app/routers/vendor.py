@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from .. import models, schemas
+from .. import models, schemas, cache, capacity, versions
 from ..database import get_db
 from ..routers.auth import get_current_user
 
@@ -14,19 +14,19 @@ def check_admin(user: models.User = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="權限不足")
     return user
 
-@router.get("/", response_model=list[schemas.Vendor])
+@router.get("/", response_model=list[schemas.Vendor], dependencies=[Depends(versions.conditional(versions.CATALOG, auth=get_current_user))])
 def get_vendors(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     """Get all vendors"""
-    vendors = db.query(models.Vendor).filter(models.Vendor.is_active == True).all()
-    return vendors
+    catalog = cache.get_catalog(db)
+    return [vendor._asdict() for vendor in sorted(catalog.vendors.values(), key=lambda vendor: vendor.id) if vendor.is_active]
 
-@router.get("/{vendor_id}", response_model=schemas.Vendor)
+@router.get("/{vendor_id}", response_model=schemas.Vendor, dependencies=[Depends(versions.conditional(versions.CATALOG, auth=get_current_user))])
 def get_vendor(vendor_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     """Get a specific vendor"""
-    vendor = db.query(models.Vendor).filter(models.Vendor.id == vendor_id).first()
+    vendor = cache.get_catalog(db).vendors.get(vendor_id)
     if not vendor:
         raise HTTPException(status_code=404, detail="找不到廠商")
-    return vendor
+    return vendor._asdict()
 
 @router.post("/", response_model=schemas.Vendor)
 def create_vendor(vendor: schemas.VendorCreate, db: Session = Depends(get_db), admin: models.User = Depends(check_admin)):
@@ -38,7 +38,9 @@ def create_vendor(vendor: schemas.VendorCreate, db: Session = Depends(get_db), a
     
     db_vendor = models.Vendor(**vendor.dict())
     db.add(db_vendor)
+    versions.bump(db, versions.CATALOG)
     db.commit()
+    cache.invalidate("catalog")
     db.refresh(db_vendor)
     return db_vendor
 
@@ -52,7 +54,9 @@ def update_vendor(vendor_id: int, vendor: schemas.VendorCreate, db: Session = De
     for key, value in vendor.dict().items():
         setattr(db_vendor, key, value)
     
+    versions.bump(db, versions.CATALOG)
     db.commit()
+    cache.invalidate("catalog")
     db.refresh(db_vendor)
     return db_vendor
 
@@ -65,18 +69,20 @@ def delete_vendor(vendor_id: int, db: Session = Depends(get_db), admin: models.U
     
     # Soft delete
     db_vendor.is_active = False
+    versions.bump(db, versions.CATALOG)
     db.commit()
+    cache.invalidate("catalog")
     return {"message": "Vendor deleted successfully"}
 
 # Vendor Menu Item endpoints
-@router.get("/{vendor_id}/menu", response_model=list[schemas.VendorMenuItem])
+@router.get("/{vendor_id}/menu", response_model=list[schemas.VendorMenuItem], dependencies=[Depends(versions.conditional(versions.CATALOG, auth=get_current_user))])
 def get_vendor_menu(vendor_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     """Get all menu items for a vendor"""
-    menu_items = db.query(models.VendorMenuItem).filter(
-        models.VendorMenuItem.vendor_id == vendor_id,
-        models.VendorMenuItem.is_active == True
-    ).all()
-    return menu_items
+    catalog = cache.get_catalog(db)
+    return [
+        item._asdict() for item in sorted(catalog.menu_items.values(), key=lambda item: item.id)
+        if item.vendor_id == vendor_id and item.is_active
+    ]
 
 @router.post("/{vendor_id}/menu", response_model=schemas.VendorMenuItem)
 def create_vendor_menu_item(
@@ -97,7 +103,9 @@ def create_vendor_menu_item(
     
     db_menu_item = models.VendorMenuItem(vendor_id=vendor_id, **menu_item.dict())
     db.add(db_menu_item)
+    versions.bump(db, versions.CATALOG)
     db.commit()
+    cache.invalidate("catalog")
     db.refresh(db_menu_item)
     return db_menu_item
 
@@ -125,7 +133,9 @@ def update_vendor_menu_item(
     for key, value in menu_item.dict().items():
         setattr(db_item, key, value)
     
+    versions.bump(db, versions.CATALOG)
     db.commit()
+    cache.invalidate("catalog")
     db.refresh(db_item)
     return db_item
 
@@ -147,13 +157,20 @@ def delete_vendor_menu_item(
     
     # Soft delete
     db_item.is_active = False
+    versions.bump(db, versions.CATALOG)
     db.commit()
+    cache.invalidate("catalog")
     return {"message": "Menu item deleted successfully"}
 
 # Get available vendors for a specific date
-@router.get("/available/{order_date}", response_model=list[dict])
+@router.get("/available/{order_date}", response_model=list[dict], dependencies=[Depends(versions.conditional(versions.CATALOG, versions.CALENDAR, auth=get_current_user, orders_date="order_date"))])
 def get_available_vendors(order_date: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    """Get available vendors and their menu items for a specific date"""
+    """
+    Get available vendors and their menu items for a specific date
+
+    remaining 為設有每日上限的廠商與品項的剩餘份數（品項已考慮廠商上限），不限時為 null；
+    所有計數器以一次查詢取得
+    """
     from datetime import datetime
     
     try:
@@ -162,44 +179,39 @@ def get_available_vendors(order_date: str, db: Session = Depends(get_db), curren
         raise HTTPException(status_code=400, detail="日期格式錯誤，請使用 YYYY-MM-DD 格式")
     
     weekday = date_obj.weekday()  # 0=Monday, 6=Sunday
-    
-    # Check SpecialDay
-    special_day = db.query(models.SpecialDay).filter(models.SpecialDay.date == date_obj).first()
-    is_holiday = False
-    
-    if special_day:
-        is_holiday = special_day.is_holiday
-    else:
-        is_holiday = weekday >= 5 # 5=Saturday, 6=Sunday
 
-    if is_holiday:
+    # SpecialDay 優先，其次為週末；廠商與品項皆來自快取
+    if cache.get_calendar(db).is_holiday(date_obj):
         return []
-    
-    vendors = db.query(models.Vendor).filter(models.Vendor.is_active == True).all()
+
+    catalog = cache.get_catalog(db)
+    items_by_vendor = {}
+    for item in sorted(catalog.menu_items.values(), key=lambda item: item.id):
+        # Menu items for this vendor that are either for all days or for this specific weekday
+        if item.is_active and (item.weekday is None or item.weekday == weekday):
+            items_by_vendor.setdefault(item.vendor_id, []).append(item)
+
+    left = capacity.load(db, catalog, [date_obj])
+
     result = []
-    
-    for vendor in vendors:
-        # Get menu items for this vendor that are either for all days or for this specific weekday
-        menu_items = db.query(models.VendorMenuItem).filter(
-            models.VendorMenuItem.vendor_id == vendor.id,
-            models.VendorMenuItem.is_active == True,
-            (models.VendorMenuItem.weekday == weekday) | (models.VendorMenuItem.weekday == None)
-        ).all()
-        
-        if menu_items:
+    for vendor in sorted(catalog.vendors.values(), key=lambda vendor: vendor.id):
+        menu_items = items_by_vendor.get(vendor.id)
+        if vendor.is_active and menu_items:
             result.append({
                 "vendor": {
                     "id": vendor.id,
                     "name": vendor.name,
                     "description": vendor.description,
-                    "color": vendor.color
+                    "color": vendor.color,
+                    "remaining": left.left(capacity.VENDOR, vendor.id, date_obj)
                 },
                 "menu_items": [
                     {
                         "id": item.id,
                         "name": item.name,
                         "description": item.description,
-                        "price": item.price
+                        "price": item.price,
+                        "remaining": left.item_left(item, date_obj)
                     } for item in menu_items
                 ]
             })
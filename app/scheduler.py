@@ -0,0 +1,350 @@
+"""
+程序內排程器
+
+以 @job(name, cron) 登記需要在固定時間執行的工作（截止時確認訂單、提醒、公告、封存等），
+由 lifespan 啟動的 asyncio 工作迴圈在到期時於執行緒中執行，不阻擋事件迴圈。
+
+- cron 為五欄格式（分 時 日 月 星期，星期 0 = 週日），以台灣時間解讀；
+  支援 *、數字、範圍（1-5）、清單（1,3）與間隔（*/15）
+- 工作狀態（下次執行時間、租約）與每次執行的紀錄存於 scheduled_jobs / job_runs，重新啟動後延續；
+  服務停止期間錯過的執行於啟動後補執行一次
+- 多個 worker 各自執行迴圈，以條件式 UPDATE 取得租約並推進下次執行時間，
+  同一次到期只有一個 worker 執行
+- 系統管理員可由 /api/admin/jobs 查看、手動觸發與檢視執行紀錄
+- 設定環境變數 WEBDINER_SCHEDULER=0 可停用迴圈（例如另有專用的排程程序）
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import func, or_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import localtime, models
+
+logger = logging.getLogger("webdiner.scheduler")
+
+# cron 以台灣時間解讀
+TIMEZONE = localtime.TAIWAN_TZ
+
+# 租約長度：超過仍未結束的執行視為已中斷
+LEASE = timedelta(hours=1)
+# 迴圈最長的休眠秒數（其他 worker 或管理者修改排程時於此期間內生效）
+POLL_SECONDS = 60.0
+# 每個工作保留的執行紀錄筆數
+KEEP_RUNS = 200
+
+WORKER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ---- cron ----
+
+# 各欄位的範圍；星期可寫 0-7（0 與 7 皆為週日）
+_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_field(field: str, low: int, high: int) -> frozenset:
+    values = set()
+    for part in field.split(","):
+        base, _, step = part.partition("/")
+        if base == "*":
+            first, last = low, high
+        elif "-" in base:
+            first, last = (int(value) for value in base.split("-", 1))
+        else:
+            first = last = int(base)
+        if not low <= first <= last <= high:
+            raise ValueError(f"cron 欄位超出範圍：{part}")
+        values.update(range(first, last + 1, int(step) if step else 1))
+    return frozenset(values)
+
+
+class Cron(NamedTuple):
+    expression: str
+    minutes: frozenset
+    hours: frozenset
+    days: frozenset
+    months: frozenset
+    weekdays: frozenset
+    any_day: bool
+    any_weekday: bool
+
+    @classmethod
+    def parse(cls, expression: str) -> "Cron":
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron 必須為五個欄位：{expression}")
+        minutes, hours, days, months, weekdays = (
+            _parse_field(field, low, high) for field, (low, high) in zip(fields, _RANGES)
+        )
+        weekdays = frozenset(day % 7 for day in weekdays)
+        return cls(expression, minutes, hours, days, months, weekdays,
+                   any_day=fields[2] == "*", any_weekday=fields[4] == "*")
+
+    def matches_day(self, day: date) -> bool:
+        if day.month not in self.months:
+            return False
+        in_days = day.day in self.days
+        in_weekdays = (day.weekday() + 1) % 7 in self.weekdays
+        # 與標準 cron 相同：日與星期都有限制時符合其一即可
+        if not self.any_day and not self.any_weekday:
+            return in_days or in_weekdays
+        return in_days and in_weekdays
+
+    def next_after(self, after: datetime) -> datetime:
+        """after（UTC naive）之後下一次觸發的時間（UTC naive）"""
+        local = after.replace(tzinfo=timezone.utc).astimezone(TIMEZONE)
+        start = local.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.date()
+        for _ in range(366 * 5):
+            if self.matches_day(day):
+                for hour in sorted(self.hours):
+                    for minute in sorted(self.minutes):
+                        candidate = datetime.combine(day, time(hour, minute), tzinfo=TIMEZONE)
+                        if candidate >= start:
+                            return candidate.astimezone(timezone.utc).replace(tzinfo=None)
+            day += timedelta(days=1)
+        raise ValueError(f"cron 沒有可觸發的時間：{self.expression}")
+
+
+# ---- 工作登記 ----
+
+class Job(NamedTuple):
+    name: str
+    cron: Cron
+    func: Callable
+    description: str
+
+
+JOBS: Dict[str, Job] = {}
+
+
+def job(name: str, cron: str, description: str):
+    """
+    登記排程工作；工作函式的參數為 (engine, now)，now 為台灣時間（aware datetime），
+    回傳可序列化為 JSON 的結果摘要
+    """
+    def register(func: Callable):
+        JOBS[name] = Job(name, Cron.parse(cron), func, description)
+        return func
+    return register
+
+
+def local_now(now: Optional[datetime] = None) -> datetime:
+    """UTC naive 時間轉為台灣時間"""
+    return (now or datetime.utcnow()).replace(tzinfo=timezone.utc).astimezone(TIMEZONE)
+
+
+def _ensure_rows(db: Session, now: datetime):
+    """新增尚未存在的工作列"""
+    if not JOBS:
+        return
+    stmt = sqlite_insert(models.ScheduledJob).values([
+        {"name": job.name, "cron": job.cron.expression, "enabled": True, "next_run_at": job.cron.next_after(now)}
+        for job in JOBS.values()
+    ])
+    db.execute(stmt.on_conflict_do_nothing(index_elements=["name"]))
+
+
+def sync(engine: Engine, now: Optional[datetime] = None):
+    """啟動時同步登記的工作：新增工作列，cron 變更時重新計算下次執行時間"""
+    now = now or datetime.utcnow()
+    with Session(engine) as db:
+        _ensure_rows(db, now)
+        for row in db.query(models.ScheduledJob).filter(models.ScheduledJob.name.in_(JOBS)).all():
+            cron = JOBS[row.name].cron
+            if row.cron != cron.expression or row.next_run_at is None:
+                row.cron = cron.expression
+                row.next_run_at = cron.next_after(now)
+        db.commit()
+
+
+# ---- 執行 ----
+
+class JobLocked(Exception):
+    """工作正由其他執行中的程序持有租約"""
+
+
+def _claim(db: Session, job: Job, now: datetime, scheduled: bool) -> bool:
+    """以條件式 UPDATE 取得租約；排定的執行同時推進下次執行時間"""
+    Job_ = models.ScheduledJob
+    stmt = update(Job_).where(
+        Job_.name == job.name,
+        or_(Job_.locked_until == None, Job_.locked_until < now),
+    ).values(locked_by=WORKER, locked_until=now + LEASE)
+    if scheduled:
+        stmt = stmt.where(Job_.enabled == True, Job_.next_run_at <= now).values(
+            next_run_at=job.cron.next_after(now)
+        )
+    return db.execute(stmt.execution_options(synchronize_session=False)).rowcount == 1
+
+
+def run_dict(run: models.JobRun) -> dict:
+    return {
+        "id": run.id,
+        "job_name": run.job_name,
+        "trigger": run.trigger,
+        "worker": run.worker,
+        "started_at": run.started_at,
+        "finished_at": run.finished_at,
+        "status": run.status,
+        "result": json.loads(run.result) if run.result else None,
+        "error": run.error,
+    }
+
+
+def run_job(engine: Engine, name: str, trigger: str = "manual", now: Optional[datetime] = None) -> Optional[dict]:
+    """
+    執行一個工作並記錄結果；回傳執行紀錄
+
+    排定的執行（trigger="schedule"）在尚未到期或已由其他 worker 取得時回傳 None；
+    手動觸發在工作執行中時拋出 JobLocked
+    """
+    job = JOBS[name]
+    now = now or datetime.utcnow()
+    scheduled = trigger == "schedule"
+    with Session(engine, expire_on_commit=False) as db:
+        _ensure_rows(db, now)
+        if not _claim(db, job, now, scheduled):
+            db.commit()
+            if scheduled:
+                return None
+            raise JobLocked(name)
+        run = models.JobRun(job_name=name, trigger=trigger, worker=WORKER, started_at=now, status="running")
+        db.add(run)
+        db.commit()
+
+        try:
+            result = job.func(engine, local_now(now))
+            run.status = "success"
+            run.result = json.dumps(result, ensure_ascii=False, default=str)
+        except Exception as exc:
+            logger.exception("scheduled job %s failed", name)
+            db.rollback()
+            run.status = "failed"
+            run.error = f"{type(exc).__name__}: {exc}"
+        run.finished_at = datetime.utcnow()
+        db.execute(
+            update(models.ScheduledJob)
+            .where(models.ScheduledJob.name == name, models.ScheduledJob.locked_by == WORKER)
+            .values(locked_by=None, locked_until=None, last_run_id=run.id)
+            .execution_options(synchronize_session=False)
+        )
+        # 只保留最近的執行紀錄
+        db.query(models.JobRun).filter(
+            models.JobRun.job_name == name, models.JobRun.id <= run.id - KEEP_RUNS
+        ).delete(synchronize_session=False)
+        db.commit()
+        logger.info("Job %s (%s) %s in %.1f s", name, trigger, run.status,
+                    (run.finished_at - now).total_seconds())
+        return run_dict(run)
+
+
+def due_jobs(db: Session, now: datetime) -> List[str]:
+    rows = db.query(models.ScheduledJob.name).filter(
+        models.ScheduledJob.name.in_(JOBS),
+        models.ScheduledJob.enabled == True,
+        models.ScheduledJob.next_run_at <= now,
+    ).order_by(models.ScheduledJob.next_run_at).all()
+    return [name for (name,) in rows]
+
+
+def run_due(engine: Engine, now: Optional[datetime] = None) -> List[dict]:
+    """執行所有到期的工作，回傳本程序實際執行的紀錄"""
+    now = now or datetime.utcnow()
+    with Session(engine) as db:
+        names = due_jobs(db, now)
+    runs = []
+    for name in names:
+        run = run_job(engine, name, trigger="schedule", now=now)
+        if run is not None:
+            runs.append(run)
+    return runs
+
+
+def _seconds_until_next(engine: Engine) -> float:
+    with Session(engine) as db:
+        upcoming = db.query(func.min(models.ScheduledJob.next_run_at)).filter(
+            models.ScheduledJob.name.in_(JOBS), models.ScheduledJob.enabled == True
+        ).scalar()
+    if upcoming is None:
+        return POLL_SECONDS
+    return min(max((upcoming - datetime.utcnow()).total_seconds(), 1.0), POLL_SECONDS)
+
+
+async def _loop(engine: Engine):
+    while True:
+        try:
+            await asyncio.to_thread(run_due, engine)
+            delay = await asyncio.to_thread(_seconds_until_next, engine)
+        except Exception:  # 資料庫暫時鎖定等狀況：下一輪再試
+            logger.exception("scheduler tick failed")
+            delay = POLL_SECONDS
+        await asyncio.sleep(delay)
+
+
+_task: Optional[asyncio.Task] = None
+
+
+def start(engine: Engine) -> Optional[asyncio.Task]:
+    """於 lifespan 中啟動排程迴圈（需在事件迴圈內呼叫）"""
+    global _task
+    if os.environ.get("WEBDINER_SCHEDULER", "1") == "0":
+        return None
+    sync(engine)
+    _task = asyncio.get_running_loop().create_task(_loop(engine))
+    return _task
+
+
+async def stop():
+    """停止排程迴圈；執行中的工作在執行緒中完成後才釋放租約"""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+# ---- 查詢 ----
+
+def status(db: Session, now: Optional[datetime] = None) -> List[dict]:
+    """所有登記工作的狀態與最後一次執行"""
+    now = now or datetime.utcnow()
+    rows = {row.name: row for row in db.query(models.ScheduledJob).filter(models.ScheduledJob.name.in_(JOBS))}
+    run_ids = [row.last_run_id for row in rows.values() if row.last_run_id]
+    last_runs = {
+        run.id: run for run in db.query(models.JobRun).filter(models.JobRun.id.in_(run_ids))
+    } if run_ids else {}
+    result = []
+    for name, job in sorted(JOBS.items()):
+        row = rows.get(name)
+        last_run = last_runs.get(row.last_run_id) if row else None
+        result.append({
+            "name": name,
+            "description": job.description,
+            "cron": job.cron.expression,
+            "enabled": row.enabled if row else True,
+            "next_run_at": row.next_run_at if row else job.cron.next_after(now),
+            "running": bool(row and row.locked_until and row.locked_until >= now),
+            "last_run": run_dict(last_run) if last_run else None,
+        })
+    return result
+
+
+def runs(db: Session, name: str, limit: int = 20) -> List[dict]:
+    return [
+        run_dict(run) for run in db.query(models.JobRun)
+        .filter(models.JobRun.job_name == name)
+        .order_by(models.JobRun.id.desc())
+        .limit(limit)
+    ]
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field
+from typing import Any, Optional, List, Dict
 from datetime import date, datetime
 
 # Auth Schemas
@@ -162,6 +162,7 @@ class VendorBase(BaseModel):
     description: Optional[str] = None
     color: Optional[str] = "#3B82F6"
     is_active: bool = True
+    daily_limit: Optional[int] = Field(None, ge=0)  # 每日份數上限，空值為不限
 
 class VendorCreate(VendorBase):
     pass
@@ -180,6 +181,7 @@ class VendorMenuItemBase(BaseModel):
     price: int
     weekday: Optional[int] = None  # 0-4 for Mon-Fri, null for all days
     is_active: bool = True
+    daily_limit: Optional[int] = Field(None, ge=0)  # 每日份數上限，空值為不限
 
 class VendorMenuItemCreate(VendorMenuItemBase):
     vendor_id: int
@@ -219,6 +221,12 @@ class OrderCreate(BaseModel):
     vendor_menu_item_id: Optional[int] = None
     is_no_order: bool = False
 
+class OrderModify(BaseModel):
+    """修改既有訂單的廠商與品項，或切換為不訂餐"""
+    vendor_id: Optional[int] = None
+    vendor_menu_item_id: Optional[int] = None
+    is_no_order: bool = False
+
 class OrderBatchCreate(BaseModel):
     """For creating multiple orders at once"""
     orders: List[OrderCreate]
@@ -230,6 +238,27 @@ class UserOrderUpdate(BaseModel):
     item_id: Optional[int] = None
     is_cancel: bool = False
 
+class AdminOrderBulkRow(BaseModel):
+    """管理者批次設定的一列：指定使用者或整個部門（在職人員）在某日的品項，或取消"""
+    user_id: Optional[int] = None
+    department_id: Optional[int] = None
+    order_date: date
+    vendor_id: Optional[int] = None
+    item_id: Optional[int] = None
+    is_cancel: bool = False
+
+class AdminOrderBulk(BaseModel):
+    rows: List[AdminOrderBulkRow]
+
+class AdminOrderBulkOutcome(BaseModel):
+    """批次設定的結果；部門列展開為每位使用者各一筆"""
+    index: int  # 在請求中的位置
+    user_id: Optional[int] = None
+    order_date: date
+    outcome: str  # created / updated / cancelled / unchanged / superseded / rejected
+    order_id: Optional[int] = None
+    reason: Optional[str] = None
+
 class Order(BaseModel):
     id: int
     user_id: int
@@ -242,6 +271,29 @@ class Order(BaseModel):
     class Config:
         from_attributes = True
 
+class OrderRejection(BaseModel):
+    """批次訂餐中被略過的訂單"""
+    index: Optional[int] = None  # 在請求中的位置；區間同步時刪除失敗者為 None
+    order_date: date
+    reason: str
+
+class OrderBatchResult(BaseModel):
+    created: List[Order] = []
+    rejected: List[OrderRejection] = []
+
+class OrderRangeSync(BaseModel):
+    """指定區間內每個日期想要的訂單；區間內未列出的日期代表不訂"""
+    start_date: date
+    end_date: date
+    selections: List[OrderCreate] = []
+
+class OrderRangeSyncResult(BaseModel):
+    created: List[Order] = []
+    updated: List[Order] = []
+    deleted: List[int] = []  # 已刪除的訂單 ID
+    unchanged: int = 0
+    rejected: List[OrderRejection] = []
+
 class OrderWithDetails(Order):
     """Order with vendor and menu item details"""
     vendor_name: Optional[str] = None
@@ -250,6 +302,23 @@ class OrderWithDetails(Order):
     menu_item_price: Optional[int] = None
     menu_item_description: Optional[str] = None
 
+class WeeklyPlanDay(BaseModel):
+    """每週固定計畫的一天（weekday：0=週一 … 4=週五）"""
+    weekday: int
+    vendor_id: Optional[int] = None
+    vendor_menu_item_id: Optional[int] = None
+    is_no_order: bool = False
+
+class WeeklyPlanUpdate(BaseModel):
+    """整份取代使用者的每週計畫；未列出的星期代表不自動訂餐"""
+    days: List[WeeklyPlanDay] = []
+
+class WeeklyPlanEntry(WeeklyPlanDay):
+    vendor_name: Optional[str] = None
+    menu_item_name: Optional[str] = None
+    menu_item_price: Optional[int] = None
+    available: bool = True  # 品項與廠商仍供應；停用後該日不會自動建立訂單
+
 # Special Day Schemas
 class SpecialDayBase(BaseModel):
     date: date
@@ -263,3 +332,60 @@ class SpecialDay(SpecialDayBase):
     id: int
     class Config:
         from_attributes = True
+
+# 月曆訂餐頁面初始資料
+class CalendarVendor(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    color: Optional[str] = None
+
+class CalendarMenuItem(BaseModel):
+    id: int
+    vendor_id: int
+    name: str
+    description: Optional[str] = None
+    price: int
+
+class CalendarMonth(BaseModel):
+    month: str  # YYYY-MM
+    orders: List[OrderWithDetails] = []
+    special_days: List[SpecialDay] = []
+    vendors: List[CalendarVendor] = []
+    menu_items: List[CalendarMenuItem] = []
+    availability: Dict[date, List[int]] = {}  # 日期 -> 可訂品項 ID（假日不列出）
+    remaining: Dict[date, Dict[int, int]] = {}  # 日期 -> 有每日上限的品項 ID -> 剩餘份數
+
+# 查詢統計設定
+class InstrumentationSettings(BaseModel):
+    enabled: bool
+    slow_request_ms: float
+    top_n: int
+    log_parameters: bool  # 慢請求日誌是否記錄繫結參數
+
+class InstrumentationSettingsUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    slow_request_ms: Optional[float] = None
+    top_n: Optional[int] = None
+    log_parameters: Optional[bool] = None
+
+# 排程工作
+class JobRun(BaseModel):
+    id: int
+    job_name: str
+    trigger: str  # schedule / manual
+    worker: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    status: str  # running / success / failed
+    result: Optional[Any] = None
+    error: Optional[str] = None
+
+class ScheduledJob(BaseModel):
+    name: str
+    description: str
+    cron: str  # 台灣時間
+    enabled: bool
+    next_run_at: Optional[datetime] = None  # UTC
+    running: bool
+    last_run: Optional[JobRun] = None
@@ -0,0 +1,65 @@
+"""
+應用程式啟動與關閉
+
+匯入 app.main 時不再觸碰資料庫；結構升級、WAL 設定與快取預熱改由 lifespan 在開始接受
+連線前執行，完成後 uvicorn 才回報 "Application startup complete"。
+
+- 多 worker 時由 run.py 在父程序先套用 migration，各 worker 的 upgrade() 只需確認版本
+- 轉換尚未正規化的舊版 JSON 訂單品項（order_lines）；完成後只需讀取進度
+- 預熱 cache 中所有已登記的領域（catalog、calendar、directory），第一個請求不需等待載入
+- 啟動 data_versions 輪詢，偵測其他 worker 的寫入（程序內快取失效、訂餐看板、查詢統計設定）
+- 套用資料庫中保存的查詢統計設定；多 worker 時開始寫入本程序的指標供 /api/metrics 合併
+- 啟動排程迴圈（app.jobs 登記的工作）；關閉時先停止排程再釋放連線
+"""
+
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from . import cache, instrumentation, jobs, metrics, migrations, order_lines, scheduler  # noqa: F401（jobs 登記排程工作）
+
+logger = logging.getLogger("webdiner.startup")
+
+
+def prepare(engine: Engine) -> dict:
+    """套用 migration、轉換舊版訂單品項、啟用 WAL 並預熱快取，回傳各階段耗時（毫秒）"""
+    timings = {}
+    started = time.perf_counter()
+    migrations.upgrade(engine, log=logger.info)
+    order_lines.convert(engine, log=logger.info)
+    with engine.connect() as connection:
+        connection.execute(text("PRAGMA journal_mode=WAL"))
+        connection.commit()
+    timings["schema"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    # 先記錄版本基準再預熱，其他程序之後的寫入都會被輪詢偵測
+    cache.start_polling(engine)
+    with sessionmaker(bind=engine)() as db:
+        warmed = cache.warm_up(db)
+        instrumentation.load(db)
+    timings["warm_up"] = (time.perf_counter() - started) * 1000
+    logger.info(
+        "Startup ready: schema %.1f ms, warm-up %.1f ms (%s)",
+        timings["schema"], timings["warm_up"], ", ".join(warmed) or "already warm",
+    )
+    return timings
+
+
+def lifespan_for(engine: Engine):
+    @asynccontextmanager
+    async def lifespan(app):
+        prepare(engine)
+        metrics.start_sharing()
+        scheduler.start(engine)
+        yield
+        await scheduler.stop()
+        cache.stop_polling()
+        metrics.stop_sharing()
+        engine.dispose()
+
+    return lifespan
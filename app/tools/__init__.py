@@ -0,0 +1 @@
+# This file makes the tools directory a Python package
@@ -0,0 +1,88 @@
+"""
+大型回應的序列化與壓縮基準測試
+
+對 seed 產生的資料庫呼叫管理報表與分機表端點，分別以未壓縮、gzip、br 與 MessagePack
+取得回應，輸出中位數延遲與傳輸大小。
+
+使用方式：
+    python -m app.tools.seed bench.db --users 2000 --orders 200000
+    python -m app.tools.bench_responses bench.db --repeat 20
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+from .. import cache, models
+from ..database import get_db
+from ..main import app
+from ..routers.auth import create_access_token
+
+VARIANTS = [
+    ("identity", {"Accept-Encoding": "identity"}),
+    ("gzip", {"Accept-Encoding": "gzip"}),
+    ("br", {"Accept-Encoding": "br"}),
+    ("msgpack+br", {"Accept-Encoding": "br", "Accept": "application/msgpack"}),
+]
+
+
+def bench(path: str, repeat: int, out=sys.stdout):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        session = SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    cache.invalidate()
+
+    with SessionLocal() as db:
+        latest = db.query(func.max(models.Order.order_date)).scalar()
+        admin = db.query(models.User.employee_id).filter(models.User.role == "sysadmin").first()[0]
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': admin})}"}
+    endpoints = [
+        f"/api/admin/orders/daily_details?date={latest}",
+        f"/api/admin/order_announcement?date={latest}",
+        f"/api/admin/stats?date={latest}",
+        "/api/extension-directory/",
+    ]
+
+    client = TestClient(app)
+    print(f"{'endpoint':<48} {'variant':<12} {'median ms':>10} {'bytes':>10}", file=out)
+    for url in endpoints:
+        for name, extra in VARIANTS:
+            timings = []
+            size = 0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = client.get(url, headers={**headers, **extra})
+                timings.append((time.perf_counter() - started) * 1000)
+                response.raise_for_status()
+                size = int(response.headers.get("content-length", len(response.content)))
+            print(f"{url.split('?')[0]:<48} {name:<12} {statistics.median(timings):>10.1f} {size:>10}", file=out)
+
+    app.dependency_overrides.pop(get_db, None)
+    engine.dispose()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="量測大型回應的序列化與壓縮效果")
+    parser.add_argument("path", help="seed 產生的 SQLite 檔案路徑")
+    parser.add_argument("--repeat", type=int, default=10, help="每個組合的重複次數")
+    args = parser.parse_args(argv)
+    bench(args.path, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+匯入與啟動時間基準測試
+
+1. import: 新的直譯器匯入 app.main 的耗時（-X importtime），並列出最重的直接相依
+2. prepare: lifespan 啟動工作（migration 檢查、WAL、快取預熱）的耗時
+3. serve: 以 run.py 啟動 N 個 worker，量測第一個回應與所有 worker 就緒的時間，
+   再關閉並重新啟動一次（restart）
+
+使用方式：
+    python -m app.tools.seed bench.db --users 2000 --orders 200000
+    python -m app.tools.bench_startup bench.db --repeat 5 --workers 1 2 4
+"""
+
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+READY_LINE = "Application startup complete"
+
+
+def _env(path: str) -> dict:
+    return {**os.environ, "WEBDINER_DATABASE_URL": f"sqlite:///{os.path.abspath(path)}", "PYTHONPATH": str(ROOT)}
+
+
+def bench_import(path: str, repeat: int, out):
+    wall, modules = [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import app.main"],
+            env=_env(path), cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        wall.append((time.perf_counter() - started) * 1000)
+        modules = result.stderr.splitlines()
+
+    # 直接相依（縮排兩格）依累計時間排序
+    direct = []
+    for line in modules:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.startswith("   ") and not name.startswith("    "):
+            direct.append((int(cumulative), name.strip()))
+    print(f"import   process wall median {statistics.median(wall):8.1f} ms", file=out)
+    for cumulative, name in sorted(direct, reverse=True)[:8]:
+        print(f"         {name:<40} {cumulative / 1000:8.1f} ms", file=out)
+
+
+def bench_prepare(path: str, repeat: int, out):
+    from sqlalchemy import create_engine
+
+    from .. import cache, startup
+    from ..main import app  # noqa: F401  匯入 router 以登記所有快取領域
+
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    schema, warm = [], []
+    for _ in range(repeat):
+        cache.invalidate()
+        timings = startup.prepare(engine)
+        schema.append(timings["schema"])
+        warm.append(timings["warm_up"])
+    cache.stop_polling()
+    engine.dispose()
+    cache.invalidate()
+    print(f"prepare  schema median {statistics.median(schema):8.1f} ms   "
+          f"warm-up median {statistics.median(warm):8.1f} ms", file=out)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve_once(path: str, workers: int, timeout: float = 60.0) -> dict:
+    port = _free_port()
+    ready = []
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "run.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        env=_env(path), cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+
+    def watch():
+        for line in process.stderr:
+            if READY_LINE in line:
+                ready.append((time.perf_counter() - started) * 1000)
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+
+    first = None
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"伺服器提前結束（exit code {process.returncode}）")
+            if first is None:
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                        if response.status == 200:
+                            first = (time.perf_counter() - started) * 1000
+                except OSError:
+                    pass
+            if first is not None and len(ready) >= workers:
+                break
+            time.sleep(0.01)
+        else:
+            raise RuntimeError("等待伺服器啟動逾時")
+    finally:
+        stopping = time.perf_counter()
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        stopped = (time.perf_counter() - stopping) * 1000
+        watcher.join(timeout=1)
+    return {"first_response": first, "all_ready": max(ready[:workers]), "shutdown": stopped}
+
+
+def bench_serve(path: str, workers_list, out):
+    for workers in workers_list:
+        for label in ("cold", "restart"):
+            result = _serve_once(path, workers)
+            print(f"serve    workers={workers:<3} {label:<8} first response {result['first_response']:8.1f} ms   "
+                  f"all ready {result['all_ready']:8.1f} ms   shutdown {result['shutdown']:8.1f} ms", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="量測匯入、啟動與多 worker 冷啟動時間")
+    parser.add_argument("path", help="seed 產生的 SQLite 檔案路徑")
+    parser.add_argument("--repeat", type=int, default=5, help="import / prepare 重複次數")
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4], help="要量測的 worker 數量")
+    args = parser.parse_args(argv)
+
+    bench_import(args.path, args.repeat, sys.stdout)
+    bench_prepare(args.path, args.repeat, sys.stdout)
+    if args.workers:
+        bench_serve(args.path, args.workers, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""
+合成資料產生器
+
+以大量 INSERT 產生接近正式環境規模的測試資料庫，用於效能分析與調校管理報表。
+
+產生內容：
+- 處別 (Division)、部門 (Department)
+- 使用者（含職稱與部門主管）
+- 廠商與每週菜單（固定星期供應或每日供應）
+- 特殊日期（國定假日與補班日）
+- 歷史訂單（含 NoOrder 不訂餐紀錄與舊版 JSON items 訂單）
+
+使用方式：
+    python -m app.tools.seed bench.db --users 2000 --orders 1000000 --seed 42
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from .. import models, migrations
+
+DEFAULT_PASSWORD = "password123"
+
+DIVISION_NAMES = ["管理處", "技術處", "審驗處", "研發處", "業務處", "資訊處"]
+DEPARTMENT_SUFFIXES = ["一部", "二部", "三部", "服務部", "企畫部", "查核部"]
+TITLES = ["工程師", "專員", "助理", "研究員", "技術員", "管理師"]
+HEAD_TITLES = ["經理", "副理", "主任"]
+VENDOR_COLORS = ["#3B82F6", "#EF4444", "#10B981", "#F59E0B", "#8B5CF6", "#EC4899", "#14B8A6", "#6B7280"]
+DISHES = ["排骨飯", "雞腿飯", "魚排飯", "控肉飯", "燒肉飯", "咖哩飯", "蔬食便當", "牛肉麵", "炒飯", "水餃"]
+SURNAMES = "陳林黃張李王吳劉蔡楊許鄭謝郭洪曾邱廖賴周"
+GIVEN_NAMES = "家宏志明俊傑淑芬美玲怡君建國雅婷冠宇"
+
+# 舊版 MenuItem，供 legacy JSON 訂單引用
+LEGACY_MENU = [("便當A", 80), ("便當B", 90), ("素食便當", 75), ("麵食", 70)]
+
+BATCH_SIZE = 50_000
+
+# 歷史訂單的欄位（未列出的欄位使用資料表預設值）
+ORDER_COLUMNS = [
+    "id", "user_id", "vendor_id", "vendor_menu_item_id", "order_date", "created_at", "status", "items",
+    "unit_price", "vendor_name", "item_name",
+]
+
+
+def _insert_sql(table, columns) -> str:
+    """以欄位名稱繫結的 INSERT；未列出的欄位（例如之後新增的可為空欄位）使用資料表預設值"""
+    unknown = set(columns) - {c.name for c in table.columns}
+    if unknown:
+        raise ValueError(f"{table.name} 沒有欄位 {', '.join(sorted(unknown))}")
+    placeholders = ", ".join(f":{column}" for column in columns)
+    return f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+def _insert_rows(conn: sqlite3.Connection, table, rows: list):
+    """rows 為以欄位名稱為鍵的 dict，欄位取自第一列"""
+    if rows:
+        conn.executemany(_insert_sql(table, list(rows[0])), rows)
+
+
+def _menu_row(item_id: int, vendor_id: int, name: str, description: str, price: int, weekday) -> dict:
+    return {
+        "id": item_id, "vendor_id": vendor_id, "name": name, "description": description,
+        "price": price, "weekday": weekday, "is_active": 1,
+    }
+
+
+def _order_row(order_id: int, user_id: int, day: str, created_at: str, status: str, **values) -> dict:
+    row = dict.fromkeys(ORDER_COLUMNS)
+    row.update(id=order_id, user_id=user_id, order_date=day, created_at=created_at, status=status, **values)
+    return row
+
+
+def _random_name(rng: random.Random) -> str:
+    return rng.choice(SURNAMES) + "".join(rng.choice(GIVEN_NAMES) for _ in range(2))
+
+
+def _is_working_day(day: date, special_days: dict) -> bool:
+    if day in special_days:
+        return not special_days[day]
+    return day.weekday() < 5
+
+
+def build_special_days(rng: random.Random, start: date, end: date) -> dict:
+    """每年約 12 天國定假日（落在平日）與 2 天補班日（落在週六）"""
+    special_days = {}
+    for year in range(start.year, end.year + 1):
+        weekdays = [
+            date(year, 1, 1) + timedelta(days=i)
+            for i in range(365)
+            if (date(year, 1, 1) + timedelta(days=i)).weekday() < 5
+        ]
+        for day in rng.sample(weekdays, 12):
+            special_days[day] = True
+        saturdays = [d + timedelta(days=5 - d.weekday()) for d in rng.sample(weekdays, 2)]
+        for day in saturdays:
+            if day.year == year:
+                special_days[day] = False
+    return special_days
+
+
+def working_days_back(end: date, count: int, special_days_for) -> list:
+    """由 end（不含）往回取 count 個工作日，依日期遞增回傳"""
+    days = []
+    day = end - timedelta(days=1)
+    while len(days) < count:
+        if _is_working_day(day, special_days_for(day)):
+            days.append(day)
+        day -= timedelta(days=1)
+    days.reverse()
+    return days
+
+
+def seed(
+    path: str,
+    users: int = 500,
+    orders: int = 100_000,
+    vendors: int = 8,
+    no_order_rate: float = 0.15,
+    legacy_rate: float = 0.05,
+    rng_seed: int = 42,
+    force: bool = False,
+    log=print,
+) -> dict:
+    """
+    產生合成資料庫
+
+    - path: 目標 SQLite 檔案
+    - users: 使用者人數
+    - orders: 歷史訂單目標筆數（決定往回產生多少個工作日）
+    - vendors: 廠商數量
+    - no_order_rate: 不訂餐 (NoOrder) 比例
+    - legacy_rate: 最舊的這段比例工作日使用舊版 JSON items 訂單
+    """
+    if os.path.exists(path):
+        if not force:
+            raise FileExistsError(f"{path} 已存在，請加上 --force 覆寫")
+        os.remove(path)
+
+    rng = random.Random(rng_seed)
+    started = time.perf_counter()
+
+    # 以 migration 建立資料表結構，確保與應用程式一致
+    engine = create_engine(f"sqlite:///{path}")
+    migrations.upgrade(engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-200000")
+
+    now = datetime.utcnow().isoformat(sep=" ")
+    counts = {}
+
+    # 1. 處別與部門
+    division_rows = []
+    department_rows = []
+    dept_id = 0
+    for div_id, div_name in enumerate(DIVISION_NAMES, start=1):
+        division_rows.append({
+            "id": div_id, "name": div_name, "is_active": 1,
+            "display_column": div_id % 4, "display_order": div_id,
+        })
+        for order, suffix in enumerate(DEPARTMENT_SUFFIXES[: rng.randint(2, len(DEPARTMENT_SUFFIXES))]):
+            dept_id += 1
+            department_rows.append({
+                "id": dept_id, "name": f"{div_name[:2]}{suffix}", "is_active": 1,
+                "division_id": div_id, "display_column": div_id % 4, "display_order": order,
+            })
+    _insert_rows(conn, models.Division.__table__, division_rows)
+    _insert_rows(conn, models.Department.__table__, department_rows)
+    counts["divisions"] = len(division_rows)
+    counts["departments"] = len(department_rows)
+
+    # 2. 使用者（每個部門第一位為主管）；密碼雜湊只計算一次以節省時間
+    from ..routers.auth import get_password_hash
+    hashed_password = get_password_hash(DEFAULT_PASSWORD)
+    user_rows = []
+    dept_has_head = set()
+    for user_id in range(1, users + 1):
+        department_id = rng.randint(1, dept_id)
+        is_head = department_id not in dept_has_head
+        dept_has_head.add(department_id)
+        role = "sysadmin" if user_id == 1 else ("admin" if user_id <= 3 else "user")
+        user_rows.append({
+            "id": user_id,
+            "employee_id": f"{user_id:05d}",
+            "name": _random_name(rng),
+            "extension": f"{1000 + user_id}",
+            "email": f"user{user_id}@example.com" if rng.random() < 0.7 else None,
+            "hashed_password": hashed_password,
+            "is_active": 1 if rng.random() < 0.97 else 0,
+            "is_admin": 1 if role != "user" else 0,
+            "role": role,
+            "department_id": department_id,
+            "title": rng.choice(HEAD_TITLES) if is_head else rng.choice(TITLES),
+            "is_department_head": 1 if is_head else 0,
+        })
+    _insert_rows(conn, models.User.__table__, user_rows)
+    counts["users"] = len(user_rows)
+
+    # 3. 廠商與每週菜單
+    vendor_rows = []
+    menu_rows = []
+    menu_by_weekday = {weekday: [] for weekday in range(5)}
+    item_id = 0
+    for vendor_id in range(1, vendors + 1):
+        vendor_name = f"廠商{vendor_id:02d}"
+        vendor_rows.append({
+            "id": vendor_id,
+            "name": vendor_name,
+            "description": f"合成廠商 {vendor_id}",
+            "color": VENDOR_COLORS[(vendor_id - 1) % len(VENDOR_COLORS)],
+            "is_active": 1,
+            "created_at": now,
+        })
+        # 每日供應品項；menu_by_weekday 保存訂單快照所需的單價與名稱
+        for _ in range(rng.randint(1, 3)):
+            item_id += 1
+            dish, price = rng.choice(DISHES), rng.randrange(70, 160, 5)
+            menu_rows.append(_menu_row(item_id, vendor_id, dish, "每日供應", price, None))
+            for weekday in range(5):
+                menu_by_weekday[weekday].append((vendor_id, item_id, price, vendor_name, dish))
+        # 固定星期供應品項
+        for weekday in range(5):
+            item_id += 1
+            dish, price = rng.choice(DISHES), rng.randrange(70, 160, 5)
+            menu_rows.append(_menu_row(item_id, vendor_id, dish, "本日特餐", price, weekday))
+            menu_by_weekday[weekday].append((vendor_id, item_id, price, vendor_name, dish))
+    _insert_rows(conn, models.Vendor.__table__, vendor_rows)
+    _insert_rows(conn, models.VendorMenuItem.__table__, menu_rows)
+    legacy_rows = [
+        {"id": i, "name": name, "description": "舊版菜單", "price": price, "category": "便當", "is_active": 1}
+        for i, (name, price) in enumerate(LEGACY_MENU, start=1)
+    ]
+    _insert_rows(conn, models.MenuItem.__table__, legacy_rows)
+    counts["vendors"] = len(vendor_rows)
+    counts["vendor_menu_items"] = len(menu_rows)
+
+    # 4. 特殊日期
+    today = date.today()
+    days_needed = max(1, -(-orders // max(users, 1)))
+    # 工作日約佔 70%，預留足夠年份產生特殊日期
+    first_year = today.year - (days_needed * 10 // 7 // 365) - 1
+    special_days = build_special_days(rng, date(first_year, 1, 1), date(today.year, 12, 31))
+    _insert_rows(
+        conn,
+        models.SpecialDay.__table__,
+        [
+            {"id": i, "date": day.isoformat(), "is_holiday": 1 if is_holiday else 0,
+             "description": "國定假日" if is_holiday else "補班日"}
+            for i, (day, is_holiday) in enumerate(sorted(special_days.items()), start=1)
+        ],
+    )
+    counts["special_days"] = len(special_days)
+
+    # 5. 歷史訂單：每位使用者每個工作日一筆
+    days = working_days_back(today, days_needed, lambda _day: special_days)
+    legacy_cutoff = days[int(len(days) * legacy_rate)] if legacy_rate > 0 else days[0]
+    order_sql = _insert_sql(models.Order.__table__, ORDER_COLUMNS)
+    order_id = 0
+    remaining = orders
+    batch = []
+    for day in days:
+        if remaining <= 0:
+            break
+        day_str = day.isoformat()
+        created_at = f"{(day - timedelta(days=1)).isoformat()} 08:00:00.000000"
+        is_legacy = day < legacy_cutoff
+        # 補班日（星期六）沿用星期五菜單
+        choices = menu_by_weekday[min(day.weekday(), 4)]
+        for user_id in range(1, min(users, remaining) + 1):
+            order_id += 1
+            if rng.random() < no_order_rate:
+                batch.append(_order_row(order_id, user_id, day_str, created_at, "NoOrder"))
+            elif is_legacy:
+                legacy_id = rng.randint(1, len(LEGACY_MENU))
+                items = json.dumps([{"menu_item_id": legacy_id, "quantity": 1}])
+                batch.append(_order_row(order_id, user_id, day_str, created_at, "Confirmed", items=items))
+            else:
+                vendor_id, menu_item_id, price, vendor_name, dish = rng.choice(choices)
+                batch.append(_order_row(
+                    order_id, user_id, day_str, created_at, "Confirmed",
+                    vendor_id=vendor_id, vendor_menu_item_id=menu_item_id,
+                    unit_price=price, vendor_name=vendor_name, item_name=dish,
+                ))
+            if len(batch) >= BATCH_SIZE:
+                conn.executemany(order_sql, batch)
+                batch.clear()
+        remaining -= min(users, remaining)
+    if batch:
+        conn.executemany(order_sql, batch)
+    counts["orders"] = order_id
+
+    # 合成資料即為起始狀態：清除 trigger 產生的變更紀錄，用戶端首次同步時完整載入
+    conn.execute("DELETE FROM change_log")
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    log(" ".join(f"{k}={v}" for k, v in counts.items()))
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="產生 WebDiner 合成測試資料庫")
+    parser.add_argument("path", help="目標 SQLite 檔案路徑")
+    parser.add_argument("--users", type=int, default=500, help="使用者人數")
+    parser.add_argument("--orders", type=int, default=100_000, help="歷史訂單筆數")
+    parser.add_argument("--vendors", type=int, default=8, help="廠商數量")
+    parser.add_argument("--no-order-rate", type=float, default=0.15, help="不訂餐比例")
+    parser.add_argument("--legacy-rate", type=float, default=0.05, help="舊版 JSON 訂單所佔工作日比例")
+    parser.add_argument("--seed", type=int, default=42, help="亂數種子")
+    parser.add_argument("--force", action="store_true", help="覆寫已存在的檔案")
+    args = parser.parse_args(argv)
+
+    try:
+        seed(
+            args.path,
+            users=args.users,
+            orders=args.orders,
+            vendors=args.vendors,
+            no_order_rate=args.no_order_rate,
+            legacy_rate=args.legacy_rate,
+            rng_seed=args.seed,
+            force=args.force,
+        )
+    except FileExistsError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
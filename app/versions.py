@@ -0,0 +1,172 @@
+"""
+資料版本計數器與條件式 GET
+
+data_versions 表為每個資料領域保存一個遞增的版本號。寫入端點在 commit 前呼叫 bump()，
+版本號與資料於同一個交易中更新；讀取端點以 conditional() 依賴由版本號計算 ETag 與
+Last-Modified，If-None-Match 相符時直接回應 304，不會執行端點本身的查詢。
+
+領域：
+- catalog: 廠商、廠商品項與舊版菜單
+- calendar: 特殊日期
+- org: 處別與部門（含分機表位置）
+- users: 使用者
+- archive: 訂單封存界線
+- billing: 已結束月份的訂單（月結報表快取；修改本月以前的訂單時遞增）
+- instrumentation: 查詢統計設定（各 worker 輪詢後套用）
+- orders:date:<YYYY-MM-DD>: 指定日期的訂單（管理報表）
+- orders:user:<id>: 指定使用者的訂單（個人訂單與月曆）
+"""
+
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import Callable, Iterable, Optional
+
+from fastapi import Depends, Request
+from fastapi.responses import Response
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import localtime, models
+from .database import get_db
+
+CATALOG = "catalog"
+CALENDAR = "calendar"
+ORG = "org"
+USERS = "users"
+ARCHIVE = "archive"
+BILLING = "billing"
+INSTRUMENTATION = "instrumentation"
+
+
+def orders_on(day) -> str:
+    return f"orders:date:{day.isoformat() if isinstance(day, date) else day}"
+
+
+def orders_of(user_id: int) -> str:
+    return f"orders:user:{user_id}"
+
+
+def month_closed(day: date) -> bool:
+    """該日期所屬月份是否已結束（月結報表不再隨日常訂餐變動）"""
+    return day < localtime.today().replace(day=1)
+
+
+def month_days(month: str) -> list:
+    """YYYY-MM 月份的所有日期；格式錯誤時拋出 ValueError"""
+    first = datetime.strptime(month, "%Y-%m").date()
+    following = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return [first + timedelta(days=n) for n in range((following - first).days)]
+
+
+def bump(db: Session, *domains: str):
+    """遞增指定領域的版本號；於呼叫端的交易中執行，隨 commit 一併生效"""
+    domains = sorted(set(domains))
+    if not domains:
+        return
+    now = datetime.utcnow()
+    stmt = sqlite_insert(models.DataVersion).values(
+        [{"domain": domain, "version": 1, "updated_at": now} for domain in domains]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["domain"],
+        set_={"version": models.DataVersion.version + 1, "updated_at": stmt.excluded.updated_at},
+    )
+    db.execute(stmt)
+
+
+def bump_orders(db: Session, user_ids: Iterable[int], dates: Iterable[date]):
+    """訂單異動：遞增受影響使用者與日期的版本號；日期屬於已結束的月份時一併遞增 billing"""
+    dates = list(dates)
+    closed = [BILLING] if any(month_closed(day) for day in dates) else []
+    bump(db, *(orders_of(user_id) for user_id in user_ids), *(orders_on(day) for day in dates), *closed)
+
+
+class NotModified(Exception):
+    def __init__(self, headers: dict):
+        self.headers = headers
+
+
+async def not_modified_handler(request: Request, exc: NotModified):
+    return Response(status_code=304, headers=exc.headers)
+
+
+def _validator_headers(etag: str, last_modified: Optional[datetime]) -> dict:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        # updated_at 以 UTC 儲存
+        headers["Last-Modified"] = format_datetime(
+            last_modified.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def _matches(request: Request, etag: str) -> bool:
+    # 僅比對 If-None-Match：Last-Modified 只有秒級精度，同一秒內的寫入無法以 If-Modified-Since 分辨
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+def conditional(*domains: str, auth: Optional[Callable] = None, orders_date: Optional[str] = None,
+                orders_month: Optional[str] = None, own_orders: bool = False):
+    """
+    讀取端點的條件式 GET 依賴
+
+    - domains: 回應內容所依賴的資料領域
+    - auth: 驗證依賴（先驗證權限，再比對版本）
+    - orders_date: 以此查詢 / 路徑參數（預設今日）決定 orders:date 領域
+    - orders_month: 以此查詢參數（YYYY-MM，預設本月）涵蓋該月每一天的 orders:date 領域
+    - own_orders: 回應為目前使用者自己的訂單
+    """
+    def no_auth():
+        return None
+
+    def dependency(request: Request, db: Session = Depends(get_db), user=Depends(auth or no_auth)):
+        keys = set(domains)
+        if orders_date is not None:
+            raw = request.query_params.get(orders_date) or request.path_params.get(orders_date)
+            try:
+                day = date.fromisoformat(raw) if raw else localtime.today()
+            except ValueError:
+                return  # 交給端點回報參數錯誤
+            keys.add(orders_on(day))
+        if orders_month is not None:
+            try:
+                days = month_days(request.query_params.get(orders_month) or localtime.today().strftime("%Y-%m"))
+            except ValueError:
+                return
+            keys.update(orders_on(day) for day in days)
+        if own_orders:
+            keys.add(orders_of(user.id))
+
+        rows = db.query(
+            models.DataVersion.domain, models.DataVersion.version, models.DataVersion.updated_at
+        ).filter(models.DataVersion.domain.in_(keys)).all()
+        versions = {row.domain: row.version for row in rows}
+        last_modified = max((row.updated_at for row in rows if row.updated_at), default=None)
+
+        # 版本號加上請求的路徑、查詢參數與回應格式，確保不同表示法不會共用 ETag；
+        # 加上今日日期，讓預設為「本日 / 本月」的端點跨日後自動失效
+        fingerprint = "|".join(
+            [request.url.path, request.url.query, request.headers.get("accept", ""), localtime.today().isoformat()]
+            + [f"{key}={versions.get(key, 0)}" for key in sorted(keys)]
+        )
+        etag = 'W/"' + hashlib.sha1(fingerprint.encode()).hexdigest()[:20] + '"'
+        headers = _validator_headers(etag, last_modified)
+        if _matches(request, etag):
+            raise NotModified(headers)
+        request.state.validators = headers
+
+    return dependency
+
+
+async def apply_validators(request: Request, call_next):
+    """HTTP middleware：為通過 conditional() 的成功回應加上 ETag / Last-Modified"""
+    response = await call_next(request)
+    headers = getattr(request.state, "validators", None)
+    if headers and response.status_code == 200:
+        for name, value in headers.items():
+            response.headers[name] = value
+    return response
@@ -0,0 +1,145 @@
+"""
+每週固定訂餐計畫
+
+使用者以 PUT /orders/weekly_plan 保存每個工作日要訂的品項（或不訂餐），排程工作 weekly_orders
+每週將計畫展開為下週的訂單。展開為單一 INSERT ... SELECT，規則皆寫在語句中，不逐筆驗證：
+- 只展開行事曆上的上班日（週末與特殊假日由快取的行事曆排除，補班的週六日沒有對應的計畫）
+- 品項與廠商須仍在供應，且品項的供應星期為空或與該日相符；不符的日期略過，由使用者自行訂餐
+- 已有訂單（含不訂餐）的日期略過；同時寫入的訂單由唯一索引 ux_orders_user_date 以 ON CONFLICT DO NOTHING 略過
+- 設有每日供應上限（app.capacity）的品項與廠商只展開到上限為止，依使用者 ID 排序，其餘由使用者自行訂餐
+- 停用的使用者不展開
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import Date, and_, case, exists, func, literal, or_, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import cache, capacity, metrics, models, order_board, versions
+from .ordering import earliest_editable_date
+
+
+def next_week(today: date) -> Tuple[date, date]:
+    """下週一至下週日"""
+    first = today + timedelta(days=7 - today.weekday())
+    return first, first + timedelta(days=6)
+
+
+def working_days(calendar: cache.Calendar, first: date, last: date) -> List[date]:
+    """區間內仍可訂餐的上班日"""
+    start = max(first, earliest_editable_date())
+    return [
+        start + timedelta(days=n) for n in range((last - start).days + 1)
+        if not calendar.is_holiday(start + timedelta(days=n))
+    ]
+
+
+def _days_cte(days: Iterable[date]):
+    return union_all(*(
+        select(literal(day, Date).label("order_date"), literal(day.weekday()).label("weekday"))
+        for day in days
+    )).cte("days")
+
+
+def materialize(db: Session, first: date, last: date) -> List[dict]:
+    """
+    將每週計畫展開為 first ~ last 間的訂單並 commit，回傳實際建立的 (user_id, order_date, status)
+    已有訂單的日期不受影響，可重複執行
+    """
+    days = working_days(cache.get_calendar(db), first, last)
+    if not days:
+        return []
+
+    plans = models.WeeklyPlan.__table__
+    orders = models.Order.__table__
+    users = models.User.__table__
+    items = models.VendorMenuItem.__table__
+    vendors = models.Vendor.__table__
+    item_used = models.OrderCapacity.__table__.alias("item_used")
+    vendor_used = models.OrderCapacity.__table__.alias("vendor_used")
+    calendar_days = _days_cte(days)
+    is_no_order = plans.c.vendor_menu_item_id.is_(None)
+
+    candidates = (
+        select(
+            plans.c.user_id,
+            plans.c.vendor_id,
+            plans.c.vendor_menu_item_id,
+            calendar_days.c.order_date,
+            case((is_no_order, "NoOrder"), else_="Pending").label("status"),
+            items.c.price,
+            vendors.c.name.label("vendor_name"),
+            items.c.name.label("item_name"),
+            # 每日上限：同一天同一品項 / 廠商依使用者排序，已訂份數加上名次不超過上限者才建立
+            (func.coalesce(item_used.c.used, 0) + func.row_number().over(
+                partition_by=(plans.c.vendor_menu_item_id, calendar_days.c.order_date), order_by=plans.c.user_id,
+            )).label("item_count"),
+            (func.coalesce(vendor_used.c.used, 0) + func.row_number().over(
+                partition_by=(items.c.vendor_id, calendar_days.c.order_date), order_by=plans.c.user_id,
+            )).label("vendor_count"),
+            items.c.daily_limit.label("item_limit"),
+            vendors.c.daily_limit.label("vendor_limit"),
+        )
+        .select_from(
+            plans.join(calendar_days, calendar_days.c.weekday == plans.c.weekday)
+            .join(users, users.c.id == plans.c.user_id)
+            .outerjoin(items, items.c.id == plans.c.vendor_menu_item_id)
+            .outerjoin(vendors, vendors.c.id == items.c.vendor_id)
+            .outerjoin(item_used, and_(item_used.c.scope == capacity.ITEM, item_used.c.ref_id == items.c.id,
+                                       item_used.c.order_date == calendar_days.c.order_date))
+            .outerjoin(vendor_used, and_(vendor_used.c.scope == capacity.VENDOR, vendor_used.c.ref_id == vendors.c.id,
+                                         vendor_used.c.order_date == calendar_days.c.order_date))
+        )
+        .where(
+            users.c.is_active.is_(True),
+            or_(
+                is_no_order,
+                and_(
+                    items.c.vendor_id == plans.c.vendor_id,
+                    items.c.is_active.is_(True),
+                    vendors.c.is_active.is_(True),
+                    or_(items.c.weekday.is_(None), items.c.weekday == calendar_days.c.weekday),
+                ),
+            ),
+            # 已有訂單者不參與名次
+            ~exists().where(orders.c.user_id == plans.c.user_id, orders.c.order_date == calendar_days.c.order_date),
+        )
+        .subquery("candidates")
+    )
+    # SQLite 的 INSERT ... SELECT ... ON CONFLICT 需要 SELECT 帶有 WHERE 子句（此處為每日上限的條件）
+    rows = select(
+        candidates.c.user_id,
+        candidates.c.vendor_id,
+        candidates.c.vendor_menu_item_id,
+        candidates.c.order_date,
+        literal(datetime.utcnow()),
+        candidates.c.status,
+        candidates.c.price,
+        candidates.c.vendor_name,
+        candidates.c.item_name,
+    ).where(
+        or_(candidates.c.item_limit.is_(None), candidates.c.item_count <= candidates.c.item_limit),
+        or_(candidates.c.vendor_limit.is_(None), candidates.c.vendor_count <= candidates.c.vendor_limit),
+    )
+    stmt = (
+        sqlite_insert(orders)
+        .from_select(
+            ["user_id", "vendor_id", "vendor_menu_item_id", "order_date", "created_at", "status",
+             "unit_price", "vendor_name", "item_name"],
+            rows,
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "order_date"])
+        .returning(orders.c.user_id, orders.c.order_date, orders.c.status)
+    )
+    created = [dict(row) for row in db.execute(stmt).mappings()]
+    dates = {order["order_date"] for order in created}
+    versions.bump_orders(db, {order["user_id"] for order in created}, dates)
+    db.commit()
+
+    for order in created:
+        metrics.order_writes.inc(status=order["status"])
+    for day in sorted(dates):
+        order_board.resync(db, day)
+    return created
@@ -3,6 +3,7 @@ import { api } from "../../lib/api";
 import { useAuth } from "../auth/AuthContext";
 import { useToast } from "../../components/Toast";
 import { Loading } from "../../components/Loading";
+import { useOrderStream, OrderStreamEvent } from "../../hooks/useOrderStream";
 
 interface OrderPerson {
     employee_id: string;
@@ -48,6 +49,42 @@ export const OrderAnnouncementView: React.FC = () => {
         }
     };
 
+    // 即時套用其他人的訂單異動，不需重新載入整份公告
+    const applyOrderEvent = (event: OrderStreamEvent) => {
+        setData((prev) => {
+            if (!prev) return prev;
+            const person = { employee_id: event.user.employee_id, name: event.user.name };
+            let items = prev.items.map((item) => ({
+                ...item,
+                orders: item.orders.filter((p) => p.employee_id !== person.employee_id),
+            }));
+            const itemId = event.order?.item_id;
+            if (itemId != null) {
+                const existing = items.find((item) => item.item_id === itemId);
+                const added = event.changes.find((c) => c.item_id === itemId && c.delta > 0);
+                if (existing) {
+                    existing.orders = [...existing.orders, person].sort((a, b) => a.employee_id.localeCompare(b.employee_id));
+                } else if (added && added.vendor_id != null) {
+                    items.push({
+                        vendor_id: added.vendor_id,
+                        vendor_name: added.vendor_name,
+                        vendor_color: added.vendor_color,
+                        item_id: itemId,
+                        item_name: added.item_name || "",
+                        item_description: added.item_description,
+                        orders: [person],
+                    });
+                }
+            }
+            items = items
+                .filter((item) => item.orders.length > 0)
+                .sort((a, b) => a.vendor_name.localeCompare(b.vendor_name) || a.item_name.localeCompare(b.item_name));
+            return { ...prev, items };
+        });
+    };
+
+    useOrderStream(selectedDate, token, { onReset: loadData, onOrder: applyOrderEvent });
+
     const handlePrint = () => {
         const printContent = printRef.current;
         if (!printContent) return;
@@ -1,8 +1,12 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { api } from "../../lib/api";
 import { useAuth } from "../auth/AuthContext";
 import { useToast } from "../../components/Toast";
 import { Loading } from "../../components/Loading";
+import { useOrderStream } from "../../hooks/useOrderStream";
+
+// 訂單異動後延遲重新載入，將截止前密集的異動合併為一次彙總
+const STATS_RELOAD_DELAY_MS = 2000;
 
 export const StatsView: React.FC = () => {
     const [stats, setStats] = useState<any>(null);
@@ -27,6 +31,28 @@ export const StatsView: React.FC = () => {
         }
     };
 
+    const reloadTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
+    const scheduleReload = () => {
+        if (reloadTimer.current) return;
+        reloadTimer.current = setTimeout(() => {
+            reloadTimer.current = null;
+            loadStats();
+        }, STATS_RELOAD_DELAY_MS);
+    };
+
+    // 切換日期或離開頁面時取消尚未執行的重新載入
+    useEffect(() => () => {
+        if (reloadTimer.current) clearTimeout(reloadTimer.current);
+        reloadTimer.current = null;
+    }, [selectedDate]);
+
+    useOrderStream(selectedDate, token, {
+        onReset: loadStats,
+        onOrder: (event) => {
+            if (event.changes.length > 0) scheduleReload();
+        },
+    });
+
     const handleDateChange = (e: React.ChangeEvent<HTMLInputElement>) => {
         setSelectedDate(e.target.value);
     };
@@ -45,6 +45,17 @@ interface AvailableVendor {
     menu_items: VendorMenuItem[];
 }
 
+interface BulkOutcome {
+    index: number;
+    user_id: number | null;
+    order_date: string;
+    outcome: "created" | "updated" | "cancelled" | "unchanged" | "superseded" | "rejected";
+    order_id: number | null;
+    reason: string | null;
+}
+
+type Selection = { is_cancel: true } | { vendor_id: number; item_id: number };
+
 export const UserOrderingSettings: React.FC = () => {
     const [date, setDate] = useState(getTodayString());
     const [orders, setOrders] = useState<OrderDetail[]>([]);
@@ -52,15 +63,19 @@ export const UserOrderingSettings: React.FC = () => {
     const { token } = useAuth();
     const { showToast } = useToast();
 
-    // Edit Modal State
-    const [editingUser, setEditingUser] = useState<OrderDetail | null>(null);
+    // Edit Modal State：編輯單一使用者或批次套用至勾選的使用者
+    const [editingUsers, setEditingUsers] = useState<OrderDetail[]>([]);
+    const [selectedIds, setSelectedIds] = useState<Set<number>>(new Set());
     const [availableVendors, setAvailableVendors] = useState<AvailableVendor[]>([]);
     const [loadingVendors, setLoadingVendors] = useState(false);
 
     useEffect(() => {
+        setSelectedIds(new Set());
         loadOrders();
     }, [date]);
 
+    const departments = Array.from(new Set(orders.map(o => o.department).filter(Boolean)));
+
     const loadOrders = async () => {
         try {
             setLoading(true);
@@ -73,8 +88,8 @@ export const UserOrderingSettings: React.FC = () => {
         }
     };
 
-    const handleEditClick = async (order: OrderDetail) => {
-        setEditingUser(order);
+    const openEditor = async (targets: OrderDetail[]) => {
+        setEditingUsers(targets);
         try {
             setLoadingVendors(true);
             const data = await api.get(`/vendors/available/${date}`, token!);
@@ -87,38 +102,38 @@ export const UserOrderingSettings: React.FC = () => {
     };
 
     const handleCloseModal = () => {
-        setEditingUser(null);
+        setEditingUsers([]);
         setAvailableVendors([]);
     };
 
-    const handleSelectNoOrder = async () => {
-        if (!editingUser) return;
-        try {
-            await api.put("/admin/orders/user_order", {
-                user_id: editingUser.user_id,
-                order_date: date,
-                is_cancel: true
-            }, token!);
-            showToast("已取消訂單", "success");
-            handleCloseModal();
-            loadOrders();
-        } catch (error: any) {
-            showToast(error.message || "操作失敗", "error");
-        }
+    const toggleSelected = (userId: number) => {
+        setSelectedIds(prev => {
+            const next = new Set(prev);
+            if (next.has(userId)) next.delete(userId);
+            else next.add(userId);
+            return next;
+        });
     };
 
-    const handleSelectItem = async (vendorId: number, itemId: number) => {
-        if (!editingUser) return;
+    const selectDepartment = (department: string) => {
+        setSelectedIds(new Set(orders.filter(o => o.department === department).map(o => o.user_id)));
+    };
+
+    // 所有變更以單一批次請求送出，伺服器在同一交易中寫入並回傳每一列的結果
+    const applySelection = async (selection: Selection) => {
+        if (editingUsers.length === 0) return;
         try {
-            await api.put("/admin/orders/user_order", {
-                user_id: editingUser.user_id,
-                order_date: date,
-                vendor_id: vendorId,
-                item_id: itemId,
-                is_cancel: false
+            const results: BulkOutcome[] = await api.put("/admin/orders/bulk", {
+                rows: editingUsers.map(user => ({ user_id: user.user_id, order_date: date, ...selection }))
             }, token!);
-            showToast("訂單已更新", "success");
+            const rejected = results.filter(r => r.outcome === "rejected");
+            if (rejected.length > 0) {
+                showToast(`${rejected.length} 筆未更新：${rejected[0].reason}`, "error");
+            } else {
+                showToast("is_cancel" in selection ? "已取消訂單" : "訂單已更新", "success");
+            }
             handleCloseModal();
+            setSelectedIds(new Set());
             loadOrders();
         } catch (error: any) {
             showToast(error.message || "操作失敗", "error");
@@ -130,6 +145,23 @@ export const UserOrderingSettings: React.FC = () => {
             <div className="flex justify-between items-center mb-6">
                 <h2 className="text-2xl font-bold">人員訂餐設定</h2>
                 <div className="flex items-center gap-2">
+                    <select
+                        className="p-2 border rounded"
+                        value=""
+                        onChange={(e) => e.target.value && selectDepartment(e.target.value)}
+                    >
+                        <option value="">選取部門...</option>
+                        {departments.map(dept => (
+                            <option key={dept} value={dept}>{dept}</option>
+                        ))}
+                    </select>
+                    <button
+                        onClick={() => openEditor(orders.filter(o => selectedIds.has(o.user_id)))}
+                        disabled={selectedIds.size === 0}
+                        className="px-3 py-2 bg-blue-600 text-white rounded hover:bg-blue-700 disabled:opacity-50"
+                    >
+                        批次設定（{selectedIds.size}）
+                    </button>
                     <label className="font-medium text-gray-700">選擇日期：</label>
                     <input
                         type="date"
@@ -147,6 +179,13 @@ export const UserOrderingSettings: React.FC = () => {
                     <table className="w-full">
                         <thead>
                             <tr className="bg-gray-100 border-b">
+                                <th className="p-3">
+                                    <input
+                                        type="checkbox"
+                                        checked={orders.length > 0 && selectedIds.size === orders.length}
+                                        onChange={(e) => setSelectedIds(e.target.checked ? new Set(orders.map(o => o.user_id)) : new Set())}
+                                    />
+                                </th>
                                 <th className="text-left p-3 font-semibold">工號</th>
                                 <th className="text-left p-3 font-semibold">姓名</th>
                                 <th className="text-left p-3 font-semibold">部門</th>
@@ -157,6 +196,13 @@ export const UserOrderingSettings: React.FC = () => {
                         <tbody>
                             {orders.map((order) => (
                                 <tr key={order.user_id} className="border-b hover:bg-gray-50">
+                                    <td className="p-3 text-center">
+                                        <input
+                                            type="checkbox"
+                                            checked={selectedIds.has(order.user_id)}
+                                            onChange={() => toggleSelected(order.user_id)}
+                                        />
+                                    </td>
                                     <td className="p-3 font-medium">{order.employee_id}</td>
                                     <td className="p-3">{order.name}</td>
                                     <td className="p-3">{order.department || "-"}</td>
@@ -176,7 +222,7 @@ export const UserOrderingSettings: React.FC = () => {
                                     </td>
                                     <td className="p-3 text-center">
                                         <button
-                                            onClick={() => handleEditClick(order)}
+                                            onClick={() => openEditor([order])}
                                             className="text-blue-600 hover:text-blue-800 font-medium"
                                         >
                                             編輯
@@ -190,12 +236,14 @@ export const UserOrderingSettings: React.FC = () => {
             )}
 
             {/* Edit Modal */}
-            {editingUser && (
+            {editingUsers.length > 0 && (
                 <div className="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50 p-4">
                     <div className="bg-white rounded-lg shadow-xl w-full max-w-2xl max-h-[90vh] overflow-y-auto">
                         <div className="p-4 border-b flex justify-between items-center sticky top-0 bg-white">
                             <h3 className="text-xl font-bold">
-                                編輯訂單 - {editingUser.name} ({editingUser.employee_id})
+                                {editingUsers.length === 1
+                                    ? `編輯訂單 - ${editingUsers[0].name} (${editingUsers[0].employee_id})`
+                                    : `批次設定 - ${editingUsers.length} 人`}
                             </h3>
                             <button
                                 onClick={handleCloseModal}
@@ -212,7 +260,7 @@ export const UserOrderingSettings: React.FC = () => {
                                 <div className="grid grid-cols-2 sm:grid-cols-3 gap-3">
                                     {/* No Order Button */}
                                     <button
-                                        onClick={handleSelectNoOrder}
+                                        onClick={() => applySelection({ is_cancel: true })}
                                         className="w-full text-left p-3 bg-gray-50 border border-gray-200 text-gray-600 rounded hover:bg-gray-100 transition-all shadow-sm flex flex-col justify-center min-h-[80px]"
                                     >
                                         <div className="font-bold text-center w-full">取消/未選</div>
@@ -222,7 +270,7 @@ export const UserOrderingSettings: React.FC = () => {
                                     {availableVendors.flatMap(v => v.menu_items.map(item => ({ vendor: v.vendor, item }))).map(({ vendor, item }) => (
                                         <button
                                             key={`${vendor.id}-${item.id}`}
-                                            onClick={() => handleSelectItem(vendor.id, item.id)}
+                                            onClick={() => applySelection({ vendor_id: vendor.id, item_id: item.id })}
                                             className="w-full text-left p-3 bg-white border text-gray-800 rounded hover:opacity-80 transition-all shadow-sm group flex flex-col justify-between min-h-[80px]"
                                             style={{ borderColor: vendor.color || '#BFDBFE', borderLeftWidth: '4px' }}
                                         >
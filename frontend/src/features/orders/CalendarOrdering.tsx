@@ -48,10 +48,6 @@ export const CalendarOrdering: React.FC = () => {
         loadExistingOrders();
     }, [currentMonth]);
 
-    useEffect(() => {
-        loadSpecialDays();
-    }, []);
-
     const getCalendarDays = () => {
         const year = currentMonth.getFullYear();
         const month = currentMonth.getMonth();
@@ -101,15 +97,47 @@ export const CalendarOrdering: React.FC = () => {
         return `${year}-${month}-${day}`;
     };
 
+    // 一次載入本月訂單、特殊日期與每日可訂品項
     const loadExistingOrders = async () => {
         try {
             setLoading(true);
-            const orders = await api.get("/orders/", token!);
+            const month = formatDate(currentMonth).slice(0, 7);
+            const data = await api.get(`/orders/calendar?month=${month}`, token!);
+
             const ordersMap: { [date: string]: any } = {};
-            orders.forEach((order: any) => {
+            data.orders.forEach((order: any) => {
                 ordersMap[order.order_date] = order;
             });
             setExistingOrders(ordersMap);
+
+            const daysMap: { [date: string]: boolean } = {};
+            data.special_days.forEach((d: any) => {
+                daysMap[d.date] = d.is_holiday;
+            });
+            setSpecialDays((prev) => ({ ...prev, ...daysMap }));
+
+            // 將去重後的廠商與品項還原成 /vendors/available/{date} 的格式
+            const vendorsById: { [id: number]: VendorWithMenu["vendor"] } = {};
+            data.vendors.forEach((v: any) => {
+                vendorsById[v.id] = v;
+            });
+            const itemsById: { [id: number]: any } = {};
+            data.menu_items.forEach((item: any) => {
+                itemsById[item.id] = item;
+            });
+            const vendorsMap: { [date: string]: VendorWithMenu[] } = {};
+            Object.entries(data.availability as { [date: string]: number[] }).forEach(([date, itemIds]) => {
+                const byVendor: { [vendorId: number]: VendorWithMenu } = {};
+                itemIds.forEach((itemId) => {
+                    const item = itemsById[itemId];
+                    if (!byVendor[item.vendor_id]) {
+                        byVendor[item.vendor_id] = { vendor: vendorsById[item.vendor_id], menu_items: [] };
+                    }
+                    byVendor[item.vendor_id].menu_items.push(item);
+                });
+                vendorsMap[date] = Object.values(byVendor);
+            });
+            setAvailableVendors((prev) => ({ ...prev, ...vendorsMap }));
         } catch (error) {
             showToast("載入訂單失敗", "error");
         } finally {
@@ -117,19 +145,6 @@ export const CalendarOrdering: React.FC = () => {
         }
     };
 
-    const loadSpecialDays = async () => {
-        try {
-            const days = await api.get("/orders/special_days", token!);
-            const map: { [date: string]: boolean } = {};
-            days.forEach((d: any) => {
-                map[d.date] = d.is_holiday;
-            });
-            setSpecialDays(map);
-        } catch (error) {
-            console.error("Failed to load special days");
-        }
-    };
-
     const loadVendorsForDate = async (date: string) => {
         if (availableVendors[date]) return;
 
@@ -688,8 +703,6 @@ export const CalendarOrdering: React.FC = () => {
             return;
         }
 
-        // Simple loop delete - in production a batch delete endpoint is better
-        // But for now we'll just find orders in range and delete them
         try {
             setLoading(true);
             const start = new Date(clearRange.start);
@@ -708,17 +721,13 @@ export const CalendarOrdering: React.FC = () => {
                 return;
             }
 
-            // Delete one by one (limitation of current API)
-            // TODO: Add batch delete API
-            let successCount = 0;
-            await Promise.all(ordersToDelete.map(async (order: any) => {
-                try {
-                    await api.delete(`/orders/${order.id}`, token!);
-                    successCount++;
-                } catch (e) {
-                    console.error(e);
-                }
-            }));
+            // 以區間同步一次刪除區間內所有可修改的訂單
+            const result = await api.put("/orders/range", {
+                start_date: clearRange.start,
+                end_date: clearRange.end,
+                selections: [],
+            }, token!);
+            const successCount = result.deleted.length;
 
             showToast(`已清除 ${successCount} 筆訂單`, "success");
             loadExistingOrders();
@@ -803,7 +812,12 @@ export const CalendarOrdering: React.FC = () => {
         try {
             setSubmitting(true);
             const result = await api.post("/orders/batch", { orders: ordersToCreate }, token!);
-            showToast(`成功儲存 ${result.length} 天的餐點`, "success");
+            if (result.rejected.length > 0) {
+                const reasons = result.rejected.map((r: any) => `${r.order_date}：${r.reason}`).join("；");
+                showToast(`成功儲存 ${result.created.length} 天，${result.rejected.length} 天未儲存（${reasons}）`, "info");
+            } else {
+                showToast(`成功儲存 ${result.created.length} 天的餐點`, "success");
+            }
             setSelections({});
             loadExistingOrders();
         } catch (error: any) {
@@ -263,11 +263,6 @@ export const LegacyCalendarOrdering: React.FC = () => {
             return;
         }
 
-        // 找出需要刪除的已存在訂單（未過期的）
-        const ordersToDelete = dayOrders
-            .filter(day => !day.isPast && day.existingOrder)
-            .map(day => day.existingOrder!.id);
-
         // 找出所有未過期的日期
         const datesToOrder = dayOrders
             .filter(day => !day.isPast)
@@ -281,12 +276,7 @@ export const LegacyCalendarOrdering: React.FC = () => {
         try {
             setSubmitting(true);
 
-            // 1. 先刪除已存在的訂單
-            if (ordersToDelete.length > 0) {
-                await Promise.all(ordersToDelete.map(id => api.delete(`/orders/${id}`, token!)));
-            }
-
-            // 2. 批次載入所有日期的可用廠商
+            // 1. 批次載入所有日期的可用廠商
             const vendorPromises = datesToOrder.map(async (dateStr) => {
                 try {
                     const vendors = await api.get(`/vendors/available/${dateStr}`, token!);
@@ -302,7 +292,7 @@ export const LegacyCalendarOrdering: React.FC = () => {
                 vendorMap[result.dateStr] = result.vendors;
             });
 
-            // 3. 根據描述匹配每個日期的品項，建立訂單
+            // 2. 根據描述匹配每個日期的品項，建立訂單
             const ordersToCreate: Array<{
                 order_date: string;
                 vendor_id: number;
@@ -365,16 +355,25 @@ export const LegacyCalendarOrdering: React.FC = () => {
                 return;
             }
 
-            const result = await api.post("/orders/batch", { orders: ordersToCreate }, token!);
+            // 3. 以區間同步一次取代本月未過期的訂單（同一交易內刪除、修改、新增）
+            const result = await api.put("/orders/range", {
+                start_date: datesToOrder[0],
+                end_date: datesToOrder[datesToOrder.length - 1],
+                selections: ordersToCreate,
+            }, token!);
             
-            let message = `成功訂餐 ${result.length} 天`;
-            if (ordersToDelete.length > 0) {
-                message += `（已取代 ${ordersToDelete.length} 筆原訂單）`;
+            let message = `成功訂餐 ${result.created.length + result.updated.length + result.unchanged} 天`;
+            const replaced = result.updated.length + result.deleted.length;
+            if (replaced > 0) {
+                message += `（已取代 ${replaced} 筆原訂單）`;
             }
             if (skipped > 0) {
                 message += `，${skipped} 天無匹配品項已跳過`;
             }
-            showToast(message, skipped > 0 ? "info" : "success");
+            if (result.rejected.length > 0) {
+                message += `，${result.rejected.length} 天無法訂餐`;
+            }
+            showToast(message, skipped > 0 || result.rejected.length > 0 ? "info" : "success");
             
             // 清除選擇並重新載入
             setDayOrders(prev => prev.map(day => ({ ...day, selectedMealIndex: undefined })));
@@ -405,9 +404,14 @@ export const LegacyCalendarOrdering: React.FC = () => {
         try {
             setCancellingAll(true);
             
-            await Promise.all(ordersToCancel.map(id => api.delete(`/orders/${id}`, token!)));
+            const futureDates = dayOrders.filter(day => !day.isPast).map(day => day.date);
+            const result = await api.put("/orders/range", {
+                start_date: futureDates[0],
+                end_date: futureDates[futureDates.length - 1],
+                selections: [],
+            }, token!);
             
-            showToast(`已取消 ${ordersToCancel.length} 筆訂單`, "success");
+            showToast(`已取消 ${result.deleted.length} 筆訂單`, result.rejected.length > 0 ? "info" : "success");
             loadExistingOrders();
         } catch (error: any) {
             showToast(error.message || "取消訂單失敗", "error");
@@ -458,7 +462,7 @@ export const LegacyCalendarOrdering: React.FC = () => {
         try {
             setSubmitting(true);
             const result = await api.post("/orders/batch", { orders: ordersToCreate }, token!);
-            showToast(`成功儲存 ${result.length} 天的餐點`, "success");
+            showToast(`成功儲存 ${result.created.length} 天的餐點`, result.rejected.length > 0 ? "info" : "success");
             // Clear selections and reload
             setDayOrders(prev => prev.map(day => ({ ...day, selectedMealIndex: undefined })));
             loadExistingOrders();
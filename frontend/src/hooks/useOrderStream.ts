@@ -0,0 +1,51 @@
+import { useEffect, useRef } from 'react';
+
+export interface OrderStreamChange {
+    delta: number;
+    item_id: number;
+    item_name: string | null;
+    item_description: string;
+    price: number;
+    vendor_id: number | null;
+    vendor_name: string;
+    vendor_color: string;
+}
+
+export interface OrderStreamEvent {
+    seq: number;
+    date: string;
+    user: { id: number; employee_id: string; name: string };
+    order: { item_id: number | null; status: string } | null;
+    changes: OrderStreamChange[];
+}
+
+interface Handlers {
+    /** 連線建立（含重新連線）或需要重新同步時呼叫，應重新載入完整資料 */
+    onReset: () => void;
+    /** 一位使用者的訂單異動 */
+    onOrder: (event: OrderStreamEvent) => void;
+}
+
+/**
+ * 訂閱 /api/admin/orders/stream 的即時訂單異動（Server-Sent Events）
+ * EventSource 無法設定 Authorization 標頭，token 以查詢參數傳遞
+ */
+export const useOrderStream = (date: string, token: string | null, handlers: Handlers) => {
+    const handlersRef = useRef(handlers);
+    handlersRef.current = handlers;
+
+    useEffect(() => {
+        if (!token || typeof EventSource === 'undefined') return;
+
+        const source = new EventSource(
+            `/api/admin/orders/stream?date=${encodeURIComponent(date)}&token=${encodeURIComponent(token)}`
+        );
+        source.addEventListener('ready', () => handlersRef.current.onReset());
+        source.addEventListener('resync', () => handlersRef.current.onReset());
+        source.addEventListener('order', (e) => {
+            handlersRef.current.onOrder(JSON.parse((e as MessageEvent).data));
+        });
+
+        return () => source.close();
+    }, [date, token]);
+};
@@ -1,14 +1,71 @@
 """
 VSCC-WebDiner 後端伺服器啟動腳本
-用於正確啟動 FastAPI 應用程式
+
+    python run.py                    # 正式環境：單一 worker
+    python run.py --workers 4        # 多個 worker（亦可設定環境變數 WEBDINER_WORKERS）
+    python run.py --reload           # 開發模式：程式碼變更時自動重新載入
+
+多 worker 時先在父程序套用 migration，再由 uvicorn 啟動各 worker；
+各 worker 於 lifespan 中預熱快取，完成後才開始接受連線。
+程序內的狀態（快取、訂餐看板、查詢統計設定）由各 worker 輪詢 data_versions 同步；
+指標寫入暫存目錄（WEBDINER_METRICS_DIR），由回應 /api/metrics 的 worker 合併。
 """
+import argparse
+import os
+import shutil
+import tempfile
+
 import uvicorn
 
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="啟動 WebDiner 後端")
+    parser.add_argument("--host", default=os.environ.get("WEBDINER_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("WEBDINER_PORT", "8200")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEBDINER_WORKERS", "1")),
+                        help="worker 程序數量（0 表示 CPU 核心數）")
+    parser.add_argument("--reload", action="store_true", help="開發模式（單一程序、自動重新載入）")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    if args.reload:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            reload=True,
+            reload_dirs=["app"],
+            log_level=args.log_level,
+        )
+        return
+
+    from app import migrations, order_lines
+    from app.database import engine
+
+    migrations.upgrade(engine, log=print)
+    order_lines.convert(engine, log=print)
+    engine.dispose()  # 不把父程序的連線帶進 worker
+
+    workers = args.workers or os.cpu_count()
+    metrics_dir = None
+    if workers > 1:
+        # 各 worker 繼承環境變數；每次啟動使用新的目錄，計數器如同單一程序重新啟動時歸零
+        metrics_dir = tempfile.mkdtemp(prefix="webdiner-metrics-")
+        os.environ["WEBDINER_METRICS_DIR"] = metrics_dir
+    try:
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            workers=workers,
+            log_level=args.log_level,
+            # SSE 連線不會自行結束，關閉時最多等待數秒
+            timeout_graceful_shutdown=5,
+        )
+    finally:
+        if metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
 if __name__ == "__main__":
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8200,
-        reload=True,
-        reload_dirs=["app"]
-    )
+    main()
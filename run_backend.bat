@@ -3,6 +3,6 @@ call .venv\Scripts\activate
 
 call pip install -r requirements.txt
 
-call python run.py
+call python run.py --reload
 
 
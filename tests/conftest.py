@@ -0,0 +1,85 @@
+"""
+測試共用的資料庫環境
+
+每個測試使用獨立的 SQLite 檔案資料庫（已套用 migration），測試期間應用程式的 get_db
+改為使用此資料庫，並在前後清除參考資料快取。各測試檔只需準備自己的資料：
+
+    @pytest.fixture
+    def env(database):
+        with database.SessionLocal() as db:
+            ...
+        return database.env(headers=database.headers("a001"), ...)
+"""
+
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import cache, migrations
+from app.database import get_db
+from app.main import app
+from app.routers.auth import create_access_token
+
+
+class Database:
+    """暫存的檔案型資料庫：多個執行緒各自取得連線，與正式環境相同地競爭寫入"""
+
+    def __init__(self, path: Path):
+        self.url = f"sqlite:///{path}"
+        self.engine = create_engine(self.url, connect_args={"check_same_thread": False, "timeout": 30})
+        migrations.upgrade(self.engine)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.client = TestClient(app)
+
+    def get_db(self):
+        session = self.SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    @staticmethod
+    def headers(employee_id: str) -> dict:
+        return {"Authorization": f"Bearer {create_access_token({'sub': employee_id})}"}
+
+    def env(self, **values) -> dict:
+        """測試檔的 env：engine、SessionLocal、client 加上各自的資料"""
+        return {"engine": self.engine, "SessionLocal": self.SessionLocal, "client": self.client, **values}
+
+
+@contextmanager
+def serving(path: Path):
+    """建立資料庫並讓應用程式的 get_db 指向它；結束時還原先前的覆寫"""
+    database = Database(path)
+    previous = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = database.get_db
+    cache.invalidate()
+    try:
+        yield database
+    finally:
+        if previous is None:
+            app.dependency_overrides.pop(get_db, None)
+        else:
+            app.dependency_overrides[get_db] = previous
+        cache.invalidate()
+        database.engine.dispose()
+
+
+@pytest.fixture
+def database(tmp_path):
+    with serving(tmp_path / "test.db") as database:
+        yield database
+
+
+@pytest.fixture(scope="module")
+def module_database(tmp_path_factory):
+    """同一測試檔共用的資料庫（資料只準備一次）"""
+    with serving(tmp_path_factory.mktemp("db") / "test.db") as database:
+        yield database
@@ -0,0 +1,30 @@
+"""
+SQL 查詢數預算檢查
+
+    with query_budget(engine, 3, "GET /api/orders/"):
+        client.get("/api/orders/", headers=headers)
+
+區塊內透過 engine 執行的 SQL 語句超過預算時，以 AssertionError 列出所有語句。
+"""
+
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+@contextmanager
+def query_budget(engine, budget: int, label: str = ""):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    if len(statements) > budget:
+        listing = "\n".join(f"  {i + 1}. {' '.join(s.split())}" for i, s in enumerate(statements))
+        raise AssertionError(f"{label} issued {len(statements)} queries, budget is {budget}:\n{listing}")
@@ -0,0 +1,144 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import func, inspect
+
+from app import archive, models
+from query_budget import query_budget
+
+TODAY = date.today()
+# 跨年的兩個舊日期與一個近期日期
+OLD_DAYS = [date(TODAY.year - 2, 12, 30), date(TODAY.year - 1, 1, 3)]
+RECENT_DAY = TODAY + timedelta(days=7)
+
+
+@pytest.fixture
+def env(database):
+    with database.SessionLocal() as db:
+        admin = models.User(employee_id="a001", name="Admin", hashed_password="x", is_active=True,
+                            is_admin=True, role="admin")
+        users = [models.User(employee_id=f"u{n:03d}", name=f"User {n}", hashed_password="x", is_active=True)
+                 for n in range(1, 4)]
+        vendor = models.Vendor(name="Vendor", description="", is_active=True)
+        db.add_all([admin, vendor, *users])
+        db.flush()
+        item = models.VendorMenuItem(vendor_id=vendor.id, name="便當", description="", price=100,
+                                     weekday=None, is_active=True)
+        db.add(item)
+        db.flush()
+        for day in OLD_DAYS + [RECENT_DAY]:
+            for user in users:
+                db.add(models.Order(user_id=user.id, vendor_id=vendor.id, vendor_menu_item_id=item.id,
+                                    order_date=day, created_at=datetime.utcnow(), status="Confirmed"))
+        db.commit()
+        ids = {"user_id": users[0].id, "vendor": vendor.id, "item": item.id}
+
+    return database.env(admin=database.headers("a001"), user=database.headers("u001"), **ids)
+
+
+def reports(env, day):
+    client, headers = env["client"], env["admin"]
+    return [
+        client.get(path, params={"date": str(day)}, headers=headers).json()
+        for path in ("/api/admin/stats", "/api/admin/orders/daily_details", "/api/admin/order_announcement")
+    ]
+
+
+def hot_dates(env):
+    with env["SessionLocal"]() as db:
+        return sorted({day for (day,) in db.query(models.Order.order_date).all()})
+
+
+def test_archive_moves_old_days_and_reports_union_them(env):
+    before = {day: reports(env, day) for day in OLD_DAYS}
+    month = OLD_DAYS[0].strftime("%Y-%m")
+    calendar_before = env["client"].get("/api/orders/calendar", params={"month": month}, headers=env["user"]).json()
+
+    result = archive.run(env["engine"], horizon_days=60, grace=0, pause=0)
+
+    assert result["days"] == 2 and result["orders"] == 6
+    assert hot_dates(env) == [RECENT_DAY]
+    tables = set(inspect(env["engine"]).get_table_names())
+    assert {f"orders_archive_{TODAY.year - 2}", f"orders_archive_{TODAY.year - 1}"} <= tables
+    for day in OLD_DAYS:
+        assert reports(env, day) == before[day]
+        assert reports(env, day)[0]["total_orders"] == 3
+    calendar_after = env["client"].get("/api/orders/calendar", params={"month": month}, headers=env["user"]).json()
+    assert calendar_after["orders"] == calendar_before["orders"]
+    assert len(calendar_after["orders"]) == 1
+    # 個人訂單列表仍包含已封存的日期
+    own = env["client"].get("/api/orders/", headers=env["user"]).json()
+    assert sorted(order["order_date"] for order in own) == [str(day) for day in OLD_DAYS + [RECENT_DAY]]
+
+
+def test_archived_orders_are_not_reported_as_deleted(env):
+    client, headers = env["client"], env["user"]
+    cursor = client.get("/api/changes", params={"since": 0}, headers=headers).json()["cursor"]
+
+    archive.run(env["engine"], horizon_days=60, grace=0, pause=0)
+
+    response = client.get("/api/changes", params={"since": cursor}, headers=headers).json()
+    assert response["reset"] is False
+    assert response["changes"]["orders"] == {"upserts": [], "deletes": []}
+    assert response["cursor"] == cursor
+
+
+def test_archive_is_resumable(env):
+    first = archive.run(env["engine"], horizon_days=60, grace=0, pause=0, max_days=1)
+    assert first["days"] == 1
+    assert hot_dates(env) == [OLD_DAYS[1], RECENT_DAY]
+
+    second = archive.run(env["engine"], horizon_days=60, grace=0, pause=0)
+    assert second["days"] == 1
+    assert hot_dates(env) == [RECENT_DAY]
+    with env["SessionLocal"]() as db:
+        state = db.get(models.OrderArchiveState, 1)
+        assert state.archived_through == OLD_DAYS[1]
+        table = archive.archive_table(OLD_DAYS[1].year)
+        assert db.query(func.count()).select_from(table).scalar() == 3
+
+
+def test_only_reports_for_archived_dates_read_the_archive(env):
+    archive.run(env["engine"], horizon_days=60, grace=0, pause=0)
+    with query_budget(env["engine"], 100) as statements:
+        reports(env, RECENT_DAY)
+    assert not any("orders_archive" in statement for statement in statements)
+    with query_budget(env["engine"], 100) as statements:
+        reports(env, OLD_DAYS[0])
+    assert any("orders_archive" in statement for statement in statements)
+
+
+def test_archived_dates_are_read_only(env):
+    archive.run(env["engine"], horizon_days=60, grace=0, pause=0)
+    response = env["client"].put("/api/admin/orders/user_order", headers=env["admin"], json={
+        "user_id": env["user_id"], "order_date": str(OLD_DAYS[0]),
+        "vendor_id": env["vendor"], "item_id": env["item"],
+    })
+    assert response.status_code == 400
+    assert response.json()["detail"] == "該日期的訂單已封存，無法修改"
+
+
+def test_horizon_must_keep_recent_orders_hot(env):
+    with pytest.raises(ValueError):
+        archive.run(env["engine"], horizon_days=archive.MIN_HORIZON_DAYS - 1, grace=0, pause=0)
+
+
+def test_archive_job_horizon_is_configurable(env, monkeypatch):
+    from app import jobs
+
+    now = datetime.combine(TODAY, datetime.min.time())
+    monkeypatch.setenv("WEBDINER_ARCHIVE_HORIZON_DAYS", "0")
+    assert jobs.archive_orders(env["engine"], now) == {"skipped": "disabled"}
+    assert hot_dates(env) == OLD_DAYS + [RECENT_DAY]
+
+    # 未設定時沿用上次封存記錄的天數
+    archive.run(env["engine"], horizon_days=(TODAY - OLD_DAYS[0]).days - 1, grace=0, pause=0)
+    assert hot_dates(env) == OLD_DAYS[1:] + [RECENT_DAY]
+    monkeypatch.delenv("WEBDINER_ARCHIVE_HORIZON_DAYS")
+    monkeypatch.setattr(archive, "run", lambda engine, horizon_days, **kwargs: {"horizon_days": horizon_days})
+    assert jobs.archive_orders(env["engine"], now) == {"horizon_days": (TODAY - OLD_DAYS[0]).days - 1}
@@ -0,0 +1,132 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+import csv
+import io
+import zipfile
+from datetime import date, timedelta
+
+import pytest
+
+from app import models
+from query_budget import query_budget
+
+THIS_MONTH = date.today().replace(day=1)
+LAST_MONTH = (THIS_MONTH - timedelta(days=1)).replace(day=1)
+
+
+@pytest.fixture
+def env(database):
+    with database.SessionLocal() as db:
+        sales, it = models.Department(name="業務部", display_order=1), models.Department(name="資訊部", display_order=0)
+        db.add_all([sales, it])
+        db.flush()
+        admin = models.User(employee_id="a001", name="Admin", hashed_password="x", is_active=True,
+                            is_admin=True, role="admin")
+        alice = models.User(employee_id="u001", name="Alice", hashed_password="x", is_active=True,
+                            department_id=sales.id)
+        bob = models.User(employee_id="u002", name="Bob", hashed_password="x", is_active=True,
+                          department_id=it.id)
+        noodles, rice = models.Vendor(name="麵店", description=""), models.Vendor(name="飯館", description="")
+        db.add_all([admin, alice, bob, noodles, rice])
+        db.flush()
+        noodle = models.VendorMenuItem(vendor_id=noodles.id, name="牛肉麵", description="", price=120)
+        bento = models.VendorMenuItem(vendor_id=rice.id, name="雞腿飯", description="", price=100)
+        db.add_all([noodle, bento])
+        db.flush()
+
+        def order(user, item, day):
+            db.add(models.Order(user_id=user.id, vendor_id=item.vendor_id, vendor_menu_item_id=item.id,
+                                order_date=day, status="Confirmed", unit_price=item.price,
+                                vendor_name=item.vendor.name, item_name=item.name))
+
+        order(alice, noodle, LAST_MONTH)
+        order(alice, bento, LAST_MONTH + timedelta(days=1))
+        order(alice, bento, LAST_MONTH + timedelta(days=2))
+        order(bob, noodle, LAST_MONTH)
+        db.add(models.Order(user_id=bob.id, order_date=LAST_MONTH + timedelta(days=1), status="NoOrder"))
+        order(bob, bento, THIS_MONTH)
+        db.commit()
+        ids = {"alice": alice.id, "bob": bob.id, "rice": rice.id, "bento": bento.id, "noodles": noodles.id,
+               "noodle": noodle.id}
+
+    return database.env(headers=database.headers("a001"), **ids)
+
+
+def billing(env, month=LAST_MONTH, **params):
+    return env["client"].get("/api/admin/reports/billing", headers=env["headers"],
+                             params={"month": month.strftime("%Y-%m"), **params})
+
+
+def test_billing_totals_per_user_and_department(env):
+    report = billing(env).json()
+    assert report["closed"] is True
+    assert (report["count"], report["amount"]) == (4, 440)
+    assert [(v["vendor_name"], v["count"], v["amount"]) for v in report["vendors"]] == [("飯館", 2, 200), ("麵店", 2, 240)]
+    # 部門依 display_order 排序
+    assert [(d["department_name"], d["count"], d["amount"]) for d in report["departments"]] == [
+        ("資訊部", 1, 120), ("業務部", 3, 320)]
+    alice = next(u for u in report["users"] if u["employee_id"] == "u001")
+    assert [(v["vendor_name"], v["count"], v["amount"]) for v in alice["vendors"]] == [("飯館", 2, 200), ("麵店", 1, 120)]
+
+    current = billing(env, THIS_MONTH).json()
+    assert current["closed"] is False
+    assert (current["count"], current["amount"]) == (1, 100)
+
+
+def test_closed_month_is_cached_until_an_admin_edits_it(env):
+    assert billing(env).json()["amount"] == 440
+    with query_budget(env["engine"], 2) as statements:
+        assert billing(env).json()["amount"] == 440
+    # 只剩驗證使用者與版本比對
+    assert not any("GROUP BY" in statement for statement in statements)
+
+    response = env["client"].put("/api/admin/orders/user_order", headers=env["headers"], json={
+        "user_id": env["bob"], "order_date": str(LAST_MONTH + timedelta(days=1)),
+        "vendor_id": env["rice"], "item_id": env["bento"],
+    })
+    assert response.status_code == 200
+    assert billing(env).json()["amount"] == 540
+
+
+def test_billing_exports_stream_csv_and_xlsx(env):
+    response = billing(env, format="csv")
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "billing-" in response.headers["content-disposition"]
+    rows = list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert rows[0] == ["部門", "工號", "姓名", "廠商", "份數", "金額"]
+    assert rows[-1] == ["合計", "", "", "", "4", "440"]
+
+    response = billing(env, format="xlsx")
+    with zipfile.ZipFile(io.BytesIO(response.content)) as workbook:
+        assert workbook.testzip() is None
+        sheet = workbook.read("xl/worksheets/sheet2.xml").decode()
+        assert "資訊部" in sheet and "<v>440</v>" in sheet
+        assert "人員" in workbook.read("xl/workbook.xml").decode()
+
+    assert billing(env, format="pdf").status_code == 400
+    assert env["client"].get("/api/admin/reports/billing", headers=env["headers"],
+                             params={"month": "2024-13"}).status_code == 400
+
+
+def test_streamed_exports_are_compressed_incrementally(env):
+    response = env["client"].get("/api/admin/reports/billing", params={
+        "month": LAST_MONTH.strftime("%Y-%m"), "format": "csv",
+    }, headers={**env["headers"], "Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content.decode("utf-8-sig").splitlines()[-1] == "合計,,,,4,440"
+
+
+def test_price_changes_do_not_rewrite_history(env):
+    client, headers = env["client"], env["headers"]
+    response = client.put(f"/api/vendors/{env['noodles']}/menu/{env['noodle']}", headers=headers,
+                          json={"vendor_id": env["noodles"], "name": "紅燒牛肉麵", "price": 150})
+    assert response.status_code == 200
+
+    assert billing(env).json()["amount"] == 440
+    stats = client.get("/api/admin/stats", headers=headers, params={"date": str(LAST_MONTH)}).json()
+    assert stats["total_price"] == 240
+    assert [item["name"] for vendor in stats["vendors"] for item in vendor["items"]] == ["牛肉麵"]
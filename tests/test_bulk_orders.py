@@ -0,0 +1,129 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from app import daily_snapshot, models
+from app.routers.auth import create_access_token
+from query_budget import query_budget
+
+PAST_DAY = date.today() - timedelta(days=1)
+FRIDAY = date.today() + timedelta(days=7 + (4 - date.today().weekday()) % 7)
+
+
+@pytest.fixture
+def env(database):
+    with database.SessionLocal() as db:
+        sales, finance = models.Department(name="業務部"), models.Department(name="財務部")
+        db.add_all([sales, finance])
+        db.flush()
+        admin = models.User(employee_id="a001", name="Admin", hashed_password="x", is_active=True,
+                            is_admin=True, role="admin", department_id=finance.id)
+        users = [models.User(employee_id=f"u{n:03d}", name=f"User {n}", hashed_password="x", is_active=n != 4,
+                             department_id=sales.id) for n in range(1, 5)]
+        vendor = models.Vendor(name="便當店", description="")
+        db.add_all([admin, vendor, *users])
+        db.flush()
+        chicken = models.VendorMenuItem(vendor_id=vendor.id, name="雞腿飯", description="", price=100)
+        pork = models.VendorMenuItem(vendor_id=vendor.id, name="排骨飯", description="", price=90)
+        db.add_all([chicken, pork])
+        db.flush()
+        for day in (PAST_DAY, FRIDAY):
+            db.add(models.Order(user_id=users[0].id, vendor_id=vendor.id, vendor_menu_item_id=pork.id,
+                                order_date=day, status="Pending", unit_price=90, vendor_name="便當店", item_name="排骨飯"))
+        db.add(models.Order(user_id=users[1].id, order_date=FRIDAY, status="NoOrder"))
+        db.commit()
+        ids = {"users": [u.id for u in users], "admin": admin.id, "sales": sales.id, "vendor": vendor.id,
+               "chicken": chicken.id, "pork": pork.id}
+
+    return database.env(headers=database.headers("a001"), **ids)
+
+
+def bulk(env, *rows):
+    return env["client"].put("/api/admin/orders/bulk", headers=env["headers"], json={"rows": list(rows)})
+
+
+def orders(env, day):
+    with env["SessionLocal"]() as db:
+        return {order.user_id: (order.status, order.item_name, order.unit_price)
+                for order in db.query(models.Order).filter(models.Order.order_date == day)}
+
+
+def test_department_rows_expand_and_later_rows_win(env):
+    users = env["users"]
+    chicken = {"vendor_id": env["vendor"], "item_id": env["chicken"]}
+    with query_budget(env["engine"], 12) as statements:
+        response = bulk(
+            env,
+            {"department_id": env["sales"], "order_date": str(FRIDAY), **chicken},
+            {"user_id": users[2], "order_date": str(FRIDAY), "is_cancel": True},
+            {"user_id": 999, "order_date": str(FRIDAY), **chicken},
+            {"user_id": users[0], "order_date": str(FRIDAY), "vendor_id": env["vendor"], "item_id": 999},
+        )
+    assert response.status_code == 200
+    assert sum(statement.lstrip().startswith("INSERT INTO orders") for statement in statements) == 1
+
+    outcomes = [(r["index"], r["user_id"], r["outcome"], r.get("reason")) for r in response.json()]
+    # 停用的 u004 不在部門展開內
+    assert outcomes == [
+        (0, users[0], "updated", None),
+        (0, users[1], "updated", None),
+        (0, users[2], "superseded", None),
+        (1, users[2], "unchanged", None),
+        (2, 999, "rejected", "找不到使用者"),
+        (3, users[0], "rejected", "找不到餐點品項"),
+    ]
+    # 既有的 Pending 保留狀態，不訂餐改為 Confirmed
+    assert orders(env, FRIDAY) == {
+        users[0]: ("Pending", "雞腿飯", 100),
+        users[1]: ("Confirmed", "雞腿飯", 100),
+    }
+
+    response = bulk(env, {"department_id": env["sales"], "order_date": str(FRIDAY), "is_cancel": True},
+                    {"user_id": users[2], "order_date": str(FRIDAY), **chicken})
+    assert [(r["user_id"], r["outcome"]) for r in response.json()] == [
+        (users[0], "cancelled"), (users[1], "cancelled"), (users[2], "superseded"), (users[2], "created")]
+    assert orders(env, FRIDAY) == {users[2]: ("Confirmed", "雞腿飯", 100)}
+
+
+def test_single_update_confirms_no_order_like_bulk(env):
+    users = env["users"]
+    response = env["client"].put("/api/admin/orders/user_order", headers=env["headers"], json={
+        "user_id": users[1], "order_date": str(FRIDAY), "vendor_id": env["vendor"], "item_id": env["chicken"]})
+    assert response.status_code == 200
+    assert orders(env, FRIDAY)[users[1]] == ("Confirmed", "雞腿飯", 100)
+
+
+def test_frozen_days_patch_the_snapshot(env):
+    client, headers = env["client"], env["headers"]
+    with env["SessionLocal"]() as db:
+        daily_snapshot.freeze(db, PAST_DAY)
+    users = env["users"]
+    response = bulk(
+        env,
+        {"user_id": users[0], "order_date": str(PAST_DAY), "is_cancel": True},
+        {"user_id": users[1], "order_date": str(PAST_DAY), "vendor_id": env["vendor"], "item_id": env["chicken"]},
+        {"user_id": users[2], "order_date": str(PAST_DAY), "vendor_id": env["vendor"], "item_id": env["pork"]},
+    )
+    assert [r["outcome"] for r in response.json()] == ["cancelled", "created", "created"]
+
+    with env["SessionLocal"]() as db:
+        patched = json.loads(db.get(models.DailySnapshot, PAST_DAY).payload)
+        rebuilt = daily_snapshot.build(db, PAST_DAY)
+    assert patched["orders"] == rebuilt["orders"]
+    assert patched["vendors"] == rebuilt["vendors"]
+    stats = client.get("/api/admin/stats", params={"date": str(PAST_DAY)}, headers=headers).json()
+    assert (stats["total_orders"], stats["total_price"]) == (2, 190)
+
+
+def test_requires_admin(env):
+    token = create_access_token({"sub": "u001"})
+    response = env["client"].put("/api/admin/orders/bulk", headers={"Authorization": f"Bearer {token}"},
+                                 json={"rows": []})
+    assert response.status_code == 403
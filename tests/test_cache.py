@@ -0,0 +1,172 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+import os
+import socket
+import subprocess
+import threading
+import time
+
+import pytest
+
+from app import cache, models
+from app.routers.auth import get_password_hash
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 另一個 worker：以自己的快取讀取廠商名稱與使用者角色
+WORKER = """
+import json, sys
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app import cache
+
+engine = create_engine(sys.argv[1])
+if sys.argv[2]:
+    cache.configure(sys.argv[2])
+cache.start_polling(engine, interval=0.05)
+print(json.dumps("ready"), flush=True)
+for line in sys.stdin:
+    command, _, arg = line.strip().partition(" ")
+    with Session(engine) as db:
+        if command == "vendor":
+            result = cache.get_catalog(db).vendors[int(arg)].name
+        else:
+            result = cache.get_principal(db, arg)["role"]
+    print(json.dumps(result), flush=True)
+"""
+
+
+@pytest.fixture
+def env(database):
+    with database.SessionLocal() as db:
+        admin = models.User(employee_id="a001", name="Admin", hashed_password=get_password_hash("password123"),
+                            is_active=True, is_admin=True, role="sysadmin")
+        user = models.User(employee_id="u001", name="User", hashed_password="x", is_active=True, role="user")
+        vendor = models.Vendor(name="Vendor", description="", is_active=True)
+        db.add_all([admin, user, vendor])
+        db.commit()
+        ids = {"user": user.id, "vendor": vendor.id}
+
+    yield database.env(url=database.url, headers=database.headers("a001"), **ids)
+    # 測試可能改用 Redis 後端
+    cache.configure("")
+
+
+class Worker:
+    def __init__(self, database_url: str, cache_url: str = ""):
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", WORKER, database_url, cache_url],
+            cwd=ROOT, env={**os.environ, "PYTHONPATH": str(ROOT)},
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        assert self.read() == "ready"
+
+    def read(self):
+        return json.loads(self.process.stdout.readline())
+
+    def ask(self, command: str):
+        self.process.stdin.write(command + "\n")
+        self.process.stdin.flush()
+        return self.read()
+
+    def eventually(self, command: str, expected, timeout: float = 5.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            value = self.ask(command)
+            if value == expected or time.monotonic() > deadline:
+                return value
+            time.sleep(0.02)
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait(timeout=10)
+
+
+def write_through_api(env):
+    client, headers = env["client"], env["headers"]
+    response = client.put(f"/api/vendors/{env['vendor']}", headers=headers,
+                          json={"name": "Renamed", "description": "", "color": "#000000", "is_active": True})
+    assert response.status_code == 200
+    response = client.put(f"/api/admin/users/{env['user']}", headers=headers, json={"role": "admin"})
+    assert response.status_code == 200
+
+
+def test_local_backend_drops_loads_that_raced_an_invalidation():
+    backend = cache.LocalBackend(max_entries=2)
+    _, token = backend.lookup("catalog", None)
+    backend.invalidate(["catalog"])
+    backend.store("catalog", None, "stale", token)
+    assert backend.lookup("catalog", None)[0] is cache._MISSING
+
+    for key in ("a", "b", "c"):
+        backend.store("principals", key, key, backend.lookup("principals", key)[1])
+    # LRU：最舊的項目被淘汰
+    assert backend.lookup("principals", "a")[0] is cache._MISSING
+    assert backend.lookup("principals", "c")[0] == "c"
+
+
+def test_polling_invalidates_other_processes(env):
+    worker = Worker(env["url"])
+    try:
+        assert worker.ask(f"vendor {env['vendor']}") == "Vendor"
+        assert worker.ask("role u001") == "user"
+
+        write_through_api(env)
+
+        assert worker.eventually(f"vendor {env['vendor']}", "Renamed") == "Renamed"
+        assert worker.eventually("role u001", "admin") == "admin"
+    finally:
+        worker.close()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_redis_backend_is_shared_between_processes(env):
+    pytest.importorskip("redis")
+    fakeredis = pytest.importorskip("fakeredis")
+    port = _free_port()
+    server = fakeredis.TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    redis_url = f"redis://127.0.0.1:{port}/0"
+    try:
+        cache.configure(redis_url)
+        cache.invalidate()
+        worker = Worker(env["url"], redis_url)
+        try:
+            assert worker.ask(f"vendor {env['vendor']}") == "Vendor"
+            assert worker.ask("role u001") == "user"
+
+            write_through_api(env)
+
+            # 失效經由 Redis 共用，不需等待輪詢
+            assert worker.ask(f"vendor {env['vendor']}") == "Renamed"
+            assert worker.ask("role u001") == "admin"
+        finally:
+            worker.close()
+    finally:
+        cache.configure("")
+        server.shutdown()
+        server.server_close()
+
+
+def test_cached_principal_can_be_updated(env):
+    client, headers = env["client"], env["headers"]
+    assert client.get("/api/auth/me", headers=headers).json()["employee_id"] == "a001"
+    with env["SessionLocal"]() as db:
+        assert "hashed_password" not in cache.get_principal(db, "a001")
+    wrong = client.post("/api/auth/change-password", headers=headers,
+                        json={"old_password": "wrong", "new_password": "password456"})
+    assert wrong.status_code == 400
+    response = client.post("/api/auth/change-password", headers=headers,
+                           json={"old_password": "password123", "new_password": "password456"})
+    assert response.status_code == 200
+    login = client.post("/api/auth/login", data={"username": "a001", "password": "password456"})
+    assert login.status_code == 200
@@ -0,0 +1,149 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from datetime import date, timedelta
+
+import pytest
+
+from app import models, weekly_plans
+from query_budget import query_budget
+
+MONDAY, _ = weekly_plans.next_week(date.today())
+TUESDAY = MONDAY + timedelta(days=1)
+
+
+@pytest.fixture
+def env(database):
+    with database.SessionLocal() as db:
+        admin = models.User(employee_id="a001", name="Admin", hashed_password="x", is_active=True,
+                            is_admin=True, role="admin")
+        users = [models.User(employee_id=f"u{n:03d}", name=f"User {n}", hashed_password="x", is_active=True)
+                 for n in range(1, 5)]
+        vendor = models.Vendor(name="便當店", description="", daily_limit=3)
+        other = models.Vendor(name="麵店", description="")
+        db.add_all([admin, vendor, other, *users])
+        db.flush()
+        chicken = models.VendorMenuItem(vendor_id=vendor.id, name="雞腿飯", description="", price=100, daily_limit=2)
+        pork = models.VendorMenuItem(vendor_id=vendor.id, name="排骨飯", description="", price=90)
+        noodle = models.VendorMenuItem(vendor_id=other.id, name="牛肉麵", description="", price=120)
+        db.add_all([chicken, pork, noodle])
+        db.commit()
+        ids = {"users": [u.id for u in users], "vendor": vendor.id, "other": other.id,
+               "chicken": chicken.id, "pork": pork.id, "noodle": noodle.id}
+
+    return database.env(
+        users_headers=[database.headers(f"u{n:03d}") for n in range(1, 5)],
+        admin=database.headers("a001"),
+        **ids,
+    )
+
+
+def order(env, user, item, day=MONDAY, vendor=None):
+    return env["client"].post("/api/orders/", headers=env["users_headers"][user], json={
+        "order_date": str(day), "vendor_id": vendor or env["vendor"], "vendor_menu_item_id": item})
+
+
+def counters(env, day=MONDAY):
+    with env["SessionLocal"]() as db:
+        return {(row.scope, row.ref_id): row.used
+                for row in db.query(models.OrderCapacity).filter(models.OrderCapacity.order_date == day)}
+
+
+def test_item_and_vendor_limits_are_enforced_by_the_insert(env):
+    assert order(env, 0, env["chicken"]).status_code == 200
+    assert order(env, 1, env["chicken"]).status_code == 200
+    with query_budget(env["engine"], 10) as statements:
+        response = order(env, 2, env["chicken"])
+    assert (response.status_code, response.json()["detail"]) == (409, "此餐點品項當日已達供應上限")
+    assert not any("count(" in statement.lower() for statement in statements)
+
+    # 廠商上限 3：第三份排骨飯可訂，第四份不行
+    assert order(env, 2, env["pork"]).status_code == 200
+    response = order(env, 3, env["pork"])
+    assert (response.status_code, response.json()["detail"]) == (409, "此廠商當日已達供應上限")
+    assert counters(env) == {("item", env["chicken"]): 2, ("item", env["pork"]): 1, ("vendor", env["vendor"]): 3}
+
+    # 取消後釋出名額；改訂其他廠商時原廠商減一
+    with env["SessionLocal"]() as db:
+        first = db.query(models.Order).filter(models.Order.user_id == env["users"][0]).one()
+    env["client"].delete(f"/api/orders/{first.id}", headers=env["users_headers"][0])
+    assert order(env, 3, env["chicken"]).status_code == 200
+    with env["SessionLocal"]() as db:
+        pork_order = db.query(models.Order).filter(models.Order.user_id == env["users"][2]).one()
+    response = env["client"].patch(f"/api/orders/{pork_order.id}", headers=env["users_headers"][2], json={
+        "vendor_id": env["other"], "vendor_menu_item_id": env["noodle"]})
+    assert response.status_code == 200
+    assert counters(env)[("vendor", env["vendor"])] == 2
+
+    # 改訂已額滿的品項
+    response = env["client"].patch(f"/api/orders/{pork_order.id}", headers=env["users_headers"][2], json={
+        "vendor_id": env["vendor"], "vendor_menu_item_id": env["chicken"]})
+    assert response.status_code == 409
+
+
+def test_availability_reports_remaining_without_per_item_queries(env):
+    order(env, 0, env["chicken"])
+    client, headers = env["client"], env["users_headers"][1]
+    with query_budget(env["engine"], 10) as statements:
+        vendors = client.get(f"/api/vendors/available/{MONDAY}", headers=headers).json()
+    assert sum("FROM order_capacity" in statement for statement in statements) == 1
+    remaining = {item["name"]: item["remaining"] for vendor in vendors for item in vendor["menu_items"]}
+    assert remaining == {"雞腿飯": 1, "排骨飯": 2, "牛肉麵": None}
+    assert [vendor["vendor"]["remaining"] for vendor in vendors] == [2, None]
+
+    month = client.get("/api/orders/calendar", headers=headers, params={"month": MONDAY.strftime("%Y-%m")})
+    assert month.json()["remaining"][str(MONDAY)] == {str(env["chicken"]): 1, str(env["pork"]): 2}
+
+    # 其他人訂餐後月曆的 ETag 失效
+    etag = month.headers["etag"]
+    order(env, 2, env["chicken"])
+    response = client.get("/api/orders/calendar", headers={**headers, "If-None-Match": etag},
+                          params={"month": MONDAY.strftime("%Y-%m")})
+    assert response.json()["remaining"][str(MONDAY)][str(env["chicken"])] == 0
+
+
+def test_batch_and_bulk_reject_rows_over_the_limit(env):
+    response = env["client"].post("/api/orders/batch", headers=env["users_headers"][0], json={"orders": [
+        {"order_date": str(day), "vendor_id": env["vendor"], "vendor_menu_item_id": env["chicken"]}
+        for day in (MONDAY, TUESDAY)]})
+    assert len(response.json()["created"]) == 2
+
+    response = env["client"].put("/api/admin/orders/bulk", headers=env["admin"], json={"rows": [
+        {"user_id": user_id, "order_date": str(MONDAY), "vendor_id": env["vendor"], "item_id": env["chicken"]}
+        for user_id in env["users"]]})
+    assert [(row["outcome"], row.get("reason")) for row in response.json()] == [
+        ("unchanged", None), ("created", None), ("rejected", "此餐點品項當日已達供應上限"),
+        ("rejected", "此餐點品項當日已達供應上限")]
+    assert counters(env)[("item", env["chicken"])] == 2
+
+
+def test_bulk_rows_can_use_slots_cancelled_in_the_same_batch(env):
+    users = env["users"]
+    assert order(env, 0, env["chicken"]).status_code == 200
+    assert order(env, 1, env["chicken"]).status_code == 200
+
+    # 取消列在後，仍可把已額滿的品項讓給前面的列
+    response = env["client"].put("/api/admin/orders/bulk", headers=env["admin"], json={"rows": [
+        {"user_id": users[2], "order_date": str(MONDAY), "vendor_id": env["vendor"], "item_id": env["chicken"]},
+        {"user_id": users[0], "order_date": str(MONDAY), "is_cancel": True},
+    ]})
+    assert [row["outcome"] for row in response.json()] == ["created", "cancelled"]
+    assert counters(env)[("item", env["chicken"])] == 2
+
+
+def test_weekly_plans_fill_up_to_the_limit(env):
+    for user in range(4):
+        env["client"].put("/api/orders/weekly_plan", headers=env["users_headers"][user], json={"days": [
+            {"weekday": 0, "vendor_id": env["vendor"], "vendor_menu_item_id": env["chicken"]},
+            {"weekday": 1, "vendor_id": env["vendor"], "vendor_menu_item_id": env["pork"]},
+        ]})
+    with env["SessionLocal"]() as db:
+        created = weekly_plans.materialize(db, MONDAY, MONDAY + timedelta(days=6))
+    assert sorted((order["order_date"], order["user_id"]) for order in created) == [
+        (MONDAY, env["users"][0]), (MONDAY, env["users"][1]),
+        (TUESDAY, env["users"][0]), (TUESDAY, env["users"][1]), (TUESDAY, env["users"][2]),
+    ]
+    assert counters(env, TUESDAY)[("vendor", env["vendor"])] == 3
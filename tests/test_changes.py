@@ -0,0 +1,133 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import changes, models
+
+
+def next_monday() -> date:
+    today = date.today()
+    return today + timedelta(days=7 - today.weekday())
+
+
+@pytest.fixture
+def env(database):
+    db = database.SessionLocal()
+    user = models.User(employee_id="u001", name="User", hashed_password="x", is_active=True)
+    other = models.User(employee_id="u002", name="Other", hashed_password="x", is_active=True)
+    admin = models.User(employee_id="a001", name="Admin", hashed_password="x", is_active=True,
+                        is_admin=True, role="admin")
+    vendor = models.Vendor(name="Vendor", description="", is_active=True)
+    db.add_all([user, other, admin, vendor])
+    db.flush()
+    item = models.VendorMenuItem(vendor_id=vendor.id, name="便當", description="", price=100, weekday=None, is_active=True)
+    db.add(item)
+    db.commit()
+    ids = {"user": user.id, "other": other.id, "vendor": vendor.id, "item": item.id}
+    db.close()
+
+    return database.env(headers=database.headers, **ids)
+
+
+def get_changes(env, employee_id, **params):
+    response = env["client"].get("/api/changes", params=params, headers=env["headers"](employee_id))
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def order(env, order_date):
+    return {"order_date": str(order_date), "vendor_id": env["vendor"], "vendor_menu_item_id": env["item"]}
+
+
+def test_first_sync_returns_reset_and_cursor(env):
+    feed = get_changes(env, "u001")
+    assert feed["reset"] is True
+    assert feed["cursor"] > 0
+    assert set(feed["changes"]) == {"orders", "vendors", "menu_items", "special_days"}
+
+    # 無新變更時游標不變
+    again = get_changes(env, "u001", since=feed["cursor"])
+    assert again["reset"] is False
+    assert again["cursor"] == feed["cursor"]
+    assert all(not c["upserts"] and not c["deletes"] for c in again["changes"].values())
+
+
+def test_order_changes_are_compacted_and_private(env):
+    client, headers = env["client"], env["headers"]
+    cursor = get_changes(env, "u001")["cursor"]
+    day = next_monday() + timedelta(days=14)
+
+    kept = client.post("/api/orders/", json=order(env, day), headers=headers("u001")).json()
+    removed = client.post("/api/orders/", json=order(env, day + timedelta(days=1)), headers=headers("u001")).json()
+    client.post("/api/orders/", json=order(env, day), headers=headers("u002"))
+    assert client.delete(f"/api/orders/{removed['id']}", headers=headers("u001")).status_code == 200
+
+    feed = get_changes(env, "u001", since=cursor, scope="orders")
+    assert list(feed["changes"]) == ["orders"]
+    orders = feed["changes"]["orders"]
+    assert [o["id"] for o in orders["upserts"]] == [kept["id"]]
+    assert orders["upserts"][0]["order_date"] == str(day)
+    assert orders["deletes"] == [removed["id"]]
+
+    other_feed = get_changes(env, "u002", since=cursor, scope="orders")
+    assert [o["user_id"] for o in other_feed["changes"]["orders"]["upserts"]] == [env["other"]]
+    assert other_feed["changes"]["orders"]["deletes"] == []
+
+
+def test_catalog_calendar_and_user_changes(env):
+    client, headers = env["client"], env["headers"]
+    cursor = get_changes(env, "a001")["cursor"]
+
+    client.delete(f"/api/vendors/{env['vendor']}", headers=headers("a001"))
+    special_day = date(2030, 1, 1)
+    created = client.post("/api/admin/special_days", json={
+        "date": str(special_day), "is_holiday": True, "description": "元旦"}, headers=headers("a001")).json()
+    client.delete(f"/api/admin/special_days/{special_day}", headers=headers("a001"))
+    client.put(f"/api/admin/users/{env['user']}", json={"name": "Renamed"}, headers=headers("a001"))
+
+    feed = get_changes(env, "a001", since=cursor)
+    # 軟刪除的廠商以 is_active = false 回傳
+    assert [(v["id"], v["is_active"]) for v in feed["changes"]["vendors"]["upserts"]] == [(env["vendor"], False)]
+    assert feed["changes"]["special_days"] == {"upserts": [], "deletes": [created["id"]]}
+    assert [u["name"] for u in feed["changes"]["users"]["upserts"]] == ["Renamed"]
+    assert "hashed_password" not in feed["changes"]["users"]["upserts"][0]
+
+
+def test_scope_validation(env):
+    client, headers = env["client"], env["headers"]
+    assert client.get("/api/changes", params={"scope": "users"}, headers=headers("u001")).status_code == 403
+    assert client.get("/api/changes", params={"scope": "orders,bogus"}, headers=headers("u001")).status_code == 400
+    assert client.get("/api/changes").status_code == 401
+
+
+def test_paging_and_stale_cursor(env):
+    client, headers = env["client"], env["headers"]
+    cursor = get_changes(env, "u001")["cursor"]
+    day = next_monday() + timedelta(days=21)
+    created = [
+        client.post("/api/orders/", json=order(env, day + timedelta(days=n)), headers=headers("u001")).json()["id"]
+        for n in range(3)
+    ]
+
+    db = env["SessionLocal"]()
+    user = db.get(models.User, env["user"])
+    first = changes.collect(db, user, ["orders"], cursor, limit=2)
+    assert first["has_more"] is True
+    assert [o["id"] for o in first["changes"]["orders"]["upserts"]] == created[:2]
+    rest = changes.collect(db, user, ["orders"], first["cursor"], limit=2)
+    assert rest["has_more"] is False
+    assert [o["id"] for o in rest["changes"]["orders"]["upserts"]] == created[2:]
+
+    # 清除舊紀錄後，過舊的游標需重新完整載入；超前的游標亦同
+    assert changes.prune(db, datetime.utcnow() + timedelta(days=1)) > 0
+    db.commit()
+    db.close()
+    assert get_changes(env, "u001", since=cursor)["reset"] is True
+    latest = get_changes(env, "u001", since=rest["cursor"])
+    assert latest["reset"] is False
+    assert get_changes(env, "u001", since=rest["cursor"] + 100)["reset"] is True
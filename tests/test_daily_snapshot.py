@@ -0,0 +1,150 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import daily_snapshot, jobs, models
+from query_budget import query_budget
+
+DAY = date.today() - timedelta(days=1)
+FUTURE_DAY = date.today() + timedelta(days=7)
+
+
+@pytest.fixture
+def env(database):
+    with database.SessionLocal() as db:
+        sales = models.Department(name="業務部")
+        db.add(sales)
+        db.flush()
+        admin = models.User(employee_id="a001", name="Admin", hashed_password="x", is_active=True,
+                            is_admin=True, role="admin")
+        users = [models.User(employee_id=f"u{n:03d}", name=f"User {n}", hashed_password="x", is_active=True,
+                             department_id=sales.id) for n in range(1, 4)]
+        noodles, rice = models.Vendor(name="麵店", description=""), models.Vendor(name="飯館", description="")
+        db.add_all([admin, noodles, rice, *users])
+        db.flush()
+        noodle = models.VendorMenuItem(vendor_id=noodles.id, name="牛肉麵", description="", price=120)
+        bento = models.VendorMenuItem(vendor_id=rice.id, name="雞腿飯", description="", price=100)
+        db.add_all([noodle, bento])
+        db.flush()
+        for user, item in ((users[0], noodle), (users[1], bento)):
+            db.add(models.Order(user_id=user.id, vendor_id=item.vendor_id, vendor_menu_item_id=item.id,
+                                order_date=DAY, status="Confirmed", unit_price=item.price,
+                                vendor_name=item.vendor.name, item_name=item.name))
+        db.add(models.Order(user_id=users[2].id, order_date=DAY, status="NoOrder"))
+        db.commit()
+        ids = {"users": [u.id for u in users], "noodles": noodles.id, "noodle": noodle.id,
+               "rice": rice.id, "bento": bento.id}
+
+    return database.env(headers=database.headers("a001"), **ids)
+
+
+def views(env, day=DAY):
+    client, headers = env["client"], env["headers"]
+    return [
+        client.get(path, params={"date": str(day)}, headers=headers).json()
+        for path in ("/api/admin/stats", "/api/admin/order_announcement", "/api/admin/orders/daily_details",
+                     "/api/admin/orders/vendor_sheets")
+    ]
+
+
+def stored(env, day=DAY):
+    with env["SessionLocal"]() as db:
+        row = db.get(models.DailySnapshot, day)
+        return json.loads(row.payload) if row else None
+
+
+def freeze(env, day=DAY):
+    """截止工作凍結指定日期"""
+    with env["SessionLocal"]() as db:
+        daily_snapshot.freeze(db, day)
+
+
+def test_past_day_is_frozen_and_served_from_snapshot(env):
+    freeze(env)
+    stats, announcement, details, sheets = views(env)
+    assert stored(env) is not None
+    assert (stats["total_orders"], stats["total_price"]) == (3, 220)
+    assert [(item["vendor_name"], item["item_name"], len(item["orders"])) for item in announcement["items"]] == [
+        ("飯館", "雞腿飯", 1), ("麵店", "牛肉麵", 1)]
+    assert {row["employee_id"]: row["item_name"] for row in details} == {
+        "a001": "未選", "u001": "牛肉麵", "u002": "雞腿飯", "u003": "未選"}
+    assert [(v["vendor_name"], v["count"], v["amount"]) for v in sheets["vendors"]] == [("飯館", 1, 100), ("麵店", 1, 120)]
+
+    with query_budget(env["engine"], 100) as statements:
+        assert views(env) == [stats, announcement, details, sheets]
+    assert not any("FROM orders" in statement for statement in statements)
+
+
+def test_admin_edits_patch_the_snapshot(env):
+    freeze(env)
+    client, headers = env["client"], env["headers"]
+    users = env["users"]
+    # u001 改訂雞腿飯、u002 取消、u003 由不訂餐改為牛肉麵
+    for body in (
+        {"user_id": users[0], "vendor_id": env["rice"], "item_id": env["bento"]},
+        {"user_id": users[1], "is_cancel": True},
+        {"user_id": users[2], "vendor_id": env["noodles"], "item_id": env["noodle"]},
+    ):
+        response = client.put("/api/admin/orders/user_order", headers=headers, json={"order_date": str(DAY), **body})
+        assert response.status_code == 200
+
+    patched = stored(env)
+    with env["SessionLocal"]() as db:
+        rebuilt = daily_snapshot.build(db, DAY)
+    assert patched["orders"] == rebuilt["orders"]
+    assert patched["vendors"] == rebuilt["vendors"]
+
+    stats, announcement, details, sheets = views(env)
+    assert (stats["total_orders"], stats["total_price"]) == (2, 220)
+    assert [(item["item_name"], [o["employee_id"] for o in item["orders"]]) for item in announcement["items"]] == [
+        ("雞腿飯", ["u001"]), ("牛肉麵", ["u003"])]
+    assert {row["employee_id"]: row["item_name"] for row in details}["u002"] == "未選"
+
+
+def test_vendor_sheet_exports(env):
+    client, headers = env["client"], env["headers"]
+    response = client.get("/api/admin/orders/vendor_sheets", headers=headers,
+                          params={"date": str(DAY), "format": "csv", "vendor_id": env["noodles"]})
+    assert f"orders-{DAY.isoformat()}" in response.headers["content-disposition"]
+    rows = list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert rows == [daily_snapshot.SHEET_HEADER, ["麵店", "牛肉麵", "120", "1", "120", "User 1（u001）"],
+                    ["麵店", "小計", "", "1", "120", ""]]
+
+    response = client.get("/api/admin/orders/vendor_sheets", headers=headers, params={"date": str(DAY), "format": "html"})
+    assert response.headers["content-type"].startswith("text/html")
+    assert response.text.count("<section>") == 2 and "業務部" in response.text
+
+    assert client.get("/api/admin/orders/vendor_sheets", headers=headers,
+                      params={"date": str(DAY), "format": "pdf"}).status_code == 400
+
+
+def test_days_before_cutoff_are_not_frozen(env):
+    stats = views(env, FUTURE_DAY)[0]
+    assert stats["total_orders"] == 0
+    assert stored(env, FUTURE_DAY) is None
+
+
+def test_reads_do_not_freeze_and_cutoff_catches_up_missed_days(env):
+    old_day = DAY - timedelta(days=400)
+    stats = views(env)[0]
+    assert (stats["total_orders"], stats["total_price"]) == (3, 220)
+    views(env, old_day)
+    assert stored(env) is None and stored(env, old_day) is None
+
+    # DAY 的截止工作未執行（服務停止）：下一次截止時補凍結最近一份快照之後有訂單的日期
+    freeze(env, DAY - timedelta(days=7))
+    today = date.today()
+    result = jobs.confirm_orders(env["engine"], datetime.combine(today, datetime.min.time()))
+    assert result["caught_up"] == [DAY]
+    assert len(stored(env)["orders"]) == 3
+    assert stored(env, today) is not None
+    assert stored(env, old_day) is None
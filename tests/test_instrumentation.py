@@ -0,0 +1,72 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app import cache, instrumentation, models
+
+
+@pytest.fixture
+def slow_app(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'slow.db'}")
+    monkeypatch.setattr(instrumentation.settings, "slow_request_ms", 0.0)
+    app = FastAPI()
+    app.middleware("http")(instrumentation.instrument_requests)
+
+    @app.get("/login")
+    def login():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT :secret"), {"secret": "$argon2id$hash"})
+        return {}
+
+    yield TestClient(app)
+    engine.dispose()
+
+
+def test_slow_query_log_omits_parameters_by_default(slow_app, caplog):
+    with caplog.at_level(logging.WARNING, logger="webdiner.slow"):
+        response = slow_app.get("/login")
+    assert response.headers["X-DB-Queries"] == "1"
+    assert "SELECT ?" in caplog.text
+    assert "$argon2id$hash" not in caplog.text
+
+
+def test_slow_query_log_parameters_can_be_enabled(slow_app, caplog, monkeypatch):
+    monkeypatch.setattr(instrumentation.settings, "log_parameters", True)
+    with caplog.at_level(logging.WARNING, logger="webdiner.slow"):
+        slow_app.get("/login")
+    assert "$argon2id$hash" in caplog.text
+
+
+def test_settings_are_persisted_and_reach_other_workers(database, monkeypatch):
+    for field in instrumentation.FIELDS:
+        monkeypatch.setattr(instrumentation.settings, field, getattr(instrumentation.settings, field))
+    with database.SessionLocal() as db:
+        db.add(models.User(employee_id="s001", name="Sysadmin", hashed_password="x", is_active=True,
+                           is_admin=True, role="sysadmin"))
+        db.commit()
+    poller = cache._Poller(database.engine, interval=60)
+    poller.poll()
+
+    response = database.client.put("/api/admin/instrumentation", headers=database.headers("s001"),
+                                   json={"slow_request_ms": 250, "log_parameters": True, "top_n": None})
+    assert response.json() == {"enabled": True, "slow_request_ms": 250, "top_n": 5, "log_parameters": True}
+
+    # 另一個 worker 仍為預設值，下一次輪詢時套用
+    monkeypatch.setattr(instrumentation.settings, "slow_request_ms", 500.0)
+    monkeypatch.setattr(instrumentation.settings, "log_parameters", False)
+    poller.poll()
+    assert (instrumentation.settings.slow_request_ms, instrumentation.settings.log_parameters) == (250, True)
+
+    # 重新啟動的 worker 於 lifespan 載入
+    monkeypatch.setattr(instrumentation.settings, "slow_request_ms", 500.0)
+    with database.SessionLocal() as db:
+        instrumentation.load(db)
+    assert instrumentation.settings.slow_request_ms == 250
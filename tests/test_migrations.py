@@ -0,0 +1,107 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, inspect, text
+from app import migrations, models
+
+
+def _legacy_engine(tmp_path):
+    """建立沒有複合索引、且含重複訂單的舊版資料庫"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER, vendor_id INTEGER, "
+            "vendor_menu_item_id INTEGER, order_date DATE, created_at DATETIME, status VARCHAR, items VARCHAR)"
+        ))
+        conn.execute(text(
+            "INSERT INTO orders (id, user_id, order_date, status) VALUES "
+            "(1, 1, '2025-01-02', 'NoOrder'), (2, 1, '2025-01-02', 'Pending'), "
+            "(3, 1, '2025-01-02', 'Pending'), (4, 2, '2025-01-02', 'NoOrder')"
+        ))
+    return engine
+
+
+def test_upgrade_deduplicates_and_adds_unique_index(tmp_path):
+    engine = _legacy_engine(tmp_path)
+
+    applied = migrations.upgrade(engine)
+
+    assert applied == [m.version for m in migrations.MIGRATIONS]
+    with engine.connect() as conn:
+        ids = [row[0] for row in conn.execute(text("SELECT id FROM orders ORDER BY id"))]
+        indexes = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    # 保留最新的實際訂單，捨棄 NoOrder 與較舊的重複資料
+    assert ids == [3, 4]
+    assert "ux_orders_user_date" in indexes
+
+
+def test_upgrade_is_idempotent(tmp_path):
+    engine = _legacy_engine(tmp_path)
+    migrations.upgrade(engine)
+
+    assert migrations.upgrade(engine) == []
+    with engine.connect() as conn:
+        assert migrations.current_version(conn) == migrations.MIGRATIONS[-1].version
+
+
+def test_upgrade_backfills_order_snapshots(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'snapshot.db'}")
+    migrations.upgrade(engine, target=5)
+    with engine.begin() as conn:
+        # 版本 5 的 orders 與封存表尚無快照欄位
+        assert "unit_price" not in {row[1] for row in conn.execute(text("PRAGMA table_info(orders)"))}
+        conn.execute(text(
+            "CREATE TABLE orders_archive_2020 (id INTEGER PRIMARY KEY, user_id INTEGER, vendor_id INTEGER, "
+            "vendor_menu_item_id INTEGER, order_date DATE, created_at DATETIME, status VARCHAR, items VARCHAR)"
+        ))
+        conn.execute(text("INSERT INTO vendors (id, name) VALUES (1, '麵店')"))
+        conn.execute(text("INSERT INTO vendor_menu_items (id, vendor_id, name, price) VALUES (1, 1, '牛肉麵', 120)"))
+        conn.execute(text(
+            "INSERT INTO orders (id, user_id, vendor_id, vendor_menu_item_id, order_date, status) VALUES "
+            "(1, 1, 1, 1, '2025-01-02', 'Confirmed'), (2, 2, NULL, NULL, '2025-01-02', 'NoOrder')"
+        ))
+        conn.execute(text(
+            "INSERT INTO orders_archive_2020 (id, user_id, vendor_id, vendor_menu_item_id, order_date, status) "
+            "VALUES (3, 1, 1, 1, '2020-01-02', 'Confirmed')"
+        ))
+        changes_before = conn.execute(text("SELECT COUNT(*) FROM change_log")).scalar()
+
+    assert migrations.upgrade(engine) == [m.version for m in migrations.MIGRATIONS if m.version > 5]
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT id, unit_price, vendor_name, item_name FROM orders "
+            "UNION ALL SELECT id, unit_price, vendor_name, item_name FROM orders_archive_2020 ORDER BY id"
+        )).fetchall()
+        indexes = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+        changes_after = conn.execute(text("SELECT COUNT(*) FROM change_log")).scalar()
+    assert [tuple(row) for row in rows] == [
+        (1, 120, "麵店", "牛肉麵"), (2, None, None, None), (3, 120, "麵店", "牛肉麵")]
+    assert {"ix_orders_date_snapshot", "ix_orders_archive_2020_date_snapshot"} <= indexes
+    assert "ix_orders_date_item" not in indexes
+    # 回填不產生同步紀錄
+    assert changes_after == changes_before
+
+
+def test_fresh_database_matches_models(tmp_path):
+    migrated = create_engine(f"sqlite:///{tmp_path / 'migrated.db'}")
+    migrations.upgrade(migrated, target=10)
+    # 版本 1 為固定的初始結構：後來的欄位由各自的 migration 加入
+    assert "daily_limit" not in {column["name"] for column in inspect(migrated).get_columns("vendors")}
+    migrations.upgrade(migrated)
+
+    expected = create_engine(f"sqlite:///{tmp_path / 'expected.db'}")
+    models.Base.metadata.create_all(expected)
+
+    def schema(engine):
+        inspector = inspect(engine)
+        return {
+            table: (
+                {column["name"] for column in inspector.get_columns(table)},
+                {index["name"] for index in inspector.get_indexes(table)},
+            )
+            for table in models.Base.metadata.tables
+        }
+
+    assert schema(migrated) == schema(expected)
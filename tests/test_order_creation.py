@@ -0,0 +1,423 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import get_db
+from app.main import app
+
+
+def next_monday() -> date:
+    today = date.today()
+    return today + timedelta(days=7 - today.weekday())
+
+
+@pytest.fixture(scope="module")
+def env(module_database):
+    db = module_database.SessionLocal()
+    user = models.User(employee_id="u001", name="User", hashed_password="x", is_active=True)
+    vendor = models.Vendor(name="Vendor", description="", is_active=True)
+    db.add_all([user, vendor])
+    db.flush()
+    item = models.VendorMenuItem(vendor_id=vendor.id, name="便當", description="", price=100, weekday=None, is_active=True)
+    weekday_item = models.VendorMenuItem(vendor_id=vendor.id, name="週二特餐", description="", price=90, weekday=1, is_active=True)
+    db.add_all([item, weekday_item])
+    db.commit()
+    ids = {"vendor": vendor.id, "item": item.id, "weekday_item": weekday_item.id}
+    db.close()
+
+    return module_database.env(headers=module_database.headers("u001"), **ids)
+
+
+def count_orders(engine, order_date):
+    with engine.connect() as conn:
+        return conn.execute(
+            models.Order.__table__.select().where(models.Order.order_date == order_date)
+        ).fetchall()
+
+
+def test_create_order_returns_created_row(env):
+    order_date = next_monday() + timedelta(days=7)
+    response = env["client"].post(
+        "/api/orders/",
+        json={"order_date": order_date.isoformat(), "vendor_id": env["vendor"], "vendor_menu_item_id": env["item"]},
+        headers=env["headers"],
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "Pending"
+    assert data["vendor_menu_item_id"] == env["item"]
+    # 寫入當下的單價與名稱保存在訂單上
+    (row,) = count_orders(env["engine"], order_date)
+    assert (row.unit_price, row.vendor_name, row.item_name) == (100, "Vendor", "便當")
+
+
+def test_create_order_rejects_unavailable_weekday(env):
+    response = env["client"].post(
+        "/api/orders/",
+        json={"order_date": next_monday().isoformat(), "vendor_id": env["vendor"], "vendor_menu_item_id": env["weekday_item"]},
+        headers=env["headers"],
+    )
+    assert response.status_code == 400
+
+
+def test_duplicate_submits_create_exactly_one_row(env):
+    order_date = next_monday()
+    payload = {"order_date": order_date.isoformat(), "vendor_id": env["vendor"], "vendor_menu_item_id": env["item"]}
+
+    def submit(_):
+        return env["client"].post("/api/orders/", json=payload, headers=env["headers"]).status_code
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        statuses = list(pool.map(submit, range(16)))
+
+    assert statuses.count(200) == 1
+    assert statuses.count(400) == 15
+    assert len(count_orders(env["engine"], order_date)) == 1
+
+
+def test_batch_reports_rejection_reasons(env):
+    monday = next_monday() + timedelta(days=14)
+    saturday = monday + timedelta(days=5)
+    response = env["client"].post(
+        "/api/orders/batch",
+        json={"orders": [
+            {"order_date": monday.isoformat(), "vendor_id": env["vendor"], "vendor_menu_item_id": env["item"]},
+            {"order_date": (monday + timedelta(days=1)).isoformat(), "is_no_order": True},
+            {"order_date": saturday.isoformat(), "is_no_order": True},
+            {"order_date": monday.isoformat(), "is_no_order": True},
+            {"order_date": (monday + timedelta(days=2)).isoformat(), "vendor_id": env["vendor"], "vendor_menu_item_id": env["weekday_item"]},
+        ]},
+        headers=env["headers"],
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [o["order_date"] for o in data["created"]] == [monday.isoformat(), (monday + timedelta(days=1)).isoformat()]
+    assert [r["index"] for r in data["rejected"]] == [2, 3, 4]
+
+    # 再送一次：已存在的日期逐筆回報
+    response = env["client"].post(
+        "/api/orders/batch",
+        json={"orders": [{"order_date": monday.isoformat(), "is_no_order": True}]},
+        headers=env["headers"],
+    )
+    assert response.json()["created"] == []
+    assert response.json()["rejected"][0]["reason"] == "您在此日期已有訂單"
+
+
+def test_range_sync_applies_minimal_diff(env):
+    monday = next_monday() + timedelta(days=21)
+    week = [monday + timedelta(days=i) for i in range(5)]
+    client, headers = env["client"], env["headers"]
+    client.post(
+        "/api/orders/batch",
+        json={"orders": [
+            {"order_date": week[0].isoformat(), "is_no_order": True},
+            {"order_date": week[1].isoformat(), "is_no_order": True},
+            {"order_date": week[2].isoformat(), "vendor_id": env["vendor"], "vendor_menu_item_id": env["item"]},
+        ]},
+        headers=headers,
+    )
+
+    response = client.put(
+        "/api/orders/range",
+        json={
+            "start_date": week[0].isoformat(),
+            "end_date": week[4].isoformat(),
+            "selections": [
+                {"order_date": week[0].isoformat(), "is_no_order": True},
+                {"order_date": week[1].isoformat(), "vendor_id": env["vendor"], "vendor_menu_item_id": env["weekday_item"]},
+                {"order_date": week[3].isoformat(), "vendor_id": env["vendor"], "vendor_menu_item_id": env["item"]},
+            ],
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["unchanged"] == 1
+    assert [o["order_date"] for o in data["updated"]] == [week[1].isoformat()]
+    assert data["updated"][0]["status"] == "Pending"
+    assert [o["order_date"] for o in data["created"]] == [week[3].isoformat()]
+    assert len(data["deleted"]) == 1
+    assert data["rejected"] == []
+    assert [row.order_date for row in count_orders_between(env["engine"], week[0], week[4])] == [week[0], week[1], week[3]]
+
+
+def count_orders_between(engine, start, end):
+    with engine.connect() as conn:
+        return conn.execute(
+            models.Order.__table__.select()
+            .where(models.Order.order_date.between(start, end))
+            .order_by(models.Order.order_date)
+        ).fetchall()
+
+
+def test_patch_swaps_item_in_place(env):
+    monday = next_monday() + timedelta(days=28)
+    client, headers = env["client"], env["headers"]
+    created = client.post(
+        "/api/orders/",
+        json={"order_date": monday.isoformat(), "is_no_order": True},
+        headers=headers,
+    ).json()
+
+    response = client.patch(
+        f"/api/orders/{created['id']}",
+        json={"vendor_id": env["vendor"], "vendor_menu_item_id": env["item"]},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["id"] == created["id"]
+    assert data["status"] == "Pending"
+    assert data["menu_item_name"] == "便當"
+    (row,) = count_orders(env["engine"], monday)
+    assert (row.unit_price, row.item_name) == (100, "便當")
+
+    # 週二特餐不能改到星期一
+    response = client.patch(
+        f"/api/orders/{created['id']}",
+        json={"vendor_id": env["vendor"], "vendor_menu_item_id": env["weekday_item"]},
+        headers=headers,
+    )
+    assert response.status_code == 400
+
+    assert client.patch("/api/orders/999999", json={"is_no_order": True}, headers=headers).status_code == 404
+
+
+def test_calendar_month_bootstrap(env):
+    # 兩個月後的第一個星期一，確保同一週都在該月內
+    first = (date.today().replace(day=1) + timedelta(days=62)).replace(day=1)
+    monday = first + timedelta(days=(7 - first.weekday()) % 7)
+    client, headers = env["client"], env["headers"]
+    client.post("/api/orders/", json={"order_date": monday.isoformat(), "is_no_order": True}, headers=headers)
+
+    response = client.get(f"/api/orders/calendar?month={monday:%Y-%m}", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert monday.isoformat() in [o["order_date"] for o in data["orders"]]
+    assert [v["id"] for v in data["vendors"]] == [env["vendor"]]
+    assert data["availability"][monday.isoformat()] == [env["item"]]
+    assert data["availability"][(monday + timedelta(days=1)).isoformat()] == [env["item"], env["weekday_item"]]
+    assert (monday + timedelta(days=5)).isoformat() not in data["availability"]
+
+    assert client.get("/api/orders/calendar?month=2025-13", headers=headers).status_code == 400
+
+
+def test_responses_report_query_count(env):
+    response = env["client"].get("/api/orders/calendar", headers=env["headers"])
+    assert response.status_code == 200
+    assert int(response.headers["X-DB-Queries"]) >= 1
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+
+
+def test_metrics_endpoint_exposes_route_histograms(env, monkeypatch):
+    env["client"].get("/api/orders/calendar", headers=env["headers"])
+
+    # 非系統管理員不可存取；本機免 token 須明確開啟（同主機的反向代理也是本機連線）
+    assert env["client"].get("/api/metrics", headers=env["headers"]).status_code == 403
+    local = TestClient(app, client=("127.0.0.1", 50000))
+    assert local.get("/api/metrics").status_code == 401
+
+    monkeypatch.setenv("WEBDINER_METRICS_ALLOW_LOCAL", "1")
+    response = local.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'webdiner_http_request_duration_seconds_bucket{method="GET",route="' in body
+    assert '/orders/calendar",le="+Inf"}' in body
+    assert "webdiner_order_writes_total" in body
+    assert 'webdiner_cache_requests_total{domain="catalog",result="hit"}' in body
+
+
+def test_metrics_are_merged_across_workers(env, tmp_path, monkeypatch):
+    import json
+    import subprocess
+
+    from app import metrics
+
+    # 另一個執行中的 worker 與一個已結束的 worker 寫入的數值
+    (tmp_path / f"worker-{os.getppid()}.json").write_text(json.dumps({
+        "webdiner_order_writes_total": [[["Imported"], 5]],
+        "webdiner_http_requests_in_flight": [[[], 2]],
+    }))
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+    (tmp_path / f"worker-{finished.pid}.json").write_text(json.dumps({
+        "webdiner_order_writes_total": [[["Imported"], 1]],
+        "webdiner_http_requests_in_flight": [[[], 3]],
+    }))
+    metrics.order_writes.inc(status="Imported")
+    own = metrics.order_writes.value(status="Imported")
+    metrics.start_sharing(str(tmp_path), interval=60)
+    try:
+        body = metrics.render()
+    finally:
+        metrics.stop_sharing()
+    assert f'webdiner_order_writes_total{{status="Imported"}} {int(own) + 6}' in body
+    assert (tmp_path / f"worker-{os.getpid()}.json").exists()
+    assert "webdiner_http_requests_in_flight 2" in body
+
+
+def test_order_write_invalidates_conditional_get(env):
+    client, headers = env["client"], env["headers"]
+    first = client.get("/api/orders/", headers=headers)
+    etag = first.headers["etag"]
+    assert client.get("/api/orders/", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    order_date = next_monday() + timedelta(days=56)
+    response = client.post("/api/orders/", json={
+        "order_date": str(order_date), "vendor_id": env["vendor"], "vendor_menu_item_id": env["item"]
+    }, headers=headers)
+    assert response.status_code == 200
+
+    refreshed = client.get("/api/orders/", headers={**headers, "If-None-Match": etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["etag"] != etag
+    assert order_date.isoformat() in [order["order_date"] for order in refreshed.json()]
+
+
+def test_order_board_streams_deltas(env):
+    import asyncio
+    import json
+
+    from app import order_board
+
+    client, headers = env["client"], env["headers"]
+    order_date = next_monday() + timedelta(days=63)
+    loop = asyncio.new_event_loop()
+    queue = asyncio.Queue()
+    SessionLocal = sessionmaker(bind=env["engine"])
+    with SessionLocal() as db:
+        order_board.subscribe(order_date, db, loop, queue)
+
+    def next_event():
+        message = loop.run_until_complete(asyncio.wait_for(queue.get(), timeout=2))
+        event, data = message.strip().split("\n")
+        return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+    try:
+        response = client.post("/api/orders/", json={
+            "order_date": str(order_date), "vendor_id": env["vendor"], "vendor_menu_item_id": env["item"]
+        }, headers=headers)
+        order_id = response.json()["id"]
+        event, data = next_event()
+        assert event == "order"
+        assert data["user"]["employee_id"] == "u001"
+        assert data["order"] == {"item_id": env["item"], "status": "Pending"}
+        assert [(c["delta"], c["item_id"], c["item_name"]) for c in data["changes"]] == [(1, env["item"], "便當")]
+
+        client.patch(f"/api/orders/{order_id}", json={"is_no_order": True}, headers=headers)
+        event, data = next_event()
+        assert data["order"] == {"item_id": None, "status": "NoOrder"}
+        assert [(c["delta"], c["item_id"]) for c in data["changes"]] == [(-1, env["item"])]
+
+        client.delete(f"/api/orders/{order_id}", headers=headers)
+        event, data = next_event()
+        assert data["order"] is None
+        assert data["changes"] == []
+    finally:
+        order_board.unsubscribe(order_date, queue)
+        loop.close()
+    assert order_board.subscriber_count(order_date) == 0
+
+
+def test_order_board_follows_writes_from_other_workers(env):
+    import asyncio
+    import json
+
+    from sqlalchemy import insert
+
+    from app import cache, order_board, versions
+
+    order_date = next_monday() + timedelta(days=77)
+    loop = asyncio.new_event_loop()
+    queue = asyncio.Queue()
+    poller = cache._Poller(env["engine"], interval=60)
+    with env["SessionLocal"]() as db:
+        order_board.subscribe(order_date, db, loop, queue)
+        poller.poll()
+        # 另一個 worker 的寫入：只更新資料與版本號，本程序沒有呼叫 publish()
+        user = db.query(models.User).filter(models.User.employee_id == "u001").one()
+        db.execute(insert(models.Order).values(
+            user_id=user.id, vendor_id=env["vendor"], vendor_menu_item_id=env["item"],
+            order_date=order_date, status="Pending",
+        ))
+        versions.bump_orders(db, [user.id], [order_date])
+        db.commit()
+    try:
+        assert queue.empty()
+        poller.poll()
+        message = loop.run_until_complete(asyncio.wait_for(queue.get(), timeout=2))
+        event, data = message.strip().split("\n")
+        data = json.loads(data.removeprefix("data: "))
+        assert event == "event: order"
+        assert data["user"]["employee_id"] == "u001"
+        assert data["order"] == {"item_id": env["item"], "status": "Pending"}
+        assert [(c["delta"], c["item_id"]) for c in data["changes"]] == [(1, env["item"])]
+
+        # 已反映的狀態不重複推送
+        poller.poll()
+        with env["SessionLocal"]() as db:
+            order_board.refresh(db, order_date)
+        assert queue.empty()
+    finally:
+        order_board.unsubscribe(order_date, queue)
+        loop.close()
+
+
+def test_order_stream_requires_admin(env):
+    client = env["client"]
+    assert client.get("/api/admin/orders/stream").status_code == 401
+    token = env["headers"]["Authorization"].split()[1]
+    assert client.get(f"/api/admin/orders/stream?token={token}").status_code == 403
+
+
+def test_order_stream_releases_its_session(env):
+    import asyncio
+
+    from starlette.requests import Request
+
+    from app import order_board
+    from app.routers import admin
+
+    open_sessions = []
+    override = app.dependency_overrides[get_db]
+
+    def tracking_get_db():
+        for session in override():
+            open_sessions.append(session)
+            try:
+                yield session
+            finally:
+                open_sessions.remove(session)
+
+    order_date = next_monday() + timedelta(days=70)
+    request = Request({"type": "http", "app": app, "method": "GET", "headers": [], "query_string": b""})
+    app.dependency_overrides[get_db] = tracking_get_db
+    try:
+        response = asyncio.run(admin.stream_orders(request, date=order_date, current_user=None))
+        # 串流開始前即已關閉 Session，不在串流期間占用連線
+        assert open_sessions == []
+        assert order_board.subscriber_count(order_date) == 1
+    finally:
+        app.dependency_overrides[get_db] = override
+
+    async def first_event():
+        events = response.body_iterator
+        try:
+            return await events.__anext__()
+        finally:
+            await events.aclose()
+
+    assert asyncio.run(first_event()).startswith("event: ready")
+    assert order_board.subscriber_count(order_date) == 0
@@ -0,0 +1,109 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import func
+
+from app import archive, models, order_lines
+
+DAY = date.today() + timedelta(days=7)
+OLD_DAY = date(date.today().year - 2, 6, 3)
+
+
+@pytest.fixture
+def env(database):
+    with database.SessionLocal() as db:
+        admin = models.User(employee_id="a001", name="Admin", hashed_password="x", is_active=True,
+                            is_admin=True, role="admin")
+        users = [models.User(employee_id=f"u{n:03d}", name=f"User {n}", hashed_password="x", is_active=True)
+                 for n in range(1, 6)]
+        rice, noodle = (models.MenuItem(name="排骨飯", description="", price=90, category="便當"),
+                        models.MenuItem(name="陽春麵", description="", price=50, category="麵"))
+        db.add_all([admin, rice, noodle, *users])
+        db.flush()
+
+        def legacy(user, day, items):
+            db.add(models.Order(user_id=user.id, order_date=day, created_at=datetime.utcnow(),
+                                status="Confirmed", items=items))
+
+        legacy(users[0], DAY, json.dumps([{"menu_item_id": rice.id, "quantity": 2}]))
+        legacy(users[1], DAY, json.dumps([{"menu_item_id": noodle.id}, {"menu_item_id": rice.id, "quantity": 1}]))
+        legacy(users[2], DAY, "not json")
+        legacy(users[3], DAY, json.dumps([{"menu_item_id": 999}]))
+        legacy(users[4], OLD_DAY, json.dumps([{"menu_item_id": noodle.id, "quantity": 3}]))
+        db.commit()
+        ids = {"users": [u.id for u in users]}
+
+    return database.env(headers=database.headers("a001"), **ids)
+
+
+def line_rows(env):
+    with env["SessionLocal"]() as db:
+        return [
+            (line.order_id, line.line_no, line.item_name, line.quantity, line.unit_price)
+            for line in db.query(models.OrderLine).order_by(models.OrderLine.order_id, models.OrderLine.line_no)
+        ]
+
+
+def test_convert_normalizes_json_items(env):
+    result = order_lines.convert(env["engine"])
+    assert result == {"orders": 5, "lines": 5, "batches": 1}
+    assert [(name, quantity, price) for _, _, name, quantity, price in line_rows(env)] == [
+        ("排骨飯", 2, 90), ("陽春麵", 1, 50), ("排骨飯", 1, 90), (None, 1, None), ("陽春麵", 3, 50),
+    ]
+
+    # 轉換完成後再次執行只讀取進度
+    assert order_lines.convert(env["engine"]) == {"orders": 0, "lines": 0, "batches": 0}
+
+
+def test_convert_resumes_from_saved_progress(env):
+    first = order_lines.convert(env["engine"], batch_size=2, max_batches=1)
+    assert first == {"orders": 2, "lines": 3, "batches": 1}
+    with env["SessionLocal"]() as db:
+        progress = db.get(models.OrderLineProgress, "orders")
+        assert progress.completed is False
+
+    rest = order_lines.convert(env["engine"], batch_size=2)
+    assert rest["orders"] == 3
+    assert len(line_rows(env)) == 5
+
+    # 進度遺失時重新轉換也不會產生重複明細
+    with env["SessionLocal"]() as db:
+        db.query(models.OrderLineProgress).delete()
+        db.commit()
+    order_lines.convert(env["engine"])
+    assert len(line_rows(env)) == 5
+
+
+def test_reports_read_normalized_lines(env):
+    order_lines.convert(env["engine"])
+    client, headers = env["client"], env["headers"]
+    stats = client.get("/api/admin/stats", headers=headers, params={"date": str(DAY)}).json()
+    assert stats["total_orders"] == 4
+    assert stats["total_price"] == 90 * 3 + 50
+    legacy = next(v for v in stats["vendors"] if v["name"] == "Legacy/General")
+    assert [(item["name"], item["count"]) for item in legacy["items"]] == [("排骨飯", 3), ("陽春麵", 1)]
+
+    details = client.get("/api/admin/orders/daily_details", headers=headers, params={"date": str(DAY)}).json()
+    names = {row["user_id"]: (row["item_name"], row["vendor_name"]) for row in details}
+    users = env["users"]
+    assert names[users[0]] == ("排骨飯", "Legacy")
+    assert names[users[1]] == ("陽春麵", "Legacy")
+    assert names[users[2]] == ("未選", "")
+    assert names[users[3]] == ("未選", "")
+
+
+def test_archived_legacy_orders_are_converted(env):
+    archive.run(env["engine"], horizon_days=60, grace=0, pause=0)
+    order_lines.convert(env["engine"])
+    with env["SessionLocal"]() as db:
+        assert db.get(models.OrderLineProgress, f"orders_archive_{OLD_DAY.year}").completed is True
+        assert db.query(func.count(models.OrderLine.id)).filter(models.OrderLine.order_date == OLD_DAY).scalar() == 1
+
+    stats = env["client"].get("/api/admin/stats", headers=env["headers"], params={"date": str(OLD_DAY)}).json()
+    assert stats["total_price"] == 150
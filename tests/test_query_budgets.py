@@ -0,0 +1,331 @@
+"""
+每個端點的 SQL 查詢數預算
+
+同一個請求分別在小、大兩種資料量下執行：查詢數必須落在預算內，且不得隨資料量成長
+（N+1 查詢會在大資料集超出預算）。新增端點時必須在 BUDGETS 宣告預算，否則
+test_every_endpoint_has_a_budget 會失敗。
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+import json
+from contextlib import ExitStack
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import cache, models, order_lines
+from app.database import get_db
+from app.main import app
+from app.routers.auth import get_password_hash
+from conftest import serving
+from query_budget import query_budget
+
+SIZES = {"small": 4, "large": 40}
+PASSWORD_HASH = get_password_hash("password123")
+
+
+def target_day() -> date:
+    # 兩週後的週一：可編輯且不會跨越截止時間
+    today = date.today()
+    return today + timedelta(days=14 - today.weekday())
+
+
+def build_dataset(engine, users_per_department: int) -> dict:
+    """兩個處別、四個部門、三家廠商各三個品項，以及目標日的新舊格式訂單"""
+    SessionLocal = sessionmaker(bind=engine)
+    db = SessionLocal()
+    day = target_day()
+
+    divisions = [models.Division(name=f"處{i}", display_column=i) for i in range(3)]
+    db.add_all(divisions)
+    db.flush()
+    departments = [
+        models.Department(name=f"部門{i}", division_id=divisions[i % 2].id, display_order=i) for i in range(4)
+    ]
+    db.add_all(departments)
+    db.flush()
+
+    admin = models.User(
+        employee_id="admin", name="Admin", hashed_password=PASSWORD_HASH,
+        is_active=True, is_admin=True, role="sysadmin", department_id=departments[0].id,
+    )
+    users = [
+        models.User(
+            employee_id=f"u{dept.id:02d}{n:03d}", name=f"User {n}", extension=str(100 + n),
+            hashed_password=PASSWORD_HASH, is_active=True, department_id=dept.id,
+            title="經理" if n == 0 else None, is_department_head=n == 0,
+        )
+        for dept in departments for n in range(users_per_department)
+    ]
+    db.add(admin)
+    db.add_all(users)
+
+    vendors = [models.Vendor(name=f"廠商{i}", description="") for i in range(3)]
+    db.add_all(vendors)
+    db.flush()
+    items = [
+        models.VendorMenuItem(vendor_id=v.id, name=f"{v.name}-{n}", description="", price=80 + n * 10, weekday=None)
+        for v in vendors for n in range(3)
+    ]
+    legacy_items = [models.MenuItem(name=f"舊品項{n}", description="", price=70, category="便當") for n in range(3)]
+    db.add_all(items + legacy_items)
+    db.add(models.SpecialDay(date=day + timedelta(days=5), is_holiday=False, description="補班"))
+    db.flush()
+
+    for n, user in enumerate(users):
+        if n % 5 == 3:
+            continue  # 未訂餐
+        if n % 5 == 4:
+            db.add(models.Order(user_id=user.id, order_date=day, status="NoOrder"))
+        elif n % 5 == 2:
+            legacy = legacy_items[n % len(legacy_items)]
+            db.add(models.Order(
+                user_id=user.id, order_date=day, status="Confirmed",
+                items=json.dumps([{"menu_item_id": legacy.id, "quantity": 1}]),
+            ))
+        else:
+            item = items[n % len(items)]
+            db.add(models.Order(
+                user_id=user.id, vendor_id=item.vendor_id, vendor_menu_item_id=item.id,
+                order_date=day, status="Pending", unit_price=item.price, item_name=item.name,
+            ))
+    admin_order = models.Order(
+        user_id=admin.id, vendor_id=items[0].vendor_id, vendor_menu_item_id=items[0].id,
+        order_date=day, status="Pending", unit_price=items[0].price, item_name=items[0].name,
+    )
+    db.add(admin_order)
+    db.commit()
+
+    ids = {
+        "day": day,
+        "user": users[0].id,
+        "user_without_order": users[3].id,
+        "divisions": [d.id for d in divisions[:2]],
+        "empty_division": divisions[2].id,
+        "departments": [d.id for d in departments],
+        "vendor": vendors[0].id,
+        "item": items[0].id,
+        "other_item": items[1].id,
+        "legacy_item": legacy_items[0].id,
+        "admin_order": admin_order.id,
+    }
+    db.close()
+    return ids
+
+
+# (method, path) -> (預算, 依資料集產生請求參數)
+# 預算包含驗證使用者的查詢與快取冷啟動時的載入查詢
+def _order(ids, **extra):
+    return {"order_date": str(ids["day"]), "vendor_id": ids["vendor"], "vendor_menu_item_id": ids["item"], **extra}
+
+
+BUDGETS = {
+    ("POST", "/api/auth/register"): (4, lambda ids: {"json": {"employee_id": "new", "name": "New", "password": "pw"}}),
+    ("POST", "/api/auth/login"): (1, lambda ids: {"data": {"username": "admin", "password": "password123"}}),
+    ("GET", "/api/auth/me"): (1, lambda ids: {}),
+    ("POST", "/api/auth/change-password"): (4, lambda ids: {
+        "json": {"old_password": "password123", "new_password": "password456"}}),
+    ("GET", "/api/menu/"): (2, lambda ids: {}),
+    ("POST", "/api/menu/"): (4, lambda ids: {
+        "json": {"name": "新品項", "price": 60, "category": "便當"}}),
+    ("PUT", "/api/menu/{item_id}"): (5, lambda ids: {
+        "path": {"item_id": ids["legacy_item"]}, "json": {"name": "改名", "price": 60, "category": "便當"}}),
+    ("DELETE", "/api/menu/{item_id}"): (4, lambda ids: {"path": {"item_id": ids["legacy_item"]}}),
+    ("GET", "/api/changes"): (8, lambda ids: {"params": {"since": 0}}),
+    ("GET", "/api/orders/special_days"): (3, lambda ids: {}),
+    ("GET", "/api/orders/calendar"): (6, lambda ids: {"params": {"month": ids["day"].strftime("%Y-%m")}}),
+    ("GET", "/api/orders/"): (6, lambda ids: {}),
+    ("POST", "/api/orders/"): (6, lambda ids: {"json": _order(ids, order_date=str(ids["day"] + timedelta(days=1)))}),
+    ("POST", "/api/orders/batch"): (6, lambda ids: {"json": {"orders": [
+        _order(ids, order_date=str(ids["day"] + timedelta(days=n))) for n in range(1, 5)]}}),
+    ("PUT", "/api/orders/range"): (7, lambda ids: {"json": {
+        "start_date": str(ids["day"]), "end_date": str(ids["day"] + timedelta(days=4)),
+        "selections": [_order(ids, order_date=str(ids["day"] + timedelta(days=n))) for n in range(3)]}}),
+    ("GET", "/api/orders/weekly_plan"): (5, lambda ids: {}),
+    ("PUT", "/api/orders/weekly_plan"): (6, lambda ids: {"json": {"days": [
+        {"weekday": n, "vendor_id": ids["vendor"], "vendor_menu_item_id": ids["item"]} for n in range(4)
+    ] + [{"weekday": 4, "is_no_order": True}]}}),
+    ("DELETE", "/api/orders/{order_id}"): (4, lambda ids: {"path": {"order_id": ids["admin_order"]}}),
+    ("PATCH", "/api/orders/{order_id}"): (6, lambda ids: {
+        "path": {"order_id": ids["admin_order"]},
+        "json": {"vendor_id": ids["vendor"], "vendor_menu_item_id": ids["other_item"]}}),
+    ("GET", "/api/admin/stats"): (5, lambda ids: {"params": {"date": str(ids["day"])}}),
+    ("GET", "/api/admin/reminders/missing"): (4, lambda ids: {"params": {"target_date": str(ids["day"])}}),
+    ("POST", "/api/admin/reminders/send"): (3, lambda ids: {"params": {"target_date": str(ids["day"])}}),
+    ("GET", "/api/admin/users"): (3, lambda ids: {}),
+    ("POST", "/api/admin/users"): (5, lambda ids: {"json": {"employee_id": "new", "name": "New", "password": "pw"}}),
+    ("PUT", "/api/admin/users/{user_id}"): (5, lambda ids: {"path": {"user_id": ids["user"]}, "json": {"name": "改名"}}),
+    ("DELETE", "/api/admin/users/{user_id}"): (5, lambda ids: {"path": {"user_id": ids["user_without_order"]}}),
+    ("GET", "/api/admin/divisions"): (3, lambda ids: {}),
+    ("POST", "/api/admin/divisions"): (5, lambda ids: {"json": {"name": "新處別"}}),
+    ("GET", "/api/admin/divisions/{division_id}"): (4, lambda ids: {"path": {"division_id": ids["divisions"][0]}}),
+    ("PUT", "/api/admin/divisions/{division_id}"): (5, lambda ids: {
+        "path": {"division_id": ids["divisions"][0]}, "json": {"display_order": 3}}),
+    ("DELETE", "/api/admin/divisions/{division_id}"): (5, lambda ids: {"path": {"division_id": ids["empty_division"]}}),
+    ("GET", "/api/admin/departments"): (3, lambda ids: {}),
+    ("POST", "/api/admin/departments"): (5, lambda ids: {
+        "json": {"name": "新部門", "division_id": ids["divisions"][0]}}),
+    ("GET", "/api/admin/departments/by-division/{division_id}"): (3, lambda ids: {
+        "path": {"division_id": ids["divisions"][0]}}),
+    ("PUT", "/api/admin/departments/{dept_id}"): (5, lambda ids: {
+        "path": {"dept_id": ids["departments"][0]}, "json": {"display_order": 3}}),
+    ("DELETE", "/api/admin/departments/{dept_id}"): (4, lambda ids: {"path": {"dept_id": ids["departments"][3]}}),
+    ("GET", "/api/admin/orders/daily_details"): (7, lambda ids: {"params": {"date": str(ids["day"])}}),
+    ("GET", "/api/admin/orders/vendor_sheets"): (3, lambda ids: {"params": {"date": str(ids["day"])}}),
+    ("PUT", "/api/admin/orders/user_order"): (7, lambda ids: {"json": {
+        "user_id": ids["user_without_order"], "order_date": str(ids["day"]),
+        "vendor_id": ids["vendor"], "item_id": ids["item"]}}),
+    ("PUT", "/api/admin/orders/bulk"): (8, lambda ids: {"json": {"rows": [
+        {"department_id": ids["departments"][1], "order_date": str(ids["day"] + timedelta(days=n)),
+         "vendor_id": ids["vendor"], "item_id": ids["item"]} for n in range(3)
+    ] + [{"user_id": ids["user"], "order_date": str(ids["day"]), "is_cancel": True}]}}),
+    ("GET", "/api/admin/special_days"): (3, lambda ids: {}),
+    ("POST", "/api/admin/special_days"): (5, lambda ids: {"json": {
+        "date": str(ids["day"] + timedelta(days=1)), "is_holiday": True, "description": "假日"}}),
+    ("DELETE", "/api/admin/special_days/{date_str}"): (4, lambda ids: {
+        "path": {"date_str": str(ids["day"] + timedelta(days=5))}}),
+    ("GET", "/api/admin/order_announcement"): (5, lambda ids: {"params": {"date": str(ids["day"])}}),
+    ("GET", "/api/admin/reports/billing"): (3, lambda ids: {"params": {"month": ids["day"].strftime("%Y-%m")}}),
+    ("GET", "/api/admin/instrumentation"): (1, lambda ids: {}),
+    ("PUT", "/api/admin/instrumentation"): (3, lambda ids: {"json": {"slow_request_ms": 500}}),
+    ("GET", "/api/admin/jobs"): (3, lambda ids: {}),
+    ("POST", "/api/admin/jobs/{name}/run"): (9, lambda ids: {"path": {"name": "prune_changes"}}),
+    ("GET", "/api/admin/jobs/{name}/runs"): (2, lambda ids: {"path": {"name": "prune_changes"}}),
+    ("GET", "/api/vendors/"): (4, lambda ids: {}),
+    ("POST", "/api/vendors/"): (5, lambda ids: {"json": {"name": "新廠商"}}),
+    ("GET", "/api/vendors/{vendor_id}"): (4, lambda ids: {"path": {"vendor_id": ids["vendor"]}}),
+    ("PUT", "/api/vendors/{vendor_id}"): (5, lambda ids: {
+        "path": {"vendor_id": ids["vendor"]}, "json": {"name": "改名廠商"}}),
+    ("DELETE", "/api/vendors/{vendor_id}"): (4, lambda ids: {"path": {"vendor_id": ids["vendor"]}}),
+    ("GET", "/api/vendors/{vendor_id}/menu"): (4, lambda ids: {"path": {"vendor_id": ids["vendor"]}}),
+    ("POST", "/api/vendors/{vendor_id}/menu"): (5, lambda ids: {
+        "path": {"vendor_id": ids["vendor"]}, "json": {"vendor_id": ids["vendor"], "name": "新品項", "price": 90}}),
+    ("PUT", "/api/vendors/{vendor_id}/menu/{item_id}"): (5, lambda ids: {
+        "path": {"vendor_id": ids["vendor"], "item_id": ids["item"]},
+        "json": {"vendor_id": ids["vendor"], "name": "改名", "price": 90}}),
+    ("DELETE", "/api/vendors/{vendor_id}/menu/{item_id}"): (4, lambda ids: {
+        "path": {"vendor_id": ids["vendor"], "item_id": ids["item"]}}),
+    ("GET", "/api/vendors/available/{order_date}"): (5, lambda ids: {"path": {"order_date": str(ids["day"])}}),
+    ("GET", "/api/extension-directory/"): (5, lambda ids: {}),
+    ("GET", "/api/extension-directory/divisions"): (3, lambda ids: {}),
+    ("GET", "/api/extension-directory/departments"): (3, lambda ids: {}),
+    ("PUT", "/api/extension-directory/divisions/{division_id}/position"): (5, lambda ids: {
+        "path": {"division_id": ids["divisions"][0]}, "params": {"display_column": 1, "display_order": 2}}),
+    ("PUT", "/api/extension-directory/departments/{dept_id}/position"): (5, lambda ids: {
+        "path": {"dept_id": ids["departments"][0]}, "params": {"display_order": 2}}),
+    ("PUT", "/api/extension-directory/divisions/batch-position"): (5, lambda ids: {"json": [
+        {"id": div_id, "display_column": 1, "display_order": n} for n, div_id in enumerate(ids["divisions"])]}),
+    ("PUT", "/api/extension-directory/departments/batch-position"): (3, lambda ids: {"json": [
+        {"id": dept_id, "display_order": n} for n, dept_id in enumerate(ids["departments"])]}),
+    ("GET", "/api/extension-directory/users/{dept_id}"): (3, lambda ids: {"path": {"dept_id": ids["departments"][0]}}),
+    ("GET", "/api/metrics"): (1, lambda ids: {}),
+    ("GET", "/"): (0, lambda ids: {}),
+}
+
+
+# 長連線端點無法以 TestClient 完整執行，改為量測建立連線時的查詢（看板載入）
+STREAMING = {
+    ("GET", "/api/admin/orders/stream"): 1,
+}
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    def build(size: str):
+        database = stack.enter_context(serving(tmp_path / f"{size}.db"))
+        ids = build_dataset(database.engine, SIZES[size])
+        order_lines.convert(database.engine)
+        return database, ids
+
+    with ExitStack() as stack:
+        yield build
+
+
+def run_request(database, ids, method: str, path: str, budget: int, build_request):
+    app.dependency_overrides[get_db] = database.get_db
+    cache.invalidate()
+
+    request = build_request(ids)
+    url = path.format(**request.get("path", {}))
+    with query_budget(database.engine, budget, f"{method} {path}") as statements:
+        response = database.client.request(
+            method, url, headers=database.headers("admin"),
+            params=request.get("params"), json=request.get("json"), data=request.get("data"),
+        )
+    assert response.status_code < 400, f"{method} {path}: {response.status_code} {response.text}"
+    return len(statements)
+
+
+def test_every_endpoint_has_a_budget():
+    declared = set(BUDGETS) | set(STREAMING)
+    routes = {
+        (method.upper(), path)
+        for path, operations in app.openapi()["paths"].items()
+        for method in operations
+    }
+    assert routes - declared == set(), "endpoints without a query budget"
+    assert declared - routes == set(), "budgets for endpoints that no longer exist"
+
+
+@pytest.mark.parametrize("method,path", sorted(BUDGETS), ids=lambda value: value)
+def test_query_budget(dataset, method, path):
+    budget, build_request = BUDGETS[(method, path)]
+    counts = {}
+    for size in SIZES:
+        database, ids = dataset(size)
+        counts[size] = run_request(database, ids, method, path, budget, build_request)
+    # 查詢數不得隨資料量成長
+    assert counts["small"] == counts["large"], counts
+
+
+def test_order_stream_board_budget(dataset):
+    import asyncio
+
+    from app import order_board
+
+    budget = STREAMING[("GET", "/api/admin/orders/stream")]
+    for size in SIZES:
+        database, ids = dataset(size)
+        loop = asyncio.new_event_loop()
+        queue = asyncio.Queue()
+        with database.SessionLocal() as db:
+            with query_budget(database.engine, budget, f"order board ({size})"):
+                order_board.subscribe(ids["day"], db, loop, queue)
+        order_board.unsubscribe(ids["day"], queue)
+        loop.close()
+
+
+CONDITIONAL_GETS = sorted(
+    key for key in BUDGETS
+    if key[0] == "GET" and key[1] not in (
+        "/", "/api/auth/me", "/api/metrics", "/api/admin/instrumentation", "/api/changes",
+        "/api/admin/jobs", "/api/admin/jobs/{name}/runs",
+    )
+)
+
+
+@pytest.mark.parametrize("method,path", CONDITIONAL_GETS, ids=lambda value: value)
+def test_revalidation_is_answered_before_endpoint_queries(dataset, method, path):
+    _, build_request = BUDGETS[(method, path)]
+    database, ids = dataset("large")
+    request = build_request(ids)
+    url = path.format(**request.get("path", {}))
+    headers = database.headers("admin")
+    client = database.client
+
+    first = client.get(url, headers=headers, params=request.get("params"))
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    # 驗證使用者 + 版本查詢
+    with query_budget(database.engine, 2, f"revalidate {path}"):
+        second = client.get(url, headers={**headers, "If-None-Match": etag}, params=request.get("params"))
+    assert second.status_code == 304
+    assert second.headers["etag"] == etag
+    assert second.content == b""
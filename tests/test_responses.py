@@ -0,0 +1,81 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import gzip
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from app import models, responses, schemas
+
+
+@pytest.fixture(scope="module")
+def env(module_database):
+    db = module_database.SessionLocal()
+    db.add(models.User(employee_id="u001", name="User", hashed_password="x", is_active=True))
+    start = date(2030, 1, 1)
+    db.add_all([
+        models.SpecialDay(date=start + timedelta(days=n), is_holiday=n % 2 == 0, description=f"特殊日 {n}")
+        for n in range(100)
+    ])
+    db.commit()
+    db.close()
+
+    return module_database.env(headers=module_database.headers("u001"))
+
+
+def raw_get(env, path, **headers):
+    # 不讓 httpx 自動解壓縮，直接檢查傳輸內容
+    with env["client"].stream("GET", path, headers={**env["headers"], **headers}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_large_response_is_gzipped(env):
+    response, body = raw_get(env, "/api/orders/special_days", **{"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    # 其他 middleware 加上的標頭需保留
+    assert "X-DB-Queries" in response.headers
+    days = json.loads(gzip.decompress(body))
+    assert len(days) == 100
+    assert days[0]["date"] == "2030-01-01"
+
+
+def test_brotli_preferred_when_available(env):
+    brotli = pytest.importorskip("brotli")
+    response, body = raw_get(env, "/api/orders/special_days", **{"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert len(json.loads(brotli.decompress(body))) == 100
+
+
+def test_small_or_unaccepted_response_is_not_compressed(env):
+    response, body = raw_get(env, "/", **{"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert json.loads(body) == {"message": "Welcome to VSCC-WebDiner API"}
+
+    response, body = raw_get(env, "/api/orders/special_days", **{"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert len(json.loads(body)) == 100
+
+
+def test_msgpack_negotiation(env):
+    msgpack = pytest.importorskip("msgpack")
+    response = env["client"].get(
+        "/api/orders/special_days", headers={**env["headers"], "Accept": "application/msgpack"}
+    )
+    assert response.headers["content-type"] == "application/msgpack"
+    days = msgpack.unpackb(response.content)
+    assert days == env["client"].get("/api/orders/special_days", headers=env["headers"]).json()
+
+
+def test_trusted_serializes_models_and_dates():
+    body = responses.trusted({
+        "date": date(2030, 1, 2),
+        "token": schemas.TokenData(username="u001"),
+        "keys": {date(2030, 1, 3): [1]},
+    }).body
+    assert json.loads(body) == {"date": "2030-01-02", "token": {"username": "u001"}, "keys": {"2030-01-03": [1]}}
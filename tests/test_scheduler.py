@@ -0,0 +1,142 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import cache, jobs, models, scheduler
+from query_budget import query_budget
+
+# 2026-03-02（週一）09:00 台灣時間
+CUTOFF = datetime(2026, 3, 2, 1, 0)
+TODAY = date(2026, 3, 2)
+
+
+@pytest.fixture
+def env(database):
+    with database.SessionLocal() as db:
+        sysadmin = models.User(employee_id="s001", name="Sys", hashed_password="x", is_active=True,
+                               is_admin=True, role="sysadmin")
+        admin = models.User(employee_id="a001", name="Admin", hashed_password="x", is_active=True,
+                            is_admin=True, role="admin")
+        users = [models.User(employee_id=f"u{n:03d}", name=f"User {n}", hashed_password="x", is_active=True)
+                 for n in range(1, 4)]
+        vendor = models.Vendor(name="便當店", description="")
+        db.add_all([sysadmin, admin, vendor, *users])
+        db.flush()
+        item = models.VendorMenuItem(vendor_id=vendor.id, name="雞腿飯", description="", price=100)
+        db.add(item)
+        db.flush()
+        for user, day in ((users[0], TODAY), (users[1], TODAY - timedelta(days=3)), (users[2], TODAY + timedelta(days=1))):
+            db.add(models.Order(user_id=user.id, vendor_id=vendor.id, vendor_menu_item_id=item.id, order_date=day,
+                                status="Pending", unit_price=100, vendor_name="便當店", item_name="雞腿飯"))
+        db.commit()
+
+    return database.env(sysadmin=database.headers("s001"), admin=database.headers("a001"))
+
+
+def statuses(env):
+    with env["SessionLocal"]() as db:
+        return {order.order_date: order.status for order in db.query(models.Order)}
+
+
+def test_cron_is_evaluated_in_taiwan_time():
+    weekdays = scheduler.Cron.parse("0 9 * * 1-5")
+    # 週五 09:00 之後的下一次為週一 09:00（UTC 01:00）
+    assert weekdays.next_after(datetime(2026, 3, 6, 1, 0)) == datetime(2026, 3, 9, 1, 0)
+    assert scheduler.Cron.parse("*/15 * * * *").next_after(datetime(2026, 3, 2, 1, 7)) == datetime(2026, 3, 2, 1, 15)
+    # 7 與 0 皆為週日
+    assert scheduler.Cron.parse("0 3 * * 7").next_after(CUTOFF) == datetime(2026, 3, 7, 19, 0)
+    for expression in ("0 9 * *", "60 9 * * *", "0 9 * * 8"):
+        with pytest.raises(ValueError):
+            scheduler.Cron.parse(expression)
+
+
+def test_cutoff_confirms_pending_orders_in_one_update(env):
+    scheduler.sync(env["engine"], now=CUTOFF - timedelta(minutes=5))
+    with query_budget(env["engine"], 20) as statements:
+        runs = scheduler.run_due(env["engine"], now=CUTOFF)
+    assert [run["job_name"] for run in runs] == ["confirm_orders"]
+    assert runs[0]["result"]["confirmed"] == 2
+    assert sum(statement.lstrip().startswith("UPDATE orders") for statement in statements) == 1
+    assert statuses(env) == {
+        TODAY: "Confirmed", TODAY - timedelta(days=3): "Confirmed", TODAY + timedelta(days=1): "Pending",
+    }
+
+    # 同一次到期不會重複執行；下次執行時間已推進到明日
+    assert scheduler.run_due(env["engine"], now=CUTOFF) == []
+    with env["SessionLocal"]() as db:
+        assert db.get(models.ScheduledJob, "confirm_orders").next_run_at == CUTOFF + timedelta(days=1)
+
+
+def test_only_one_worker_runs_a_job(env):
+    scheduler.sync(env["engine"], now=CUTOFF - timedelta(minutes=5))
+    with env["SessionLocal"]() as db:
+        row = db.get(models.ScheduledJob, "confirm_orders")
+        row.locked_by, row.locked_until = "other:1", CUTOFF + timedelta(minutes=30)
+        db.commit()
+
+    assert scheduler.run_job(env["engine"], "confirm_orders", trigger="schedule", now=CUTOFF) is None
+    with pytest.raises(scheduler.JobLocked):
+        scheduler.run_job(env["engine"], "confirm_orders", now=CUTOFF)
+    assert statuses(env)[TODAY] == "Pending"
+
+    # 租約到期後（持有者已中斷）可再次取得
+    run = scheduler.run_job(env["engine"], "confirm_orders", trigger="schedule", now=CUTOFF + timedelta(hours=1))
+    assert run["status"] == "success"
+
+
+def test_failed_runs_are_recorded(env):
+    @scheduler.job("broken", "0 0 * * *", "測試用")
+    def broken(engine, now):
+        raise RuntimeError("boom")
+
+    try:
+        run = scheduler.run_job(env["engine"], "broken", now=CUTOFF)
+        assert (run["status"], run["error"]) == ("failed", "RuntimeError: boom")
+        # 失敗後釋放租約
+        assert scheduler.run_job(env["engine"], "broken", now=CUTOFF)["status"] == "failed"
+    finally:
+        scheduler.JOBS.pop("broken")
+
+
+def test_announcement_and_reminders_skip_holidays(env):
+    with env["SessionLocal"]() as db:
+        db.add(models.SpecialDay(date=TODAY, is_holiday=True, description="補假"))
+        db.commit()
+    cache.invalidate()
+    for name in ("order_reminders", "order_announcement"):
+        assert scheduler.run_job(env["engine"], name, now=CUTOFF)["result"]["skipped"] == "holiday"
+
+    run = scheduler.run_job(env["engine"], "order_announcement", now=CUTOFF + timedelta(days=1))
+    assert run["result"]["orders"] == 1
+    assert "【便當店】雞腿飯 × 1：User 3" in run["result"]["text"]
+
+
+def test_reminders_go_to_active_users_without_an_order(env):
+    run = scheduler.run_job(env["engine"], "order_reminders", now=CUTOFF - timedelta(minutes=30))
+    assert run["result"]["sent"] == 4
+
+
+def test_sysadmin_api_lists_triggers_and_inspects_runs(env):
+    client, headers = env["client"], env["sysadmin"]
+    assert client.get("/api/admin/jobs", headers=env["admin"]).status_code == 403
+
+    listed = client.get("/api/admin/jobs", headers=headers).json()
+    assert {job["name"] for job in listed} == set(scheduler.JOBS)
+    confirm = next(job for job in listed if job["name"] == "confirm_orders")
+    assert confirm["cron"] == jobs._at(0) == "0 9 * * *"
+
+    response = client.post("/api/admin/jobs/prune_changes/run", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["trigger"] == "manual" and response.json()["status"] == "success"
+    assert client.post("/api/admin/jobs/missing/run", headers=headers).status_code == 404
+
+    runs = client.get("/api/admin/jobs/prune_changes/runs", headers=headers).json()
+    assert [run["id"] for run in runs] == [response.json()["id"]]
+    listed = client.get("/api/admin/jobs", headers=headers).json()
+    assert next(job for job in listed if job["name"] == "prune_changes")["last_run"]["status"] == "success"
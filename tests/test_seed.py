@@ -0,0 +1,25 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.tools import seed
+
+
+def test_seed_builds_database(tmp_path):
+    path = tmp_path / "seed.db"
+
+    counts = seed.seed(str(path), users=20, orders=200, vendors=2, log=lambda *_: None)
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 20
+        assert conn.execute("SELECT COUNT(*) FROM vendors").fetchone()[0] == 2
+        assert conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == counts["orders"] == 200
+        # 後來新增的可為空欄位使用預設值
+        assert conn.execute("SELECT COUNT(*) FROM vendors WHERE daily_limit IS NOT NULL").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM vendor_menu_items WHERE is_active = 1").fetchone()[0] \
+            == counts["vendor_menu_items"]
+    finally:
+        conn.close()
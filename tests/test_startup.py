@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import os
+import subprocess
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app import cache, migrations, models, startup
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_importing_app_does_not_touch_database(tmp_path):
+    subprocess.run(
+        [sys.executable, "-c", "import app.main"],
+        cwd=tmp_path, env={**os.environ, "PYTHONPATH": str(ROOT)}, check=True,
+    )
+    assert not (tmp_path / "webdiner.db").exists()
+
+
+def test_lifespan_upgrades_schema_and_warms_caches(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'startup.db'}", connect_args={"check_same_thread": False})
+    cache.invalidate()
+    try:
+        with TestClient(FastAPI(lifespan=startup.lifespan_for(engine))):
+            # 開始接受請求前，所有已登記的快取領域都已載入
+            assert {"catalog", "calendar", "directory"} <= cache.backend().loaded_domains()
+        with engine.connect() as conn:
+            assert migrations.current_version(conn) == migrations.MIGRATIONS[-1].version
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        # 已預熱時不重複載入
+        with sessionmaker(bind=engine)() as db:
+            assert cache.warm_up(db) == []
+    finally:
+        cache.invalidate()
+        engine.dispose()
+
+
+def test_directory_cache_is_invalidated_by_org_writes(database):
+    with database.SessionLocal() as db:
+        db.add(models.User(employee_id="a001", name="Admin", hashed_password="x", is_active=True,
+                           is_admin=True, role="admin"))
+        db.commit()
+    client = database.client
+    headers = database.headers("a001")
+
+    def department_names():
+        directory = client.get("/api/extension-directory/", headers=headers).json()
+        return [dept["name"] for column in directory["columns"]
+                for division in column["divisions"] for dept in division["departments"]]
+
+    assert department_names() == []
+    assert client.post("/api/admin/departments", json={"name": "行政服務部"}, headers=headers).status_code == 200
+    assert department_names() == ["行政服務部"]
@@ -0,0 +1,136 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import cache, models, scheduler, weekly_plans
+from app.routers.auth import create_access_token
+from query_budget import query_budget
+
+TODAY = date.today()
+MONDAY, SUNDAY = weekly_plans.next_week(TODAY)
+
+
+@pytest.fixture
+def env(database):
+    with database.SessionLocal() as db:
+        users = [models.User(employee_id=f"u{n:03d}", name=f"User {n}", hashed_password="x", is_active=True)
+                 for n in range(1, 4)]
+        vendor = models.Vendor(name="便當店", description="")
+        db.add_all([vendor, *users])
+        db.flush()
+        daily = models.VendorMenuItem(vendor_id=vendor.id, name="雞腿飯", description="", price=100)
+        friday = models.VendorMenuItem(vendor_id=vendor.id, name="週五咖哩", description="", price=110, weekday=4)
+        db.add_all([daily, friday])
+        db.commit()
+        ids = {"users": [u.id for u in users], "vendor": vendor.id, "daily": daily.id, "friday": friday.id}
+
+    return database.env(
+        headers=[{"Authorization": f"Bearer {create_access_token({'sub': f'u{n:03d}'})}"} for n in range(1, 4)],
+        **ids,
+    )
+
+
+def plan(env, user, *days):
+    return env["client"].put("/api/orders/weekly_plan", headers=env["headers"][user], json={"days": list(days)})
+
+
+def orders(env):
+    with env["SessionLocal"]() as db:
+        return {(order.user_id, order.order_date): (order.status, order.item_name, order.unit_price)
+                for order in db.query(models.Order)}
+
+
+def test_plan_is_validated_against_the_catalog(env):
+    item = {"vendor_id": env["vendor"], "vendor_menu_item_id": env["daily"]}
+    assert plan(env, 0, {"weekday": 5, **item}).status_code == 400
+    assert plan(env, 0, {"weekday": 0, **item}, {"weekday": 0, "is_no_order": True}).status_code == 400
+    response = plan(env, 0, {"weekday": 0, "vendor_id": env["vendor"], "vendor_menu_item_id": env["friday"]})
+    assert (response.status_code, response.json()["detail"]) == (400, "此餐點品項在星期一不供應")
+    assert plan(env, 0, {"weekday": 0, "vendor_id": env["vendor"], "vendor_menu_item_id": 999}).status_code == 404
+
+    response = plan(env, 0, {"weekday": 4, "vendor_id": env["vendor"], "vendor_menu_item_id": env["friday"]},
+                    {"weekday": 0, **item}, {"weekday": 2, "is_no_order": True})
+    assert response.status_code == 200
+    stored = env["client"].get("/api/orders/weekly_plan", headers=env["headers"][0])
+    assert stored.json() == response.json()
+    assert [(day["weekday"], day["menu_item_name"]) for day in stored.json()] == [
+        (0, "雞腿飯"), (2, "不訂餐"), (4, "週五咖哩")]
+
+    # 計畫變更後 ETag 失效
+    etag = stored.headers["etag"]
+    assert env["client"].get("/api/orders/weekly_plan", headers={**env["headers"][0], "If-None-Match": etag}).status_code == 304
+    plan(env, 0)
+    assert env["client"].get("/api/orders/weekly_plan", headers={**env["headers"][0], "If-None-Match": etag}).json() == []
+
+
+def test_next_week_is_materialized_in_one_insert(env):
+    users = env["users"]
+    daily = {"vendor_id": env["vendor"], "vendor_menu_item_id": env["daily"]}
+    plan(env, 0, *({"weekday": n, **daily} for n in range(5)))
+    plan(env, 1, {"weekday": 0, "is_no_order": True}, {"weekday": 4, "vendor_id": env["vendor"],
+                                                       "vendor_menu_item_id": env["friday"]})
+    plan(env, 2, {"weekday": 1, **daily})
+
+    with env["SessionLocal"]() as db:
+        # 週三為假日；u003 週二已自行改訂不訂餐；u001 的週四品項停用後略過
+        db.add(models.SpecialDay(date=MONDAY + timedelta(days=2), is_holiday=True, description="國定假日"))
+        db.add(models.Order(user_id=users[2], order_date=MONDAY + timedelta(days=1), status="NoOrder"))
+        db.commit()
+    cache.invalidate()
+
+    with query_budget(env["engine"], 20) as statements:
+        with env["SessionLocal"]() as db:
+            created = weekly_plans.materialize(db, MONDAY, SUNDAY)
+    assert sum("INSERT INTO orders" in statement for statement in statements) == 1
+    assert len(created) == 6
+
+    day = lambda n: MONDAY + timedelta(days=n)
+    assert orders(env) == {
+        (users[0], day(0)): ("Pending", "雞腿飯", 100),
+        (users[0], day(1)): ("Pending", "雞腿飯", 100),
+        (users[0], day(3)): ("Pending", "雞腿飯", 100),
+        (users[0], day(4)): ("Pending", "雞腿飯", 100),
+        (users[1], day(0)): ("NoOrder", None, None),
+        (users[1], day(4)): ("Pending", "週五咖哩", 110),
+        (users[2], day(1)): ("NoOrder", None, None),
+    }
+
+    # 重複執行不會覆蓋或重複建立
+    with env["SessionLocal"]() as db:
+        assert weekly_plans.materialize(db, MONDAY, SUNDAY) == []
+
+
+def test_inactive_items_and_users_are_skipped(env):
+    plan(env, 0, {"weekday": 0, "vendor_id": env["vendor"], "vendor_menu_item_id": env["daily"]})
+    plan(env, 1, {"weekday": 0, "vendor_id": env["vendor"], "vendor_menu_item_id": env["daily"]})
+    with env["SessionLocal"]() as db:
+        db.get(models.User, env["users"][1]).is_active = False
+        db.commit()
+    with env["SessionLocal"]() as db:
+        assert [order["user_id"] for order in weekly_plans.materialize(db, MONDAY, SUNDAY)] == [env["users"][0]]
+
+    with env["SessionLocal"]() as db:
+        db.get(models.VendorMenuItem, env["daily"]).is_active = False
+        db.commit()
+    cache.invalidate()
+    plan_view = env["client"].get("/api/orders/weekly_plan", headers=env["headers"][0]).json()
+    assert plan_view[0]["available"] is False
+    with env["SessionLocal"]() as db:
+        assert weekly_plans.materialize(db, MONDAY + timedelta(days=7), SUNDAY + timedelta(days=7)) == []
+
+
+def test_weekly_job_targets_the_following_week(env):
+    plan(env, 0, {"weekday": 0, "vendor_id": env["vendor"], "vendor_menu_item_id": env["daily"]})
+    friday = TODAY + timedelta(days=(4 - TODAY.weekday()) % 7)
+    # 週五 12:00 台灣時間（UTC 04:00）
+    now = datetime.combine(friday, datetime.min.time()).replace(hour=4)
+    run = scheduler.run_job(env["engine"], "weekly_orders", now=now)
+    assert run["status"] == "success"
+    assert run["result"]["created"] == 1
+    assert list(orders(env)) == [(env["users"][0], friday + timedelta(days=3))]